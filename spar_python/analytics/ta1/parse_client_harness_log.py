@@ -506,9 +506,12 @@ def main():
         resolved_file = log_parser.resolve_ts_to_temp(log)
         if resolved_file:
             # Parse the timestamp modified file
-            (new_rows, baseline_matches) = \
-                parse_queries(log_parser, resolved_file, \
-                                  record_func, results_db, flags)
+            # push all of this file's rows to the database in a single
+            # transaction:
+            with results_db.bulk_writes():
+                (new_rows, baseline_matches) = \
+                    parse_queries(log_parser, resolved_file, \
+                                      record_func, results_db, flags)
             if options.baseline:
                 # merge the baseline data from each log file
                 for qid, data in baseline_matches.iteritems():
@@ -528,15 +531,18 @@ def main():
     if options.baseline:
         # do baseline mods now that it has all the client logs parsed and 
         # stored in all_baseline_matches
-        process_baseline_matches(all_baseline_matches, results_db)
+        with results_db.bulk_writes():
+            process_baseline_matches(all_baseline_matches, results_db)
 
 
     if options.baseline:
         # do baseline mods now that it has all the client logs parsed and 
         # stored in all_baseline_matches
-        process_baseline_matches(all_baseline_matches, results_db)
-
+        with results_db.bulk_writes():
+            process_baseline_matches(all_baseline_matches, results_db)
 
+    # index the database now that it has been loaded:
+    results_db.create_indices()
     results_db.close()
 
 
@@ -114,6 +114,8 @@ def process_results_data(log_parser, results, output_db):
         except sqlite3.IntegrityError, error:
             LOGGER.warning('Failed to insert row into verifications table:  ' + \
                            '%s.\nSkipping row:  %s', error, str(row))
+    # index the database now that it has been loaded:
+    server_db.create_indices()
     server_db.close()
 
 def parse_file(log_parser, input_file):
@@ -225,6 +225,8 @@ class CircuitParser(log_parser_util.LogParserUtil):
                     self.logger.warning('Could not insert row into %s ' +\
                                         'table:  %s.\nSkipping row:  %s', \
                                         table, error, str(row))
+        # index the database now that it has been loaded:
+        circuit_db.create_indices()
         circuit_db.close()
 
     def get_id_from_filename(self, filename):
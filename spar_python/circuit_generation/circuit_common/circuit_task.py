@@ -0,0 +1,70 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            SY
+#  Description:        TA2 circuit generation task class
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+# general imports:
+import abc
+import multiprocessing
+import time
+
+# SPAR imports:
+import spar_python.common.spar_random as sr
+
+class CircuitTask(object):
+    """
+    This superclass represents the generation of one circuit, along with its
+    inputs, and the writing of them to their files. This class is never meant
+    to be instantiated; only its subclasses are, and they implement generate.
+    If a task is given a base seed and a stream number, it seeds the RNG with
+    that substream of the seed before generating (see
+    spar_random.seed_substream), so that what it generates does not depend on
+    the tasks run before it, or on the process it is run in. Otherwise, it
+    simply carries on from the current state of the RNG.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, base_seed=None, stream=None):
+        """Initializes the task with the base seed and stream number of its
+        RNG substream, if it has one."""
+        self.__base_seed = base_seed
+        self.__stream = stream
+
+    @abc.abstractmethod
+    def generate(self):
+        """Generates the circuit and its inputs, writes them to their files,
+        and returns the results which the caller needs to record them."""
+        pass
+
+    def run(self):
+        """Runs the task, and returns the results of generate along with the
+        number of seconds it took."""
+        start_time = time.time()
+        if self.__stream is not None:
+            sr.seed_substream(self.__base_seed, self.__stream)
+        results = self.generate()
+        return (results, time.time() - start_time)
+
+def _run_task(task):
+    """Runs task; a module-level function, so that it can be handed to a
+    multiprocessing pool."""
+    return task.run()
+
+def run_tasks(tasks, num_processes=1):
+    """Runs the CircuitTasks in tasks, in a pool of num_processes processes if
+    that is more than one (and one after another in this process otherwise),
+    and returns the list of their results in the same order."""
+    if num_processes > 1:
+        pool = multiprocessing.Pool(num_processes)
+        try:
+            return pool.map(_run_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    return [task.run() for task in tasks]
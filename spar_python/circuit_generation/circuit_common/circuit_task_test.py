@@ -0,0 +1,40 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            SY
+#  Description:        TA2 circuit generation task class test
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+import unittest
+
+import spar_python.circuit_generation.circuit_common.circuit_task as ct
+import spar_python.common.spar_random as sr
+
+class RandomBitsTask(ct.CircuitTask):
+    """A task which just draws some random bits."""
+    def generate(self):
+        return [sr.randbit() for bit_num in xrange(20)]
+
+class TestCircuitTask(unittest.TestCase):
+
+    def test_substreams(self):
+        """
+        Tests that tasks with substreams yield the same results whatever the
+        number of processes they are run in, and that tasks without them
+        carry on from the current state of the RNG.
+        """
+        tasks = [RandomBitsTask(1234, stream) for stream in xrange(4)]
+        sr.seed(1)
+        results = [result for (result, seconds) in ct.run_tasks(tasks)]
+        sr.seed(2)
+        self.assertEqual(results, [result for (result, seconds)
+                                   in ct.run_tasks(tasks, 3)])
+        self.assertEqual(4, len(set(tuple(result) for result in results)))
+        sr.seed(3)
+        first_result = RandomBitsTask().run()[0]
+        sr.seed(3)
+        self.assertEqual(first_result, [sr.randbit() for bit_num in xrange(20)])
@@ -11,6 +11,8 @@
 #  14 Nov 2012   SY             Original Version
 # *****************************************************************
 
+import numpy
+
 class IBMBatch(list):
     """
     This class represents a batched input.
@@ -25,3 +27,43 @@ class IBMBatch(list):
             if elt == value:
                 num_values += 1
         return num_values
+
+class IBMPackedBatch(object):
+    """
+    This class represents a batched input whose bits are stored packed, eight
+    to a byte (see numpy.packbits), rather than as a list of ints. It displays
+    and counts values just as an IBMBatch holding the same bits does.
+    """
+    def __init__(self, bits):
+        """Initializes the batch with a sequence of bits."""
+        bits = numpy.asarray(bits, dtype=numpy.uint8)
+        self.__L = len(bits)
+        self.__packed = numpy.packbits(bits)
+
+    @staticmethod
+    def from_packed(packed, L):
+        """Returns the batch of the first L bits packed into the array
+        packed."""
+        batch = IBMPackedBatch([])
+        batch.__L = L
+        batch.__packed = packed
+        return batch
+
+    def __len__(self):
+        return self.__L
+
+    def get_bits(self):
+        """returns the bits of the batch, as an array of 0s and 1s"""
+        return numpy.unpackbits(self.__packed)[:self.__L]
+
+    def __str__(self):
+        return (self.get_bits() + ord("0")).tostring()
+
+    def get_num_values(self, value):
+        """returns the number of instances of value in the batch"""
+        num_ones = int(numpy.count_nonzero(self.get_bits()))
+        if value == 1:
+            return num_ones
+        elif value == 0:
+            return self.__L - num_ones
+        return 0
@@ -10,6 +10,7 @@
 #  14 Nov 2012   SY             Original Version
 # *****************************************************************
 
+import numpy
 import ibm_batch as ib
 import unittest
 
@@ -27,3 +28,20 @@ class TestBatch(unittest.TestCase):
         self.assertEqual(2, batch.get_num_values(1))
         self.assertEqual(3, batch.get_num_values(0))
  
+
+    def test_packed_batch(self):
+        """
+        Tests that an IBMPackedBatch displays and counts values just as an
+        IBMBatch with the same bits does.
+        """
+        for bits in [[1, 0, 1, 1, 0, 0, 1, 0, 1, 1, 1], [0, 0, 0], []]:
+            batch = ib.IBMBatch(bits)
+            packed_batch = ib.IBMPackedBatch(bits)
+            self.assertEqual(str(batch), str(packed_batch))
+            self.assertEqual(len(batch), len(packed_batch))
+            for value in [0, 1]:
+                self.assertEqual(batch.get_num_values(value),
+                                 packed_batch.get_num_values(value))
+        packed_batch = ib.IBMPackedBatch.from_packed(
+            numpy.packbits([1, 0, 1, 1]), 3)
+        self.assertEqual("101", str(packed_batch))
@@ -9,6 +9,9 @@
 #  ----          ----           ------------
 #  08 Nov 2012   SY             Original Version
 # *****************************************************************
+
+import collections
+import StringIO
     
 class IBMCircuit(object):
     """
@@ -25,6 +28,10 @@ class IBMCircuit(object):
         # self.__levels is a list of the circuit's levels, and is set when
         # the levels first need to be accessed.
         self.__levels = None
+        # self.__num_gates is a Counter mapping each gate function name to the
+        # number of gates with that function, and is set when the number of
+        # gates is first needed.
+        self.__num_gates = None
 
     def set_input_wires(self, input_wires):
         """Sets the input wires"""
@@ -33,6 +40,8 @@ class IBMCircuit(object):
     def set_output_gate(self, output_gate):
         """Sets the output gate."""
         self.__output_gate = output_gate
+        self.__levels = None
+        self.__num_gates = None
 
     def get_depth(self):
         """Returns the depth (as measured by IBM) of the circuit"""
@@ -60,15 +69,20 @@ class IBMCircuit(object):
         # into the appropriate level in self.__levels, and its inputs are
         # pushed onto the stack to eventually be processed as well (unless
         # they have already been processed).
+        # The ids of the circuit objects already processed are kept in a set,
+        # since searching the levels themselves would take time quadratic in
+        # the number of gates per level.
         object_stack = [self.__output_gate]
+        processed_ids = set()
         while len(object_stack) > 0:
             this_object = object_stack.pop()
+            if id(this_object) in processed_ids:
+                continue
+            processed_ids.add(id(this_object))
             this_level = this_object.get_level()
-            if (this_object not in self.__levels[this_level]):
-                self.__levels[this_level].append(this_object)
-                if this_level > 1:
-                    for other_object in this_object.get_inputs():
-                        object_stack.append(other_object)
+            self.__levels[this_level].append(this_object)
+            if this_level > 1:
+                object_stack.extend(this_object.get_inputs())
 
     def get_levels(self):
         """Returns the circuit's levels"""
@@ -79,29 +93,40 @@ class IBMCircuit(object):
     def get_num_gates(self, gate_func_name=None):
         """Returns the number of gates (with the given function name if
         provided)"""
-        num_gates = 0
-        for level in self.get_levels()[1:] + [[self.__output_gate]]:
-            for gate in level:
-                if ((not gate_func_name) or
-                    (gate.get_func_name() == gate_func_name)):
-                    num_gates += 1
-        return num_gates
+        if self.__num_gates == None:
+            # note that the output gate is counted twice: once in its level,
+            # and once on its own.
+            self.__num_gates = collections.Counter(
+                gate.get_func_name()
+                for level in self.get_levels()[1:] + [[self.__output_gate]]
+                for gate in level)
+        if not gate_func_name:
+            return sum(self.__num_gates.itervalues())
+        return self.__num_gates[gate_func_name]
 
     def get_output_gate_func(self):
         """Returns the name of the output gate function"""
         return self.__output_gate.get_func_name()
 
+    def write(self, circuit_file):
+        """Writes the display string for the circuit (see display()) to
+        circuit_file a level at a time, so that the whole string never needs
+        to be held in memory."""
+        circuit_file.write("".join(["W=",
+                                    str(self.get_num_inputs()),
+                                    ",D=",
+                                    str(self.get_depth()),
+                                    ",L=",
+                                    str(self.get_batch_size())]))
+        for level in self.get_levels()[1:]:
+            circuit_file.write("\n")
+            circuit_file.write("\n".join([gate.get_full_display_string()
+                                          for gate in level]))
+
     def display(self):
         """Returns display string for the circuit. This is the string that
         is then given to the IBM server prototype as a representation of this
         circuit."""
-        param_string = "".join(["W=",
-                                str(self.get_num_inputs()),
-                                ",D=",
-                                str(self.get_depth()),
-                                ",L=",
-                                str(self.get_batch_size())])
-        return "\n".join([param_string] +
-                         ["\n".join((gate.get_full_display_string()
-                                     for gate in level))
-                          for level in self.get_levels()[1:]])  
+        display_file = StringIO.StringIO()
+        self.write(display_file)
+        return display_file.getvalue()
@@ -14,6 +14,7 @@ import ibm_wire as iw
 import ibm_gate_mul as igm
 import ibm_gate_add as iga
 import ibm_circuit as ic
+import StringIO
 import unittest
 import spar_python.common.spar_random as sr
 
@@ -89,6 +90,43 @@ class TestAndGate(unittest.TestCase):
         circuit.set_output_gate(output_gate)
         self.assertEqual(3, circuit.get_num_gates(gate_func_name="LADD"))
         self.assertEqual(1, circuit.get_num_gates(gate_func_name="LMUL"))
+        self.assertEqual(4, circuit.get_num_gates())
+
+    def test_write(self):
+        """
+        Tests that the write method writes the display string a level at a
+        time, in a circuit with many gates per level.
+        """
+        # set the desired batch size:
+        L = 10
+        circuit = ic.IBMCircuit(L)
+        # create input wires:
+        wires = [iw.IBMInputWire("w" + str(ind), circuit) for ind in xrange(4)]
+        # create two wide levels of gates, each of which uses every gate in
+        # the level above it:
+        level1 = [iga.IBMAddGate("g" + str(ind), wires[ind % 4],
+                                 wires[(ind + 1) % 4], circuit)
+                  for ind in xrange(1000)]
+        level2 = [igm.IBMMulGate("h" + str(ind), level1[ind],
+                                 level1[(ind + 1) % 1000], circuit)
+                  for ind in xrange(1000)]
+        output_gate = level2[0]
+        for gate in level2[1:]:
+            output_gate = iga.IBMAddGate("og", output_gate, gate, circuit)
+        circuit.set_input_wires(wires)
+        circuit.set_output_gate(output_gate)
+        levels = circuit.get_levels()
+        self.assertEqual(1000, len(levels[1]))
+        self.assertEqual(1000, len(levels[2]))
+        circuit_file = StringIO.StringIO()
+        circuit.write(circuit_file)
+        self.assertEqual(circuit.display(), circuit_file.getvalue())
+        lines = circuit_file.getvalue().split("\n")
+        self.assertEqual("W=4,", lines[0][:4])
+        self.assertEqual(3000, len(lines))
+        # (the output gate is counted twice)
+        self.assertEqual(2000, circuit.get_num_gates(gate_func_name="LADD"))
+        self.assertEqual(1000, circuit.get_num_gates(gate_func_name="LMUL"))
 
     def test_get_num_inputs(self):
         """
@@ -13,21 +13,25 @@
 import ibm_gate_one_inp_and_const as igoiac
 import ibm_batch as ib
 
+def get_additional_depth(batch_size):
+    """Returns the depth which a rotate gate adds to that of its input, for
+    the given batch size."""
+    if batch_size == 600:
+        return .75
+    elif batch_size > 600:
+        # possible batch sizes greater than 600 are 682 and 630.
+        return .25
+    else:
+        # possible batch sizes smaller than 600 are 256 and 378.
+        return .5
+
 class IBMRotateGate(igoiac.IBMGateOneInpAndConst):
     """
     This class represents a rotate gate.
     """
     def __init__(self, displayname, input1, const, circuit):
         """Initializes the gate."""
-        if input1.get_batch_size() == 600:
-            additional_depth = .75
-        elif input1.get_batch_size() > 600:
-            # possible batch sizes greater than 600 are 682 and 630.
-            additional_depth = .25
-        elif input1.get_batch_size() < 600:
-            # possible batch sizes smaller than 600 are 256 and 378.
-            additional_depth = .5
-        D = input1.get_depth() + additional_depth
+        D = input1.get_depth() + get_additional_depth(input1.get_batch_size())
         igoiac.IBMGateOneInpAndConst.__init__(self, displayname, D, input1,
                                               int(const), circuit)
 
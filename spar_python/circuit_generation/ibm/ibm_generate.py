@@ -13,6 +13,7 @@
 # general imports:
 from optparse import OptionParser
 import csv
+import logging
 import os
 import sys
 this_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,6 +21,7 @@ base_dir = os.path.join(this_dir, '../../..')
 sys.path.append(base_dir)
 
 # SPAR imports:
+import spar_python.circuit_generation.circuit_common.circuit_task as ct
 import spar_python.circuit_generation.ibm.ibm_generation_functions as igf
 import spar_python.common.file_handle_object as fho
 import spar_python.report_generation.ta2.ta2_schema as t2s
@@ -36,6 +38,73 @@ RESULTSDB_FIELDS_TO_GATE_TYPES = {
 
 PERFORMERNAME = "ibm"
 
+LOGGER = logging.getLogger(__name__)
+
+class IBMCircuitTask(ct.CircuitTask):
+    """
+    This class represents the generation of one IBM circuit and its inputs.
+    params holds the parameters L, D, num_levels and W; circuits of test type
+    RANDOM are generated by depth, and all others by number of levels.
+    """
+    def __init__(self, test_type, bulk, params, circuit_file_name,
+                 input_file_names, file_handle_object, base_seed=None,
+                 stream=None):
+        """Initializes the task with the test type, whether to generate the
+        circuit in bulk, the parameters, the names of the files to write,
+        and the file_handle_object to write them with."""
+        ct.CircuitTask.__init__(self, base_seed, stream)
+        self.__test_type = test_type
+        self.__bulk = bulk
+        self.__params = params
+        self.circuit_file_name = circuit_file_name
+        self.input_file_names = input_file_names
+        self.__fho = file_handle_object
+
+    def generate(self):
+        """Generates the circuit and its inputs and writes them to their
+        files. Returns the circuit table fields describing the circuit, the
+        list of the numbers of zeros and ones in each input, and the size of
+        the circuit file in bytes."""
+        (L, D, num_levels, W) = self.__params
+        if self.__bulk:
+            generators_by_depth = igf.TEST_TYPE_TO_BULK_GENERATOR_BY_DEPTH
+            generators_by_level = igf.TEST_TYPE_TO_BULK_GENERATOR_BY_LEVEL
+        else:
+            generators_by_depth = igf.TEST_TYPE_TO_GENERATOR_BY_DEPTH
+            generators_by_level = igf.TEST_TYPE_TO_GENERATOR_BY_LEVEL
+        # generate a random circuit:
+        if self.__test_type == igf.TEST_TYPES.RANDOM:
+            gen = generators_by_depth[igf.TEST_TYPES.RANDOM]
+            circ = gen(L, D, W)
+        else:
+            gen = generators_by_level[self.__test_type]
+            circ = gen(L, num_levels, W)
+        circuit_fields = {
+            t2s.CIRCUIT_NUMLEVELS: circ.get_num_levels(),
+            t2s.CIRCUIT_OUTPUTGATETYPE: circ.get_output_gate_func()}
+        num_gates = 0
+        for database_field in RESULTSDB_FIELDS_TO_GATE_TYPES.keys():
+            num_gates_this_type = circ.get_num_gates(
+                gate_func_name=RESULTSDB_FIELDS_TO_GATE_TYPES[database_field])
+            circuit_fields[database_field] = num_gates_this_type
+            num_gates += num_gates_this_type
+        circuit_fields[t2s.CIRCUIT_NUMGATES] = num_gates
+        # write the circuit to the circuit file:
+        circuit_file = self.__fho.get_file_object(self.circuit_file_name, 'w')
+        circ.write(circuit_file)
+        circuit_size = circuit_file.tell()
+        self.__fho.close_file_object(circuit_file)
+        input_counts = []
+        for input_file_name in self.input_file_names:
+            # generate a random input:
+            inp = igf.make_random_input(L, W)
+            input_counts.append((inp.get_num_zeros(), inp.get_num_ones()))
+            # write the input to an input file:
+            input_file = self.__fho.get_file_object(input_file_name, 'w')
+            input_file.write(str(inp))
+            self.__fho.close_file_object(input_file)
+        return (circuit_fields, input_counts, circuit_size)
+
 class ParserAndGenerator(object):
     """
     This class parses the config file living in the directory test_name,
@@ -57,6 +126,13 @@ class ParserAndGenerator(object):
     num_circuits, and num_inputs) can be reset multiple times throughout the
     config.txt file.
     Note that the seed parameter may be omitted.
+    If 'bulk = True' occurs, the circuits generated from then on are drawn a
+    level at a time with an IBMCircuitBuilder, which is much faster for large
+    batch sizes but does not yield the same circuits from a given seed.
+    If num_processes is given, the circuits are generated in a pool of that
+    many processes, each from its own substream of the seed (so the same
+    circuits are generated whatever the number of processes, though not the
+    same ones as without num_processes).
     For the large and varying parameters tests, test_type should be 'random' and
     K, L, D, W, num_circuits and num_inputs should be specified.
     For the single gate type test, test_type should change throughout the test;
@@ -72,10 +148,11 @@ class ParserAndGenerator(object):
     """
     def __init__(self, test_name, config_file,
                  results_database, data_path=PERFORMERNAME,
-                 file_handle_object=None):
+                 file_handle_object=None, num_processes=None):
         """
         Initializes the class with a test_name, a config file, a results
-        database, and a file_handle_object.
+        database, a file_handle_object and the number of processes to use, if
+        any.
         Test_name should correspond to a directory with the name 'test_name'.
         """
         self.__resultsdb = results_database
@@ -107,7 +184,8 @@ class ParserAndGenerator(object):
                                   "num_circuits": self.__handle_num_circuits,
                                   "num_inputs": self.__handle_num_inputs,
                                   "generate": self.__handle_generate,
-                                  "seed": self.__handle_seed}
+                                  "seed": self.__handle_seed,
+                                  "bulk": self.__handle_bulk}
         # stores the latest param recorded, in order to detect changes:
         self.__latest_params = None
         # set all of the parameters to None:
@@ -120,13 +198,18 @@ class ParserAndGenerator(object):
         self.__num_circuits = None
         self.__num_inputs = None
         self.__sec_param_id = None
-        self.__circuit_id = None
-        self.__input_id = None
         self.__test_type = None
+        self.__bulk = False
+        self.__num_processes = num_processes
 
     def __handle_seed(self, randseed):
         """Handles a new randomness seed appropriately."""
-        sr.seed(int(randseed))
+        self.__seed = int(randseed)
+        sr.seed(self.__seed)
+
+    def __handle_bulk(self, bulk):
+        """Handles a new choice of whether to generate circuits in bulk."""
+        self.__bulk = eval(bulk)
 
     def __handle_test_type(self, test_type):
         """Handles a new test type appropriately."""
@@ -213,73 +296,79 @@ class ParserAndGenerator(object):
         """Generates circuits with the current parameters"""
         # update the params if needed:
         self.__handle_new_params()
+        # the circuits and inputs are numbered consecutively from the next
+        # free ids:
+        first_circuit_id = self.__resultsdb.get_next_circuit_id()
+        first_input_id = self.__resultsdb.get_next_input_id()
+        tasks = []
         # make self.__num_circuits circuits:
         for circuit_num in xrange(self.__num_circuits):
-            # generate a random circuit:
-            if self.__test_type == igf.TEST_TYPES.RANDOM:
-                gen = igf.TEST_TYPE_TO_GENERATOR_BY_DEPTH[igf.TEST_TYPES.RANDOM]
-                circ = gen(self.__L, self.__D, self.__W)
-            else:
-                gen = igf.TEST_TYPE_TO_GENERATOR_BY_LEVEL[self.__test_type]
-                circ = gen(self.__L, self.__num_levels, self.__W)
-            self.__write_circuit(circ)
+            circuit_id = first_circuit_id + circuit_num
+            circuit_file_name = os.path.join(self.__circuit_dir_name,
+                                             str(circuit_id) + ".cir")
             # for each circuit, make self.__num_inputs inputs:
-            for input_num in xrange(self.__num_inputs):
-                # generate a random input:
-                inp = igf.make_random_input(self.__L, self.__W)
-                self.__write_input(inp)
+            input_ids = [first_input_id + circuit_num * self.__num_inputs +
+                         input_num for input_num in xrange(self.__num_inputs)]
+            input_file_names = [os.path.join(self.__input_dir_name,
+                                             str(input_id) + ".input")
+                                for input_id in input_ids]
+            # in process-pool mode, each circuit is generated from its own
+            # substream of the seed:
+            if self.__num_processes is None:
+                (base_seed, stream) = (None, None)
+            else:
+                (base_seed, stream) = (self.__seed, circuit_id)
+            task = IBMCircuitTask(self.__test_type, self.__bulk,
+                                  (self.__L, self.__D, self.__num_levels,
+                                   self.__W),
+                                  circuit_file_name, input_file_names,
+                                  self.__fho, base_seed, stream)
+            tasks.append((circuit_id, input_ids, task))
+        results = ct.run_tasks([task for (circuit_id, input_ids, task)
+                                in tasks], self.__num_processes or 1)
+        for ((circuit_id, input_ids, task),
+             ((circuit_fields, input_counts, circuit_size), seconds)) in zip(
+                 tasks, results):
+            LOGGER.info("Generated %s (%d bytes) in %.2f seconds",
+                        task.circuit_file_name, circuit_size, seconds)
+            self.__write_circuit(circuit_id, task.circuit_file_name,
+                                 circuit_fields)
+            for (input_id, input_file_name, (num_zeros, num_ones)) in zip(
+                input_ids, task.input_file_names, input_counts):
+                self.__write_input(input_id, circuit_id, input_file_name,
+                                   num_zeros, num_ones)
 
-    def __write_circuit(self, circ):
-        """Handles writing a circuit, both to the circuit file and to the test
-        file."""
-        # find the circuit id:
-        self.__circuit_id = self.__resultsdb.get_next_circuit_id()
+    def __write_circuit(self, circuit_id, circuit_file_name, circuit_fields):
+        """Handles recording a circuit which has been written to
+        circuit_file_name, both in the results database and in the test
+        file. circuit_fields holds the fields describing the circuit itself
+        (see IBMCircuitTask)."""
         # write the circuit to the results database:
         row = {t2s.CIRCUIT_TESTNAME: self.__test_name,
-               t2s.CIRCUIT_CID: self.__circuit_id,
+               t2s.CIRCUIT_CID: circuit_id,
                t2s.CIRCUIT_PID: self.__sec_param_id,
                t2s.CIRCUIT_W: self.__W,
-               t2s.CIRCUIT_NUMLEVELS: circ.get_num_levels(),
-               t2s.CIRCUIT_OUTPUTGATETYPE: circ.get_output_gate_func(),
                t2s.CIRCUIT_TESTTYPE:
                igf.TEST_TYPES.number_to_value[self.__test_type]}
-        num_gates = 0
-        for database_field in RESULTSDB_FIELDS_TO_GATE_TYPES.keys():
-            num_gates_this_type = circ.get_num_gates(
-                gate_func_name=RESULTSDB_FIELDS_TO_GATE_TYPES[database_field])
-            row[database_field] = num_gates_this_type
-            num_gates += num_gates_this_type
-        row[t2s.CIRCUIT_NUMGATES] = num_gates
+        row.update(circuit_fields)
         self.__resultsdb.add_row(t2s.CIRCUIT_TABLENAME, row)
-        # write the circuit to the circuit file:
-        circuit_file_name = os.path.join(self.__circuit_dir_name,
-                                         str(self.__circuit_id) + ".cir")
-        circuit_file = self.__fho.get_file_object(circuit_file_name, 'w')
-        circuit_file.write(circ.display())
-        self.__fho.close_file_object(circuit_file)
         # write the circuit location to the test file:
         self.__test_file.write(
             "".join(["CIRCUIT\n",
                      self.__get_testfile_path(circuit_file_name), "\n"]))
 
-    def __write_input(self, inp):
-        """Handles writing an input, both to the input file and to the test
+    def __write_input(self, input_id, circuit_id, input_file_name, num_zeros,
+                      num_ones):
+        """Handles recording an input which has been written to
+        input_file_name, both in the results database and in the test
         file."""
-        # find the input id:
-        self.__input_id = self.__resultsdb.get_next_input_id()
         # write the input to the results database:
         row = {t2s.INPUT_TESTNAME: self.__test_name,
-               t2s.INPUT_IID: self.__input_id,
-               t2s.INPUT_CID: self.__circuit_id,
-               t2s.INPUT_NUMZEROS: inp.get_num_zeros(),
-               t2s.INPUT_NUMONES: inp.get_num_ones()}
+               t2s.INPUT_IID: input_id,
+               t2s.INPUT_CID: circuit_id,
+               t2s.INPUT_NUMZEROS: num_zeros,
+               t2s.INPUT_NUMONES: num_ones}
         self.__resultsdb.add_row(t2s.INPUT_TABLENAME, row)
-         # write the input to an input file:
-        input_file_name = os.path.join(self.__input_dir_name,
-                                       str(self.__input_id) + ".input")
-        input_file = self.__fho.get_file_object(input_file_name, 'w')
-        input_file.write(str(inp))
-        self.__fho.close_file_object(input_file)
         # write the input location to the test file:
         self.__test_file.write(
             "".join(["INPUT\n",
@@ -316,8 +405,12 @@ if __name__ == '__main__':
     parser.add_option(
         "-t", "--test-name",
         help="the name to be assigned to the test script")
+    parser.add_option(
+        "-n", "--num-processes", type="int",
+        help="the number of processes to generate circuits in")
     # Arguments are interpreted as test names.
     (options, args) = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
     config_file_name = options.config_file_name
     config_file = open(config_file_name, 'r')
     results_database_name = options.results_database_name
@@ -333,5 +426,6 @@ if __name__ == '__main__':
     ParserAndGenerator(test_name=test_name,
                        config_file=config_file,
                        results_database=results_database,
-                       data_path=data_path).parse_and_generate()
+                       data_path=data_path,
+                       num_processes=options.num_processes).parse_and_generate()
     config_file.close()
@@ -13,11 +13,14 @@
 # general imports:
 import time
 import os
+import shutil
 import StringIO
+import tempfile
 import unittest
 
 # SPAR imports:
 import spar_python.circuit_generation.ibm.ibm_generate as gen
+import spar_python.common.file_handle_object as fho
 import spar_python.common.spar_random as sr
 import spar_python.common.test_file_handle_object as tfho
 import spar_python.report_generation.ta2.ta2_database as t2d
@@ -140,3 +143,99 @@ class GenerateTest(unittest.TestCase):
             (t2s.INPUT_IID, 1),
             (t2s.INPUT_CID, 1)]
         check_values(t2s.INPUT_TABLENAME, input_fields_and_values)
+
+    def test_bulk_config_file(self):
+        """
+        tests that circuits generated in bulk have the requested depth or
+        number of levels.
+        """
+        test_name = "unit_test_test_2"
+        D = 3.0
+        num_levels = 4
+        W = 5
+        config_file_text = "\n".join(["bulk = True",
+                                      "test_type = RANDOM",
+                                      "K = 'key'",
+                                      "L = 10",
+                                      " = ".join(["D", str(D)]),
+                                      " = ".join(["W", str(W)]),
+                                      "num_circuits = 1",
+                                      "num_inputs = 1",
+                                      "generate = True",
+                                      "test_type = LMUL",
+                                      " = ".join(["num_levels",
+                                                  str(num_levels)]),
+                                      "generate = True"])
+        fho = tfho.TestFileHandleObject()
+        resultsdb = t2d.Ta2ResultsDB(":memory:")
+        data_path = "ibm"
+        pag = gen.ParserAndGenerator(test_name,
+                                     StringIO.StringIO(config_file_text),
+                                     results_database=resultsdb,
+                                     data_path=data_path,
+                                     file_handle_object=fho)
+        pag.parse_and_generate()
+        circuit_file = fho.get_file(os.path.join(data_path, "circuit", "1.cir"))
+        circuit_header = circuit_file.getvalue().split("\n")[0]
+        D_value = float(circuit_header.split(",")[1].split("=")[-1])
+        self.assertTrue((D <= D_value) and (D + 1.0 > D_value))
+        self.assertEqual(
+            [num_levels],
+            resultsdb.get_values(
+                fields=[(t2s.CIRCUIT_TABLENAME, t2s.CIRCUIT_NUMLEVELS)],
+                constraint_list=[(t2s.CIRCUIT_TABLENAME, t2s.CIRCUIT_CID,
+                                  2)])[0])
+
+    def test_num_processes(self):
+        """
+        tests that in process-pool mode, the circuits and inputs depend only
+        on the seed, and not on the state of the RNG beforehand or on the
+        number of processes.
+        """
+        test_name = "unit_test_test_3"
+        config_file_text = "\n".join(["seed = 123",
+                                      "test_type = RANDOM",
+                                      "K = 'key'",
+                                      "L = 10",
+                                      "D = 3.0",
+                                      "W = 5",
+                                      "num_circuits = 3",
+                                      "num_inputs = 2",
+                                      "generate = True"])
+        file_texts = []
+        circuit_values = []
+        for (rand_seed, num_processes) in [(1, 1), (2, 2)]:
+            sr.seed(rand_seed)
+            # the circuits are written by the pool's worker processes, so
+            # they have to go to real files:
+            data_path = tempfile.mkdtemp()
+            try:
+                resultsdb = t2d.Ta2ResultsDB(":memory:")
+                pag = gen.ParserAndGenerator(
+                    test_name, StringIO.StringIO(config_file_text),
+                    results_database=resultsdb, data_path=data_path,
+                    file_handle_object=fho.FileHandleObject(),
+                    num_processes=num_processes)
+                pag.parse_and_generate()
+                file_names = [os.path.join(data_path, "circuit",
+                                           str(circuit_num) + ".cir")
+                              for circuit_num in xrange(1, 4)]
+                file_names += [os.path.join(data_path, "input",
+                                            str(input_num) + ".input")
+                               for input_num in xrange(1, 7)]
+                these_file_texts = []
+                for file_name in file_names:
+                    with open(file_name) as this_file:
+                        these_file_texts.append(this_file.read())
+                file_texts.append(these_file_texts)
+                circuit_values.append(resultsdb.get_values(
+                    fields=[(t2s.CIRCUIT_TABLENAME, t2s.CIRCUIT_CID),
+                            (t2s.CIRCUIT_TABLENAME, t2s.CIRCUIT_NUMGATES)]))
+                resultsdb.close()
+            finally:
+                shutil.rmtree(data_path)
+        self.assertEqual(file_texts[0], file_texts[1])
+        self.assertEqual(circuit_values[0], circuit_values[1])
+        self.assertEqual([1, 2, 3], sorted(circuit_values[0][0]))
+        # the circuits should all differ:
+        self.assertEqual(3, len(set(file_texts[0][:3])))
@@ -12,6 +12,7 @@
 
 # general imports:
 import functools
+import numpy
 
 # SPAR imports:
 import spar_python.circuit_generation.ibm.ibm_batch as ib
@@ -51,6 +52,11 @@ TEST_TYPES = enum.Enum(*test_types)
 # There is also a method for creating a gate where the gate type is chosen
 # uniformly at random.
 
+def make_random_batch(L):
+    """creates a random batch of L bits. The bits are drawn in a single call,
+    but are the same as those L calls to sr.randbit() would yield."""
+    return ib.IBMPackedBatch(sr.randint(0, 1, L))
+
 def make_random_two_inp_gate(L, ultimate_level, penultimate_level, gate_name,
                              circuit, gate_factory):
     """creates a random gate with two inputs."""
@@ -77,7 +83,7 @@ def make_random_one_inp_and_const_inp_gate(L, ultimate_level, penultimate_level,
     assert(len(ultimate_level) + len(penultimate_level) > 0)
     input1_index = sr.randint(0, len(ultimate_level) - 1)
     input1 = ultimate_level[input1_index]
-    const = ci.Input([ib.IBMBatch([sr.randbit() for inp_ind in xrange(L)])])
+    const = ci.Input([make_random_batch(L)])
     return gate_factory(gate_name, input1, const, circuit)
 
 def make_random_one_inp_and_const_int_gate(L, ultimate_level, penultimate_level,
@@ -108,7 +114,7 @@ def make_random_two_inp_and_const_inp_gate(L, ultimate_level, penultimate_level,
         input2 = ultimate_level[input2_index]
     else:
         input2 = penultimate_level[input2_index - len(ultimate_level)]
-    const = ci.Input([ib.IBMBatch([sr.randbit() for inp_ind in xrange(L)])])
+    const = ci.Input([make_random_batch(L)])
     return gate_factory(gate_name, input1, input2, const, circuit)
 
 
@@ -144,8 +150,7 @@ TEST_TYPE_TO_GATE_MAKER[TEST_TYPES.RANDOM] =  make_random_gate
 
 def make_random_input(L, W):
     """Creates a random input with W batches, each with L bits."""
-    return ci.Input([ib.IBMBatch([sr.randbit() for inp_num in xrange(L)])
-                     for batch_num in xrange(W)])
+    return ci.Input([make_random_batch(L) for batch_num in xrange(W)])
 
 def generate_circuit_by_level(L, num_levels, W, gate_maker):
     """
@@ -263,3 +268,271 @@ TEST_TYPE_TO_GENERATOR_BY_DEPTH = dict(
 TEST_TYPE_TO_GENERATOR = dict(
     (gate_type, TEST_TYPE_TO_GENERATOR_BY_LEVEL[gate_type])
     for gate_type in GATE_TYPES.numbers_generator())
+
+# Below is a bulk alternative to the generators above. Rather than creating
+# gate objects one at a time, it draws the gate types, inputs and constants of
+# a whole level in a few numpy calls and stores them in arrays; gate objects
+# are only created at the end, for the gates that the output gate depends on.
+# It draws its randomness in a different order, so it does not yield the same
+# circuits from a given seed as the generators above.
+
+# A dictionary mapping gate type to the gate class:
+GATE_TYPE_TO_GATE_FACTORY = {
+    GATE_TYPES.LADD: iga.IBMAddGate,
+    GATE_TYPES.LADDconst: igac.IBMAddConstGate,
+    GATE_TYPES.LMUL: igm.IBMMulGate,
+    GATE_TYPES.LMULconst: igmc.IBMMulConstGate,
+    GATE_TYPES.LSELECT: igs.IBMSelectGate,
+    GATE_TYPES.LROTATE: igr.IBMRotateGate}
+# The gate types which take two inputs, and those which take a constant batch:
+TWO_INP_GATE_TYPES = [GATE_TYPES.LADD, GATE_TYPES.LMUL, GATE_TYPES.LSELECT]
+CONST_INP_GATE_TYPES = [GATE_TYPES.LADDconst, GATE_TYPES.LMULconst,
+                        GATE_TYPES.LSELECT]
+# A dictionary mapping gate type to the depth that a gate of that type adds to
+# the depth of its (deepest) input, as in the gate classes. The depth added by
+# a rotate gate depends on the batch size (see igr.get_additional_depth):
+GATE_TYPE_TO_ADDITIONAL_DEPTH = {
+    GATE_TYPES.LADD: .1,
+    GATE_TYPES.LADDconst: 0.0,
+    GATE_TYPES.LMUL: 1.0,
+    GATE_TYPES.LMULconst: .5,
+    GATE_TYPES.LSELECT: .6}
+
+class _IBMLevel(object):
+    """
+    One level of gates drawn by an IBMCircuitBuilder, stored as arrays with
+    one entry per gate. input1s index the level above, and input2s index the
+    level above followed by the one above that (with -1 for gates taking one
+    input). The constant batch of the i'th gate (if it takes one) is packed in
+    consts[const_rows[i]], and the constant of a rotate gate is in rotations.
+    """
+    def __init__(self, gate_types, input1s, input2s, consts, const_rows,
+                 rotations, depths):
+        self.gate_types = gate_types
+        self.input1s = input1s
+        self.input2s = input2s
+        self.consts = consts
+        self.const_rows = const_rows
+        self.rotations = rotations
+        self.depths = depths
+
+class IBMCircuitBuilder(object):
+    """
+    This class generates a random IBM circuit a level of W gates at a time,
+    following the same rules as the gate makers above: each gate takes its
+    first input from the level above, any second input from either of the two
+    levels above, and any constants uniformly at random. The types of the
+    gates are chosen uniformly at random from gate_types.
+
+    Simple use:
+    builder = IBMCircuitBuilder(L, W, [GATE_TYPES.LADD, GATE_TYPES.LMUL])
+    for level_num in xrange(num_levels):
+        builder.add_level()
+    # The IBMCircuit whose output gate is the 0th gate of the last level:
+    circuit = builder.make_circuit(num_levels - 1, 0)
+    """
+    def __init__(self, L, W, gate_types):
+        """Initializes the builder with the batch size L, the width W and the
+        list of gate types to choose from."""
+        self.__L = L
+        self.__W = W
+        self.__gate_types = numpy.array(gate_types, dtype=numpy.intp)
+        self.__levels = []
+        # the depth that each gate type adds to that of its input(s):
+        additional_depths = dict(GATE_TYPE_TO_ADDITIONAL_DEPTH)
+        additional_depths[GATE_TYPES.LROTATE] = igr.get_additional_depth(L)
+        self.__additional_depths = numpy.array(
+            [additional_depths[gate_type]
+             for gate_type in GATE_TYPES.numbers_generator()])
+
+    def get_num_levels(self):
+        """Returns the number of levels of gates added so far."""
+        return len(self.__levels)
+
+    def get_depths(self, level_index):
+        """Returns the array of the depths of the gates at level_index."""
+        return self.__levels[level_index].depths
+
+    def __get_input_depths(self, levels_back):
+        """Returns the depths of the gates levels_back levels above the level
+        being added (those of the input wires if that is the level above
+        all the gates, and none if it is further up)."""
+        num_levels = len(self.__levels)
+        if levels_back <= num_levels:
+            return self.__levels[num_levels - levels_back].depths
+        elif levels_back == num_levels + 1:
+            return numpy.zeros(self.__W)
+        return numpy.zeros(0)
+
+    def add_level(self):
+        """Adds a level of W random gates, and returns the array of their
+        depths."""
+        W = self.__W
+        L = self.__L
+        ultimate_depths = self.__get_input_depths(1)
+        available_depths = numpy.concatenate([ultimate_depths,
+                                              self.__get_input_depths(2)])
+        num_available = len(available_depths)
+        gate_types = self.__gate_types[
+            sr.randint(0, len(self.__gate_types) - 1, W)]
+        two_inps = numpy.in1d(gate_types, TWO_INP_GATE_TYPES)
+        const_inps = numpy.in1d(gate_types, CONST_INP_GATE_TYPES)
+        rotates = gate_types == GATE_TYPES.LROTATE
+        input1s = sr.randint(0, W - 1, W)
+        input2s = -numpy.ones(W, dtype=numpy.intp)
+        if two_inps.any():
+            # These gates require two inputs; at least two inputs should be
+            # available.
+            assert(num_available > 1)
+            input2s = sr.randint(0, num_available - 1, W)
+            clashes = two_inps & (input2s == input1s)
+            while clashes.any():
+                input2s[clashes] = sr.randint(0, num_available - 1,
+                                              clashes.sum())
+                clashes &= input2s == input1s
+            input2s[~two_inps] = -1
+        num_consts = int(const_inps.sum())
+        consts = numpy.packbits(
+            sr.randint(0, 1, (num_consts, L)).astype(numpy.uint8), axis=1)
+        const_rows = numpy.cumsum(const_inps) - 1
+        rotations = numpy.zeros(W, dtype=numpy.intp)
+        if rotates.any():
+            rotations[rotates] = sr.randint(0, L - 1, rotates.sum())
+        input_depths = numpy.where(
+            two_inps,
+            numpy.maximum(ultimate_depths[input1s],
+                          available_depths[input2s.clip(0)]),
+            ultimate_depths[input1s])
+        # depths are rounded just as in IBMCircuitObject:
+        depths = numpy.array(
+            [round(depth, 2) for depth in
+             (input_depths + self.__additional_depths[gate_types]).tolist()])
+        self.__levels.append(_IBMLevel(gate_types, input1s, input2s, consts,
+                                       const_rows, rotations, depths))
+        return depths
+
+    def __find_used(self, level_index, gate_index):
+        """Returns a list holding, for each level up to level_index, an array
+        indicating which of its gates the gate_index'th gate at level_index
+        depends on (itself included)."""
+        W = self.__W
+        used = [numpy.zeros(W, dtype=numpy.bool_)
+                for level in self.__levels[:level_index + 1]]
+        used[level_index][gate_index] = True
+        for this_index in xrange(level_index, 0, -1):
+            level = self.__levels[this_index]
+            used[this_index - 1][level.input1s[used[this_index]]] = True
+            input2s = level.input2s[used[this_index]]
+            used[this_index - 1][input2s[(input2s >= 0) &
+                                         (input2s < W)]] = True
+            if this_index > 1:
+                used[this_index - 2][input2s[input2s >= W] - W] = True
+        return used
+
+    def make_circuit(self, level_index, gate_index):
+        """Returns the IBMCircuit whose output gate is the gate_index'th gate
+        at level_index. Gates are named as in the generators above."""
+        W = self.__W
+        L = self.__L
+        circuit = ic.IBMCircuit(L)
+        wires = [iw.IBMInputWire("".join(("W", str(wire_ind))), circuit)
+                 for wire_ind in xrange(W)]
+        circuit.set_input_wires(wires)
+        used = self.__find_used(level_index, gate_index)
+        # maps each used gate at the last two levels to its gate object:
+        ultimate_level = dict(enumerate(wires))
+        penultimate_level = {}
+        for this_index in xrange(level_index + 1):
+            level = self.__levels[this_index]
+            new_level = {}
+            for index in numpy.flatnonzero(used[this_index]).tolist():
+                gate_type = level.gate_types[index]
+                gate_name = "".join(["G", str(W * (this_index + 1) + index)])
+                args = [ultimate_level[level.input1s[index]]]
+                input2_index = level.input2s[index]
+                if input2_index >= W:
+                    args.append(penultimate_level[input2_index - W])
+                elif input2_index >= 0:
+                    args.append(ultimate_level[input2_index])
+                if gate_type == GATE_TYPES.LROTATE:
+                    args.append(int(level.rotations[index]))
+                elif gate_type in CONST_INP_GATE_TYPES:
+                    args.append(ci.Input([ib.IBMPackedBatch.from_packed(
+                        level.consts[level.const_rows[index]], L)]))
+                new_level[index] = GATE_TYPE_TO_GATE_FACTORY[gate_type](
+                    gate_name, *(args + [circuit]))
+            penultimate_level = ultimate_level
+            ultimate_level = new_level
+        circuit.set_output_gate(ultimate_level[gate_index])
+        return circuit
+
+def generate_circuit_by_level_in_bulk(L, num_levels, W, gate_types):
+    """
+    This function generates a random IBM circuit with num_levels levels, as
+    generate_circuit_by_level does, using an IBMCircuitBuilder.
+    It is called with the following inputs:
+    L, the number of bits per batch,
+    num_levels, the the number of levels in the circuit,
+    W, the number of input 'wires' (batch inputs taken) in the circuit, and
+    gate_types, the list of gate types to choose from.
+    """
+    assert(num_levels > 0)
+    builder = IBMCircuitBuilder(L, W, gate_types)
+    for level in xrange(num_levels):
+        builder.add_level()
+    # Select the output gate from the last level:
+    return builder.make_circuit(num_levels - 1, sr.randint(0, W - 1))
+
+def generate_circuit_by_depth_in_bulk(L, D, W, gate_types):
+    """
+    This function generates a random IBM circuit of depth D, as
+    generate_circuit_by_depth does, using an IBMCircuitBuilder.
+    It is called with the following inputs:
+    L, the number of bits per batch,
+    D, the depth of the circuit as defined by IBM,
+    W, the number of input 'wires' (batch inputs taken) in the circuit, and
+    gate_types, the list of gate types to choose from.
+    """
+    builder = IBMCircuitBuilder(L, W, gate_types)
+    # Keep track of the smallest gate depth at the last level:
+    min_depth = 0
+    # Maintain lists of the (level index, gate index) pairs of the gates at
+    # depth D, and of those between depth D and D+1, not including D:
+    depth_D_gates = []
+    depth_around_D_gates = []
+    while (min_depth <= D):
+        level_index = builder.get_num_levels()
+        depths = builder.add_level()
+        depth_D_gates.extend(
+            (level_index, gate_index)
+            for gate_index in numpy.flatnonzero(depths == D).tolist())
+        depth_around_D_gates.extend(
+            (level_index, gate_index) for gate_index in
+            numpy.flatnonzero((depths > D) & (depths < D + 1)).tolist())
+        min_depth = depths.min()
+    # If there is at least one gate of depth exactly D, select the output
+    # gate from among such gates at random. Otherwise, select the output
+    # gate from among gates between depth D and D+1.
+    if(len(depth_D_gates) > 0):
+        output_gate = sr.choice(depth_D_gates)
+    else:
+        output_gate = sr.choice(depth_around_D_gates)
+    return builder.make_circuit(*output_gate)
+
+# A dictionary mapping test type to the list of gate types it draws from:
+TEST_TYPE_TO_GATE_TYPES = dict(
+    (test_type, [test_type]) for test_type in GATE_TYPES.numbers_generator())
+TEST_TYPE_TO_GATE_TYPES[TEST_TYPES.RANDOM] = list(
+    GATE_TYPES.numbers_generator())
+
+TEST_TYPE_TO_BULK_GENERATOR_BY_LEVEL = dict(
+    (test_type, functools.partial(
+        generate_circuit_by_level_in_bulk,
+        gate_types = TEST_TYPE_TO_GATE_TYPES[test_type]))
+    for test_type in TEST_TYPES.numbers_generator())
+
+TEST_TYPE_TO_BULK_GENERATOR_BY_DEPTH = dict(
+    (test_type, functools.partial(
+        generate_circuit_by_depth_in_bulk,
+        gate_types = TEST_TYPE_TO_GATE_TYPES[test_type]))
+    for test_type in TEST_TYPES.numbers_generator())
@@ -136,3 +136,79 @@ class generation_functions_test(unittest.TestCase):
                 circ = generate(L, num_levels, W)
                 self.assertEqual(num_levels, circ.get_num_levels())
 
+    def test_make_random_batch(self):
+        """
+        Tests that make_random_batch draws the same bits as calls to
+        sr.randbit() would.
+        """
+        L = 100
+        rand_seed = sr.randint(0, 1000000)
+        sr.seed(rand_seed)
+        batch = g.make_random_batch(L)
+        sr.seed(rand_seed)
+        self.assertEqual("".join(str(sr.randbit()) for bit_num in xrange(L)),
+                         str(batch))
+
+    def test_bulk_builder(self):
+        """
+        Tests that the gates made by an IBMCircuitBuilder have the depths it
+        computed for them, and the levels in which it placed them.
+        """
+        for L in [100, 600, 682]:
+            builder = g.IBMCircuitBuilder(L, 10, list(
+                g.GATE_TYPES.numbers_generator()))
+            for level_index in xrange(6):
+                builder.add_level()
+            for level_index in [0, 3, 5]:
+                for gate_index in xrange(10):
+                    circ = builder.make_circuit(level_index, gate_index)
+                    self.assertEqual(
+                        builder.get_depths(level_index)[gate_index],
+                        circ.get_depth())
+                    self.assertEqual(level_index + 1, circ.get_num_levels())
+                    output_gate = circ.get_levels()[-1][0]
+                    self.assertEqual(
+                        "G" + str(10 * (level_index + 1) + gate_index),
+                        output_gate.get_name())
+                    for level in circ.get_levels()[1:]:
+                        for gate in level:
+                            inp_levels = [inp.get_level()
+                                          for inp in gate.get_inputs()]
+                            self.assertEqual(gate.get_level() - 1,
+                                             inp_levels[0])
+                            self.assertTrue(min(inp_levels) >=
+                                            gate.get_level() - 2)
+
+    def test_bulk_depth(self):
+        """
+        Tests that the depth of circuits generated in bulk is as desired.
+        """
+        generate = g.TEST_TYPE_TO_BULK_GENERATOR_BY_DEPTH[g.TEST_TYPES.RANDOM]
+        L = 100
+        D = 10
+        W = 10
+        num_trials = 50
+        for trial_num in xrange(num_trials):
+            circ = generate(L, D, W)
+            self.assertTrue(circ.get_depth() < float(D) + 1.0)
+            self.assertTrue(circ.get_depth() >= float(D))
+
+    def test_bulk_single_gate_type(self):
+        """
+        Tests that single gate type circuits generated in bulk have the
+        correct gate types and the desired number of levels.
+        """
+        num_trials = 10
+        L = 100
+        num_levels = 5
+        W = 10
+        for gate_type_ind in g.GATE_TYPES.numbers_generator():
+            gate_type_string = g.GATE_TYPES.to_string(gate_type_ind)
+            generate = g.TEST_TYPE_TO_BULK_GENERATOR_BY_LEVEL[gate_type_ind]
+            for trial_num in xrange(num_trials):
+                circ = generate(L, num_levels, W)
+                self.assertEqual(num_levels, circ.get_num_levels())
+                for level in circ.get_levels()[1:]:
+                    for gate in level:
+                        self.assertEqual(gate_type_string,
+                                         gate.get_func_name())
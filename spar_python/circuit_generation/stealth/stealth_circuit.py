@@ -9,6 +9,8 @@
 #  ----          ----           ------------
 #  08 Nov 2012   SY             Original Version
 # *****************************************************************
+
+import spar_python.circuit_generation.stealth.stealth_compiled_circuit as scc
     
 class StealthCircuit(object):
     """
@@ -68,6 +70,21 @@ class StealthCircuit(object):
             self.__init_levels()
         return self.__levels
 
+    def compile(self):
+        """Returns a StealthCompiledCircuit with the same input wires and gates
+        as this circuit, which evaluates much faster on large circuits (see
+        stealth_compiled_circuit.py). Later changes to this circuit are not
+        reflected in it."""
+        compiled = scc.StealthCompiledCircuit(
+            [wire.get_name() for wire in self.__input_wires])
+        index_of = dict((id(wire), wire_index) for (wire_index, wire)
+                        in enumerate(self.__input_wires))
+        for level in self.get_levels()[1:]:
+            first = compiled.add_gates(level, index_of)
+            index_of.update((id(gate), first + gate_index)
+                            for (gate_index, gate) in enumerate(level))
+        return compiled
+
     def display(self):
         """returns display string for the circuit"""
         return "\nL\n".join([""]+["\n".join([gate.get_full_display_string()
@@ -0,0 +1,262 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            SY
+#  Description:        Stealth TA2 circuit stored as flat arrays
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+import numpy
+
+import spar_python.common.spar_random as sr
+
+# The gate types, numbered in the same order as GATE_TYPES in
+# stealth_generation_functions.py:
+FUNC_NAMES = ["AND", "OR", "XOR"]
+(AND, OR, XOR) = range(len(FUNC_NAMES))
+
+class _StealthLevel(object):
+    """
+    One level of gates in a StealthCompiledCircuit. The inputs of all the
+    gates are stored in one flat array, gate by gate: the inputs of the
+    i'th gate are inputs[starts[i]:starts[i] + fanins[i]], and are negated
+    where negations is True. owners holds the (level) position of the gate
+    each input belongs to.
+    """
+    def __init__(self, first, gate_types, inputs, negations):
+        self.first = first
+        self.size = len(gate_types)
+        self.types = numpy.array(gate_types, dtype=numpy.int8)
+        self.fanins = numpy.array([len(inp) for inp in inputs],
+                                  dtype=numpy.intp)
+        self.starts = numpy.zeros(self.size, dtype=numpy.intp)
+        numpy.cumsum(self.fanins[:-1], out=self.starts[1:])
+        self.owners = numpy.repeat(numpy.arange(self.size), self.fanins)
+        self.inputs = numpy.fromiter((ind for inp in inputs for ind in inp),
+                                     dtype=numpy.intp,
+                                     count=len(self.owners))
+        self.negations = numpy.fromiter((neg for negs in negations
+                                         for neg in negs),
+                                        dtype=numpy.bool_,
+                                        count=len(self.owners))
+
+class StealthCompiledCircuit(object):
+    """
+    This class represents a Stealth TA2 circuit compiled into flat numpy
+    arrays, one set per level, so that a whole level of gates can be
+    evaluated (or balanced) with a handful of vectorized operations rather
+    than by walking a graph of StealthGate objects.
+    Input wires and gates are identified by their index: the input wires
+    are numbered from 0, and the gates are numbered after them in the order
+    in which they are added. The output gate is the last gate added, unless
+    set otherwise with set_output.
+
+    Simple use:
+    # The circuit of stealth_circuit_test.py can be built as follows:
+    circuit = StealthCompiledCircuit(["w1", "w2", "w3"])
+    circuit.add_level(["g1"], [AND], [[0, 1]], [[True, False]])
+    circuit.add_level(["g2"], [OR], [[3, 2]], [[False, False]])
+    circuit.add_level(["og"], [XOR], [[3, 4]], [[False, False]])
+    # It can be evaluated on input [True, False, False] as follows:
+    circuit.evaluate([True, False, False])
+    # A circuit made of gate objects can be compiled with
+    # StealthCircuit.compile().
+    """
+    def __init__(self, input_names):
+        """Initializes the circuit with the names of its input wires."""
+        self.__num_inputs = len(input_names)
+        self.__names = list(input_names)
+        self.__levels = []
+        # the value of every input wire and gate, as of the last evaluation
+        # or balancing:
+        self.__values = numpy.zeros(self.__num_inputs, dtype=numpy.bool_)
+        self.__output = None
+
+    def get_num_inputs(self):
+        """Returns the number of input wires of the circuit."""
+        return self.__num_inputs
+
+    def get_num_levels(self):
+        """Returns the number of levels of gates in the circuit."""
+        return len(self.__levels)
+
+    def get_name(self, index):
+        """Returns the name of the index'th input wire or gate."""
+        return self.__names[index]
+
+    def set_name(self, index, name):
+        """Sets the name of the index'th input wire or gate."""
+        self.__names[index] = name
+
+    def get_value(self, index):
+        """Returns the value of the index'th input wire or gate, as of the
+        last evaluation or balancing."""
+        return bool(self.__values[index])
+
+    def set_output(self, index):
+        """Makes the index'th gate the output gate."""
+        assert(index >= self.__num_inputs)
+        self.__output = index
+
+    def __get_output(self):
+        """Returns the index of the output gate."""
+        if self.__output is None:
+            return len(self.__names) - 1
+        return self.__output
+
+    def add_level(self, names, gate_types, inputs, negations):
+        """Adds a level of gates to the circuit, and returns the index of the
+        first. Each gate is given by its name, its type (AND, OR or XOR),
+        the list of indices of its inputs, which must all be input wires or
+        gates at earlier levels, and the list of bits indicating which
+        inputs are negated."""
+        first = len(self.__names)
+        assert(len(names) == len(gate_types) == len(inputs) == len(negations))
+        level = _StealthLevel(first, gate_types, inputs, negations)
+        assert(level.size > 0)
+        assert(numpy.all(level.fanins > 1))
+        assert(len(level.inputs) == 0 or level.inputs.max() < first)
+        self.__levels.append(level)
+        self.__names.extend(names)
+        self.__values = numpy.concatenate(
+            [self.__values, numpy.zeros(level.size, dtype=numpy.bool_)])
+        return first
+
+    def add_gates(self, gates, index_of):
+        """Adds a level made of the StealthGate objects gates to the circuit,
+        and returns the index of the first. index_of should map the id() of
+        each of their inputs to its index in this circuit."""
+        return self.add_level(
+            [gate.get_name() for gate in gates],
+            [FUNC_NAMES.index(gate.get_func_name()) for gate in gates],
+            [[index_of[id(inp)] for inp in gate.get_inputs()]
+             for gate in gates],
+            [gate.get_negations() for gate in gates])
+
+    def __evaluate_level(self, level):
+        """Computes the values of the gates in level from the values of their
+        inputs, stores them and returns them."""
+        input_values = self.__values[level.inputs] != level.negations
+        num_true = numpy.add.reduceat(input_values, level.starts,
+                                      dtype=numpy.intp)
+        gate_values = numpy.where(level.types == AND,
+                                  num_true == level.fanins,
+                                  numpy.where(level.types == OR,
+                                              num_true > 0,
+                                              num_true % 2 == 1))
+        self.__values[level.first:level.first + level.size] = gate_values
+        return gate_values
+
+    def set_input(self, input_val_list):
+        """Sets the values of the input wires to the W bits in
+        input_val_list."""
+        assert(len(input_val_list) == self.__num_inputs)
+        self.__values[:self.__num_inputs] = input_val_list
+
+    def evaluate(self, input_val_list):
+        """Evaluates this circuit on the given input, and returns the value
+        of the output gate."""
+        self.set_input(input_val_list)
+        for level in self.__levels:
+            self.__evaluate_level(level)
+        return self.get_value(self.__get_output())
+
+    def balance(self, level_index, desired_outputs, positions=None):
+        """Changes the negations on the inputs of the gates at level_index so
+        that they yield the bits in desired_outputs. If positions is given,
+        only the gates at those positions in the level are balanced (and
+        desired_outputs holds one bit for each of them). As in the balance
+        methods of the gate classes, a gate is fixed by flipping a single
+        randomly chosen negation where that is enough, and by setting the
+        negations of all of its inputs otherwise. Unlike them, gates which
+        already yield the desired bit are left alone.
+        The values of the gates at earlier levels must be up to date, i.e.
+        the circuit must have been evaluated (or its earlier levels
+        balanced) since its input or any earlier negation last changed."""
+        level = self.__levels[level_index]
+        desired_outputs = numpy.asarray(desired_outputs, dtype=numpy.bool_)
+        if positions is None:
+            positions = numpy.arange(level.size)
+        else:
+            positions = numpy.asarray(positions, dtype=numpy.intp)
+        assert(len(positions) == len(desired_outputs))
+        current = self.__evaluate_level(level)[positions]
+        mismatched = current != desired_outputs
+        wrong = positions[mismatched]
+        wanted = desired_outputs[mismatched]
+        wrong_types = level.types[wrong]
+        # a single flipped negation fixes an XOR gate, an AND gate which
+        # should yield False, or an OR gate which should yield True:
+        flip_one = ((wrong_types == XOR) |
+                    ((wrong_types == AND) & ~wanted) |
+                    ((wrong_types == OR) & wanted))
+        flip_gates = wrong[flip_one]
+        if len(flip_gates) > 0:
+            offsets = (sr.random(len(flip_gates)) *
+                       level.fanins[flip_gates]).astype(numpy.intp)
+            level.negations[level.starts[flip_gates] + offsets] ^= True
+        # otherwise, every input must be made to yield True (for an AND gate)
+        # or False (for an OR gate):
+        force_gates = wrong[~flip_one]
+        if len(force_gates) > 0:
+            forced = numpy.zeros(level.size, dtype=numpy.bool_)
+            forced[force_gates] = True
+            force_to = numpy.zeros(level.size, dtype=numpy.bool_)
+            force_to[force_gates] = wanted[~flip_one]
+            edges = forced[level.owners]
+            level.negations[edges] = (self.__values[level.inputs[edges]] !=
+                                      force_to[level.owners[edges]])
+        self.__values[level.first + wrong] = wanted
+
+    def __find_used(self):
+        """Returns an array indicating, for each input wire and gate, whether
+        the output gate depends on it."""
+        used = numpy.zeros(len(self.__names), dtype=numpy.bool_)
+        used[self.__get_output()] = True
+        for level in reversed(self.__levels):
+            gates_used = used[level.first:level.first + level.size]
+            used[level.inputs[gates_used[level.owners]]] = True
+        return used
+
+    def __get_level_display_strings(self, level, used):
+        """Returns the display strings of the gates in level (only those
+        marked in used, if it is not None)."""
+        names = self.__names
+        inputs = level.inputs.tolist()
+        negations = level.negations.tolist()
+        display_strings = []
+        for (pos, start, fanin, gate_type) in zip(xrange(level.size),
+                                                 level.starts.tolist(),
+                                                 level.fanins.tolist(),
+                                                 level.types.tolist()):
+            if used is not None and not used[level.first + pos]:
+                continue
+            inp_strs = ("".join(["N(", names[inp], ")"]) if neg
+                        else names[inp]
+                        for (inp, neg) in zip(inputs[start:start + fanin],
+                                              negations[start:start + fanin]))
+            display_strings.append("".join([names[level.first + pos],
+                                            ":",
+                                            FUNC_NAMES[gate_type],
+                                            "(",
+                                            ",".join(inp_strs),
+                                            ")"]))
+        return display_strings
+
+    def display(self, trim=False):
+        """Returns the display string for the circuit, in the same format as
+        StealthCircuit.display(). If trim is True, gates which the output
+        gate does not depend on are left out, as are levels after that of
+        the output gate."""
+        levels = self.__levels
+        used = None
+        if trim:
+            used = self.__find_used()
+            output = self.__get_output()
+            levels = [level for level in levels if level.first <= output]
+        return "\nL\n".join([""] + ["\n".join(
+            self.__get_level_display_strings(level, used))
+                                    for level in levels])
@@ -0,0 +1,159 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            SY
+#  Description:        Stealth TA2 compiled circuit class test
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+# general imports:
+import unittest
+import time
+
+# SPAR imports:
+import spar_python.circuit_generation.stealth.stealth_wire as sw
+import spar_python.circuit_generation.stealth.stealth_gate_and as sga
+import spar_python.circuit_generation.stealth.stealth_gate_or as sgo
+import spar_python.circuit_generation.stealth.stealth_gate_xor as sgx
+import spar_python.circuit_generation.stealth.stealth_circuit as sc
+import spar_python.circuit_generation.stealth.stealth_compiled_circuit as scc
+import spar_python.circuit_generation.stealth.stealth_generation_functions as sgf
+import spar_python.common.spar_random as sr
+
+class TestCompiledCircuit(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Records the randomness used.
+        """
+        # record the randomness used in case the test fails:
+        self.rand_seed = int(time.time())
+        sr.seed(self.rand_seed)
+        print("seed for this test: " + str(self.rand_seed))
+
+    def make_random_circuit(self, W, num_levels):
+        """Returns a random StealthCircuit with W input wires and num_levels
+        levels of W gates each, in which each gate takes inputs from the level
+        directly above it and from earlier levels, along with its input
+        wires. Returns the circuit, and the list of its levels (the last of
+        which holds only the output gate)."""
+        input_wires = [sgf.make_random_input_wire("W" + str(wire_ind))
+                       for wire_ind in xrange(W)]
+        levels = [input_wires]
+        for level_ind in xrange(num_levels):
+            levels.append(
+                [sgf.TYPE_TO_FAM3_GATE_GEN[sgf.TEST_TYPES.RANDOM](
+                    levels, "G" + str(level_ind * W + gate_ind))
+                 for gate_ind in xrange(W)])
+        output_gate = sgf.TYPE_TO_GATE_GEN[sgf.TEST_TYPES.RANDOM](
+            levels[-1], 1, "output_gate")
+        levels.append([output_gate])
+        return (sc.StealthCircuit(input_wires, output_gate), levels)
+
+    def test_simple_circuit_example(self):
+        """
+        Tests that the simple circuit example of stealth_circuit_test.py can
+        be built and evaluated, both directly and by compiling a
+        StealthCircuit.
+        """
+        circ = scc.StealthCompiledCircuit(["w1", "w2", "w3"])
+        self.assertEqual(3, circ.add_level(["g1"], [scc.AND], [[0, 1]],
+                                           [[True, False]]))
+        circ.add_level(["g2"], [scc.OR], [[3, 2]], [[False, False]])
+        circ.add_level(["og"], [scc.XOR], [[3, 4]], [[False, False]])
+        w1 = sw.StealthInputWire("w1", True)
+        w2 = sw.StealthInputWire("w2", True)
+        w3 = sw.StealthInputWire("w3", False)
+        g1 = sga.StealthAndGate("g1", [w1, w2], [True, False])
+        g2 = sgo.StealthOrGate("g2", [g1, w3], [False, False])
+        output_gate = sgx.StealthXorGate("og", [g1, g2], [False, False])
+        compiled = sc.StealthCircuit([w1, w2, w3], output_gate).compile()
+        for this_circ in [circ, compiled]:
+            self.assertEqual(
+                "\nL\ng1:AND(N(w1),w2)\nL\ng2:OR(g1,w3)\nL\nog:XOR(g1,g2)",
+                this_circ.display())
+            self.assertEqual(3, this_circ.get_num_inputs())
+            self.assertEqual(3, this_circ.get_num_levels())
+            self.assertEqual(False, this_circ.evaluate([True, True, False]))
+            self.assertEqual(True, this_circ.evaluate([True, True, True]))
+            self.assertEqual(True, this_circ.get_value(4))
+
+    def test_compile_randomized(self):
+        """
+        Tests that compiled random circuits display and evaluate exactly as
+        the circuits they were compiled from.
+        """
+        W = 6
+        for circuit_num in xrange(10):
+            (circ, levels) = self.make_random_circuit(W, 4)
+            compiled = circ.compile()
+            self.assertEqual(circ.display(), compiled.display())
+            for input_num in xrange(10):
+                inp = [bool(sr.randbit()) for wire_ind in xrange(W)]
+                self.assertEqual(circ.evaluate(inp), compiled.evaluate(inp))
+
+    def test_balancing_randomized(self):
+        """
+        Test to determine that balancing a level at a time forces the desired
+        outputs, and leaves the gates which already yield them alone.
+        """
+        W = 8
+        num_levels = 5
+        for circuit_num in xrange(10):
+            # compile every gate, rather than just those which the output
+            # gate depends on:
+            (circ, levels) = self.make_random_circuit(W, num_levels)
+            compiled = scc.StealthCompiledCircuit(
+                [wire.get_name() for wire in levels[0]])
+            index_of = dict((id(wire), wire_ind)
+                            for (wire_ind, wire) in enumerate(levels[0]))
+            for level in levels[1:]:
+                first = compiled.add_gates(level, index_of)
+                index_of.update((id(gate), first + gate_ind)
+                                for (gate_ind, gate) in enumerate(level))
+            inp = [bool(sr.randbit()) for wire_ind in xrange(W)]
+            desired = [[bool(sr.randbit()) for gate_ind in xrange(W)]
+                       for level_ind in xrange(num_levels)] + [[True]]
+            compiled.set_input(inp)
+            for (level_ind, level_desired) in enumerate(desired):
+                compiled.balance(level_ind, level_desired)
+            # balancing should agree with a full evaluation:
+            values = [compiled.get_value(index)
+                      for index in xrange(W, W * (num_levels + 1) + 1)]
+            self.assertEqual(True, compiled.evaluate(inp))
+            self.assertEqual(values, [compiled.get_value(index) for index
+                                      in xrange(W, W * (num_levels + 1) + 1)])
+            self.assertEqual(values, sum(desired, []))
+            # balancing a gate to its current value should change nothing:
+            display = compiled.display()
+            compiled.balance(2, values[2 * W:3 * W])
+            compiled.balance(-1, [not values[-1]])
+            compiled.balance(-1, [values[-1]], [0])
+            self.assertEqual(values, [compiled.get_value(index) for index
+                                      in xrange(W, W * (num_levels + 1) + 1)])
+            self.assertEqual(display.split("\n")[:-1],
+                             compiled.display().split("\n")[:-1])
+
+    def test_display_trim(self):
+        """
+        Tests that trimming leaves out exactly the gates which the output gate
+        does not depend on, along with the levels after it.
+        """
+        circ = scc.StealthCompiledCircuit(["w0", "w1", "w2"])
+        circ.add_level(["g3", "g4"], [scc.AND, scc.OR], [[0, 1], [1, 2]],
+                       [[False, False], [True, False]])
+        circ.add_level(["g5", "g6"], [scc.XOR, scc.AND], [[3, 0], [4, 3]],
+                       [[False, True], [False, False]])
+        circ.add_level(["g7"], [scc.OR], [[5, 6]], [[False, False]])
+        self.assertEqual("\nL\ng3:AND(w0,w1)\ng4:OR(N(w1),w2)"
+                         "\nL\ng5:XOR(g3,N(w0))\ng6:AND(g4,g3)"
+                         "\nL\ng7:OR(g5,g6)",
+                         circ.display(trim=True))
+        circ.set_output(5)
+        circ.set_name(5, "output_gate")
+        self.assertEqual("\nL\ng3:AND(w0,w1)\nL\noutput_gate:XOR(g3,N(w0))",
+                         circ.display(trim=True))
+        self.assertEqual(True, circ.evaluate([False, True, False]))
@@ -51,6 +51,10 @@ class StealthGate(sco.StealthCircuitObject):
         """Returns the level this gate is at."""
         return self.__level
 
+    def get_negations(self):
+        """Returns the list of bits indicating which inputs are negated."""
+        return self.__negations
+
     def get_full_display_string(self):
         """Returns the string representing the wire. For instance, for gate G3,
         this might look something like "G3 = AND(G0,G1,N(G2))" (if G3 is the
@@ -12,16 +12,72 @@
 # *****************************************************************
 
 from optparse import OptionParser
+import logging
 import os
 import sys
 this_dir = os.path.dirname(os.path.abspath(__file__))
 base_dir = os.path.join(this_dir, '..', '..', '..')
 sys.path.append(base_dir)
 
+import spar_python.circuit_generation.circuit_common.circuit_task as ct
 import spar_python.circuit_generation.stealth.stealth_generation_functions as sgf
 import spar_python.common.file_handle_object as fho
 import spar_python.common.spar_random as sr
 
+LOGGER = logging.getLogger(__name__)
+
+class StealthCircuitTask(ct.CircuitTask):
+    """
+    This class represents the generation of one Stealth circuit, along with
+    its first input and the corresponding output, and of the rest of its
+    inputs. params holds the parameters W, G, fg, X, fx and D, of which only
+    those used by the family fam are needed.
+    """
+    def __init__(self, fam, test_type, params, circuit_file_name,
+                 input_file_names, output_file_name, file_handle_object,
+                 base_seed=None, stream=None):
+        """Initializes the task with the circuit family and test type, the
+        parameters, the names of the files to write, and the
+        file_handle_object to write them with."""
+        ct.CircuitTask.__init__(self, base_seed, stream)
+        self.__fam = fam
+        self.__test_type = test_type
+        self.__params = params
+        self.circuit_file_name = circuit_file_name
+        self.input_file_names = input_file_names
+        self.output_file_name = output_file_name
+        self.__fho = file_handle_object
+
+    def generate(self):
+        """Generates the circuit and its inputs, writes them to their files,
+        and returns the size of the circuit file in bytes."""
+        (W, G, fg, X, fx, D) = self.__params
+        circuit_file = self.__fho.get_file_object(self.circuit_file_name, 'w')
+        input_file = self.__fho.get_file_object(self.input_file_names[0], 'w')
+        output_file = self.__fho.get_file_object(self.output_file_name, 'w')
+        type_to_generator = sgf.FAM_TO_TYPE_TO_GENERATOR[self.__fam]
+        generator = type_to_generator[self.__test_type]
+        if self.__fam == 3:
+            generator(W, D, circuit_file, input_file, output_file).generate()
+        elif self.__fam == 1:
+            generator(W, G, fg, circuit_file, input_file,
+                      output_file).generate()
+        elif self.__fam == 2:
+            generator(W, G, fg, circuit_file, input_file, output_file,
+                      X, fx).generate()
+        circuit_size = circuit_file.tell()
+        self.__fho.close_file_object(circuit_file)
+        self.__fho.close_file_object(input_file)
+        self.__fho.close_file_object(output_file)
+        for input_file_name in self.input_file_names[1:]:
+            # generate a random input:
+            inp = sgf.make_random_input(W)
+            # write the input to an input file:
+            input_file = self.__fho.get_file_object(input_file_name, 'w')
+            input_file.write(str(inp))
+            self.__fho.close_file_object(input_file)
+        return circuit_size
+
 class ParserAndGenerator(object):
     """
     This class parses the config file living in the directory test_name,
@@ -47,6 +103,10 @@ class ParserAndGenerator(object):
     num_circuits, and num_inputs) can be reset multiple times throughout the
     config.txt file.
     Note that the seed parameter may be omitted.
+    If num_processes is given, the circuits are generated in a pool of that
+    many processes, each from its own substream of the seed (so the same
+    circuits are generated whatever the number of processes, though not the
+    same ones as without num_processes).
     For the large and varying parameters tests, test_type should be RANDOM.
     fam, K, W, G, fg, X, fx, num_circuits and num_inputs should be specified.
     For the single gate type test, test_type should change throughout the test;
@@ -60,10 +120,10 @@ class ParserAndGenerator(object):
     circuits and inputs in the order in which they are used.
     """
     def __init__(self, test_name, config_file,
-                 file_handle_object=None):
+                 file_handle_object=None, num_processes=None):
         """
-        Initializes the class with a config_file, a test_name and a
-        file_handle_object.
+        Initializes the class with a config_file, a test_name, a
+        file_handle_object and the number of processes to use, if any.
         Test_name should correspond to a directory with the name 'test_name'.
         """
         self.__config_file_lines = config_file.read().split("\n")
@@ -85,6 +145,15 @@ class ParserAndGenerator(object):
         self.__unique_key_num = 0
         self.__unique_circuit_num = 0
         self.__unique_input_num = 0
+        self.__num_processes = num_processes
+        # set all of the parameters to None:
+        self.__seed = None
+        self.__W = None
+        self.__G = None
+        self.__fg = None
+        self.__X = None
+        self.__fx = None
+        self.__D = None
         # create the map which maps line to line handler:
         self.__line_to_handler = {"fam": self.__handle_fam,
                                   "test_type": self.__handle_test_type,
@@ -102,7 +171,8 @@ class ParserAndGenerator(object):
 
     def __handle_seed(self, randseed):
         """Handles a new randomness seed appropriately."""
-        sr.seed(int(randseed))
+        self.__seed = int(randseed)
+        sr.seed(self.__seed)
 
     def __handle_fam(self, fam):
         """Handles a new fam appropriately."""
@@ -167,55 +237,45 @@ class ParserAndGenerator(object):
     
     def __make_circuits(self):
         """Generates circuits with the current parameters"""
+        tasks = []
         for circuit_num in xrange(self.__num_circuits):
             self.__unique_circuit_num += 1
-            self.__unique_input_num +=1 
             circuit_file_name = os.path.join(self.__circuit_dir_name,
                                              str(self.__unique_circuit_num))
-            circuit_file = self.__fho.get_file_object(circuit_file_name, 'w')
-            input_file_name = os.path.join(self.__input_dir_name,
-                                           str(self.__unique_input_num))
-            input_file = self.__fho.get_file_object(input_file_name, 'w')
+            # each circuit gets at least one input, along with its output:
+            input_file_names = []
+            for input_num in xrange(max(self.__num_inputs, 1)):
+                self.__unique_input_num += 1
+                input_file_names.append(
+                    os.path.join(self.__input_dir_name,
+                                 str(self.__unique_input_num)))
             output_file_name = os.path.join(self.__output_dir_name,
-                                            str(self.__unique_input_num))
-            output_file = self.__fho.get_file_object(output_file_name, 'w')
-            type_to_generator = sgf.FAM_TO_TYPE_TO_GENERATOR[self.__fam]
-            generator = type_to_generator[self.__test_type]
-            if self.__fam == 3:
-                generator(self.__W, self.__D, circuit_file,
-                          input_file, output_file).generate()
-            elif self.__fam == 1:
-                generator(self.__W, self.__G, self.__fg, circuit_file,
-                          input_file, output_file).generate()
-            elif self.__fam == 2:
-                generator(self.__W, self.__G, self.__fg,
-                          circuit_file, input_file, output_file,
-                          self.__X, self.__fx).generate()
-            self.__fho.close_file_object(circuit_file)
-            self.__fho.close_file_object(input_file)
-            self.__fho.close_file_object(output_file)
+                                            os.path.basename(
+                                                input_file_names[0]))
+            # in process-pool mode, each circuit is generated from its own
+            # substream of the seed:
+            if self.__num_processes is None:
+                (base_seed, stream) = (None, None)
+            else:
+                (base_seed, stream) = (self.__seed, self.__unique_circuit_num)
+            tasks.append(StealthCircuitTask(
+                self.__fam, self.__test_type,
+                (self.__W, self.__G, self.__fg, self.__X, self.__fx,
+                 self.__D),
+                circuit_file_name, input_file_names, output_file_name,
+                self.__fho, base_seed, stream))
+        results = ct.run_tasks(tasks, self.__num_processes or 1)
+        for (task, (circuit_size, seconds)) in zip(tasks, results):
+            LOGGER.info("Generated %s (%d bytes) in %.2f seconds",
+                        task.circuit_file_name, circuit_size, seconds)
             # write the circuit location to the test file:
             self.__test_file.write("".join(["CIRCUIT\n",
-                                            os.path.join("stealth",
-                                                         circuit_file_name),
-                                            "\n"]))
-            # write the input location to the test file:
-            self.__test_file.write("".join(["INPUT\n",
-                                            os.path.join("stealth",
-                                                         input_file_name),
+                                            os.path.join(
+                                                "stealth",
+                                                task.circuit_file_name),
                                             "\n"]))
-            # for each circuit, make self.__num_inputs inputs:
-            for input_num in xrange(1, self.__num_inputs):
-                self.__unique_input_num += 1
-                # generate a random input:
-                inp = sgf.make_random_input(self.__W)
-                # write the input to an input file:
-                input_file_name = os.path.join(self.__input_dir_name,
-                                                str(self.__unique_input_num))
-                input_file = self.__fho.get_file_object(input_file_name, 'w')
-                input_file.write(str(inp))
-                self.__fho.close_file_object(input_file)
-                # write the input location to the test file:
+            # write the input locations to the test file:
+            for input_file_name in task.input_file_names:
                 self.__test_file.write("".join(["INPUT\n",
                                                 os.path.join("stealth",
                                                              input_file_name),
@@ -239,10 +299,16 @@ class ParserAndGenerator(object):
 if __name__ == '__main__':
     parser = OptionParser(usage = ('This generates test files,'
                                    'one per argument passed to this script.'))
+    parser.add_option(
+        "-n", "--num-processes", type="int",
+        help="the number of processes to generate circuits in")
     # Arguments are interpreted as test names.
     (options, args) = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
     for arg in args:
         config_file_name = os.path.join(arg, 'config.txt')
         config_file = open(config_file_name, 'r')
-        ParserAndGenerator(arg, config_file).parse_and_generate()
+        ParserAndGenerator(
+            arg, config_file,
+            num_processes=options.num_processes).parse_and_generate()
         config_file.close()
@@ -94,3 +94,39 @@ class GenerateTest(unittest.TestCase):
         self.assertEqual(D, D_value)
         self.assertEqual(fam, fam_value)
  
+
+    def test_num_processes(self):
+        """
+        tests that in process-pool mode, the circuits and inputs depend only
+        on the seed, and not on the state of the RNG beforehand.
+        """
+        test_name = "unit_test_test_2"
+        config_file_text = "\n".join(["seed = 123",
+                                      "test_type = RANDOM",
+                                      "K = 80",
+                                      "fam = 3",
+                                      "W = 5",
+                                      "D = 4",
+                                      "num_circuits = 3",
+                                      "num_inputs = 2",
+                                      "generate = True"])
+        file_texts = []
+        for rand_seed in [1, 2]:
+            sr.seed(rand_seed)
+            fho = tfho.TestFileHandleObject()
+            pag = gen.ParserAndGenerator(test_name,
+                                         StringIO.StringIO(config_file_text),
+                                         fho, num_processes=1)
+            pag.parse_and_generate()
+            file_names = [os.path.join(test_name, "test.txt")]
+            for circuit_num in xrange(1, 4):
+                file_names.append(os.path.join(test_name, "circuit",
+                                               str(circuit_num)))
+            for input_num in xrange(1, 7):
+                file_names.append(os.path.join(test_name, "input",
+                                               str(input_num)))
+            file_texts.append([fho.get_file(file_name).getvalue()
+                               for file_name in file_names])
+        self.assertEqual(file_texts[0], file_texts[1])
+        # the circuits should all differ:
+        self.assertEqual(3, len(set(file_texts[0][1:4])))
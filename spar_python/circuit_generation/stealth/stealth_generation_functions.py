@@ -15,7 +15,7 @@ import spar_python.circuit_generation.stealth.stealth_wire as sw
 import spar_python.circuit_generation.stealth.stealth_gate_and as sga
 import spar_python.circuit_generation.stealth.stealth_gate_or as sgo
 import spar_python.circuit_generation.stealth.stealth_gate_xor as sgx
-import spar_python.circuit_generation.stealth.stealth_circuit as sc
+import spar_python.circuit_generation.stealth.stealth_compiled_circuit as scc
 import spar_python.circuit_generation.circuit_common.circuit_input as si
 import spar_python.common.spar_random as sr
 import spar_python.common.enum as enum
@@ -66,8 +66,9 @@ def make_random_gate(ultimate_level, fanin_frac, gate_name, gate_factory):
                        max_fanin))
         # choose random inputs:
         inputs = sr.sample(ultimate_level, fanin)
-    # choose the negations:
-    negations = [sr.randbit() for neg_ind in xrange(fanin)]
+    # choose the negations (drawing them all at once yields the same bits as
+    # drawing them one at a time with sr.randbit()):
+    negations = sr.randint(0, 1, fanin).tolist()
     return gate_factory(gate_name, inputs, negations)
 
 def make_random_fam_3_gate(levels, gate_name, gate_factory):
@@ -154,6 +155,37 @@ def make_random_input(W):
     # bits at once.
     return si.Input([sr.randbit() for inp_num in xrange(W)])
 
+def compile_input_wires(input_wires):
+    """Returns a StealthCompiledCircuit with input_wires as its input wires
+    (set to their current values), and no gates yet."""
+    circ = scc.StealthCompiledCircuit([wire.get_name() for wire in input_wires])
+    circ.set_input([wire.evaluate() for wire in input_wires])
+    return circ
+
+def add_balanced_level(circ, gates, index_of):
+    """Adds gates to the StealthCompiledCircuit circ as its next level, and
+    balances each of them with respect to a randomly chosen output.
+
+    Args:
+        circ: the circuit, whose existing gates must be balanced.
+        gates: a list of gates, whose inputs all belong to circ.
+        index_of: a dictionary mapping the id() of each of their inputs to
+            its index in circ.
+
+    Returns a list of input wires, set to the values of the gates, which can
+    serve in their stead as inputs to later gates (so that the gates, and the
+    gates they take as input, need not be kept around), and a dictionary
+    mapping the id() of each of those wires to the index of its gate in circ.
+    """
+    first = circ.add_gates(gates, index_of)
+    circ.balance(-1, sr.randint(0, 1, len(gates)))
+    wires = [sw.StealthInputWire(gate.get_name(),
+                                 circ.get_value(first + gate_ind))
+             for (gate_ind, gate) in enumerate(gates)]
+    wire_index_of = dict((id(wire), first + wire_ind)
+                         for (wire_ind, wire) in enumerate(wires))
+    return (wires, wire_index_of)
+
 class circuit_maker(object):
     """This is the circuit maker superclass. f1f2 and f3 makers extend it."""
 
@@ -255,6 +287,11 @@ class f1f2_circuit_maker_with_trimming_switch(circuit_maker):
         input_wires = self._create_input_wires()
         # create the output and write it to the output file:
         output = self._create_output()
+        # the gates are compiled into a StealthCompiledCircuit level by level,
+        # so that each level can be balanced all at once:
+        circ = compile_input_wires(input_wires)
+        index_of = dict((id(wire), wire_ind)
+                        for (wire_ind, wire) in enumerate(input_wires))
         # initialize the global gate counter, which acts as the unique numerical
         # id of each gate:
         unique_gate_num_gen = itertools.count(self._W, 1)
@@ -262,11 +299,6 @@ class f1f2_circuit_maker_with_trimming_switch(circuit_maker):
         ultimate_level = input_wires
         # for each level:
         for level_ind in xrange(len(self._level_type_array)):
-            if not self._trimming:
-                # if this circuit is not being trimmed, then we have to write
-                # 'L' to the circuit file, because we will not be creating a
-                # circuit object to take care of our printing for us:
-                self._circuit_file.write("\nL")
             # if this is an intermediate level:
             if self._level_type_array[level_ind] == LEVEL_TYPES.RANDOM:
                 num_gates = self._G
@@ -278,44 +310,25 @@ class f1f2_circuit_maker_with_trimming_switch(circuit_maker):
                 fanin_frac = self._fx
                 make_gate = TYPE_TO_GATE_GEN[GATE_TYPES.XOR]
             # Create the list of gates at this level:
-            this_level = [None] * num_gates
-            for gate_ind in xrange(num_gates):
-                displayname = "".join(["G", str(unique_gate_num_gen.next())])
-                # make the random gate:
-                new_gate = make_gate(ultimate_level, fanin_frac, displayname)
-                # choose a random output, and balance the new gate with respect
-                # to that output:
-                new_gate_output = sr.randbit()
-                new_gate.balance(new_gate_output)
-                if not self._trimming:
-                    # if this circuit is not being trimmed, then we can just
-                    # write the gate to the circuit file right away:
-                    self._circuit_file.write(
-                        "".join(["\n", new_gate.get_full_display_string()]))
-                    # since this gate is already written to the circuit file,
-                    # we can save on memory space by re-representing it as an
-                    # input wire with the correct value:
-                    new_gate = sw.StealthInputWire(displayname, new_gate_output)
-                # add this gate to our list of gates at this level:
-                this_level[gate_ind] = new_gate
-                # increment the global gate counter:
-            # set things up for the next level:
-            ultimate_level = this_level
+            this_level = [make_gate(ultimate_level, fanin_frac,
+                                    "".join(["G",
+                                             str(unique_gate_num_gen.next())]))
+                          for gate_ind in xrange(num_gates)]
+            # choose a random output for each new gate, and balance the new
+            # gates with respect to those outputs. The gates at the earlier
+            # levels only serve as inputs from now on, so input wires are
+            # used in their stead:
+            (ultimate_level, index_of) = add_balanced_level(circ, this_level,
+                                                            index_of)
         # create the output gate:
-        negations = [sr.randbit() for neg_ind in xrange(len(ultimate_level))]
         output_gate = self._gate_maker(ultimate_level, 1, "output_gate")
         # balance the output gate with respect to the chosen output:
-        output_gate.balance(output)
-        if self._trimming:
-            # if this circuit is being trimmed, then we create a circuit and
-            # write it to the circuit_file:
-            circ = sc.StealthCircuit(input_wires, output_gate)
-            self._circuit_file.write(circ.display())
-        else:
-            # otherwise, we will have already written all the gates as we went
-            # along, so we only need to record the output gate:
-            self._circuit_file.write("".join(["\nL\n",
-                                        output_gate.get_full_display_string()]))
+        circ.add_gates([output_gate], index_of)
+        circ.balance(-1, [output])
+        # write the circuit to the circuit file, leaving out the gates which
+        # do not contribute to the output gate if this circuit is being
+        # trimmed:
+        self._circuit_file.write(circ.display(trim=self._trimming))
 
 def get_prob_needs_trimming(W, G, fg, X, fx, level_type_array):
     """Calculates the probability that a circuit with the parameters specified
@@ -412,6 +425,11 @@ class f3_circuit_maker(circuit_maker):
         header_string = self._create_circuit_header()
         # create the input wires and write the inputs to the input file:
         input_wires = self._create_input_wires()
+        # the gates are compiled into a StealthCompiledCircuit level by level,
+        # so that each level can be balanced all at once:
+        circ = compile_input_wires(input_wires)
+        index_of = dict((id(wire), wire_ind)
+                        for (wire_ind, wire) in enumerate(input_wires))
         # set set of all circuit objects already created:
         levels = [input_wires]
         # initialize the global gate counter, which acts as the unique numerical
@@ -420,28 +438,28 @@ class f3_circuit_maker(circuit_maker):
         # for each level:
         for level_index in xrange(self._D):
             # Create the list of gates at this level:
-            this_level = [None] * self._W
-            for gate_ind in xrange(self._W):
-                displayname = "".join(["G",str(unique_gate_num_gen.next())])
-                # make the new gate:
-                new_gate = self._gate_maker(levels, displayname)
-                new_gate_output = sr.randbit()
-                new_gate.balance(new_gate_output)
-                # add this gate to our list of gates at this level:
-                this_level[gate_ind] = new_gate
+            this_level = [self._gate_maker(
+                levels, "".join(["G",str(unique_gate_num_gen.next())]))
+                          for gate_ind in xrange(self._W)]
+            # choose a random output for each new gate, and balance the new
+            # gates with respect to those outputs:
+            (this_level, level_index_of) = add_balanced_level(circ,
+                                                              this_level,
+                                                              index_of)
+            index_of.update(level_index_of)
             # set things up for the next level:
-            ultimate_level = this_level
             levels.append(this_level)
-        output_gate = sr.choice(levels[-1])
-        output_gate.set_name("output_gate")
+        output_gate_ind = sr.randint(0, self._W - 1)
+        output_gate_index = index_of[id(levels[-1][output_gate_ind])]
+        circ.set_name(output_gate_index, "output_gate")
+        circ.set_output(output_gate_index)
         # choose a random output, and write it to the output file:
         output = sr.randbit()
         self._output_file.write(str(output))
         # balance the output gate with respect to the chosen output:
-        output_gate.balance(output)
-        circ = sc.StealthCircuit(input_wires, output_gate)
+        circ.balance(-1, [output], [output_gate_ind])
         # write the circuit to the circuit file:
-        self._circuit_file.write(circ.display())
+        self._circuit_file.write(circ.display(trim=True))
 
 TYPE_TO_FAM1_GEN = {TEST_TYPES.RANDOM:
                     functools.partial(
@@ -10,6 +10,7 @@
 #  12 Nov 2012   SY             Original Version
 # *****************************************************************
 
+import functools
 import math
 import time
 import spar_python.circuit_generation.stealth.stealth_generation_functions as g
@@ -359,3 +360,60 @@ class generation_functions_test(unittest.TestCase):
         self.assertEqual(D, D_value)
         self.assertEqual(F, F_value)
 
+
+    def evaluate_circuit_string(self, circuit_string, input_string):
+        """
+        Parses a circuit written by a circuit maker, and returns the value of
+        its output gate on the input written along with it.
+        """
+        values = dict(("W" + str(wire_ind), bit == "1")
+                      for (wire_ind, bit) in enumerate(input_string[1:-1]))
+        funcs = {"AND": all, "OR": any,
+                 "XOR": lambda bits: sum(bits) % 2 == 1}
+        # skip the header, and the 'L's separating the levels:
+        for line in circuit_string.split("\n")[1:]:
+            if line == "L":
+                continue
+            (name, definition) = line.split(":")
+            (func_name, args) = definition[:-1].split("(", 1)
+            bits = [(not values[arg[2:-1]]) if arg.startswith("N(")
+                    else values[arg] for arg in args.split(",")]
+            values[name] = funcs[func_name](bits)
+        return values["output_gate"]
+
+    def test_circuits_yield_output(self):
+        """
+        Tests that the circuits made by all the circuit makers, with and
+        without trimming, yield the output written along with them on the
+        input written along with them.
+        """
+        fho = tfho.TestFileHandleObject()
+        W = 8
+        G = 30
+        fg = .4
+        X = 10
+        fx = .5
+        D = 6
+        makers = []
+        for test_type in g.TEST_TYPES.numbers_generator():
+            for trimming in [True, False]:
+                makers.append(functools.partial(
+                    g.f1f2_circuit_maker_with_trimming_switch,
+                    W, G, fg, X=None, fx=None,
+                    gate_maker=g.TYPE_TO_GATE_GEN[test_type],
+                    level_type_array=[g.LEVEL_TYPES.RANDOM],
+                    trimming=trimming))
+            makers.append(functools.partial(
+                g.TYPE_TO_FAM2_GEN[test_type], W, G, fg, X=X, fx=fx))
+            makers.append(functools.partial(g.TYPE_TO_FAM3_GEN[test_type],
+                                            W, D))
+        for (maker_num, maker) in enumerate(makers):
+            file_names = [name + str(maker_num)
+                          for name in ["circuit", "input", "output"]]
+            files = [fho.get_file_object(name, 'w') for name in file_names]
+            maker(*files).generate()
+            (circuit_string, input_string, output_string) = [
+                fho.get_file(name).getvalue() for name in file_names]
+            self.assertEqual(output_string == "1",
+                             self.evaluate_circuit_string(circuit_string,
+                                                          input_string))
@@ -21,6 +21,7 @@ sys.path.append(base_dir)
 
 import spar_python.common.aggregators.base_aggregator \
     as base_aggregator
+import spar_python.common.aggregators.row_bitmaps as row_bitmaps
 import abc
 import spar_python.data_generation.spar_variables as sv
 import collections
@@ -134,6 +135,19 @@ class BaseCollector(base_aggregator.BaseAggregator):
         larger_set.update(smaller_set)
         return larger_set
 
+    def match_bitmap(self, row_list):
+        '''
+        Returns a pair (bitmap, result): the bitmap of the positions of the
+        rows in row_list which satisfy match_row, and the set of values
+        extracted from those rows (which is what map_reduce_row_list would
+        return). Used by compound_aggregators.BooleanCollector.
+        '''
+        positions = [position for (position, row) in enumerate(row_list)
+                     if self.match_row(row)]
+        return (row_bitmaps.from_positions(positions),
+                set(self.extract_value(row_list[position])
+                    for position in positions))
+
     def done(self):
         '''
         Do nothing.
@@ -35,8 +35,9 @@ class BaseAggregator(object):
 
     
     In addition, this class provides an implementation of two list-based
-    methods, reduce_row_list() and map_reduce_row_list(). Subclasses may wish
-    to override these naive implementations with optimized ones.
+    methods, reduce_row_list() and map_reduce_row_list(), and one batch-based
+    method, map_reduce_column_batch(). Subclasses may wish to override these
+    naive implementations with optimized ones.
     
     
     A note about state: it is strongly advised that aggregators be as 
@@ -206,3 +207,16 @@ class BaseAggregator(object):
         map_vals = map(self.map, row_list)
         reduce_val = self.reduce_list(map_vals) 
         return reduce_val
+
+
+    def map_reduce_column_batch(self, column_batch):
+        """
+        A high-level function to take a whole batch of rows in columnar form
+        (a GeneratedColumnBatch, see data_generation/generated_row.py), map
+        them, and reduce the results. This is only called when the
+        DataGeneratorEngine is in columnar mode. The default implementation
+        simply turns the batch back into rows and calls map_reduce_row_list(),
+        but sub-classes can override this to work on whole columns at once.
+        Will raise an AssertionError if the batch is empty.
+        """
+        return self.map_reduce_row_list(column_batch.rows())
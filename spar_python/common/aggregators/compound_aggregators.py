@@ -28,6 +28,8 @@ LOGGER = logging.getLogger(__name__)
 
 import spar_python.common.aggregators.base_aggregator \
     as base_aggregator
+import spar_python.common.aggregators.row_bitmaps as row_bitmaps
+import spar_python.data_generation.spar_variables as sv
 
 
 CompoundResult = collections.namedtuple('CompoundResult', 
@@ -44,6 +46,11 @@ class BooleanCollector(base_aggregator.BaseAggregator):
     otherwise.
     
     * reduce(result1, result2) should return the union of reduce1 and reduce2
+
+    map_reduce_row_list() does not call map() on every row. Instead, each
+    sub-aggregator produces a bitmap of the positions of the matching rows
+    in the batch (see match_bitmap()), and the top-level result is found
+    with one bitwise operation per sub-aggregator for the whole batch.
     """
     __metaclass__ = abc.ABCMeta
 
@@ -83,6 +90,32 @@ class BooleanCollector(base_aggregator.BaseAggregator):
         
         top_level_answer = self._extract_top_level_result(sub_answers_as_sets)
         return CompoundResult(top_level_answer, sub_answers)
+
+    @abc.abstractmethod
+    def _extract_top_level_bitmap(self, sub_bitmaps):
+        '''
+        The bitmap analogue of _extract_top_level_result().
+        '''
+        pass
+
+    def match_bitmap(self, row_list):
+        '''
+        Returns a pair (bitmap, result), where bitmap has the positions of
+        the rows in row_list that match the compound query set, and result
+        is what map_reduce_row_list(row_list) returns.
+        '''
+        sub_pairs = [sub_match_bitmap(agg, row_list)
+                     for agg in self.sub_aggregators]
+        bitmap = self._extract_top_level_bitmap([b for (b, _) in sub_pairs])
+        top_level_result = set(row_list[position][sv.VARS.ID]
+                               for position
+                               in row_bitmaps.to_positions(bitmap))
+        return (bitmap,
+                CompoundResult(top_level_result, [r for (_, r) in sub_pairs]))
+
+    def map_reduce_row_list(self, row_list):
+        assert len(row_list) >= 1
+        return self.match_bitmap(row_list)[1]
                 
                     
     def reduce(self, result1, result2):
@@ -98,10 +131,33 @@ class BooleanCollector(base_aggregator.BaseAggregator):
 
 
 
+def sub_match_bitmap(agg, row_list):
+    '''
+    Returns the (bitmap, result) pair of BooleanCollector.match_bitmap() for
+    any sub-aggregator. Collectors which do not provide match_bitmap() are
+    mapped row by row, and a row matches if its map() result is non-empty.
+    '''
+    try:
+        match_bitmap = agg.match_bitmap
+    except AttributeError:
+        pass
+    else:
+        return match_bitmap(row_list)
+    map_vals = map(agg.map, row_list)
+    bitmap = row_bitmaps.from_positions(
+        position for (position, map_val) in enumerate(map_vals)
+        if getattr(map_val, 'top_level_result', map_val))
+    return (bitmap, agg.reduce_list(map_vals))
+
+
+
 class ConjunctiveCollector(BooleanCollector):
     
     def _extract_top_level_result(self, sub_answers):
         return set.intersection(*sub_answers)
+
+    def _extract_top_level_bitmap(self, sub_bitmaps):
+        return row_bitmaps.intersection(sub_bitmaps)
     
     
 
@@ -111,6 +167,32 @@ class DisjunctiveCollector(BooleanCollector):
     
     def _extract_top_level_result(self, sub_answers):
         return set.union(*sub_answers)
+
+    def _extract_top_level_bitmap(self, sub_bitmaps):
+        return row_bitmaps.union(sub_bitmaps)
+
+
+
+class ThresholdCollector(BooleanCollector):
+    '''
+    Collects the rows matched by at least m of its sub-aggregators (an
+    M-of-N query).
+    '''
+
+    def __init__(self, sub_aggregators, m):
+        super(ThresholdCollector, self).__init__(sub_aggregators)
+        assert 1 <= m <= len(sub_aggregators)
+        self.m = m
+
+    def _extract_top_level_result(self, sub_answers):
+        counts = collections.Counter()
+        for sub_answer in sub_answers:
+            counts.update(sub_answer)
+        return set(value for (value, count) in counts.iteritems()
+                   if count >= self.m)
+
+    def _extract_top_level_bitmap(self, sub_bitmaps):
+        return row_bitmaps.threshold(sub_bitmaps, self.m)
         
 
     
\ No newline at end of file
@@ -11,6 +11,7 @@
 # *****************************************************************
 
 
+import itertools
 import unittest
 
 import spar_python.data_generation.spar_variables as sv
@@ -428,3 +429,54 @@ class CompoundCollectorTest(unittest.TestCase):
                                   set([1,2])])  # agg3
         self.assertEqual(result, goal)
 
+
+
+    def test_map_reduce_row_list(self):
+        rows = [{'field1' : f1, 'field2' : f2, 'field3' : f3,
+                 sv.VARS.ID : 10 * i}
+                for (i, (f1, f2, f3)) in enumerate(
+                    itertools.product(['a', None], ['b', None], ['c', None]))]
+        goal = reduce(self.agg.reduce, map(self.agg.map, rows))
+        result = self.agg.map_reduce_row_list(rows)
+        self.assertEqual(result, goal)
+        self.assertEqual(result.top_level_result, set([0, 20, 40]))
+        (bitmap, _) = self.agg.match_bitmap(rows)
+        self.assertEqual(bitmap, 0b10101)
+
+
+
+
+class ThresholdCollectorTest(unittest.TestCase):
+    """
+    Test that the ThresholdCollector class acts as expected.
+    """
+
+
+    def setUp(self):
+        sub_aggs = [aqa.EqualityCollector('field1', 'a'),
+                    aqa.EqualityCollector('field2', 'b'),
+                    aqa.EqualityCollector('field3', 'c')]
+        self.agg = ca.ThresholdCollector(sub_aggs, 2)
+        self.rows = [{'field1' : f1, 'field2' : f2, 'field3' : f3,
+                      sv.VARS.ID : i}
+                     for (i, (f1, f2, f3)) in enumerate(
+                         itertools.product(['a', None], ['b', None],
+                                           ['c', None]))]
+
+
+    def test_map(self):
+        goals = [set([0]), set([1]), set([2]), set(),
+                 set([4]), set(), set(), set()]
+        for (row, goal) in zip(self.rows, goals):
+            result = self.agg.map(row)
+            self.assertEqual(result.top_level_result, goal)
+
+
+    def test_map_reduce_row_list(self):
+        goal = reduce(self.agg.reduce, map(self.agg.map, self.rows))
+        result = self.agg.map_reduce_row_list(self.rows)
+        self.assertEqual(result, goal)
+        self.assertEqual(result.top_level_result, set([0, 1, 2, 4]))
+        self.assertEqual(result.sub_results,
+                         [set([0, 1, 2, 3]), set([0, 1, 4, 5]),
+                          set([0, 2, 4, 6])])
@@ -50,6 +50,13 @@ class CountsAggregator(base_aggregator.BaseAggregator):
         '''
         return a + b
 
+    def map_reduce_column_batch(self, column_batch):
+        '''
+        Returns the number of rows in the batch.
+        '''
+        assert len(column_batch) >= 1
+        return len(column_batch)
+
     def fields_needed(self):
         return set()
 
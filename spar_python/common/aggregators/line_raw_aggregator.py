@@ -29,6 +29,68 @@ LOGGER = logging.getLogger(__name__)
 
 
 
+class LineRawEncoder(object):
+    """
+    Turns rows into LineRaw records for one output order (schema). The
+    converter for each field and the layout of a record are looked up once,
+    here, rather than once per field of every row. Each record is returned
+    as a single string, so that a whole batch can be written to file in
+    one call.
+
+    Encoders hold bound methods (which cannot be pickled), so aggregators
+    should get them from get_encoder() rather than storing them.
+    """
+
+    def __init__(self, var_order):
+        self.__var_order = list(var_order)
+        self.__converters = [sv.VAR_CONVERTERS[var].to_line_raw
+                             for var in self.__var_order]
+        self.__record_format = \
+            'INSERT\n' + '%s\n' * len(self.__var_order) + 'ENDINSERT\n'
+
+
+    def encode_rows(self, row_list):
+        '''
+        Returns the list of LineRaw records for the rows in row_list.
+        '''
+        record_format = self.__record_format
+        pairs = zip(self.__var_order, self.__converters)
+        return [record_format % tuple([to_line_raw(row[var])
+                                       for (var, to_line_raw) in pairs])
+                for row in row_list]
+
+
+    def encode_column_batch(self, column_batch):
+        '''
+        Returns the list of LineRaw records for the rows in column_batch (a
+        GeneratedColumnBatch), converting each column in one go.
+        '''
+        if not self.__var_order:
+            return [self.__record_format] * len(column_batch)
+        record_format = self.__record_format
+        encoded_columns = [map(to_line_raw, column_batch.column(var))
+                           for (var, to_line_raw)
+                           in zip(self.__var_order, self.__converters)]
+        return [record_format % values for values in zip(*encoded_columns)]
+
+
+
+_ENCODERS = {}
+
+def get_encoder(var_order):
+    '''
+    Returns the (shared) LineRawEncoder for var_order.
+    '''
+    var_order = tuple(var_order)
+    try:
+        return _ENCODERS[var_order]
+    except KeyError:
+        encoder = LineRawEncoder(var_order)
+        _ENCODERS[var_order] = encoder
+        return encoder
+
+
+
 class LineRawBase(base_aggregator.BaseAggregator):
     """
     
@@ -39,6 +101,10 @@ class LineRawBase(base_aggregator.BaseAggregator):
     files, one that opens named pipes, and one that writes to a file-like
     object provided to the constructor. (The last one is useful for
     unit tests, as it can be given a StringIO object.)
+
+    Whole batches (map_reduce_row_list and map_reduce_column_batch) are
+    encoded by a LineRawEncoder and written with a single write() call per
+    output file, rather than one per field of every row.
     
     """
     
@@ -72,22 +138,46 @@ class LineRawBase(base_aggregator.BaseAggregator):
         return set(self.__output_order)
 
 
+    def _encoder(self):
+        """
+        Returns the LineRawEncoder for this aggregator's output order.
+        """
+        return get_encoder(self.__output_order)
+
+
     def _write_row(self, file_obj, row_dict):
         """
         Given a row dictionary and a file-like object, write the row to the file
         in LineRaw format.
         """
-        
-        file_obj.write('INSERT\n')
-        for i in self.__output_order:
-            val = row_dict[i]
-            line_raw_val = sv.VAR_CONVERTERS[i].to_line_raw(val)
-            file_obj.write(line_raw_val)
-            file_obj.write('\n')
-        file_obj.write('ENDINSERT\n')
+        file_obj.write(self._encoder().encode_rows([row_dict])[0])
         return
 
 
+    @abc.abstractmethod
+    def _write_records(self, records):
+        """
+        Write a list of LineRaw records (see LineRawEncoder) to the output.
+        """
+        pass
+
+
+    def map_reduce_row_list(self, row_list):
+        """
+        Write all the rows in the list to the output, and return None.
+        """
+        self._write_records(self._encoder().encode_rows(row_list))
+        return None
+
+
+    def map_reduce_column_batch(self, column_batch):
+        """
+        Write all the rows in the batch to the output, and return None.
+        """
+        self._write_records(self._encoder().encode_column_batch(column_batch))
+        return None
+
+
         
     @staticmethod
     def reduce(_ignore_me, _ignore_me_too):
@@ -197,6 +287,16 @@ class LineRawPipeAggregator(LineRawBase):
         self._write_row(self.__file, row_dict)
 
 
+    def _write_records(self, records):
+        """
+        Write the records to the named pipe in one call, and flush them so
+        that the reader at the other end gets whole batches as soon as they
+        are ready rather than whenever the (large) buffer fills up.
+        """
+        self.__file.write(''.join(records))
+        self.__file.flush()
+
+
     def done(self):
         '''
         Flushes and clloses the underlying named pipe.
@@ -223,7 +323,7 @@ class LineRawFileAggregator(LineRawBase):
     def __init__(self, 
                  base_filename = None,
                  buffer_size = 10**8,
-                 rows_per_file = 1000,
+                 rows_per_file = None,
                  schema_file = None,
                  var_order = None):
         """
@@ -233,8 +333,9 @@ class LineRawFileAggregator(LineRawBase):
         when opening new files/FIFOs. This should be chosen to optimize speed
         of i/o.
           
-        * rows_per_file should specify the number of rows to be written to 
-        a single file before the file is closed and a new file opened.
+        * rows_per_file (optional) should specify the number of rows to be
+        written to a single file before the file is closed and a new file
+        opened. If absent or None, all rows go to a single file (per worker).
           
         * If var_order is present, it will govern the order in which
         values appear in a CSV row. If absent or None, then schema_file
@@ -315,16 +416,41 @@ class LineRawFileAggregator(LineRawBase):
         # we hit the limit in our old file. The natural place to do this is 
         # here.
         
-        if self.__count >= self.__rows_per_file:
+        if self.__rows_per_file is not None and \
+                self.__count >= self.__rows_per_file:
             self.__file.close()
             self.__file = self._open_new_file()
             self.__count = 0
         
         self._write_row(self.__file, row_dict)
+        self.__count += 1
 
         return None
 
 
+    def _write_records(self, records):
+        """
+        Write the records to file, with one write() call per file. As in
+        map(), a new file is opened whenever the current one holds
+        rows_per_file rows (if given).
+        """
+        if self.__rows_per_file is None:
+            self.__file.write(''.join(records))
+            self.__count += len(records)
+            return
+        start = 0
+        while start < len(records):
+            if self.__count >= self.__rows_per_file:
+                self.__file.close()
+                self.__file = self._open_new_file()
+                self.__count = 0
+            stop = min(len(records),
+                       start + self.__rows_per_file - self.__count)
+            self.__file.write(''.join(records[start:stop]))
+            self.__count += stop - start
+            start = stop
+
+
     def done(self):
         '''
         Flushes and clloses the underlying line-raw file.
@@ -388,4 +514,11 @@ class LineRawHandleAggregator(LineRawBase):
         """
         self._write_row(self.__file_obj, row_dict)
 
+
+    def _write_records(self, records):
+        """
+        Write the records to the file object in one call.
+        """
+        self.__file_obj.write(''.join(records))
+
     
@@ -10,10 +10,16 @@
 #  23 Oct 2012   omd            Original version
 # *****************************************************************
 
+import datetime
+import os
+import shutil
+import tempfile
 import unittest
 
 import line_raw_aggregator as lra
 import cStringIO
+import spar_python.data_generation.generated_row as generated_row
+import spar_python.data_generation.spar_variables as sv
 
 class LineRawAggregatorTest(unittest.TestCase):
     
@@ -115,3 +121,94 @@ class LineRawAggregatorTest(unittest.TestCase):
         self.assertEqual(outfile.getvalue(),
                 'INSERT\nhello\nthere\nworld\nENDINSERT\n'
                 'INSERT\nthis\nis\ngood\nENDINSERT\n')
+
+
+    def test_map_reduce_column_batch(self):
+        """
+        
+        Ensure that map_reduce_column_batch() writes the same as map()
+        """
+        var_order = [sv.VARS.FIRST_NAME, sv.VARS.ID, sv.VARS.AGE,
+                     sv.VARS.DOB, sv.VARS.FINGERPRINT]
+        columns = {sv.VARS.FIRST_NAME : ['ALICE', 'BOB'],
+                   sv.VARS.AGE : [30, 2 ** 40],
+                   sv.VARS.DOB : [datetime.date(1980, 1, 2),
+                                  datetime.date(1990, 3, 4)],
+                   sv.VARS.FINGERPRINT : [bytearray('\x00\n%s'),
+                                          bytearray()]}
+        batch = generated_row.GeneratedColumnBatch([7, 8], columns)
+
+        row_outfile = cStringIO.StringIO()
+        aggregator = lra.LineRawHandleAggregator(row_outfile,
+                                                 var_order = var_order)
+        for row in batch.rows():
+            aggregator.map(row)
+
+        batch_outfile = cStringIO.StringIO()
+        aggregator = lra.LineRawHandleAggregator(batch_outfile,
+                                                 var_order = var_order)
+        self.assertIsNone(aggregator.map_reduce_column_batch(batch))
+        self.assertEqual(batch_outfile.getvalue(), row_outfile.getvalue())
+        self.assertEqual(batch_outfile.getvalue(),
+                'INSERT\nALICE\n7\n30\n1980-01-02\nRAW\n4\n\x00\n%sENDRAW\n'
+                'ENDINSERT\n'
+                'INSERT\nBOB\n8\n1099511627776\n1990-03-04\nRAW\n0\nENDRAW\n'
+                'ENDINSERT\n')
+
+
+    def test_no_file_rotation_by_default(self):
+        """
+        
+        Ensure that LineRawFileAggregator writes all of a worker's rows to
+        a single file unless rows_per_file is given
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            aggregator = lra.LineRawFileAggregator(
+                base_filename = os.path.join(temp_dir, 'rows.lineraw'),
+                var_order = [0])
+            aggregator.start()
+            for _ in xrange(600):
+                aggregator.map({0: 'a'})
+            aggregator.map_reduce_row_list([{0: 'b'}] * 1500)
+            aggregator.done()
+
+            filenames = os.listdir(temp_dir)
+            self.assertEqual(len(filenames), 1)
+            with open(os.path.join(temp_dir, filenames[0])) as f:
+                self.assertEqual(f.read().count('ENDINSERT\n'), 2100)
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+    def test_file_rotation(self):
+        """
+        
+        Ensure that LineRawFileAggregator starts a new file every
+        rows_per_file rows, whether rows come one at a time or in batches
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            aggregator = lra.LineRawFileAggregator(
+                base_filename = os.path.join(temp_dir, 'rows.lineraw'),
+                rows_per_file = 3, var_order = [0])
+            aggregator.start()
+            aggregator.map({0: 'a'})
+            aggregator.map_reduce_row_list([{0: c} for c in 'bcdefg'])
+            aggregator.map({0: 'h'})
+            aggregator.map_reduce_row_list([{0: 'i'}])
+            aggregator.done()
+
+            contents = []
+            for filename in os.listdir(temp_dir):
+                with open(os.path.join(temp_dir, filename)) as f:
+                    contents.append(f.read())
+            self.assertEqual(sorted(contents),
+                    ['INSERT\na\nENDINSERT\nINSERT\nb\nENDINSERT\n'
+                     'INSERT\nc\nENDINSERT\n',
+                     'INSERT\nd\nENDINSERT\nINSERT\ne\nENDINSERT\n'
+                     'INSERT\nf\nENDINSERT\n',
+                     'INSERT\ng\nENDINSERT\nINSERT\nh\nENDINSERT\n'
+                     'INSERT\ni\nENDINSERT\n'])
+        finally:
+            shutil.rmtree(temp_dir)
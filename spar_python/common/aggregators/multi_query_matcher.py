@@ -0,0 +1,495 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Matches a batch of rows against many atomic
+#                      queries at once
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+"""
+Query generation runs every generated row past every atomic query
+aggregator, and each aggregator used to filter the whole batch with its own
+match_row(). With thousands of queries, that is thousands of passes over
+every batch even though most of the queries are on the same handful of
+fields and are simple equality, range or keyword predicates.
+
+MultiQueryMatcher compiles all such predicates on the same field into one
+index, and then matches a whole batch against all of them at once:
+
+* equality and not-equal queries go into a hash map from value to queries,
+  so that each row needs one dictionary lookup per field,
+
+* range, less-than and greater-than queries are answered by sorting the
+  batch's values for that field once and bisecting for each query's
+  bounds, and
+
+* P3/P4 keyword queries go into a hash map from search term to queries.
+  For text generated as token IDs (see token_vocabulary.py) this is turned
+  into a reverse index from token ID to queries, so that one scan over
+  each row's sorted, distinct token IDs finds every query it matches.
+  Other text is intersected with the row's word (or stem) set, and
+
+* P6/P7 wildcard searches go into an Aho-Corasick automaton built from a
+  literal 'anchor' string which every match must contain. One pass of the
+  automaton over a row's value finds every anchor in it, and the full
+  wildcard pattern (with its position constraints) is only checked for
+  the queries whose anchor was found.
+
+The results are exactly what the per-query predicates would have produced,
+including the order of the matching rows. Values which cannot be hashed or
+consistently ordered fall back on a straightforward scan, as do fields with
+too few inequality or wildcard queries to be worth sorting or building an
+automaton for. All the scans on a field are done by one compiled
+query_plan.FieldPlan, in a single pass over the batch.
+
+Aggregators describe their predicates to the matcher through 'index keys'
+of the form (kind, field, args), where kind is one of the constants below
+and args depends on the kind:
+
+  EQUAL, NOT_EQUAL, AT_MOST, AT_LEAST:  the value to compare against
+  RANGE:                                (lbound, ubound), both inclusive
+  CONTAINS_STEM, CONTAINS_UPPER:        the (upper-case) search term
+  SUBSTRING:                            (anchor, predicate, exact), where
+                                        predicate(value) is the full test,
+                                        anchor is a substring of every
+                                        value it accepts and exact is True
+                                        if containing anchor is enough
+"""
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..', '..')
+sys.path.append(base_dir)
+
+import bisect
+import collections
+import datetime
+import itertools
+
+import spar_python.common.aggregators.query_plan as query_plan
+
+
+EQUAL = 'equal'
+NOT_EQUAL = 'not_equal'
+RANGE = 'range'
+AT_MOST = 'at_most'
+AT_LEAST = 'at_least'
+CONTAINS_STEM = 'contains_stem'
+CONTAINS_UPPER = 'contains_upper'
+SUBSTRING = 'substring'
+
+VALUE_KINDS = frozenset([EQUAL, NOT_EQUAL, RANGE, AT_MOST, AT_LEAST,
+                         SUBSTRING])
+TEXT_KINDS = frozenset([CONTAINS_STEM, CONTAINS_UPPER])
+
+# Sorting a batch costs a few scans' worth of comparisons, so only sort
+# when there are at least this many inequality queries on the field.
+MIN_QUERIES_TO_SORT = 4
+
+# Likewise, str.find() is faster than running the automaton (in python) 
+# unless there are at least this many wildcard searches on the field.
+MIN_QUERIES_FOR_AUTOMATON = 8
+
+_NUMBER_TYPES = (int, long, float)
+_ORDERED_TYPES = (str, unicode, datetime.date, datetime.datetime,
+                  datetime.time)
+
+# kind -> (query_plan.FieldPlan template, function from args to the
+# template's constants)
+_PLAN_TEMPLATES = {
+    EQUAL : ('value == %s', lambda goal: [goal]),
+    NOT_EQUAL : ('value != %s', lambda goal: [goal]),
+    RANGE : ('%s <= value <= %s', lambda bounds: list(bounds)),
+    AT_MOST : ('value <= %s', lambda goal: [goal]),
+    AT_LEAST : ('value >= %s', lambda goal: [goal]),
+    SUBSTRING : ('%s(value)', lambda search: [search[1]]) }
+
+
+
+def _order_class(value):
+    '''
+    Returns the class of values which value can be consistently ordered
+    against, or None if it should not be sorted at all.
+    '''
+    value_type = type(value)
+    if value_type in _NUMBER_TYPES:
+        # NaN does not compare consistently with anything
+        if value != value:
+            return None
+        return _NUMBER_TYPES
+    if value_type in _ORDERED_TYPES:
+        return value_type
+    return None
+
+
+def _is_sortable(values, bounds):
+    '''
+    Returns True if values and bounds are all of one class of totally
+    ordered values, so that bisecting the sorted values gives the same
+    answers as comparing them one by one.
+    '''
+    classes = set(_order_class(v) for v in itertools.chain(values, bounds))
+    return len(classes) == 1 and None not in classes
+
+
+
+class AhoCorasickAutomaton(object):
+    '''
+    Finds which of a fixed set of (non-empty) patterns occur in a string,
+    in a single pass over the string.
+
+    Usage:
+      automaton = AhoCorasickAutomaton(['HE', 'SHE', 'HERS'])
+      automaton.find('USHERS')  # returns set([0, 1, 2])
+    '''
+
+    def __init__(self, patterns):
+        # State 0 is the root of the trie of patterns. For each state:
+        # _goto maps characters to the next state in the trie, _fail is the
+        # state for the longest proper suffix which is also in the trie,
+        # and _out lists the patterns which end at that state.
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for (pattern_index, pattern) in enumerate(patterns):
+            assert pattern
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(pattern_index)
+        # Breadth-first, so that fail links always point to states which
+        # are already finished.
+        queue = collections.deque(self._goto[0].itervalues())
+        while queue:
+            state = queue.popleft()
+            for (char, next_state) in self._goto[state].iteritems():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._out[next_state] = \
+                    self._out[next_state] + self._out[fail]
+
+    def find(self, text):
+        '''
+        Returns the set of indices of the patterns which occur in text.
+        '''
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+
+class _FieldIndex(object):
+    '''
+    The compiled queries against one field. Each query is identified by
+    its position in the MultiQueryMatcher's list of index keys.
+    '''
+
+    def __init__(self):
+        self.equal = collections.defaultdict(list)
+        self.not_equal = collections.defaultdict(list)
+        self.inequalities = []
+        self.scans = []
+        self.stems = collections.defaultdict(list)
+        self.uppers = collections.defaultdict(list)
+        self.searches = []
+        # Built on first use: see _match_searches()
+        self._automaton = None
+        # Tuple of the query indices scanned -> FieldPlan. Built on first
+        # use: see _scan()
+        self._scan_plans = {}
+        # id(vocabulary) -> [vocabulary, number of its tokens indexed,
+        # token ID -> list of queries]. Built on first use: see
+        # _token_queries()
+        self._token_indices = {}
+
+    def add(self, i, kind, args):
+        if kind in (EQUAL, NOT_EQUAL):
+            try:
+                hash(args)
+            except TypeError:
+                self.scans.append((i, kind, args))
+                return
+            if kind == EQUAL:
+                self.equal[args].append(i)
+            else:
+                self.not_equal[args].append(i)
+        elif kind in (RANGE, AT_MOST, AT_LEAST):
+            self.inequalities.append((i, kind, args))
+        elif kind == CONTAINS_STEM:
+            self.stems[args].append(i)
+        elif kind == CONTAINS_UPPER:
+            self.uppers[args].append(i)
+        elif kind == SUBSTRING:
+            self.searches.append((i, args))
+        else:
+            raise ValueError("Unknown query kind: %s" % kind)
+
+    def match_values(self, values, matches):
+        '''
+        Matches the column of values against the equality and inequality
+        queries, storing a list of matching positions for query i in
+        matches[i].
+        '''
+        # (i, kind, args) for the queries which are not answered by an
+        # index, and so need a scan
+        scans = list(self.scans)
+        if self.equal or self.not_equal:
+            try:
+                self._match_equal(values, matches)
+            except TypeError:
+                # Some value could not be hashed
+                for goals in (self.equal, self.not_equal):
+                    kind = EQUAL if goals is self.equal else NOT_EQUAL
+                    for (goal, query_indices) in goals.iteritems():
+                        for i in query_indices:
+                            scans.append((i, kind, goal))
+        if self.inequalities:
+            bounds = []
+            for (_, kind, args) in self.inequalities:
+                bounds.extend(args if kind == RANGE else [args])
+            if len(self.inequalities) >= MIN_QUERIES_TO_SORT and \
+                    _is_sortable(values, bounds):
+                self._match_inequalities(values, matches)
+            else:
+                scans.extend(self.inequalities)
+        if self.searches:
+            if len(self.searches) >= MIN_QUERIES_FOR_AUTOMATON and \
+                    all(type(v) is str for v in values):
+                self._match_searches(values, matches)
+            else:
+                scans.extend((i, SUBSTRING, args) 
+                             for (i, args) in self.searches)
+        if scans:
+            self._scan(values, scans, matches)
+
+    def _match_searches(self, values, matches):
+        if self._automaton is None:
+            # anchor -> [(query index, predicate or None if exact)]
+            self._candidates = collections.OrderedDict()
+            # Searches with an empty anchor must be checked on every value
+            self._unanchored = []
+            for (i, (anchor, predicate, exact)) in self.searches:
+                if anchor:
+                    self._candidates.setdefault(anchor, []).append(
+                        (i, None if exact else predicate))
+                else:
+                    self._unanchored.append((i, predicate))
+            self._anchor_queries = self._candidates.values()
+            self._automaton = AhoCorasickAutomaton(self._candidates.keys())
+        for (i, _) in self.searches:
+            matches[i] = []
+        find = self._automaton.find
+        anchor_queries = self._anchor_queries
+        unanchored = self._unanchored
+        for (pos, value) in enumerate(values):
+            for anchor_index in find(value):
+                for (i, predicate) in anchor_queries[anchor_index]:
+                    if predicate is None or predicate(value):
+                        matches[i].append(pos)
+            for (i, predicate) in unanchored:
+                if predicate(value):
+                    matches[i].append(pos)
+
+    def _match_equal(self, values, matches):
+        found = dict((goal, []) for goal in self.equal)
+        for goal in self.not_equal:
+            found[goal] = []
+        found_get = found.get
+        for (pos, value) in enumerate(values):
+            positions = found_get(value)
+            if positions is not None:
+                positions.append(pos)
+        for (goal, query_indices) in self.equal.iteritems():
+            for i in query_indices:
+                matches[i] = list(found[goal])
+        for (goal, query_indices) in self.not_equal.iteritems():
+            equal_positions = set(found[goal])
+            not_equal_positions = [pos for pos in xrange(len(values))
+                                   if pos not in equal_positions]
+            for i in query_indices:
+                matches[i] = list(not_equal_positions)
+
+    def _match_inequalities(self, values, matches):
+        num_values = len(values)
+        order = sorted(xrange(num_values), key = values.__getitem__)
+        sorted_values = [values[pos] for pos in order]
+        for (i, kind, args) in self.inequalities:
+            if kind == RANGE:
+                (lbound, ubound) = args
+                low = bisect.bisect_left(sorted_values, lbound)
+                high = bisect.bisect_right(sorted_values, ubound)
+            elif kind == AT_MOST:
+                low = 0
+                high = bisect.bisect_right(sorted_values, args)
+            else:
+                low = bisect.bisect_left(sorted_values, args)
+                high = num_values
+            if low < high:
+                matches[i] = sorted(order[low:high])
+            else:
+                matches[i] = []
+
+    def _scan(self, values, scans, matches):
+        '''
+        Matches the column of values against the given (i, kind, args)
+        queries, one by one but in a single pass.
+        '''
+        scan_key = tuple(i for (i, _, _) in scans)
+        try:
+            plan = self._scan_plans[scan_key]
+        except KeyError:
+            plan = query_plan.FieldPlan()
+            for (i, kind, args) in scans:
+                (template, get_constants) = _PLAN_TEMPLATES[kind]
+                plan.add(i, template, get_constants(args))
+            self._scan_plans[scan_key] = plan
+        plan.match(values, matches)
+
+    def match_texts(self, texts, matches):
+        '''
+        Matches the column of GeneratedText objects against the keyword
+        queries, storing a list of matching positions for query i in
+        matches[i].
+        '''
+        for query_indices in self.stems.itervalues():
+            for i in query_indices:
+                matches[i] = []
+        for query_indices in self.uppers.itervalues():
+            for i in query_indices:
+                matches[i] = []
+        stems = self.stems
+        uppers = self.uppers
+        for (pos, text) in enumerate(texts):
+            vocabulary = getattr(text, 'vocabulary', None)
+            if vocabulary is not None:
+                token_queries = self._token_queries(vocabulary)
+                for token_id in text.distinct_token_ids():
+                    for i in token_queries.get(token_id, ()):
+                        # Several tokens can match the same query (words
+                        # with the same stem, say)
+                        query_matches = matches[i]
+                        if not query_matches or query_matches[-1] != pos:
+                            query_matches.append(pos)
+                continue
+            if stems:
+                self._match_words(text.stem_set, stems, pos, matches)
+            if uppers:
+                self._match_words(text.upper_set, uppers, pos, matches)
+
+    def _token_queries(self, vocabulary):
+        '''
+        Returns the reverse index from token ID (in vocabulary) to the
+        keyword queries which the token matches.
+        '''
+        try:
+            index = self._token_indices[id(vocabulary)]
+        except KeyError:
+            token_queries = collections.defaultdict(list)
+            for (stem, query_indices) in self.stems.iteritems():
+                for token_id in vocabulary.token_ids_with_stem(stem):
+                    token_queries[token_id].extend(query_indices)
+            for (upper, query_indices) in self.uppers.iteritems():
+                for token_id in vocabulary.token_ids_with_upper(upper):
+                    token_queries[token_id].extend(query_indices)
+            index = [vocabulary, len(vocabulary), dict(token_queries)]
+            self._token_indices[id(vocabulary)] = index
+        if index[1] < len(vocabulary):
+            # Tokens (alarmwords) have been added to the vocabulary since
+            # the index was built
+            token_queries = index[2]
+            for token_id in xrange(index[1], len(vocabulary)):
+                query_indices = []
+                if vocabulary.stems[token_id] is not None:
+                    query_indices.extend(
+                        self.stems.get(vocabulary.stems[token_id], ()))
+                if vocabulary.is_word[token_id]:
+                    query_indices.extend(
+                        self.uppers.get(vocabulary.uppers[token_id], ()))
+                if query_indices:
+                    token_queries[token_id] = query_indices
+            index[1] = len(vocabulary)
+        return index[2]
+
+    @staticmethod
+    def _match_words(words, queries, pos, matches):
+        if len(words) < len(queries):
+            for word in words:
+                for i in queries.get(word, ()):
+                    matches[i].append(pos)
+        else:
+            for (word, query_indices) in queries.iteritems():
+                if word in words:
+                    for i in query_indices:
+                        matches[i].append(pos)
+
+
+
+class MultiQueryMatcher(object):
+    '''
+    Matches batches against a list of queries, given by their index keys.
+    Queries whose key is None are not indexed and are left to the caller.
+
+    Usage:
+      matcher = MultiQueryMatcher(index_keys)
+      matches = matcher.match(num_rows, get_column)
+
+    where get_column(i) returns the column of values (in the order of the
+    batch) which query i is matched against: values in the aggregator
+    format for the value kinds, and GeneratedText objects for the text
+    kinds. get_column() is called at most once per indexed field. match()
+    returns a list parallel to index_keys, holding the sorted list of
+    matching positions for each indexed query and None for the others.
+    '''
+
+    def __init__(self, index_keys):
+        self._num_queries = len(index_keys)
+        # (is_text, field) -> (index of first query on it, _FieldIndex)
+        self._field_indices = collections.OrderedDict()
+        for (i, key) in enumerate(index_keys):
+            if key is None:
+                continue
+            (kind, field, args) = key
+            field_key = (kind in TEXT_KINDS, field)
+            if field_key not in self._field_indices:
+                self._field_indices[field_key] = (i, _FieldIndex())
+            self._field_indices[field_key][1].add(i, kind, args)
+
+    def __len__(self):
+        return len(self._field_indices)
+
+    def match(self, num_rows, get_column):
+        matches = [None] * self._num_queries
+        for ((is_text, _), (first, field_index)) in \
+                self._field_indices.iteritems():
+            column = get_column(first)
+            assert len(column) == num_rows
+            if is_text:
+                field_index.match_texts(column, matches)
+            else:
+                field_index.match_values(column, matches)
+        return matches
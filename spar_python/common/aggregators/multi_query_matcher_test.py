@@ -0,0 +1,240 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Tests for multi_query_matcher.py
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..', '..')
+sys.path.append(base_dir)
+
+import datetime
+import time
+import unittest
+
+import spar_python.common.aggregators.multi_query_matcher as mqm
+import spar_python.common.spar_random as spar_random
+from spar_python.common.distributions.generated_text import GeneratedText
+from spar_python.common.distributions.token_vocabulary import TokenVocabulary
+
+
+def scan(values, kind, args):
+    '''
+    The obvious, one-query-at-a-time answer.
+    '''
+    if kind == mqm.EQUAL:
+        return [i for (i, v) in enumerate(values) if v == args]
+    elif kind == mqm.NOT_EQUAL:
+        return [i for (i, v) in enumerate(values) if v != args]
+    elif kind == mqm.RANGE:
+        return [i for (i, v) in enumerate(values) if args[0] <= v <= args[1]]
+    elif kind == mqm.AT_MOST:
+        return [i for (i, v) in enumerate(values) if v <= args]
+    elif kind == mqm.AT_LEAST:
+        return [i for (i, v) in enumerate(values) if v >= args]
+    elif kind == mqm.CONTAINS_STEM:
+        return [i for (i, t) in enumerate(values) if t.contains_stem(args)]
+    elif kind == mqm.CONTAINS_UPPER:
+        return [i for (i, t) in enumerate(values) if t.contains_upper(args)]
+    elif kind == mqm.SUBSTRING:
+        return [i for (i, v) in enumerate(values) if args[1](v)]
+
+
+class MultiQueryMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.seed = int(time.time())
+        self.seed_msg = "Random seed used for this test: %s" % self.seed
+        spar_random.seed(self.seed)
+
+    def check(self, index_keys, columns):
+        '''
+        Checks the matcher against scan() over the given columns (a dict
+        from field to column).
+        '''
+        num_rows = len(columns.values()[0])
+        matcher = mqm.MultiQueryMatcher(index_keys)
+        requested = []
+        def get_column(i):
+            field = index_keys[i][1]
+            requested.append(field)
+            return columns[field]
+        matches = matcher.match(num_rows, get_column)
+        self.assertEqual(len(matches), len(index_keys))
+        for (key, match) in zip(index_keys, matches):
+            if key is None:
+                self.assertIsNone(match)
+            else:
+                (kind, field, args) = key
+                self.assertEqual(match, scan(columns[field], kind, args),
+                                 "%s: %s" % (key, self.seed_msg))
+        # Each field is only requested once
+        self.assertEqual(len(requested), len(set(requested)))
+
+    def test_values(self):
+        columns = {'int' : [spar_random.randint(0, 20) for _ in xrange(200)],
+                   'str' : [spar_random.choice(['A', 'B', 'BB', 'C', 'D'])
+                            for _ in xrange(200)]}
+        index_keys = [None]
+        for _ in xrange(30):
+            (low, high) = sorted([spar_random.randint(-2, 22),
+                                  spar_random.randint(-2, 22)])
+            index_keys.extend([(mqm.EQUAL, 'int', low),
+                               (mqm.NOT_EQUAL, 'int', high),
+                               (mqm.RANGE, 'int', (low, high)),
+                               (mqm.RANGE, 'int', (high, low)),
+                               (mqm.AT_MOST, 'int', low),
+                               (mqm.AT_LEAST, 'int', high)])
+        index_keys.extend([(mqm.EQUAL, 'str', 'BB'),
+                           (mqm.EQUAL, 'str', 'E'),
+                           (mqm.NOT_EQUAL, 'str', 'A'),
+                           (mqm.RANGE, 'str', ('B', 'C')),
+                           (mqm.AT_MOST, 'str', 'B'),
+                           (mqm.AT_LEAST, 'str', 'BB'),
+                           (mqm.AT_LEAST, 'str', 'D'),
+                           None])
+        self.check(index_keys, columns)
+
+    def test_dates(self):
+        start = datetime.date(1950, 1, 1)
+        column = [start + datetime.timedelta(spar_random.randint(0, 1000))
+                  for _ in xrange(100)]
+        index_keys = []
+        for _ in xrange(10):
+            day = start + datetime.timedelta(spar_random.randint(0, 1000))
+            index_keys.extend([(mqm.AT_MOST, 'dob', day),
+                               (mqm.AT_LEAST, 'dob', day),
+                               (mqm.EQUAL, 'dob', column[0])])
+        self.check(index_keys, {'dob' : column})
+
+    def test_unsortable_values(self):
+        # Mixed types (and NaN) cannot be bisected, and unhashable values
+        # cannot be looked up, so these must fall back on scanning.
+        columns = {'mixed' : [1, 'A', 2.5, float('nan'), 3, 'B'] * 5,
+                   'lists' : [[1], [2], [1, 2]] * 10}
+        index_keys = [(mqm.AT_MOST, 'mixed', 2)] * mqm.MIN_QUERIES_TO_SORT + \
+                     [(mqm.RANGE, 'mixed', ('A', 'B')),
+                      (mqm.EQUAL, 'mixed', 3),
+                      (mqm.EQUAL, 'lists', [1]),
+                      (mqm.NOT_EQUAL, 'lists', (1,)),
+                      (mqm.AT_LEAST, 'lists', [1, 5])]
+        self.check(index_keys, columns)
+
+    def test_texts(self):
+        words = ['DOG', 'DOGS', 'CAT', 'CATS', 'RUN', 'RUNNING', 'THE']
+        texts = []
+        for _ in xrange(50):
+            uppers = [spar_random.choice(words)
+                      for _ in xrange(spar_random.randint(0, 6))]
+            stems = [w.rstrip('S').replace('NING', '') for w in uppers]
+            texts.append(GeneratedText(uppers, stems, uppers))
+        index_keys = []
+        for word in words + ['BIRD']:
+            index_keys.extend([(mqm.CONTAINS_STEM, 'notes', word),
+                               (mqm.CONTAINS_UPPER, 'notes', word)])
+        self.check(index_keys, {'notes' : texts})
+        # With fewer queries than words in most rows
+        self.check(index_keys[:2], {'notes' : texts})
+
+    def test_token_texts(self):
+        # Words with different cases (and so different tokens) share an
+        # upper-case form, and different words share a stem
+        words = ['Dog', 'DOG', 'dogs', 'Cat', 'cats', 'run', 'running',
+                 'The']
+        vocabulary = TokenVocabulary()
+        space_id = vocabulary.intern(' ', None, ' ', False)
+        period_id = vocabulary.intern('.', None, '.', False)
+        word_ids = [vocabulary.intern(w, w.upper().rstrip('S').replace(
+                                          'NING', ''), w.upper(), True)
+                    for w in words]
+        def make_texts():
+            texts = []
+            # The first text is long enough to take an alarmword
+            for num_words in [300] + [spar_random.randint(3, 8)
+                                      for _ in xrange(49)]:
+                token_ids = []
+                for _ in xrange(num_words):
+                    token_ids.extend([spar_random.choice(word_ids),
+                                      space_id])
+                token_ids.append(period_id)
+                texts.append(GeneratedText.from_token_ids(vocabulary,
+                                                          token_ids))
+            return texts
+        index_keys = []
+        for word in ['DOG', 'CAT', 'CATS', 'RUN', 'RUNNING', 'THE', 'BIRD',
+                     'QUADGE', '.']:
+            index_keys.extend([(mqm.CONTAINS_STEM, 'notes', word),
+                               (mqm.CONTAINS_UPPER, 'notes', word)])
+        matcher = mqm.MultiQueryMatcher(index_keys)
+        for alarmword in [None, 'quadge', 'Bird']:
+            texts = make_texts()
+            if alarmword:
+                # Adds a new token to the vocabulary after the matcher has
+                # indexed it
+                texts[0].add_single_alarmword(alarmword)
+            matches = matcher.match(len(texts), lambda i: texts)
+            for (key, match) in zip(index_keys, matches):
+                (kind, field, args) = key
+                self.assertEqual(match, scan(texts, kind, args),
+                                 "%s: %s" % (key, self.seed_msg))
+            # Same answers as texts built from lists
+            list_texts = [GeneratedText(t.word_list, t.stem_list,
+                                        t.upper_word_list) for t in texts]
+            self.assertEqual(matcher.match(len(texts),
+                                           lambda i: list_texts), matches)
+        self.assertIn('QUADGE', vocabulary.uppers)
+
+    def test_automaton(self):
+        patterns = ['HE', 'SHE', 'HIS', 'HERS', 'E', 'XYZ']
+        automaton = mqm.AhoCorasickAutomaton(patterns)
+        for text in ['USHERS', 'HIS', 'HHHIS', 'XY', '', 'SHEHERSHIS',
+                     'AXYZ']:
+            self.assertEqual(automaton.find(text),
+                             set(i for (i, p) in enumerate(patterns)
+                                 if p in text), text)
+        # Random patterns and texts over a small alphabet, so that there
+        # are lots of overlapping matches
+        patterns = [''.join(spar_random.choice('AB')
+                            for _ in xrange(spar_random.randint(1, 5)))
+                    for _ in xrange(20)]
+        automaton = mqm.AhoCorasickAutomaton(patterns)
+        for _ in xrange(50):
+            text = ''.join(spar_random.choice('ABC')
+                           for _ in xrange(spar_random.randint(0, 20)))
+            self.assertEqual(automaton.find(text),
+                             set(i for (i, p) in enumerate(patterns)
+                                 if p in text),
+                             "%s: %s" % (text, self.seed_msg))
+
+    def test_searches(self):
+        column = [''.join(spar_random.choice('ABC')
+                          for _ in xrange(spar_random.randint(0, 8)))
+                  for _ in xrange(100)]
+        index_keys = []
+        for _ in xrange(mqm.MIN_QUERIES_FOR_AUTOMATON):
+            value = ''.join(spar_random.choice('ABC')
+                            for _ in xrange(spar_random.randint(0, 3)))
+            index_keys.extend(
+                [(mqm.SUBSTRING, 'name',
+                  (value, lambda data, value=value: value in data, True)),
+                 (mqm.SUBSTRING, 'name',
+                  (value, lambda data, value=value: data.startswith(value),
+                   False)),
+                 (mqm.SUBSTRING, 'name',
+                  (value, lambda data, value=value: data[1:] == value,
+                   False))])
+        self.check(index_keys, {'name' : column})
+        # Only plain strings are given to the automaton
+        self.check(index_keys, {'name' : column[:-1] + [u'ABC']})
+
+    def test_unknown_kind(self):
+        self.assertRaises(ValueError, mqm.MultiQueryMatcher,
+                          [('bogus', 'field', 1)])
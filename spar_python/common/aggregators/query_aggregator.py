@@ -14,8 +14,12 @@ sys.path.append(base_dir)
 import copy
 import operator
 import itertools
+import numpy
 
 import spar_python.common.aggregators.base_aggregator as base_aggregator
+import spar_python.common.aggregators.multi_query_matcher as mqm
+import spar_python.common.aggregators.query_plan as query_plan
+import spar_python.common.aggregators.record_ids as record_ids
 
 import spar_python.data_generation.spar_variables as sv
 import spar_python.report_generation.ta1.ta1_schema as rdb
@@ -23,15 +27,50 @@ import spar_python.query_generation.query_schema as qs
 import abc
 import spar_python.query_generation.query_bounds as qbs
 
+
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+def _is_vectorizable(column, *constants):
+    '''
+    Returns True if column is a numpy (integer) array and all the constants
+    are integers which can be compared against it exactly, in which case 
+    the comparisons can be done by numpy over the whole column at once. 
+    Otherwise, the comparisons need to be done value-by-value.
+    '''
+    if not isinstance(column, numpy.ndarray):
+        return False
+    for c in constants:
+        if not isinstance(c, (int, long)) or isinstance(c, bool):
+            return False
+        if not (_INT64_MIN <= c <= _INT64_MAX):
+            return False
+    return True
+
+
 class GenChooseAggregator(base_aggregator.BaseAggregator):
     """
     Aggregator for batches of queries where x are generated and y are
-    chosen from the set
+    chosen from the set.
+
+    The contained aggregators may themselves be GenChooseAggregators. When
+    mapping over a whole batch, the atomic aggregators found anywhere
+    underneath this one are matched against the batch together by a
+    MultiQueryMatcher (see multi_query_matcher.py) rather than one by one.
+    Wrapping the aggregators of all querysets in a single
+    GenChooseAggregator therefore lets every query on a field share one
+    index. Atomic aggregators which cannot be indexed are matched by a
+    compiled QueryPlan (see query_plan.py) instead, which evaluates all of
+    their predicates on a field in one pass.
     """
     def __init__(self, aggregators):
         ''' Initialize needs a list of aggregators '''
         self.aggs = aggregators
         self.active = len(self.aggs) > 0
+        # Built on first use: see _get_matcher()
+        self._leaves = None
+        self._matcher = None
+        self._plan = None
         
     def fields_needed(self):
         ''' returns a set of all fields needed for all aggregators'''
@@ -48,9 +87,90 @@ class GenChooseAggregator(base_aggregator.BaseAggregator):
         return { qs.QRY_SUBRESULTS : [agg.map(row) for agg in self.aggs] }
           
     
-    def map_reduce_row_list(self, row_list):
+    def _find_leaves(self):
+        '''
+        Returns the list of all non-GenChoose aggregators underneath this
+        one, depth first.
+        '''
+        leaves = []
+        for agg in self.aggs:
+            if isinstance(agg, GenChooseAggregator):
+                leaves.extend(agg._find_leaves())
+            else:
+                leaves.append(agg)
+        return leaves
+
+    def _get_matcher(self):
+        if self._matcher is None:
+            self._leaves = self._find_leaves()
+            index_keys = [agg.index_key() 
+                          if isinstance(agg, AtomicQueryAggregatorBase)
+                          else None
+                          for agg in self._leaves]
+            self._matcher = mqm.MultiQueryMatcher(index_keys)
+            self._plan = query_plan.QueryPlan(
+                [agg if key is None and 
+                 isinstance(agg, AtomicQueryAggregatorBase) else None
+                 for (agg, key) in zip(self._leaves, index_keys)])
+        return self._matcher
+
+    def _map_reduce_leaves(self, num_rows, get_column, get_row_ids,
+                           map_reduce_leaf):
+        '''
+        Returns the list of map/reduce results for the leaves of this
+        aggregator over one batch. Indexed atomic aggregators get their
+        matches from the matcher, and planned ones from the plan.
+        Everything else is handed to map_reduce_leaf().
+        '''
+        matcher = self._get_matcher()
+        leaves = self._leaves
+        all_matches = matcher.match(num_rows, 
+                                    lambda i: get_column(leaves[i]))
+        if len(self._plan):
+            plan_matches = self._plan.match(num_rows,
+                                            lambda i: get_column(leaves[i]))
+            all_matches = [matches if matches is not None else planned
+                           for (matches, planned) 
+                           in zip(all_matches, plan_matches)]
+        row_ids = None
+        results = []
+        for (agg, matches) in zip(leaves, all_matches):
+            if matches is None:
+                results.append(map_reduce_leaf(agg))
+            else:
+                if row_ids is None:
+                    row_ids = get_row_ids()
+                results.append(agg.make_result([row_ids[pos] 
+                                                for pos in matches]))
+        return results
+
+    def _assemble(self, leaf_results):
+        '''
+        Nests the results from the iterator leaf_results (in the order 
+        given by _find_leaves()) back into the shape of this aggregator.
+        '''
         return {qs.QRY_SUBRESULTS : 
-                [agg.map_reduce_row_list(row_list) for agg in self.aggs]}
+                [agg._assemble(leaf_results) 
+                 if isinstance(agg, GenChooseAggregator) 
+                 else next(leaf_results)
+                 for agg in self.aggs]}
+
+    def map_reduce_row_list(self, row_list):
+        sv_VARS_ID = sv.VARS.ID
+        leaf_results = self._map_reduce_leaves(
+            len(row_list),
+            lambda agg: map(agg.extract_value, row_list),
+            lambda: [row[sv_VARS_ID] for row in row_list],
+            lambda agg: agg.map_reduce_row_list(row_list))
+        return self._assemble(iter(leaf_results))
+
+    def map_reduce_column_batch(self, column_batch):
+        leaf_results = self._map_reduce_leaves(
+            len(column_batch),
+            lambda agg: agg.extract_column(column_batch),
+            lambda: column_batch.row_ids,
+            lambda agg: agg.map_reduce_column_batch(column_batch))
+        return self._assemble(iter(leaf_results))
         
     
     def reduce(self, larger, smaller):
@@ -149,6 +269,36 @@ class AtomicQueryAggregatorBase(base_aggregator.BaseAggregator):
         Sub-classes must override this method.
         '''    
         pass
+
+    def match_column(self, column_batch):
+        '''
+        The column-based version of match_row(): given a GeneratedColumnBatch,
+        returns a sequence (list or numpy array) of booleans, one for each 
+        row in the batch. The default implementation falls back on 
+        match_row() over the rows of the batch, but sub-classes should
+        override this to work on the whole column at once.
+        '''
+        return map(self.match_row, column_batch.rows())
+
+    def index_key(self):
+        '''
+        Returns the (kind, field, args) key describing this aggregator's
+        predicate to a MultiQueryMatcher, or None if the predicate cannot
+        be indexed (the default). Sub-classes which return a key must match
+        exactly the rows which the key describes.
+        '''
+        return None
+
+    def plan_predicate(self):
+        '''
+        Returns the (field, template, constants) triple describing this
+        aggregator's predicate to a query_plan.QueryPlan, or None if the
+        predicate cannot be compiled (the default). template is a python
+        expression over the name 'value', the result of extract_value(),
+        with a %s for each of the constants. Aggregators with the same
+        field must extract their values the same way.
+        '''
+        return None
     
     def extract_value(self, row):
         '''
@@ -166,6 +316,16 @@ class AtomicQueryAggregatorBase(base_aggregator.BaseAggregator):
             reformat = sv.VAR_CONVERTERS[field_id].to_agg_fmt
             reformatted_val = reformat(row[field_id])
             return reformatted_val
+
+    def extract_column(self, column_batch):
+        '''
+        Column-based version of extract_value(): returns the list of values
+        which extract_value() would return for the rows of the batch.
+        '''
+        values = column_batch.agg_column(self._field)
+        if isinstance(values, numpy.ndarray):
+            values = values.tolist()
+        return values
     
     def set_process_limit(self, num_processes):
         '''
@@ -205,7 +365,7 @@ class AtomicQueryAggregatorBase(base_aggregator.BaseAggregator):
         larger[qs.QRY_VALID] = larger[qs.QRY_VALID] and \
                                      smaller[qs.QRY_VALID]
         if not larger[qs.QRY_VALID]:
-            larger[rdb.DBF_MATCHINGRECORDIDS] = []
+            larger[rdb.DBF_MATCHINGRECORDIDS] = record_ids.RecordIdArray()
         else:
             larger[rdb.DBF_MATCHINGRECORDIDS].extend(smaller[rdb.DBF_MATCHINGRECORDIDS])
         return larger
@@ -222,18 +382,38 @@ class AtomicQueryAggregatorBase(base_aggregator.BaseAggregator):
         match_row = self.match_row
         matching_rows = filter(match_row, row_list)
         num_matching_rows = len(matching_rows)
-        self._count += num_matching_rows
         getitem = operator.getitem
         sv_VARS_ID = sv.VARS.ID
         sv_VARS_ID_repeater = itertools.repeat(sv_VARS_ID, num_matching_rows)
         matching_row_ids = map(getitem, matching_rows, sv_VARS_ID_repeater)
-        matching_row_id_list = matching_row_ids
+        return self.make_result(matching_row_ids)
+
+
+    def map_reduce_column_batch(self, column_batch):
+        """
+        Take a GeneratedColumnBatch and return the single final result for
+        the whole batch. Returns exactly what map_reduce_row_list() would
+        return on the rows of the batch.
+        """
+        matches = self.match_column(column_batch)
+        return self.make_result(column_batch.select_row_ids(matches))
+
+
+    def make_result(self, matching_row_id_list):
+        """
+        Returns the single final result for a batch, given the list of IDs
+        of the rows in the batch which matched (in batch order). Counts 
+        the matches towards the process cutoff. The IDs are returned as a
+        compact RecordIdArray.
+        """
+        self._count += len(matching_row_id_list)
         valid = True
         if self._top_level==True and self._count > self._process_cutoff:
             valid = False
             matching_row_id_list = []
         return { qs.QRY_QID : self._qid, qs.QRY_VALID : valid, 
-                rdb.DBF_MATCHINGRECORDIDS : matching_row_id_list }
+                rdb.DBF_MATCHINGRECORDIDS : 
+                record_ids.RecordIdArray(matching_row_id_list) }
 
 
     def done(self):
@@ -261,6 +441,22 @@ class EqualityQueryAggregator(AtomicQueryAggregatorBase):
         '''
         return self.extract_value(row) == self._value
 
+    def index_key(self):
+        return (mqm.EQUAL, self._field, self._value)
+
+    def plan_predicate(self):
+        return (self._field, 'value == %s', [self._value])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        values = column_batch.agg_column(self._field)
+        goal = self._value
+        if _is_vectorizable(values, goal):
+            return values == goal
+        return [value == goal for value in values]
+
 class NotEqualQA(EqualityQueryAggregator):
     """An aggregator for equality"""
     
@@ -272,6 +468,22 @@ class NotEqualQA(EqualityQueryAggregator):
         '''
         return self.extract_value(row) != self._value
 
+    def index_key(self):
+        return (mqm.NOT_EQUAL, self._field, self._value)
+
+    def plan_predicate(self):
+        return (self._field, 'value != %s', [self._value])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        values = column_batch.agg_column(self._field)
+        goal = self._value
+        if _is_vectorizable(values, goal):
+            return values != goal
+        return [value != goal for value in values]
+
 class RangeQueryAggregator(AtomicQueryAggregatorBase):
     """An aggregator for double sided inequality"""
     
@@ -292,6 +504,24 @@ class RangeQueryAggregator(AtomicQueryAggregatorBase):
         '''
         return self._lbound <= self.extract_value(row) <= self._ubound
 
+    def index_key(self):
+        return (mqm.RANGE, self._field, (self._lbound, self._ubound))
+
+    def plan_predicate(self):
+        return (self._field, '%s <= value <= %s', 
+                [self._lbound, self._ubound])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        values = column_batch.agg_column(self._field)
+        lbound = self._lbound
+        ubound = self._ubound
+        if _is_vectorizable(values, lbound, ubound):
+            return (values >= lbound) & (values <= ubound)
+        return [lbound <= value <= ubound for value in values]
+
        
 class LessThanQueryAggregator(AtomicQueryAggregatorBase):
     """An aggregator for equality"""
@@ -311,6 +541,22 @@ class LessThanQueryAggregator(AtomicQueryAggregatorBase):
         '''
         return self.extract_value(row) <= self._value
 
+    def index_key(self):
+        return (mqm.AT_MOST, self._field, self._value)
+
+    def plan_predicate(self):
+        return (self._field, 'value <= %s', [self._value])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        values = column_batch.agg_column(self._field)
+        goal = self._value
+        if _is_vectorizable(values, goal):
+            return values <= goal
+        return [value <= goal for value in values]
+
 
 class GreaterThanQueryAggregator(AtomicQueryAggregatorBase):
     """An aggregator for equality"""
@@ -330,6 +576,22 @@ class GreaterThanQueryAggregator(AtomicQueryAggregatorBase):
         '''
         return self.extract_value(row) >= self._value
 
+    def index_key(self):
+        return (mqm.AT_LEAST, self._field, self._value)
+
+    def plan_predicate(self):
+        return (self._field, 'value >= %s', [self._value])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        values = column_batch.agg_column(self._field)
+        goal = self._value
+        if _is_vectorizable(values, goal):
+            return values >= goal
+        return [value >= goal for value in values]
+
 
 
 class P3P4QueryAggregator(AtomicQueryAggregatorBase):
@@ -357,6 +619,34 @@ class P3P4QueryAggregator(AtomicQueryAggregatorBase):
         '''    
         return row[self._field]
 
+    def extract_column(self, column_batch):
+        '''
+        Column-based version of extract_value(). Overrides the baseclass 
+        method.
+        '''
+        return column_batch.column(self._field)
+
+    def index_key(self):
+        if self.search_against == 'stems':
+            return (mqm.CONTAINS_STEM, self._field, self._search_for)
+        elif self.search_against == 'lowers':
+            return (mqm.CONTAINS_UPPER, self._field, self._search_for)
+        else:
+            return None
+
+    def plan_predicate(self):
+        '''
+        The values are GeneratedText objects, not the aggregator format, so
+        the field is keyed apart from other aggregators on the same field.
+        '''
+        if self.search_against == 'stems':
+            template = 'value.contains_stem(%s)'
+        elif self.search_against == 'lowers':
+            template = 'value.contains_upper(%s)'
+        else:
+            return None
+        return (('text', self._field), template, [self._search_for])
+
     def match_row(self, row):
         '''
         called to determine if this row matches.
@@ -371,6 +661,20 @@ class P3P4QueryAggregator(AtomicQueryAggregatorBase):
         else:
             raise RuntimeError("Invalid list: %s" % self.search_against)
 
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row(). Note that this works on the
+        GeneratedText objects themselves, not their aggregator format.
+        '''
+        gened_texts = column_batch.column(self._field)
+        search_for = self._search_for
+        if self.search_against == 'stems':
+            return [t.contains_stem(search_for) for t in gened_texts]
+        elif self.search_against == 'lowers':
+            return [t.contains_upper(search_for) for t in gened_texts]
+        else:
+            raise RuntimeError("Invalid list: %s" % self.search_against)
+
 
 ###########################################################################
 # Implement a specific class for each type of search for performance 
@@ -446,6 +750,13 @@ class SearchQABase(AtomicQueryAggregatorBase):
         ''' check for value in data must be implemented by derived class'''
         pass
 
+    # True if containing self._value is enough for is_match() to succeed
+    _ANCHOR_IS_EXACT = False
+
+    # is_match(%s, value) as a query_plan template, or None to call 
+    # is_match() itself
+    _PLAN_TEMPLATE = None
+
     def match_row(self, row):
         '''
         called to determine if this row matches.
@@ -454,11 +765,35 @@ class SearchQABase(AtomicQueryAggregatorBase):
         '''
         return self.is_match(self._value, self.extract_value(row))
 
+    def index_key(self):
+        is_match = self.is_match
+        value = self._value
+        return (mqm.SUBSTRING, self._field, 
+                (value, lambda data: is_match(value, data), 
+                 self._ANCHOR_IS_EXACT))
+
+    def plan_predicate(self):
+        if self._PLAN_TEMPLATE is None:
+            return (self._field, '%s(%s, value)', 
+                    [self.is_match, self._value])
+        return (self._field, self._PLAN_TEMPLATE, [self._value])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        is_match = self.is_match
+        value = self._value
+        return [is_match(value, data) 
+                for data in column_batch.agg_column(self._field)]
+
 class P7InitialQA(SearchQABase):
     ''' 
     Aggregator for P7_inital search queries
     Search for: <zero-or-more-chars> value
     '''
+    _PLAN_TEMPLATE = 'value.endswith(%s)'
+
     @staticmethod
     def is_match(value, data):
         return data.endswith(value)
@@ -468,6 +803,9 @@ class P7BothQA(SearchQABase):
     Aggregator for P7_both search queries
     Search for: <zero-or-more-chars> value <zero-or-more-chars>
     '''
+    _ANCHOR_IS_EXACT = True
+    _PLAN_TEMPLATE = 'value.find(%s) != -1'
+
     @staticmethod
     def is_match(value, data):
         return data.find(value) != -1
@@ -477,6 +815,8 @@ class P7FinalQA(SearchQABase):
     Aggregator for P7_final search queries
     Search for: value <zero-or-more-chars>
     '''
+    _PLAN_TEMPLATE = 'value.startswith(%s)'
+
     @staticmethod
     def is_match(value, data):
         return data.startswith(value)
@@ -519,6 +859,27 @@ class SearchNumQABase(AtomicQueryAggregatorBase):
         '''
         return self.is_match(self._value, self._num, self.extract_value(row))
 
+    def index_key(self):
+        is_match = self.is_match
+        value = self._value
+        num = self._num
+        return (mqm.SUBSTRING, self._field, 
+                (value, lambda data: is_match(value, num, data), False))
+
+    def plan_predicate(self):
+        return (self._field, '%s(%s, %s, value)', 
+                [self.is_match, self._value, self._num])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        is_match = self.is_match
+        value = self._value
+        num = self._num
+        return [is_match(value, num, data) 
+                for data in column_batch.agg_column(self._field)]
+
 class SearchInitialNumQA(SearchNumQABase):
     ''' 
     Aggregator for: P6_initial_one, P7_other_5, P7_other_6
@@ -595,6 +956,32 @@ class SearchMultipleNumQABase(AtomicQueryAggregatorBase):
         return self.is_match(self._value_list, self._num, 
                              self.extract_value(row))
 
+    def index_key(self):
+        '''
+        Every match contains all of the values, so the longest of them is
+        the most selective anchor.
+        '''
+        is_match = self.is_match
+        value_list = self._value_list
+        num = self._num
+        anchor = max(value_list, key = len)
+        return (mqm.SUBSTRING, self._field, 
+                (anchor, lambda data: is_match(value_list, num, data), False))
+
+    def plan_predicate(self):
+        return (self._field, '%s(%s, %s, value)', 
+                [self.is_match, self._value_list, self._num])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        is_match = self.is_match
+        value_list = self._value_list
+        num = self._num
+        return [is_match(value_list, num, data) 
+                for data in column_batch.agg_column(self._field)]
+
 
     @staticmethod
     def multiple_num_helper(value_list, num, data):
@@ -811,6 +1198,19 @@ class FishingMixin(object):
     * extract_value()
     * _qid
     '''
+    def index_key(self):
+        '''
+        Fishing results are not simple lists of matching rows, so fishing
+        aggregators are never indexed.
+        '''
+        return None
+
+    def plan_predicate(self):
+        '''
+        Nor are they planned, for the same reason.
+        '''
+        return None
+
     def map(self, row):
         '''
         Return a dictionary where DBF_MATCHINGRECORDIDS either
@@ -893,6 +1293,31 @@ class FishingMixin(object):
                 qs.QRY_FISHING_MATCHES_FOUND : return_me}
 
 
+    def map_reduce_column_batch(self, column_batch):
+        """
+        Take a GeneratedColumnBatch and produce the final map/reduce value for
+        the batch. Returns exactly what map_reduce_row_list() would return on
+        the rows of the batch.
+        """
+        matches = self.match_column(column_batch)
+        values = column_batch.agg_column(self._field)
+        if isinstance(values, numpy.ndarray):
+            values = values.tolist()
+        field_values = list(itertools.compress(values, matches))
+        row_ids = column_batch.select_row_ids(matches)
+
+        return_me = collections.defaultdict(list)
+        if field_values:
+            min_field_val = min(field_values)
+            min_field_val_id_list = [row_id for (field_val, row_id) 
+                                     in zip(field_values, row_ids) 
+                                     if field_val == min_field_val]
+            return_me[min_field_val] = min_field_val_id_list
+       
+        return {qs.QRY_QID : self._qid, qs.QRY_VALID: True,
+                qs.QRY_FISHING_MATCHES_FOUND : return_me}
+
+
 
 class SearchFishingQA(FishingMixin, P7BothQA):
     ''' 
@@ -962,6 +1387,19 @@ class XMLLeafQueryAggregator(AtomicQueryAggregatorBase):
         return self.extract_value(row).has_leaf(self._leaf_tag, 
                                                 self._leaf_value)
 
+    def plan_predicate(self):
+        return (self._field, 'value.has_leaf(%s, %s)', 
+                [self._leaf_tag, self._leaf_value])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        leaf_tag = self._leaf_tag
+        leaf_value = self._leaf_value
+        return [xml.has_leaf(leaf_tag, leaf_value) 
+                for xml in column_batch.agg_column(self._field)]
+
 
 class XMLPathQueryAggregator(AtomicQueryAggregatorBase):
     """An aggregator for XML 'full path' queries"""
@@ -981,6 +1419,19 @@ class XMLPathQueryAggregator(AtomicQueryAggregatorBase):
         return self.extract_value(row).has_path(self._leaf_tag, 
                                                 self._leaf_value)
 
+    def plan_predicate(self):
+        return (self._field, 'value.has_path(%s, %s)', 
+                [self._leaf_tag, self._leaf_value])
+
+    def match_column(self, column_batch):
+        '''
+        Column-based version of match_row().
+        '''
+        leaf_tag = self._leaf_tag
+        leaf_value = self._leaf_value
+        return [xml.has_path(leaf_tag, leaf_value) 
+                for xml in column_batch.agg_column(self._field)]
+
 
 
 
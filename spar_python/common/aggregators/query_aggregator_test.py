@@ -22,6 +22,7 @@ from spar_python.common.distributions.xml_generator import \
     (XmlGenerator, GeneratedXml)
 
 import spar_python.common.aggregators.query_aggregator as qa
+import spar_python.data_generation.generated_row as generated_row
 from spar_python.common.distributions.generated_text import GeneratedText
 import unittest
 import copy
@@ -38,6 +39,15 @@ def compare_results(r1, r2):
         result1[rdb.DBF_MATCHINGRECORDIDS] = set(result1[rdb.DBF_MATCHINGRECORDIDS])
         result2[rdb.DBF_MATCHINGRECORDIDS] = set(result2[rdb.DBF_MATCHINGRECORDIDS])
         return result1 == result2
+
+def make_column_batch(rows):
+    '''
+    Helper function to turn a list of row-dicts into a GeneratedColumnBatch
+    '''
+    fields = [f for f in rows[0].keys() if f != sv.VARS.ID]
+    columns = dict((f, [row[f] for row in rows]) for f in fields)
+    row_ids = [row[sv.VARS.ID] for row in rows]
+    return generated_row.GeneratedColumnBatch(row_ids, columns)
     
 class EqualityQueryAggregatorTest(unittest.TestCase):
     """
@@ -144,6 +154,19 @@ class EqualityQueryAggregatorTest(unittest.TestCase):
         goal = { qs.QRY_QID : 1, rdb.DBF_MATCHINGRECORDIDS : [1, 3, 4], qs.QRY_VALID: True }
         self.assertEqual(compare_results(result_val, goal), True)
         
+    def test_map_reduce_column_batch(self):
+        '''
+        Test the map_reduce_column_batch() method.
+        '''
+        rows = [{ sv.VARS.ID : 1, sv.VARS.FIRST_NAME : 'nick' },
+                { sv.VARS.ID : 2, sv.VARS.FIRST_NAME : 'jill' },
+                { sv.VARS.ID : 3, sv.VARS.FIRST_NAME : 'nick' },
+                { sv.VARS.ID : 4, sv.VARS.FIRST_NAME : 'nick' }]
+        column_batch = make_column_batch(rows)
+        result_val = self.aggregator.map_reduce_column_batch(column_batch)
+        goal = { qs.QRY_QID : 1, rdb.DBF_MATCHINGRECORDIDS : [1, 3, 4], qs.QRY_VALID: True }
+        self.assertEqual(result_val, goal)
+
 
     def test_fields_needed(self):
         ''' test fields_needed function '''
@@ -384,6 +407,28 @@ class RangeQueryAggregatorTest(unittest.TestCase):
         goal = { qs.QRY_QID : 1, rdb.DBF_MATCHINGRECORDIDS : [1, 3, 4], qs.QRY_VALID: True }
         self.assertEqual(compare_results(reduce_val, goal), True)
 
+    def test_map_reduce_column_batch(self):
+        rows = [{ sv.VARS.ID : 1, sv.VARS.FOO : 100 },
+               { sv.VARS.ID : 2, sv.VARS.FOO : 5 },
+               { sv.VARS.ID : 3, sv.VARS.FOO : 500 },
+               { sv.VARS.ID : 4, sv.VARS.FOO : 499 }]
+        reduce_val = self.aggregator.map_reduce_column_batch(
+            make_column_batch(rows))
+        goal = { qs.QRY_QID : 1, rdb.DBF_MATCHINGRECORDIDS : [1, 3, 4], qs.QRY_VALID: True }
+        self.assertEqual(reduce_val, goal)
+
+        # FOO values which do not fit into 64 signed bits
+        rows.append({ sv.VARS.ID : 5, sv.VARS.FOO : 2**64 - 1 })
+        query = { qs.QRY_QID : 2,
+                  qs.QRY_FIELD : 'foo',
+                  qs.QRY_LBOUND : 2**63,
+                  qs.QRY_UBOUND : 2**64 - 1 }
+        aggregator = qa.RangeQueryAggregator(query)
+        reduce_val = aggregator.map_reduce_column_batch(
+            make_column_batch(rows))
+        goal = { qs.QRY_QID : 2, rdb.DBF_MATCHINGRECORDIDS : [5], qs.QRY_VALID: True }
+        self.assertEqual(reduce_val, goal)
+
     def test_fields_needed(self):
         ''' test fields_needed function '''
         fn = self.aggregator.fields_needed()
@@ -1779,6 +1824,141 @@ class GenChooseAggregatorTest(unittest.TestCase):
         reduce_val = self.aggregator.map_reduce_row_list(rows)
         self.assertEqual(reduce_val, self.reduce_golden[1])
 
+    def test_map_reduce_indexed(self):
+        '''
+        test that nested aggregators of mixed kinds, matched together by
+        the MultiQueryMatcher, give the same results as matching each
+        aggregator on its own
+        '''
+        def make_aggs():
+            fname = lambda cls, qid, value: \
+                cls({qs.QRY_QID : qid, qs.QRY_FIELD : 'fname',
+                     qs.QRY_VALUE : value})
+            ranges = [qa.RangeQueryAggregator({qs.QRY_QID : 10 + i,
+                                               qs.QRY_FIELD : 'lname',
+                                               qs.QRY_LBOUND : lbound,
+                                               qs.QRY_UBOUND : ubound})
+                      for (i, (lbound, ubound)) in
+                      enumerate([('a', 'k'), ('jones', 'jones'),
+                                 ('k', 'z'), ('z', 'a')])]
+            fishing = qa.RangeFishingQA({qs.QRY_QID : 20,
+                                         qs.QRY_FIELD : 'lname',
+                                         qs.QRY_LBOUND : 'a',
+                                         qs.QRY_UBOUND : 'z'})
+            inner = qa.GenChooseAggregator(
+                [fname(qa.EqualityQueryAggregator, 1, 'nick'),
+                 fname(qa.NotEqualQA, 2, 'nick'),
+                 fname(qa.LessThanQueryAggregator, 3, 'jill'),
+                 fname(qa.GreaterThanQueryAggregator, 4, 'jill')])
+            return [inner, qa.GenChooseAggregator(ranges + [fishing]),
+                    fname(qa.EqualityQueryAggregator, 5, 'jane')]
+
+        rows = [self.rows[i] for i in [10, 11, 12]] * 2
+        aggs = make_aggs()
+        indexed = qa.GenChooseAggregator(aggs).map_reduce_row_list(rows)
+        self.assertEqual(len(indexed[qs.QRY_SUBRESULTS]), 3)
+        unindexed = []
+        for agg in make_aggs():
+            if isinstance(agg, qa.GenChooseAggregator):
+                unindexed.append({qs.QRY_SUBRESULTS :
+                                  [a.map_reduce_row_list(rows)
+                                   for a in agg.aggs]})
+            else:
+                unindexed.append(agg.map_reduce_row_list(rows))
+        self.assertEqual(indexed[qs.QRY_SUBRESULTS], unindexed)
+        self.assertEqual(indexed[qs.QRY_SUBRESULTS][0][qs.QRY_SUBRESULTS][1]
+                         [rdb.DBF_MATCHINGRECORDIDS], [10, 12, 10, 12])
+
+        batch = make_column_batch(rows)
+        indexed = qa.GenChooseAggregator(make_aggs())
+        self.assertEqual(indexed.map_reduce_column_batch(batch)
+                         [qs.QRY_SUBRESULTS], unindexed)
+
+    def test_map_reduce_indexed_searches(self):
+        '''
+        test that wildcard searches matched through the Aho-Corasick
+        automaton give the same results as matching each aggregator on its
+        own
+        '''
+        addresses = ['1 PEACH TREE LN', '42 PEACH CIRCLE', 'PEACH',
+                     'APPLE ST', '7 APPLE PEACH WAY', '']
+        rows = [{ sv.VARS.ID : row_id, sv.VARS.STREET_ADDRESS : address }
+                for (row_id, address) in enumerate(addresses * 3)]
+        def make_aggs():
+            aggs = []
+            qid = 0
+            for cls in [qa.P7InitialQA, qa.P7BothQA, qa.P7FinalQA]:
+                for value in ['peach', 'apple st', '', 'way']:
+                    qid += 1
+                    aggs.append(cls({qs.QRY_QID : qid,
+                                     qs.QRY_FIELD : 'address',
+                                     qs.QRY_SEARCHFOR : value}))
+            for cls in [qa.SearchInitialNumQA, qa.SearchFinalNumQA]:
+                for (value, num) in [('each', 1), ('peach', 0),
+                                     ('apple', 3)]:
+                    qid += 1
+                    aggs.append(cls({qs.QRY_QID : qid,
+                                     qs.QRY_FIELD : 'address',
+                                     qs.QRY_SEARCHFOR : value,
+                                     qs.QRY_SEARCHDELIMNUM : num}))
+            for cls in [qa.SearchMultipleNumQA, qa.SearchFinalMultipleNumQA,
+                        qa.SearchBothMultipleNumQA,
+                        qa.SearchInitialMultipleNumQA]:
+                for (value_list, num) in [(['1', 'peach'], 1),
+                                          (['peach', 'tree', 'ln'], 1),
+                                          (['apple', 'way'], 7)]:
+                    qid += 1
+                    aggs.append(cls({qs.QRY_QID : qid,
+                                     qs.QRY_FIELD : 'address',
+                                     qs.QRY_SEARCHFORLIST : value_list,
+                                     qs.QRY_SEARCHDELIMNUM : num}))
+            return aggs
+
+        unindexed = [agg.map_reduce_row_list(rows) for agg in make_aggs()]
+        indexed = qa.GenChooseAggregator(make_aggs()).map_reduce_row_list(rows)
+        self.assertEqual(indexed[qs.QRY_SUBRESULTS], unindexed)
+        self.assertEqual(unindexed[4][rdb.DBF_MATCHINGRECORDIDS],
+                         [0, 1, 2, 4, 6, 7, 8, 10, 12, 13, 14, 16])
+
+    def test_map_reduce_planned(self):
+        '''
+        test that aggregators which cannot be indexed, matched together by
+        a compiled QueryPlan, give the same results as matching each
+        aggregator on its own
+        '''
+        def make_xml(tag, value):
+            root = ElementTree.Element('a')
+            leaf = ElementTree.SubElement(root, tag)
+            leaf.text = value
+            return GeneratedXml(ElementTree.ElementTree(root))
+        rows = [{ sv.VARS.ID : row_id, 
+                  sv.VARS.FIRST_NAME : fname,
+                  sv.VARS.XML : make_xml(tag, fname) }
+                for (row_id, (tag, fname)) in 
+                enumerate([('b', 'nick'), ('c', 'nick'), ('b', 'jane')])]
+        def make_aggs():
+            aggs = [qa.EqualityQueryAggregator({qs.QRY_QID : 1,
+                                                qs.QRY_FIELD : 'fname',
+                                                qs.QRY_VALUE : 'nick'})]
+            for (qid, tag, value) in [(2, 'b', 'nick'), (3, 'c', 'nick'),
+                                      (4, 'b', 'jane'), (5, 'a', 'nick')]:
+                aggs.append(qa.XMLLeafQueryAggregator(
+                        {qs.QRY_QID : qid, qs.QRY_FIELD : 'xml',
+                         qs.QRY_XPATH : tag, qs.QRY_VALUE : value}))
+            aggs.append(qa.XMLPathQueryAggregator(
+                    {qs.QRY_QID : 6, qs.QRY_FIELD : 'xml',
+                     qs.QRY_XPATH : ['a', 'b'], qs.QRY_VALUE : 'nick'}))
+            return aggs
+
+        unindexed = [agg.map_reduce_row_list(rows) for agg in make_aggs()]
+        aggregator = qa.GenChooseAggregator(make_aggs())
+        planned = aggregator.map_reduce_row_list(rows)
+        self.assertEqual(len(aggregator._plan), 1)
+        self.assertEqual(planned[qs.QRY_SUBRESULTS], unindexed)
+        self.assertEqual([result[rdb.DBF_MATCHINGRECORDIDS] 
+                          for result in unindexed],
+                         [[0, 1], [0], [1], [2], [], [0]])
+
     def test_fields_needed(self):
         ''' test fields_needed function '''
         fn = self.aggregator.fields_needed()
@@ -2194,6 +2374,16 @@ class RangeFishingAggregatorTest(unittest.TestCase):
         self.assertEqual(reduce_val3, self.foo_reduce_golden[2])
 
 
+    def test_map_reduce_column_batch(self):
+
+        rows = [self.rows[i] for i in [10, 11, 12, 13]]
+        column_batch = make_column_batch(rows)
+        reduce_val = self.foo_aggregator.map_reduce_column_batch(column_batch)
+        self.assertEqual(reduce_val, self.foo_reduce_golden[2])
+        reduce_val = self.dob_aggregator.map_reduce_column_batch(column_batch)
+        self.assertEqual(reduce_val, self.dob_reduce_golden[2])
+
+
     def test_map_reduce_row_list_foo(self):
 
         rows = [self.rows[i] for i in [10, 11]]
@@ -0,0 +1,183 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Compiles the predicates on a field into one
+#                      python function
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+"""
+Checking a batch of rows against a query one row at a time costs several
+python function calls per row: map_reduce_row_list() calls match_row(),
+which calls extract_value() and then some comparison method. The
+map_reduce_row_list() and match_column() methods of the aggregators hoist
+some of that work out of the loop by hand (see optimization_notes.txt),
+but every query still makes its own pass over the batch.
+
+A FieldPlan automates that hoisting for all the queries on one field at
+once. Each query describes its predicate as a snippet of python source
+over the name 'value', along with the constants it needs, e.g.
+
+  ('value == %s', ['SMITH'])
+  ('%s <= value <= %s', [18, 65])
+  ('value.has_leaf(%s, %s)', ['fname', 'JOHN'])
+
+and the FieldPlan generates, compiles and then runs a single function
+which makes one pass over the batch and evaluates every predicate inline
+for each value:
+
+  def match(values, matches):
+      matches[3] = _matches_0 = []
+      _append_0 = _matches_0.append
+      ...
+      for (pos, value) in enumerate(values):
+          if value == 'SMITH':
+              _append_0(pos)
+          if 18 <= value <= 65:
+              _append_1(pos)
+          ...
+
+Strings, integers, booleans and None are written straight into the
+source. Other constants (dates, functions, lists) are bound to names in
+the function's globals.
+
+A QueryPlan does the same for a whole list of aggregators, with one
+FieldPlan for each field. Aggregators take part through their
+plan_predicate() method (see query_aggregator.py).
+"""
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..', '..')
+sys.path.append(base_dir)
+
+import collections
+
+
+# Types whose repr() is python source for an equal value of the same type
+_LITERAL_TYPES = frozenset([str, unicode, int, long, bool, type(None)])
+
+
+class FieldPlan(object):
+    '''
+    The compiled predicates against one field. Each predicate is identified
+    by the index of the query it belongs to.
+
+    Usage:
+      plan = FieldPlan()
+      plan.add(0, 'value == %s', ['SMITH'])
+      plan.add(3, '%s <= value <= %s', [18, 65])
+      plan.match(values, matches)
+
+    after which matches[0] and matches[3] hold the sorted lists of positions
+    (in values) which match the predicates of queries 0 and 3.
+    '''
+
+    def __init__(self):
+        # (query index, python expression)
+        self._predicates = []
+        # Globals of the generated function
+        self._namespace = {}
+        self._num_constants = 0
+        # Built on first use: see _compile()
+        self._match = None
+        self.source = None
+
+    def __len__(self):
+        return len(self._predicates)
+
+    def _constant(self, value):
+        '''
+        Returns python source which evaluates to value inside the generated
+        function.
+        '''
+        if type(value) in _LITERAL_TYPES:
+            return repr(value)
+        name = '_c%d' % self._num_constants
+        self._num_constants += 1
+        self._namespace[name] = value
+        return name
+
+    def add(self, i, template, constants = ()):
+        '''
+        Adds the predicate of query i. template is a python expression over
+        the name 'value', with one %s for each of the constants.
+        '''
+        assert self._match is None, "Plan has already been compiled"
+        expression = template % tuple(self._constant(c) for c in constants)
+        self._predicates.append((i, expression))
+
+    def _compile(self):
+        lines = ['def match(values, matches):']
+        for (n, (i, _)) in enumerate(self._predicates):
+            lines.append('    matches[%d] = _matches_%d = []' % (i, n))
+            lines.append('    _append_%d = _matches_%d.append' % (n, n))
+        lines.append('    for (pos, value) in enumerate(values):')
+        for (n, (_, expression)) in enumerate(self._predicates):
+            lines.append('        if %s:' % expression)
+            lines.append('            _append_%d(pos)' % n)
+        lines.append('        pass')
+        self.source = '\n'.join(lines) + '\n'
+        code = compile(self.source, '<query plan>', 'exec')
+        exec code in self._namespace
+        self._match = self._namespace['match']
+
+    def match(self, values, matches):
+        '''
+        Matches the column of values against every predicate in the plan,
+        storing the list of matching positions for query i in matches[i].
+        '''
+        if self._match is None:
+            self._compile()
+        self._match(values, matches)
+
+
+
+class QueryPlan(object):
+    '''
+    Matches batches against a list of aggregators, through one FieldPlan
+    for each field. Aggregators which are None, or whose plan_predicate()
+    returns None, are left to the caller.
+
+    Usage:
+      plan = QueryPlan(aggregators)
+      matches = plan.match(num_rows, get_column)
+
+    where get_column(i) returns the column of values (in the order of the
+    batch) which aggregator i is matched against, as returned by its
+    extract_value(). get_column() is called once per field. As with
+    MultiQueryMatcher.match(), match() returns a list parallel to
+    aggregators, holding the sorted list of matching positions for each
+    planned aggregator and None for the others.
+    '''
+
+    def __init__(self, aggregators):
+        self._num_queries = len(aggregators)
+        # field -> (index of first query on it, FieldPlan)
+        self._field_plans = collections.OrderedDict()
+        for (i, agg) in enumerate(aggregators):
+            if agg is None:
+                continue
+            predicate = agg.plan_predicate()
+            if predicate is None:
+                continue
+            (field, template, constants) = predicate
+            if field not in self._field_plans:
+                self._field_plans[field] = (i, FieldPlan())
+            self._field_plans[field][1].add(i, template, constants)
+
+    def __len__(self):
+        return len(self._field_plans)
+
+    def match(self, num_rows, get_column):
+        matches = [None] * self._num_queries
+        for (first, field_plan) in self._field_plans.itervalues():
+            column = get_column(first)
+            assert len(column) == num_rows
+            field_plan.match(column, matches)
+        return matches
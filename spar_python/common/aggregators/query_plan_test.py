@@ -0,0 +1,167 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Tests for query_plan.py
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..', '..')
+sys.path.append(base_dir)
+
+import datetime
+import unittest
+
+import spar_python.common.aggregators.query_aggregator as qa
+import spar_python.common.aggregators.query_plan as query_plan
+from spar_python.common.distributions.generated_text import GeneratedText
+from spar_python.common.distributions.xml_generator import GeneratedXml
+import spar_python.data_generation.spar_variables as sv
+import spar_python.query_generation.query_schema as qs
+
+
+class FieldPlanTest(unittest.TestCase):
+
+    def test_match(self):
+        plan = query_plan.FieldPlan()
+        plan.add(2, 'value == %s', ['B'])
+        plan.add(0, '%s <= value <= %s', ['A', 'C'])
+        plan.add(3, 'value != %s', [u'B'])
+        plan.add(5, '%s(value)', [lambda value: value.startswith('C')])
+        self.assertEqual(len(plan), 4)
+        matches = [None] * 6
+        plan.match(['A', 'B', 'C', 'CD', 'B'], matches)
+        self.assertEqual(matches, [[0, 1, 2, 4], None, [1, 4], [0, 2, 3],
+                                   None, [2, 3]])
+        # The plan is only compiled once, and can be reused
+        source = plan.source
+        plan.match([], matches)
+        self.assertEqual(matches, [[], None, [], [], None, []])
+        self.assertIs(plan.source, source)
+        with self.assertRaises(AssertionError):
+            plan.add(1, 'value == %s', ['A'])
+
+    def test_constants(self):
+        day = datetime.date(2013, 10, 30)
+        constants = ["it's \\ \"quoted\"\n", u'\xe9', 2 ** 70, -3, True,
+                     None, day, [1, 2], float('nan')]
+        plan = query_plan.FieldPlan()
+        for (i, constant) in enumerate(constants):
+            plan.add(i, 'value == %s', [constant])
+        matches = [None] * len(constants)
+        plan.match(constants, matches)
+        self.assertEqual(matches[:-1], [[i] for i in xrange(8)])
+        # NaN is not equal to anything, not even itself
+        self.assertEqual(matches[-1], [])
+        # Literals are inlined, and everything else is bound to a name
+        self.assertIn(repr(constants[0]), plan.source)
+        self.assertIn(repr(2 ** 70), plan.source)
+        self.assertNotIn('datetime', plan.source)
+
+    def test_empty(self):
+        plan = query_plan.FieldPlan()
+        matches = []
+        plan.match(['A'], matches)
+        self.assertEqual(matches, [])
+
+
+class QueryPlanTest(unittest.TestCase):
+    """
+    A QueryPlan should match exactly the rows which the aggregators'
+    match_row() methods match.
+    """
+
+    def make_xml(self, leaf_value):
+        root = ('a', None, [('b', None, [('c', leaf_value, None)]),
+                            ('d', 'D', None)])
+        leaves = set([('c', leaf_value.upper()), ('d', 'D')])
+        paths = set([('a', 'b', 'c', leaf_value.upper()), ('a', 'd', 'D')])
+        return GeneratedXml.from_nodes(root, leaves, paths)
+
+    def setUp(self):
+        names = ['JILL', 'NICK', 'JANE', 'NICK', 'ZED']
+        addresses = ['1 PEACH TREE LN', '42 PEACH CIRCLE', 'PEACH',
+                     'APPLE ST', '7 APPLE PEACH WAY']
+        notes = [GeneratedText(['The', ' ', 'dogs', '.'],
+                               ['THE', None, 'DOG', None],
+                               ['THE', ' ', 'DOGS', '.']),
+                 GeneratedText(['A', ' ', 'cat'], ['A', None, 'CAT'],
+                               ['A', ' ', 'CAT'])]
+        self.rows = [{ sv.VARS.ID : row_id,
+                       sv.VARS.FIRST_NAME : names[row_id],
+                       sv.VARS.STREET_ADDRESS : addresses[row_id],
+                       sv.VARS.NOTES1 : notes[row_id % 2],
+                       sv.VARS.XML : self.make_xml(names[row_id]) }
+                     for row_id in xrange(5)]
+
+    def make_aggs(self):
+        aggs = []
+        for cls in [qa.EqualityQueryAggregator, qa.NotEqualQA,
+                    qa.LessThanQueryAggregator,
+                    qa.GreaterThanQueryAggregator]:
+            aggs.append(cls({qs.QRY_QID : len(aggs), qs.QRY_FIELD : 'fname',
+                             qs.QRY_VALUE : 'nick'}))
+        aggs.append(qa.RangeQueryAggregator({qs.QRY_QID : len(aggs),
+                                             qs.QRY_FIELD : 'fname',
+                                             qs.QRY_LBOUND : 'jane',
+                                             qs.QRY_UBOUND : 'nick'}))
+        for (cat, word) in [('P3', 'dogs'), ('P4', 'dog'), ('P3', 'cat')]:
+            aggs.append(qa.P3P4QueryAggregator({qs.QRY_QID : len(aggs),
+                                                qs.QRY_FIELD : 'notes1',
+                                                qs.QRY_CAT : cat,
+                                                qs.QRY_SEARCHFOR : word}))
+        for cls in [qa.P7InitialQA, qa.P7BothQA, qa.P7FinalQA]:
+            aggs.append(cls({qs.QRY_QID : len(aggs),
+                             qs.QRY_FIELD : 'address',
+                             qs.QRY_SEARCHFOR : 'peach'}))
+        for cls in [qa.SearchInitialNumQA, qa.SearchFinalNumQA]:
+            aggs.append(cls({qs.QRY_QID : len(aggs),
+                             qs.QRY_FIELD : 'address',
+                             qs.QRY_SEARCHFOR : 'each',
+                             qs.QRY_SEARCHDELIMNUM : 1}))
+        for cls in [qa.SearchMultipleNumQA, qa.SearchBothMultipleNumQA]:
+            aggs.append(cls({qs.QRY_QID : len(aggs),
+                             qs.QRY_FIELD : 'address',
+                             qs.QRY_SEARCHFORLIST : ['peach', 'tree'],
+                             qs.QRY_SEARCHDELIMNUM : 1}))
+        for cls in [qa.XMLLeafQueryAggregator, qa.XMLPathQueryAggregator]:
+            aggs.append(cls({qs.QRY_QID : len(aggs),
+                             qs.QRY_FIELD : 'xml',
+                             qs.QRY_XPATH : ('c' if cls is
+                                             qa.XMLLeafQueryAggregator
+                                             else ['a', 'b', 'c']),
+                             qs.QRY_VALUE : 'nick'}))
+        # Fishing aggregators are not planned
+        aggs.append(qa.SearchFishingQA({qs.QRY_QID : len(aggs),
+                                        qs.QRY_FIELD : 'address',
+                                        qs.QRY_SEARCHFOR : 'peach'}))
+        return aggs
+
+    def test_match(self):
+        aggs = self.make_aggs()
+        plan = query_plan.QueryPlan(aggs + [None])
+        # fname, notes1 (as GeneratedText), address and xml
+        self.assertEqual(len(plan), 4)
+        fields_extracted = []
+        def get_column(i):
+            fields_extracted.append(i)
+            return [aggs[i].extract_value(row) for row in self.rows]
+        matches = plan.match(len(self.rows), get_column)
+        self.assertEqual(len(fields_extracted), 4)
+        self.assertEqual(len(matches), len(aggs) + 1)
+        for (agg, agg_matches) in zip(aggs, matches):
+            if isinstance(agg, qa.SearchFishingQA):
+                self.assertIsNone(agg_matches)
+            else:
+                goal = [pos for (pos, row) in enumerate(self.rows)
+                        if agg.match_row(row)]
+                self.assertEqual(agg_matches, goal, type(agg))
+        self.assertEqual(matches[0], [1, 3])
+        self.assertIsNone(matches[-1])
@@ -0,0 +1,70 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Compact lists of matching record IDs
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+"""
+The query aggregators hold on to the ID of every row which matches every
+query until all of the rows have been generated. As a python list, each
+ID costs a pointer plus a 24-byte int object, which is why the aggregators
+need a process cutoff at all. RecordIdArray stores the same IDs as packed
+64-bit integers (8 bytes each) instead, and pickles as a single string
+when results are sent back from the worker processes.
+
+A RecordIdArray supports everything the query-batch code does with the old
+lists (len(), iteration, 'in', extend(), set(), sorting) and compares equal
+to a list or tuple holding the same IDs in the same order.
+"""
+
+import array
+
+
+# A signed 64-bit integer on every platform we build on. Row IDs are
+# 64-bit (see generator_workers.Worker._row_id_generator) but always
+# non-negative and well below 2**63.
+TYPECODE = 'l'
+assert array.array(TYPECODE).itemsize == 8
+
+
+class RecordIdArray(array.array):
+    """
+    An array.array of record IDs.
+
+    Usage:
+      ids = RecordIdArray()
+      ids = RecordIdArray([1, 5, 7])
+    """
+
+    def __new__(cls, *args):
+        if len(args) == 2:
+            # Called by pickle, as RecordIdArray(typecode, data)
+            return array.array.__new__(cls, *args)
+        return array.array.__new__(cls, TYPECODE, *args)
+
+    def __eq__(self, other):
+        if isinstance(other, array.array):
+            return array.array.__eq__(self, other)
+        if isinstance(other, (list, tuple)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __copy__(self):
+        return RecordIdArray(self)
+
+    def __deepcopy__(self, memo):
+        return RecordIdArray(self)
+
+    def __repr__(self):
+        return 'RecordIdArray(%r)' % self.tolist()
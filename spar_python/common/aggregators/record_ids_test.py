@@ -0,0 +1,53 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Tests for record_ids.py
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..', '..')
+sys.path.append(base_dir)
+
+import copy
+import cPickle
+import unittest
+
+import spar_python.common.aggregators.record_ids as record_ids
+
+
+class RecordIdArrayTest(unittest.TestCase):
+
+    def test_list_compatible(self):
+        ids = record_ids.RecordIdArray([5, 2 ** 40, 3])
+        self.assertEqual(ids, [5, 2 ** 40, 3])
+        self.assertEqual([5, 2 ** 40, 3], ids)
+        self.assertEqual({'ids' : ids}, {'ids' : [5, 2 ** 40, 3]})
+        self.assertNotEqual(ids, [5, 3])
+        self.assertEqual(len(ids), 3)
+        self.assertTrue(3 in ids)
+        self.assertEqual(set(ids), set([3, 5, 2 ** 40]))
+        self.assertEqual(sorted(ids), [3, 5, 2 ** 40])
+        ids.extend([7])
+        ids.extend(record_ids.RecordIdArray([8]))
+        self.assertEqual(ids, [5, 2 ** 40, 3, 7, 8])
+        self.assertEqual(record_ids.RecordIdArray(), [])
+
+    def test_copy_and_pickle(self):
+        ids = record_ids.RecordIdArray(xrange(1000))
+        for new_ids in [copy.copy(ids), copy.deepcopy(ids),
+                        cPickle.loads(cPickle.dumps(ids,
+                                                    cPickle.HIGHEST_PROTOCOL))]:
+            self.assertEqual(type(new_ids), record_ids.RecordIdArray)
+            self.assertEqual(new_ids, ids)
+            self.assertIsNot(new_ids, ids)
+        # Pickled as packed 64-bit integers, not one object per ID
+        self.assertLess(len(cPickle.dumps(ids, cPickle.HIGHEST_PROTOCOL)),
+                        8 * len(ids) + 100)
@@ -0,0 +1,167 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Bitmaps over row positions for compound queries
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+"""
+Compound queries (AND, OR and M-of-N threshold) are evaluated by combining
+the rows matched by each of their clauses. Doing that with one python set
+per clause (or worse, per row) means hashing every record ID again for
+every combination of clauses we try. Instead, each clause is turned into a
+bitmap over row positions exactly once, and the clauses are combined with
+bitwise operations.
+
+A bitmap is a plain python integer in which bit i is set when the row at
+position i matches. Python's long integers give us arbitrary-length bitwise
+AND/OR/NOT in C for free, and they pickle and compare like any other value.
+
+Positions are either the positions of rows within a batch (see
+compound_aggregators.BooleanCollector.match_bitmap) or positions handed out
+by a RecordIdBitmaps object to the record IDs it has seen (see the compound
+query batches).
+"""
+
+import binascii
+
+
+EMPTY = 0
+
+
+def from_positions(positions):
+    '''
+    Returns the bitmap with the bits at the given (non-negative) positions
+    set.
+    '''
+    positions = list(positions)
+    if not positions:
+        return EMPTY
+    # Set the bits in a little-endian byte buffer and convert it in one go;
+    # or-ing the bits into a long one at a time is quadratic.
+    buf = bytearray((max(positions) >> 3) + 1)
+    for position in positions:
+        buf[position >> 3] |= 1 << (position & 7)
+    buf.reverse()
+    return int(binascii.hexlify(buf), 16)
+
+
+def to_positions(bitmap):
+    '''
+    Returns the positions of the bits set in the bitmap, in increasing order.
+    '''
+    bits = bin(bitmap)[:1:-1]
+    positions = []
+    position = bits.find('1')
+    while position >= 0:
+        positions.append(position)
+        position = bits.find('1', position + 1)
+    return positions
+
+
+def count(bitmap):
+    '''
+    Returns the number of bits set in the bitmap.
+    '''
+    return bin(bitmap).count('1')
+
+
+def intersection(bitmaps):
+    '''
+    Returns the bitmap of the positions set in all of the bitmaps.
+    '''
+    return reduce(lambda b1, b2: b1 & b2, bitmaps)
+
+
+def union(bitmaps):
+    '''
+    Returns the bitmap of the positions set in any of the bitmaps.
+    '''
+    return reduce(lambda b1, b2: b1 | b2, bitmaps, EMPTY)
+
+
+def at_least(bitmaps, max_count):
+    '''
+    Returns a list `levels` of max_count + 1 bitmaps, where levels[k] has
+    the positions set in at least k of the given bitmaps. (levels[0] is -1,
+    which has every bit set.) This takes len(bitmaps) * max_count bitwise
+    operations, where taking the union of the intersections of every
+    combination of k bitmaps would take (len(bitmaps) choose k) of them.
+    '''
+    levels = [-1] + [EMPTY] * max_count
+    for (i, bitmap) in enumerate(bitmaps):
+        # Going down, so that each bitmap is counted at most once per level
+        for k in xrange(min(i + 1, max_count), 0, -1):
+            levels[k] |= levels[k - 1] & bitmap
+    return levels
+
+
+def threshold(bitmaps, m):
+    '''
+    Returns the bitmap of the positions set in at least m of the bitmaps.
+    '''
+    assert m >= 1
+    return at_least(bitmaps, m)[m]
+
+
+def exactly(bitmaps):
+    '''
+    Returns a list `counts` where counts[k] is the number of positions set
+    in exactly k of the bitmaps, for k from 1 to len(bitmaps). (counts[0]
+    is always 0, since we cannot count positions set in none of them.)
+    '''
+    levels = at_least(bitmaps, len(bitmaps)) + [EMPTY]
+    return [0] + [count(levels[k] & ~levels[k + 1])
+                  for k in xrange(1, len(bitmaps) + 1)]
+
+
+class RecordIdBitmaps(object):
+    """
+    Hands out bitmap positions to record IDs, so that lists of matching
+    record IDs can be combined as bitmaps. The bitmap of each list is only
+    built once, however many combinations it takes part in.
+
+    Usage:
+      bitmaps = RecordIdBitmaps()
+      both = bitmaps.bitmap(ids1) & bitmaps.bitmap(ids2)
+      both_ids = bitmaps.record_ids(both)
+    """
+
+    def __init__(self):
+        self._positions = {}
+        self._record_ids = []
+        # id() of each list of record IDs -> (the list, its bitmap). The
+        # list is kept so that its id() cannot be reused by another one.
+        self._bitmaps = {}
+
+    def bitmap(self, record_ids):
+        '''
+        Returns the bitmap of the given record IDs (any iterable), which
+        should not change afterwards.
+        '''
+        try:
+            return self._bitmaps[id(record_ids)][1]
+        except KeyError:
+            pass
+        positions = []
+        for record_id in record_ids:
+            try:
+                positions.append(self._positions[record_id])
+            except KeyError:
+                self._positions[record_id] = len(self._record_ids)
+                positions.append(len(self._record_ids))
+                self._record_ids.append(record_id)
+        bitmap = from_positions(positions)
+        self._bitmaps[id(record_ids)] = (record_ids, bitmap)
+        return bitmap
+
+    def record_ids(self, bitmap):
+        '''
+        Returns the set of record IDs in the bitmap.
+        '''
+        return set(self._record_ids[position]
+                   for position in to_positions(bitmap))
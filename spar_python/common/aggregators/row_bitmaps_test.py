@@ -0,0 +1,83 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Tests for row_bitmaps.py
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..', '..')
+sys.path.append(base_dir)
+
+import itertools
+import time
+import unittest
+
+import spar_python.common.aggregators.row_bitmaps as row_bitmaps
+import spar_python.common.spar_random as spar_random
+
+
+class RowBitmapsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.seed = int(time.time())
+        self.seed_msg = "Random seed used for this test: %s" % self.seed
+        spar_random.seed(self.seed)
+
+    def random_sets(self, num_sets, num_positions):
+        return [set(p for p in xrange(num_positions)
+                    if spar_random.randint(0, 2) == 0)
+                for _ in xrange(num_sets)]
+
+    def test_positions(self):
+        for positions in [[], [0], [7], [8], [0, 1, 63, 64, 1000],
+                          sorted(set(int(spar_random.randint(0, 5000))
+                                     for _ in xrange(300)))]:
+            bitmap = row_bitmaps.from_positions(reversed(positions))
+            self.assertEqual(bitmap, sum(1 << p for p in positions))
+            self.assertEqual(row_bitmaps.to_positions(bitmap), positions)
+            self.assertEqual(row_bitmaps.count(bitmap), len(positions))
+        # Repeated positions are only set once
+        self.assertEqual(row_bitmaps.from_positions([3, 3]), 8)
+
+    def test_combinations(self):
+        sets = self.random_sets(6, 50)
+        bitmaps = [row_bitmaps.from_positions(s) for s in sets]
+        def positions(bitmap):
+            return set(row_bitmaps.to_positions(bitmap))
+        self.assertEqual(positions(row_bitmaps.intersection(bitmaps)),
+                         set.intersection(*sets), self.seed_msg)
+        self.assertEqual(positions(row_bitmaps.union(bitmaps)),
+                         set.union(*sets), self.seed_msg)
+        self.assertEqual(row_bitmaps.union([]), row_bitmaps.EMPTY)
+        for m in xrange(1, len(sets) + 1):
+            goal = set()
+            for m_sets in itertools.combinations(sets, m):
+                goal.update(set.intersection(*m_sets))
+            self.assertEqual(positions(row_bitmaps.threshold(bitmaps, m)),
+                             goal, self.seed_msg)
+        counts = [0] * (len(sets) + 1)
+        for position in set.union(*sets):
+            counts[sum(1 for s in sets if position in s)] += 1
+        self.assertEqual(row_bitmaps.exactly(bitmaps), counts, self.seed_msg)
+
+    def test_record_id_bitmaps(self):
+        ids1 = [2 ** 40, 5, 17, 3]
+        ids2 = [17, 9, 2 ** 40]
+        bitmaps = row_bitmaps.RecordIdBitmaps()
+        bitmap1 = bitmaps.bitmap(ids1)
+        bitmap2 = bitmaps.bitmap(ids2)
+        self.assertEqual(row_bitmaps.count(bitmap1), 4)
+        self.assertIs(bitmaps.bitmap(ids1), bitmap1)
+        self.assertEqual(bitmaps.record_ids(bitmap1 & bitmap2),
+                         set([17, 2 ** 40]))
+        self.assertEqual(bitmaps.record_ids(bitmap1 | bitmap2),
+                         set([2 ** 40, 3, 5, 9, 17]))
+        self.assertEqual(bitmaps.record_ids(row_bitmaps.EMPTY), set())
@@ -65,6 +65,7 @@ base_dir = os.path.join(this_dir, '..', '..')
 sys.path.append(base_dir)
 
 import bisect
+import numpy
 import spar_python.common.spar_random as spar_random
 import operator
 from spar_python.common.enum import Enum
@@ -184,6 +185,47 @@ class CompactIndependentDistribution(object):
         x = spar_random.randint(1, self.__total)
         idx = bisect.bisect_left(self.__cum_counts, x)
         return self.__values[idx]
+
+    def _get_cdf(self):
+        """
+        Returns the (__values, __cum_counts, __total) triple described in
+        generate(), converting __counts first if necessary. Used to build
+        read-only copies of this distribution (see frozen_distributions.py).
+        """
+        if self.__counts is not None:
+            self.__counts_to_cdf()
+            assert(self.__counts is None)
+        return (self.__values, self.__cum_counts, self.__total)
+
+    def generate_n(self, k, ind_vars_list=None):
+        """
+        Returns a list of k random items that reflect the distribution
+        of add calls. ind_vars_list is ignored.
+
+        This does exactly what k calls to generate() would do (and
+        consumes the same random numbers, in the same order) but draws
+        all k random numbers at once and replaces the k binary
+        searches with a single numpy.searchsorted over a cached copy of
+        __cum_counts.
+        """
+        if self.__counts is not None:
+            self.__counts_to_cdf()
+            assert(self.__counts is None)
+
+        assert self.__total > 0
+        if k <= 0:
+            return []
+        try:
+            cum_counts_array = self.__cum_counts_array
+        except AttributeError:
+            # Built on first use, so that distributions pickled before
+            # generate_n() existed still work.
+            cum_counts_array = numpy.array(self.__cum_counts)
+            self.__cum_counts_array = cum_counts_array
+        xs = spar_random.randint(1, self.__total, k)
+        idxs = numpy.searchsorted(cum_counts_array, xs, side='left')
+        values = self.__values
+        return [values[idx] for idx in idxs]
     
     def generate_conditional_pdf(self, min, max, ind_vars):
         """
@@ -416,6 +458,18 @@ class SimpleIndependentDistribution(CompactIndependentDistribution):
         x = spar_random.randint(0, self.__randint_bound)
         return self._added_items[x]
 
+    def generate_n(self, k, ind_vars_list=None):
+        """
+        Returns a list of k random items that reflect the distribution
+        of add calls, drawing all k indices into _added_items at once.
+        ind_vars_list is ignored.
+        """
+        if k <= 0:
+            return []
+        xs = spar_random.randint(0, self.__randint_bound, k)
+        added_items = self._added_items
+        return [added_items[x] for x in xs]
+
     def size(self, *args):
         """
         Returns the number of distinct items that could be generated
@@ -609,6 +663,54 @@ class SimpleConditionalDistribution(object):
             underlying_dist = self._underlying_dists[random_tuple]
             
         return underlying_dist.generate()
+
+    def generate_n(self, k, ind_vars_list):
+        """
+        Returns a list of k random items, where the i-th item is
+        conditioned on the values for the independent vars in
+        ind_vars_list[i] (just as if generate(ind_vars_list[i]) had been
+        called).
+
+        Rather than going to the underlying distributions once per item,
+        the items are first grouped by their independent-variable
+        values, and each underlying distribution is then asked for its
+        whole group at once through its own generate_n(). As with
+        generate(), items whose independent-variable values were never
+        seen by add() are assigned a random underlying distribution.
+
+        Note: because items are drawn group-by-group, the output is not
+        the same as calling generate() k times from the same seed---it
+        only has the same distribution.
+        """
+        assert len(ind_vars_list) == k
+        ind_vars_names = self._ind_vars
+        underlying_dists = self._underlying_dists
+        groups = {}
+        group_order = []
+        ind_var_tuples = None
+        for (i, ind_vars) in enumerate(ind_vars_list):
+            ind_var_tuple = tuple([ind_vars[v] for v in ind_vars_names])
+            if ind_var_tuple not in underlying_dists:
+                # Oops. We have not seen these ind_vars before.
+                # Get a random underlying_dict.
+                if ind_var_tuples is None:
+                    ind_var_tuples = underlying_dists.keys()
+                ind_var_tuple = spar_random.choice(ind_var_tuples)
+            try:
+                groups[ind_var_tuple].append(i)
+            except KeyError:
+                groups[ind_var_tuple] = [i]
+                group_order.append(ind_var_tuple)
+
+        results = [None] * k
+        for ind_var_tuple in group_order:
+            indices = groups[ind_var_tuple]
+            underlying_dist = underlying_dists[ind_var_tuple]
+            values = underlying_dist.generate_n(len(indices))
+            for (i, value) in zip(indices, values):
+                results[i] = value
+        return results
+
     def size_pdf(self):
         """
         Returns the number of distinct items that could be generated
@@ -319,6 +319,22 @@ class IndependentDistributionTest(unittest.TestCase):
         self.assertEqual(dist.size(), 2)
         self.assertSetEqual(dist.support(), set(['hello', 'there']))
 
+    def helper_generate_n_matches_generate(self, dist):
+        """
+        Test template:
+
+        generate_n(k) should produce exactly what k calls to generate()
+        would produce from the same seed.
+        """
+        dist.add('hello', 2)
+        dist.add('there', 1)
+        dist.add('world', 5)
+        spar_random.seed(self.seed)
+        expected = [dist.generate() for _ in xrange(1000)]
+        spar_random.seed(self.seed)
+        self.assertListEqual(dist.generate_n(1000), expected, self.seed_msg)
+        self.assertListEqual(dist.generate_n(0), [])
+
         
     def test_compact_distribution_buckets(self):
         """
@@ -437,6 +453,12 @@ class IndependentDistributionTest(unittest.TestCase):
         dist = self.simple_dist
         self.helper_remap_postgeneration(dist)
 
+    def test_compact_generate_n(self):
+        self.helper_generate_n_matches_generate(self.compact_dist)
+
+    def test_simple_generate_n(self):
+        self.helper_generate_n_matches_generate(self.simple_dist)
+
     def test_simple_support_and_size(self):
         """
         Run the helper_support_and_size test on
@@ -766,6 +788,32 @@ class ConditionalDistributionTest(unittest.TestCase):
                         self.seed_msg)
 
 
+    def helper_generate_n(self, dist):
+        """
+        Test template:
+
+        generate_n() should condition each item on its own ind_vars,
+        even when the ind_vars are interleaved, and should handle
+        ind_vars never seen by add().
+        """
+        dist.add('hello', 1, True, True)
+        dist.add('there', 1, True, False)
+        dist.add('world', 1, False, False)
+
+        ind_vars_list = []
+        for i in xrange(3000):
+            ind_vars_list.append({VARS.FOO : (i % 3 != 2),
+                                  VARS.BAR : (i % 3 == 0)})
+        ind_vars_list.append({VARS.FOO : False, VARS.BAR : True})
+        values = dist.generate_n(len(ind_vars_list), ind_vars_list)
+        self.assertEqual(len(values), len(ind_vars_list))
+        for (i, value) in enumerate(values[:-1]):
+            self.assertEqual(value, ['hello', 'there', 'world'][i % 3],
+                             self.seed_msg)
+        self.assertIn(values[-1], ['hello', 'there', 'world'])
+        self.assertListEqual(dist.generate_n(0, []), [])
+
+
     def helper_correct_remap(self, dist):
         """
         Test template:
@@ -955,3 +1003,20 @@ class ConditionalDistributionTest(unittest.TestCase):
         dist = self.simple_dist_2d
         self.helper_support(dist)
 
+
+    def test_compact_distribution_generate_n(self):
+        """
+        Run the helper_generate_n template on a
+        CompactConditionalDistribution.
+        """
+        dist = self.compact_dist_2d
+        self.helper_generate_n(dist)
+
+
+    def test_simple_distribution_generate_n(self):
+        """
+        Run the helper_generate_n template on a
+        SimpleConditionalDistribution.
+        """
+        dist = self.simple_dist_2d
+        self.helper_generate_n(dist)
@@ -0,0 +1,284 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Read-only, shared-memory copies of learned
+#                      distributions for multi-process data generation
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+"""
+In multi-process mode, every worker process gets its own copy of the
+DistributionHolder. Even though the workers are forked (and so start out
+sharing the mothership's memory), CPython touches the reference count of
+every object it reads. Generating rows therefore slowly copies every page
+holding the learned PUMS, name, zip-code and street-address
+distributions into every worker, which adds up to a great deal of
+duplicated memory on a machine with many cores.
+
+This module fixes that by 'freezing' a DistributionHolder: the
+independent distributions (including the underlying distributions of
+every conditional distribution) are replaced by FrozenIndependentDistribution
+objects whose values and cumulative counts live in numpy arrays. All of
+those arrays are views into a single anonymous shared mmap, allocated by a
+SharedArrayArena before the workers are forked, and are never written
+afterwards. Strings are packed into one byte-array plus offsets, and
+integers into an int64 array, so that there are no per-value Python
+objects left to be touched.
+
+A frozen distribution consumes the random-number stream exactly as the
+original did, and so generates exactly the same rows from the same seeds.
+It only supports the methods used during row-generation: generate(),
+generate_n(), size() and support(). Query-generation (which calls things
+like generate_pdf()) should keep using the original distributions.
+
+Basic usage:
+
+  frozen_holder = freeze_distribution_holder(dist_holder)
+"""
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..')
+sys.path.append(base_dir)
+
+import collections
+import copy
+import mmap
+import numpy
+import spar_python.common.spar_random as spar_random
+import spar_python.common.distributions.base_distributions \
+    as base_distributions
+import spar_python.common.distributions.distribution_holder \
+    as distribution_holder
+
+
+# Arrays are packed into the shared buffer on 8-byte boundaries
+_ALIGNMENT = 8
+
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+# Objects from modules in this package (bespoke distributions, the XML
+# generator, etc.) are searched for distributions to freeze.
+_PACKAGE_PREFIX = 'spar_python.common.distributions.'
+
+
+
+class SharedArrayArena(object):
+    """
+    Collects numpy arrays that belong to frozen distributions and then
+    moves all of them into a single anonymous shared mmap. Since the
+    mmap is shared (rather than private) and is never written after
+    share() is called, processes forked afterwards all read the same
+    physical pages.
+
+    Usage:
+      arena = SharedArrayArena()
+      arena.add(owner, 'attribute_name', some_array)
+      ...
+      arena.share()
+
+    add() sets owner.attribute_name to the array immediately, and share()
+    replaces it with a read-only view into the shared buffer.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._buffer = None
+        self.nbytes = 0
+
+    def add(self, owner, attr, array):
+        assert self._buffer is None
+        setattr(owner, attr, array)
+        self._pending.append((owner, attr, array))
+
+    def share(self):
+        assert self._buffer is None
+        offsets = []
+        size = 0
+        for (_, _, array) in self._pending:
+            offsets.append(size)
+            size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        # mmap will not allocate an empty buffer
+        self._buffer = mmap.mmap(-1, max(size, _ALIGNMENT))
+        self.nbytes = size
+        for ((owner, attr, array), offset) in zip(self._pending, offsets):
+            if len(array):
+                view = numpy.frombuffer(self._buffer,
+                                        dtype = array.dtype,
+                                        count = len(array),
+                                        offset = offset)
+                view[:] = array
+            else:
+                view = numpy.empty(0, dtype = array.dtype)
+            view.flags.writeable = False
+            setattr(owner, attr, view)
+        self._pending = []
+
+
+
+class FrozenIndependentDistribution(object):
+    """
+    A read-only, array-backed copy of a CompactIndependentDistribution or
+    SimpleIndependentDistribution. Generates by drawing
+    x = spar_random.randint(low, high) and returning the value whose
+    cumulative-count interval contains x, which is how both of those
+    classes generate. Which side of the interval is closed (and the
+    bounds of the draw) depends on the class being frozen.
+
+    Values are stored as an int64 array if they are all ints, as a
+    packed byte-array and offsets if they are all strings, and otherwise
+    (rarely) as a plain list.
+    """
+
+    _INT_VALUES = 'int'
+    _STR_VALUES = 'str'
+    _LIST_VALUES = 'list'
+
+    def __init__(self, dist, arena):
+        if type(dist) is base_distributions.SimpleIndependentDistribution:
+            # SimpleIndependentDistribution draws an index into
+            # _added_items, so freeze the run-length encoding of that list.
+            values = []
+            run_ends = []
+            for (i, item) in enumerate(dist._added_items):
+                if values and item == values[-1]:
+                    run_ends[-1] = i + 1
+                else:
+                    values.append(item)
+                    run_ends.append(i + 1)
+            self._low = 0
+            self._high = len(dist._added_items) - 1
+            self._side = 'right'
+            cum_counts = run_ends
+        else:
+            assert type(dist) is \
+                base_distributions.CompactIndependentDistribution
+            (values, cum_counts, total) = dist._get_cdf()
+            self._low = 1
+            self._high = total
+            self._side = 'left'
+        self._size = len(values)
+        arena.add(self, '_cum_counts', numpy.array(cum_counts))
+        self._freeze_values(values, arena)
+
+    def _freeze_values(self, values, arena):
+        if all(type(v) is int for v in values) and \
+                all(_INT64_MIN <= v <= _INT64_MAX for v in values):
+            self._kind = self._INT_VALUES
+            arena.add(self, '_values', numpy.array(values, dtype=numpy.int64))
+        elif all(type(v) is str for v in values):
+            self._kind = self._STR_VALUES
+            ends = numpy.cumsum([len(v) for v in values], dtype=numpy.int64)
+            offsets = numpy.concatenate([numpy.zeros(1, dtype=numpy.int64),
+                                         ends])
+            arena.add(self, '_offsets', offsets)
+            arena.add(self, '_values',
+                      numpy.frombuffer(''.join(values) or '\0',
+                                       dtype=numpy.uint8))
+        else:
+            self._kind = self._LIST_VALUES
+            self._values = list(values)
+
+    def _value(self, idx):
+        if self._kind == self._INT_VALUES:
+            return int(self._values[idx])
+        elif self._kind == self._STR_VALUES:
+            return self._values[self._offsets[idx]:
+                                self._offsets[idx + 1]].tostring()
+        else:
+            return self._values[idx]
+
+    def generate(self, ind_vars=None):
+        assert self._size > 0
+        x = spar_random.randint(self._low, self._high)
+        idx = self._cum_counts.searchsorted(x, side=self._side)
+        return self._value(idx)
+
+    def generate_n(self, k, ind_vars_list=None):
+        assert self._size > 0
+        if k <= 0:
+            return []
+        xs = spar_random.randint(self._low, self._high, k)
+        idxs = self._cum_counts.searchsorted(xs, side=self._side)
+        return [self._value(idx) for idx in idxs]
+
+    def size(self, *args):
+        return self._size
+
+    def support(self, *args):
+        return [self._value(idx) for idx in xrange(self._size)]
+
+
+
+def _freeze(obj, arena, memo):
+    """
+    Returns a frozen copy of obj, recursing into the attributes of the
+    bespoke/wrapper distributions defined in this package (DOB, fuzzed,
+    XML, etc.) so that the distributions they wrap get frozen too.
+    Objects are frozen only once, no matter how many times they are
+    referenced. Anything that cannot be frozen is returned as is.
+    """
+    try:
+        return memo[id(obj)]
+    except KeyError:
+        pass
+
+    if type(obj) in (base_distributions.CompactIndependentDistribution,
+                     base_distributions.SimpleIndependentDistribution):
+        frozen = FrozenIndependentDistribution(obj, arena)
+    elif isinstance(obj, base_distributions.SimpleConditionalDistribution):
+        # Keep the class (so that subclasses like AddressDistribution keep
+        # their generate() methods) but freeze the underlying distributions.
+        # generate() falls back to a random choice from
+        # _underlying_dists.keys(), so the keys must come back in the same
+        # order for the frozen copy to make the same choice.
+        frozen = copy.copy(obj)
+        frozen._underlying_dists = \
+            collections.OrderedDict(
+                (key, _freeze(dist, arena, memo))
+                for (key, dist) in obj._underlying_dists.iteritems())
+        frozen._top_level_dist = _freeze(obj._top_level_dist, arena, memo)
+    elif isinstance(obj, distribution_holder.DistributionHolder):
+        dist_dict = dict((var, _freeze(dist, arena, memo))
+                         for (var, dist) in obj.dist_dict.iteritems())
+        frozen = distribution_holder.DistributionHolder(obj.var_order,
+                                                        obj.var_names,
+                                                        dist_dict)
+    elif isinstance(obj, list):
+        frozen = [_freeze(x, arena, memo) for x in obj]
+        if all(x is y for (x, y) in zip(frozen, obj)):
+            frozen = obj
+    elif hasattr(obj, '__dict__') and \
+            type(obj).__module__.startswith(_PACKAGE_PREFIX):
+        frozen = obj
+        for (attr, value) in vars(obj).items():
+            frozen_value = _freeze(value, arena, memo)
+            if frozen_value is not value:
+                if frozen is obj:
+                    frozen = copy.copy(obj)
+                setattr(frozen, attr, frozen_value)
+    else:
+        frozen = obj
+    memo[id(obj)] = frozen
+    return frozen
+
+
+
+def freeze_distribution_holder(dist_holder):
+    """
+    Returns a copy of dist_holder in which every learned distribution
+    has been frozen into the shared-memory arrays described above.
+    dist_holder itself is not modified (beyond converting any compact
+    distributions to their generation-ready form, which generate()
+    would have done anyway).
+    """
+    arena = SharedArrayArena()
+    frozen_holder = _freeze(dist_holder, arena, {})
+    arena.share()
+    return frozen_holder
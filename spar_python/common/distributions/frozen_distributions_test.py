@@ -0,0 +1,120 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Tests for frozen_distributions.py
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..')
+sys.path.append(base_dir)
+
+import spar_python.common.distributions.base_distributions \
+    as base_distributions
+import spar_python.common.distributions.bespoke_distributions \
+    as bespoke_distributions
+import spar_python.common.distributions.distribution_holder \
+    as distribution_holder
+import spar_python.common.distributions.frozen_distributions \
+    as frozen_distributions
+import spar_python.common.spar_random as spar_random
+import spar_python.data_generation.spar_variables as sv
+import spar_python.common.enum as enum
+import time
+import unittest
+
+VARS = enum.Enum('AHA', 'BAR', 'FOO')
+
+
+class FrozenDistributionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.seed = int(time.time())
+        self.seed_msg = "Random seed used for this test: %s" % self.seed
+        self.longMessage = True
+        spar_random.seed(self.seed)
+
+    def freeze(self, dist):
+        holder = distribution_holder.DistributionHolder([VARS.AHA],
+                                                        ['AHA'],
+                                                        {VARS.AHA: dist})
+        frozen_holder = \
+            frozen_distributions.freeze_distribution_holder(holder)
+        return frozen_holder.dist_dict[VARS.AHA]
+
+    def helper_same_output(self, dist, frozen, ind_vars={}, num=500):
+        spar_random.seed(self.seed)
+        expected = [dist.generate(ind_vars) for _ in xrange(num)]
+        spar_random.seed(self.seed)
+        actual = [frozen.generate(ind_vars) for _ in xrange(num)]
+        self.assertListEqual(actual, expected, self.seed_msg)
+        for (e, a) in zip(expected, actual):
+            self.assertIs(type(a), type(e))
+
+    def test_compact_strings(self):
+        dist = base_distributions.CompactIndependentDistribution()
+        dist.add('hello', 2.5)
+        dist.add('', 1)
+        dist.add('world', 7.25)
+        frozen = self.freeze(dist)
+        self.assertIsInstance(frozen,
+                              frozen_distributions.FrozenIndependentDistribution)
+        self.helper_same_output(dist, frozen)
+        self.assertEqual(frozen.size(), 3)
+        self.assertSetEqual(set(frozen.support()), set(['hello', '', 'world']))
+
+    def test_compact_ints(self):
+        dist = base_distributions.CompactIndependentDistribution()
+        for i in xrange(20):
+            dist.add(i * 1000, i + 1)
+        frozen = self.freeze(dist)
+        self.helper_same_output(dist, frozen)
+        spar_random.seed(self.seed)
+        expected = dist.generate_n(100)
+        spar_random.seed(self.seed)
+        self.assertListEqual(frozen.generate_n(100), expected, self.seed_msg)
+
+    def test_simple_mixed(self):
+        dist = base_distributions.SimpleIndependentDistribution()
+        dist.add('a', 2)
+        dist.add(('b', 1), 1)
+        dist.add('a', 3)
+        dist.add(None, 1)
+        frozen = self.freeze(dist)
+        self.helper_same_output(dist, frozen)
+
+    def test_conditional(self):
+        dist = bespoke_distributions.AddressDistribution()
+        dist.add('MAIN ST', 1, '02134')
+        dist.add('ELM ST', 3, '02134')
+        dist.add('OAK AVE', 1, '90210')
+        frozen = self.freeze(dist)
+        self.assertIsInstance(frozen, bespoke_distributions.AddressDistribution)
+        self.helper_same_output(dist, frozen, {sv.VARS.ZIP_CODE: '02134'})
+        self.helper_same_output(dist, frozen, {sv.VARS.ZIP_CODE: '90210'})
+        self.helper_same_output(dist, frozen, {sv.VARS.ZIP_CODE: '00000'})
+
+    def test_wrapped_distribution(self):
+        age_dist = base_distributions.CompactIndependentDistribution()
+        for age in xrange(1, 90):
+            age_dist.add(age, 90 - age)
+        dist = bespoke_distributions.DOBDistribution(age_dist)
+        frozen = self.freeze(dist)
+        self.assertIsInstance(frozen.age_dist,
+                              frozen_distributions.FrozenIndependentDistribution)
+        self.assertIs(dist.age_dist, age_dist)
+        self.helper_same_output(dist, frozen)
+
+    def test_read_only(self):
+        dist = base_distributions.CompactIndependentDistribution()
+        dist.add('hello', 2)
+        frozen = self.freeze(dist)
+        with self.assertRaises(ValueError):
+            frozen._cum_counts[0] = 5
@@ -12,6 +12,8 @@
 # *****************************************************************
 
 
+import array
+
 import spar_python.common.spar_stemming as spar_stemming
 import spar_python.common.spar_random as spar_random
 
@@ -39,6 +41,12 @@ class GeneratedText(object):
     * upper_case_list[i] is word_list[i].upper()
     
     If word_list[i] is not a word, then stem_list[i] is None.
+
+    Text made by the TextGenerator is instead stored as a list of token IDs
+    into the generator's (shared) TokenVocabulary; see from_token_ids(). The
+    three lists above are then only built if someone asks for them, and
+    word_set, upper_set and stem_set are built from the distinct token IDs
+    with array lookups into the vocabulary.
     
     Also, this class exports two attributes indicating the presence or 
     absence of alarmwords:
@@ -61,30 +69,53 @@ class GeneratedText(object):
     
     """
 
-    def __init__(self, word_list, stem_list, upper_word_list):
+    # A useful set for filtering out non-words. (Filled in on first use, to
+    # avoid a circular import of TextGenerator.)
+    _non_words = None
 
-        # Do this hear to avoid circular imports
-        from spar_python.common.distributions.text_generator import TextGenerator
+    def __init__(self, word_list, stem_list, upper_word_list):
 
         assert len(word_list) == len(upper_word_list)
         assert len(word_list) == len(stem_list)
         assert None not in word_list, (word_list, upper_word_list)
         assert None not in upper_word_list, (word_list, upper_word_list)      
 
-        self.word_list = word_list
-        self.stem_list = stem_list
-        self.upper_word_list = upper_word_list
+        self._vocabulary = None
+        self._token_ids = None
+        self._word_list = word_list
+        self._stem_list = stem_list
+        self._upper_word_list = upper_word_list
+        self._init_helpers()
+
+
+    @classmethod
+    def from_token_ids(cls, vocabulary, token_ids):
+        '''
+        Returns the GeneratedText for the given list of token IDs into
+        vocabulary (a TokenVocabulary). The list is kept, not copied.
+        '''
+        generated_text = cls.__new__(cls)
+        generated_text._vocabulary = vocabulary
+        generated_text._token_ids = token_ids
+        generated_text._word_list = None
+        generated_text._stem_list = None
+        generated_text._upper_word_list = None
+        generated_text._init_helpers()
+        return generated_text
+
+
+    def _init_helpers(self):
         
         # These will be given values by methods so that they only need
         # to be computed once
-        self._cased_string = None
-        self._upper_string = None
-        self._word_set = None
-        self._stem_set = None
-        self._upper_set = None
-                
-        # A useful set for filtering out non-words
-        self._non_words = frozenset(TextGenerator.START_TOKENS | set([' ']))
+        self._reset_helpers()
+
+        if GeneratedText._non_words is None:
+            # Do this hear to avoid circular imports
+            from spar_python.common.distributions.text_generator \
+                import TextGenerator
+            GeneratedText._non_words = \
+                frozenset(TextGenerator.START_TOKENS | set([' ']))
 
         # Attributes to signal information about the presence/absence of
         # alarmwords
@@ -94,8 +125,60 @@ class GeneratedText(object):
         # For the moment, cannot add alarmwords to this object more than once.
         self._alarmwords_added = False
 
+    def __getstate__(self):
+        '''
+        Pickles as lists of strings, rather than dragging the whole
+        vocabulary along.
+        '''
+        state = self.__dict__.copy()
+        state['_word_list'] = self.word_list
+        state['_stem_list'] = self.stem_list
+        state['_upper_word_list'] = self.upper_word_list
+        state['_vocabulary'] = None
+        state['_token_ids'] = None
+        return state
+
+
+    @property
+    def token_ids(self):
+        '''
+        The list of token IDs into vocabulary, or None if this text was
+        built from lists of strings.
+        '''
+        return self._token_ids
+
+    @property
+    def vocabulary(self):
+        '''
+        The TokenVocabulary of token_ids, or None.
+        '''
+        return self._vocabulary
+
+    @property
+    def word_list(self):
+        if self._word_list is None:
+            words = self._vocabulary.words
+            self._word_list = [words[i] for i in self._token_ids]
+        return self._word_list
+
+    @property
+    def stem_list(self):
+        if self._stem_list is None:
+            stems = self._vocabulary.stems
+            self._stem_list = [stems[i] for i in self._token_ids]
+        return self._stem_list
+
+    @property
+    def upper_word_list(self):
+        if self._upper_word_list is None:
+            uppers = self._vocabulary.uppers
+            self._upper_word_list = [uppers[i] for i in self._token_ids]
+        return self._upper_word_list
+
+
     def _reset_helpers(self):        
         # re-set all pre-computed auxilary information
+        self._distinct_ids = None
         self._cased_string = None
         self._upper_string = None
         self._word_set = None
@@ -124,17 +207,45 @@ class GeneratedText(object):
         return not (token in self._non_words)
 
 
+    def distinct_token_ids(self):
+        '''
+        Returns the distinct token IDs in this text as a sorted array, or
+        None if this text was built from lists of strings.
+        '''
+        if self._token_ids is None:
+            return None
+        if self._distinct_ids is None:
+            self._distinct_ids = array.array('i',
+                                             sorted(set(self._token_ids)))
+        return self._distinct_ids
+
+    def _distinct_word_ids(self):
+        '''
+        Returns the distinct token IDs of the words (not spaces or
+        punctuation) in this text. Only for texts with token IDs.
+        '''
+        is_word = self._vocabulary.is_word
+        return [i for i in self.distinct_token_ids() if is_word[i]]
+
     @property
     def word_set(self):
         if not self._word_set:
-            real_words = filter(self._is_real_word, self.word_list)
+            if self._token_ids is not None:
+                words = self._vocabulary.words
+                real_words = [words[i] for i in self._distinct_word_ids()]
+            else:
+                real_words = filter(self._is_real_word, self.word_list)
             self._word_set = frozenset(real_words)
         return self._word_set
 
     @property
     def upper_set(self):
         if not self._upper_set:
-            real_uppers = filter(self._is_real_word, self.upper_word_list)
+            if self._token_ids is not None:
+                uppers = self._vocabulary.uppers
+                real_uppers = [uppers[i] for i in self._distinct_word_ids()]
+            else:
+                real_uppers = filter(self._is_real_word, self.upper_word_list)
             self._upper_set = frozenset(real_uppers)
         return self._upper_set
 
@@ -142,12 +253,37 @@ class GeneratedText(object):
     @property
     def stem_set(self):
         if not self._stem_set:
-            real_stems = filter(lambda s: s is not None, self.stem_list)
+            if self._token_ids is not None:
+                stems = self._vocabulary.stems
+                real_stems = [stems[i] for i in self.distinct_token_ids()
+                              if stems[i] is not None]
+            else:
+                real_stems = filter(lambda s: s is not None, self.stem_list)
             self._stem_set = frozenset(real_stems)
         return self._stem_set
 
 
     
+    def _insert_tokens(self, insert_point, triples):
+        '''
+        Inserts the (word, stem, upper) triples at insert_point, in order.
+        '''
+        if self._token_ids is not None:
+            vocabulary = self._vocabulary
+            new_ids = [vocabulary.intern(word, stem, upper,
+                                         self._is_real_word(word))
+                       for (word, stem, upper) in triples]
+            self._token_ids[insert_point:insert_point] = new_ids
+            self._word_list = None
+            self._stem_list = None
+            self._upper_word_list = None
+        else:
+            for (word, stem, upper) in reversed(triples):
+                self.word_list.insert(insert_point, word)
+                self.stem_list.insert(insert_point, stem)
+                self.upper_word_list.insert(insert_point, upper)
+
+
     def upper(self):
         """
         Equal to `self.str().upper()`, but faster.
@@ -197,13 +333,9 @@ class GeneratedText(object):
         # break anything (and is even to be expected in real human-generated
         # text.
         
-        # Note: the order of the next loop is fragile:
-        for (word, stem, upper) in [(' ', None, ' '),
-                                    (alarmword, stem, word_upper),
-                                    (' ', None, ' ')]:
-            self.word_list.insert(insert_point, word)
-            self.stem_list.insert(insert_point, stem,)
-            self.upper_word_list.insert(insert_point, upper)
+        self._insert_tokens(insert_point, [(' ', None, ' '),
+                                           (alarmword, stem, word_upper),
+                                           (' ', None, ' ')])
                 
         self._reset_helpers()
         self._alarmwords_added = True
@@ -291,14 +423,9 @@ class GeneratedText(object):
             # text.
 
             
-            for (word_entry, stem_entry, upper_entry) in [(' ', None, ' '),
-                                                          (word, stem, 
-                                                           word_upper),
-                                                          (' ', None, ' ')]:
-
-                self.word_list.insert(insert_point, word_entry)
-                self.stem_list.insert(insert_point, stem_entry)
-                self.upper_word_list.insert(insert_point, upper_entry)
+            self._insert_tokens(insert_point, [(' ', None, ' '),
+                                               (word, stem, word_upper),
+                                               (' ', None, ' ')])
 
         self._reset_helpers()
         self._alarmwords_added = True
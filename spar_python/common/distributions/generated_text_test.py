@@ -18,9 +18,12 @@ sys.path.append(base_dir)
 import unittest
 import collections
 import copy
+import cPickle
 import re
 
 from spar_python.common.distributions.generated_text import GeneratedText
+from spar_python.common.distributions.token_vocabulary import TokenVocabulary
+import spar_python.common.spar_random as spar_random
 
 class GeneratedTextTest(unittest.TestCase):
 
@@ -227,3 +230,111 @@ class GeneratedTextTest(unittest.TestCase):
                           self.generated_text.add_two_alarmwords,
                           'quadge', 'splonk', 100)
         
+
+
+
+class GeneratedTextTokenIdTest(unittest.TestCase):
+    """
+    GeneratedText objects built from token IDs should behave exactly like
+    those built from lists.
+    """
+
+    def setUp(self):
+        self.word_list = ['It', ' ', 'was', ' ', 'the', ' ', 'best', ' ',
+                          'of', ' ', 'times', '.', ' ', 'It', ' ', 'was',
+                          ' ', 'the', ' ', 'worst', ' ', 'of', ' ', 'times',
+                          '.']
+        self.stem_list = [None if w in ' .' else w.lower().rstrip('s')
+                          for w in self.word_list]
+        self.upper_word_list = [word.upper() for word in self.word_list]
+        self.vocabulary = TokenVocabulary()
+        self.token_ids = [self.vocabulary.intern(w, s, u, s is not None)
+                          for (w, s, u) in zip(self.word_list,
+                                               self.stem_list,
+                                               self.upper_word_list)]
+
+    def make_texts(self):
+        from_lists = GeneratedText(list(self.word_list),
+                                   list(self.stem_list),
+                                   list(self.upper_word_list))
+        from_ids = GeneratedText.from_token_ids(self.vocabulary,
+                                                list(self.token_ids))
+        return (from_lists, from_ids)
+
+    def assert_same(self, from_lists, from_ids):
+        self.assertEqual(str(from_ids), str(from_lists))
+        self.assertEqual(from_ids.upper(), from_lists.upper())
+        self.assertEqual(len(from_ids), len(from_lists))
+        self.assertListEqual(from_ids.word_list, from_lists.word_list)
+        self.assertListEqual(from_ids.stem_list, from_lists.stem_list)
+        self.assertListEqual(from_ids.upper_word_list,
+                             from_lists.upper_word_list)
+        self.assertEqual(from_ids.word_set, from_lists.word_set)
+        self.assertEqual(from_ids.upper_set, from_lists.upper_set)
+        self.assertEqual(from_ids.stem_set, from_lists.stem_set)
+        self.assertEqual(from_ids.alarmwords, from_lists.alarmwords)
+        self.assertEqual(from_ids.alarmword_distances,
+                         from_lists.alarmword_distances)
+
+    def test_same_as_lists(self):
+        (from_lists, from_ids) = self.make_texts()
+        self.assert_same(from_lists, from_ids)
+        self.assertEqual(len(self.vocabulary), 9)
+        self.assertIsNone(from_lists.token_ids)
+        self.assertTrue(from_ids.contains_stem('time'))
+        self.assertTrue(from_ids.contains_upper('WORST'))
+        self.assertFalse(from_ids.contains_upper('.'))
+
+    def test_add_alarmwords(self):
+        (from_lists, from_ids) = self.make_texts()
+        seed = spar_random.randint(0, 2 ** 30)
+        for (text, vocab_size) in [(from_lists, 9), (from_ids, 10)]:
+            spar_random.seed(seed)
+            text.add_single_alarmword('quadge')
+            self.assertEqual(len(self.vocabulary), vocab_size)
+        self.assert_same(from_lists, from_ids)
+        self.assertIn('quadge', from_ids.word_set)
+
+        (from_lists, from_ids) = self.make_texts()
+        for text in [from_lists, from_ids]:
+            spar_random.seed(seed)
+            text.add_two_alarmwords('quadge', 'splonk', 20)
+        self.assert_same(from_lists, from_ids)
+        # The vocabulary is shared, and was changed in place
+        self.assertIn('splonk', self.vocabulary.words)
+
+    def test_pickle(self):
+        (from_lists, from_ids) = self.make_texts()
+        from_ids.add_single_alarmword('quadge')
+        unpickled = cPickle.loads(cPickle.dumps(from_ids,
+                                                cPickle.HIGHEST_PROTOCOL))
+        self.assertIsNone(unpickled.token_ids)
+        self.assertListEqual(unpickled.word_list, from_ids.word_list)
+        self.assertEqual(unpickled.alarmwords, ['quadge'])
+
+    def test_distinct_token_ids(self):
+        (from_lists, from_ids) = self.make_texts()
+        self.assertIsNone(from_lists.distinct_token_ids())
+        self.assertEqual(list(from_ids.distinct_token_ids()),
+                         sorted(set(self.token_ids)))
+        from_ids.add_single_alarmword('quadge')
+        quadge_id = self.vocabulary.words.index('quadge')
+        self.assertIn(quadge_id, from_ids.distinct_token_ids())
+
+    def test_vocabulary_lookups(self):
+        times_id = self.vocabulary.words.index('times')
+        self.assertEqual(self.vocabulary.token_ids_with_stem('time'),
+                         [times_id])
+        self.assertEqual(self.vocabulary.token_ids_with_upper('TIMES'),
+                         [times_id])
+        # Spaces and punctuation are not words
+        self.assertEqual(self.vocabulary.token_ids_with_upper('.'), [])
+        self.assertEqual(self.vocabulary.token_ids_with_stem('bird'), [])
+        # Tokens added after the lookups are built are found too
+        bird_id = self.vocabulary.intern('Birds', 'bird', 'BIRDS', True)
+        self.assertEqual(self.vocabulary.token_ids_with_stem('bird'),
+                         [bird_id])
+        # and the lookups are rebuilt after pickling
+        unpickled = cPickle.loads(cPickle.dumps(self.vocabulary,
+                                                cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(unpickled.token_ids_with_upper('BIRDS'), [bird_id])
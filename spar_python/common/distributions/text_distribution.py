@@ -289,6 +289,45 @@ class TextDistribution(object):
     
     
     
+    def generate_n(self, k, ind_vars_list=None):
+        """
+        Returns a list of k GeneratedText objects, drawn as by generate()
+        (ind_vars_list is ignored). All k target lengths (and alarmword
+        specs) are drawn first and the texts are then generated with a
+        single call to the TextGenerator's generate_n(). So: the output has
+        the same distribution as k calls to generate(), but is not the same
+        as calling generate() k times from the same seed.
+        """
+        if k <= 0:
+            return []
+        targets = [int(t) for t in spar_random.randint(self.__min_length,
+                                                       self.__max_length, k)]
+        if not self._add_alarmwords:
+            return self.__generator.generate_n(targets)
+
+        alarmword_specs = [self._alarmword_dist.generate() for _ in xrange(k)]
+        new_targets = []
+        for (target, spec) in zip(targets, alarmword_specs):
+            if spec.spec_type == ALARMWORDSPEC.ONE_ALARMWORD:
+                # The extra '2' are for the spaces on either side of the
+                # alarmword
+                target -= len(spec.alarmword) + 2
+            elif spec.spec_type == ALARMWORDSPEC.TWO_ALARMWORDS:
+                # the +4 is for the spaces on either side of the alarmwords
+                target -= len(spec.first_alarmword) + \
+                          len(spec.second_alarmword) + 4
+            new_targets.append(target)
+        generated_texts = self.__generator.generate_n(new_targets)
+        for (generated_text, spec) in zip(generated_texts, alarmword_specs):
+            if spec.spec_type == ALARMWORDSPEC.ONE_ALARMWORD:
+                generated_text.add_single_alarmword(spec.alarmword)
+            elif spec.spec_type == ALARMWORDSPEC.TWO_ALARMWORDS:
+                generated_text.add_two_alarmwords(spec.first_alarmword,
+                                                  spec.second_alarmword,
+                                                  spec.distance)
+        return generated_texts
+
+
     def generate_trigram(self, min=0.0, maxim=1.0):
         """
         Wrapper function for generate_trigram in text_generator
@@ -217,3 +217,30 @@ class TextDistributionTest(unittest.TestCase):
             
         
 
+
+    def test_generate_n(self):
+        """generate_n() should return texts in the requested length range,
+        with alarmwords added as by generate()."""
+        f = StringIO('This is the file. It has tokens in it')
+        gen = TextGenerator((f,))
+        dist = TextDistribution(gen, 100, 200)
+        generated = dist.generate_n(50)
+        self.assertEqual(len(generated), 50)
+        for generated_text in generated:
+            self.assertLessEqual(len(generated_text.str()), 200,
+                                 self.seed_msg)
+            self.assertEqual(generated_text.alarmwords, [])
+        self.assertEqual(dist.generate_n(0), [])
+
+        dist = TextDistribution(gen, 1000, 2000, add_alarmwords = True)
+        num_alarmwords_counts = collections.Counter()
+        for generated_text in dist.generate_n(1000):
+            self.assertLessEqual(len(generated_text.str()), 2000,
+                                 self.seed_msg)
+            for alarmword in generated_text.alarmwords:
+                self.assertIn(' %s ' % alarmword, generated_text.str(),
+                              self.seed_msg)
+            num_alarmwords_counts[len(generated_text.alarmwords)] += 1
+        self.assertGreater(num_alarmwords_counts[0], 700, self.seed_msg)
+        self.assertGreater(num_alarmwords_counts[1], 50, self.seed_msg)
+        self.assertGreater(num_alarmwords_counts[2], 50, self.seed_msg)
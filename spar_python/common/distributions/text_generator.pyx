@@ -24,16 +24,18 @@ from spar_python.common.distributions.base_distributions\
 from spar_python.data_generation.file_iterators\
      import FileTokenIterator
 from spar_python.common.distributions.generated_text import GeneratedText
+from spar_python.common.distributions.token_vocabulary import TokenVocabulary
 from cStringIO import StringIO
 import spar_python.common.spar_stemming as spar_stemming
 
 
-# This C-struct will store, for every word, whetehr it is a start-token and
-# how long it is. This saves us from needing to re-calculate these during
+# This C-struct will store, for every word, whetehr it is a start-token,
+# how long it is and its ID in the vocabulary. This saves us from needing to re-calculate these during
 # text-generation.
 cdef struct TokenMetadata:
     bint is_start_token
     int length
+    int token_id
 
 
 cdef class TextGenerator(object):
@@ -71,11 +73,18 @@ cdef class TextGenerator(object):
     enough characters for three words) or double space (if the last thing 
     appended to the sentence is a space). This is reflected in the unit
     tests for text_generation. 
+
+    Every token (word, space or punctuation) is given an ID in a
+    TokenVocabulary when the corpus is read, and text is generated as a list
+    of token IDs. generate() wraps that list in a GeneratedText, which only
+    builds the word, stem and upper-case strings if asked for them;
+    generate_n() produces many texts in one call.
     
     Sample use:
 
     gen = TextGenerator((file1, file2, file3))
     almost_1000_bytes_of_random_text = gen.generate(1000)
+    many_texts = gen.generate_n([1000, 500, 1000])
     
     """
     
@@ -84,6 +93,8 @@ cdef class TextGenerator(object):
     cdef object __tuple_dist, __tuple_to_word_dist, __stem_upper_mapping
     cdef object __metadata, __stem_to_word
     cdef object __word_dist, __stem_dist, __tri_card
+    cdef object __vocabulary
+    cdef int __space_id, __period_id
     
     # These tokens indicate the start of a sentence.
     START_TOKENS = set(['.', '!', '?', ';', ',', '-'])
@@ -119,6 +130,7 @@ cdef class TextGenerator(object):
             self.__process_file(f)
         # Make sure we have at least 1 starting place.
         assert(self.__tuple_dist.size() > 0)
+        self.__build_vocabulary()
 
     def __process_file(self, corpus_file):
         """Process corpus_file discovering the appropriate distributions."""
@@ -139,6 +151,8 @@ cdef class TextGenerator(object):
             else:
                 metadata.is_start_token = False
             metadata.length = len(tok)
+            # Filled in by __build_vocabulary, once the corpus has been read
+            metadata.token_id = -1
             self.__metadata[tok] = metadata
             
             tokens_found += 1
@@ -190,6 +204,28 @@ cdef class TextGenerator(object):
                 self.__word_dist[tok_length].add(tok.upper(), weight)
                     
 
+    def __build_vocabulary(self):
+        """
+        Gives every token seen in the corpus (plus the space and period we
+        add ourselves) a token ID, and records it in the token's metadata.
+        Tokens are numbered in sorted order so that the IDs do not depend
+        on dictionary order.
+        """
+        cdef TokenMetadata metadata
+        vocabulary = TokenVocabulary()
+        for tok in sorted(self.__metadata):
+            metadata = self.__metadata[tok]
+            if metadata.is_start_token:
+                metadata.token_id = vocabulary.intern(tok, None, tok, False)
+            else:
+                (stem, upper) = self.__stem_upper_mapping[tok]
+                metadata.token_id = vocabulary.intern(tok, stem, upper, True)
+            self.__metadata[tok] = metadata
+        self.__space_id = vocabulary.intern(' ', None, ' ', False)
+        self.__period_id = vocabulary.intern('.', None, '.', False)
+        self.__vocabulary = vocabulary
+
+
     # Developer's note: both of the following methods, __add_start_token
     # and __add_word, used to be combined into one method: __add_word, which
     # would immediately branch on whether or not the input was a start token. 
@@ -202,32 +238,28 @@ cdef class TextGenerator(object):
     # exceptions by returning -1)
 
     cdef int __add_start_token(self, 
-                               object start_token, 
-                               object word_list,
-                               object stem_list,
-                               object upper_list,
+                               int start_token_id, 
+                               object token_ids,
                                int prev_chars_generated, 
                                int max_characters) except -1:
         """
-        Add start-token to the existing (word,stem)-pair list. 
+        Add start-token to the existing token-ID list. 
         
         Args:
-            start_token: The token to add to the buffer.
-            word_list: The word list to which we should add
+            start_token_id: The token ID of the start token to add.
+            token_ids: The token-ID list to which we should add
                             the start token.
-            stem_list: The list of stems corresponding to word_list.
-            upper_list: The list of uppercase-strings corresponding to word_list.
             prev_chars_generated: the number of characters already in
-                                  word_stem_list
+                                  token_ids
             max_characters: the maximum number of characters that can be in 
-                            word_stem_list
+                            token_ids
             
             
         Returns:
-            The number of characters in word_stem_list after addition.
+            The number of characters in token_ids after addition.
             
         Raises:
-            StopIteration, if adding word would raise word_stem_list over
+            StopIteration, if adding word would raise token_ids over
             max_characters
 
         """
@@ -236,45 +268,37 @@ cdef class TextGenerator(object):
         new_length = prev_chars_generated + 1 
         if new_length > max_characters:
             raise StopIteration
-        word_list.append(start_token)
-        stem_list.append(None)
-        upper_list.append(start_token)
+        token_ids.append(start_token_id)
         return new_length
 
 
     # (Note: the 'except -1' at the end allows this C function to raise
     # exceptions by returning -1)
     cdef int __add_word(self, 
-                        object word, 
-                        object stem,
-                        object upper,
+                        int word_id, 
                         int word_length,
-                        object word_list, 
-                        object stem_list, 
-                        object upper_list, 
+                        object token_ids, 
                         int prev_chars_generated, 
                         int max_characters) except -1:
         """
-        Add word to the existing (word,stem)-pair list. Do not call when
-        'word' is a start-token. Use __add_start_token instead.
+        Add word (and the space before it) to the existing token-ID list. Do
+        not call when 'word' is a start-token. Use __add_start_token instead.
         
         Args:
-            word: The word to add to the buffer.
-            word_list: The word list to which we should add
-                            the start token.
-            stem_list: The list of stems corresponding to word_list.
-            upper_list: The list of uppercase-strings corresponding to word_list.
+            word_id: The token ID of the word to add.
+            word_length: The length of the word.
+            token_ids: The token-ID list to which we should add the word.
             prev_chars_generated: the number of characters already in
-                                  word_stem_list
+                                  token_ids
             max_characters: the maximum number of characters that can be in 
-                            word_stem_list
+                            token_ids
             
             
         Returns:
-            The number of characters in word_stem_list after addition.
+            The number of characters in token_ids after addition.
             
         Raises:
-            StopIteration, if adding word would raise word_stem_list over
+            StopIteration, if adding word would raise token_ids over
             max_characters
 
         """
@@ -283,18 +307,42 @@ cdef class TextGenerator(object):
         new_length = prev_chars_generated + 1
         if new_length > max_characters:
             raise StopIteration
-        word_list.append(' ')
-        stem_list.append(None)
-        upper_list.append(' ')
+        token_ids.append(self.__space_id)
         new_length += word_length
         if new_length > max_characters:
             raise StopIteration
-        word_list.append(word)
-        stem_list.append(stem)
-        upper_list.append(upper)
+        token_ids.append(word_id)
         return new_length
 
 
+    def get_state(self):
+        """Returns the learned model as a tuple, which can be handed to
+        set_state() on a fresh TextGenerator.__new__(TextGenerator) to
+        recreate this object without re-reading the corpus. (The extension
+        module is not built under its package name, so pickle cannot find
+        it on its own. See distribution_cache.py.)
+        """
+        return (self.__tuple_dist, self.__tuple_to_word_dist,
+                self.__stem_upper_mapping, self.__word_dist,
+                self.__stem_dist, self.__metadata, self.__stem_to_word,
+                self.__tri_card, self.__vocabulary, self.__space_id,
+                self.__period_id)
+
+    def set_state(self, state):
+        """Restores a model previously returned by get_state()."""
+        (self.__tuple_dist, self.__tuple_to_word_dist,
+         self.__stem_upper_mapping, self.__word_dist,
+         self.__stem_dist, self.__metadata, self.__stem_to_word,
+         self.__tri_card, self.__vocabulary, self.__space_id,
+         self.__period_id) = state
+
+    def vocabulary(self):
+        """
+        Returns the TokenVocabulary shared by all the text generated by this
+        object.
+        """
+        return self.__vocabulary
+
     def generate(self, int max_characters):
         """
         Generate text (that follows the expected distribution) of length <=
@@ -304,13 +352,39 @@ cdef class TextGenerator(object):
             max_characters: cap on the number of characters to generate.
 
         Returns:
-            A triple of lists:
-            * A list of words,
-            * A list of stems, and
-            * A list of upper-case words.
-            
-            For all i, it will be the case that stem[i] is the stem of
-            word[i], and upper[i] will be word[i].upper().
+            A GeneratedText, holding the IDs of its tokens in this
+            object's vocabulary().
+        
+        """
+        return GeneratedText.from_token_ids(self.__vocabulary,
+                                            self.generate_token_ids(max_characters))
+
+    def generate_n(self, targets):
+        """
+        Generate one text for each of the max_characters values in targets.
+        This does exactly what calling generate() on each target in turn
+        would do, but in one call.
+
+        Returns:
+            A list of GeneratedText objects, in the order of targets.
+        """
+        vocabulary = self.__vocabulary
+        from_token_ids = GeneratedText.from_token_ids
+        generate_token_ids = self.generate_token_ids
+        return [from_token_ids(vocabulary, generate_token_ids(target))
+                for target in targets]
+
+    def generate_token_ids(self, int max_characters):
+        """
+        Generate text (that follows the expected distribution) of length <=
+        max_characters.
+        
+        Args:
+            max_characters: cap on the number of characters to generate.
+
+        Returns:
+            A list of the IDs of the generated tokens (words, spaces and
+            punctuation) in this object's vocabulary().
         
         """
         
@@ -325,12 +399,12 @@ cdef class TextGenerator(object):
         
         cdef int characters_generated 
         cdef TokenMetadata first_word_metadata, second_word_metadata, word_metadata
+        cdef TokenMetadata third_last_metadata, second_last_metadata, last_metadata
+        cdef int space_id = self.__space_id
         
         assert(max_characters > 0)
 
-        generated_words = []
-        generated_stems = []
-        generated_uppers = []
+        generated_ids = []
 
         # According to http://wiki.python.org/moin/PythonSpeed/PerformanceTips
         # it takes time to resolve the '.' operation in 'self.anything',
@@ -338,7 +412,6 @@ cdef class TextGenerator(object):
         # out such function look-ups:
         __metadata = self.__metadata
         __tuple_dist_generate = self.__tuple_dist.generate
-        __stem_upper_mapping = self.__stem_upper_mapping
         __tuple_to_word_dist = self.__tuple_to_word_dist
 
 
@@ -348,17 +421,12 @@ cdef class TextGenerator(object):
 
         # Generate the last three words of the sentence from a known 
         # distribution, then add those values to characters_generated
-        last_three_words = []
         cur_tuple = __tuple_dist_generate()
         (third_last_word, second_last_word) = cur_tuple
         last_word = self.__tuple_to_word_dist[(third_last_word,second_last_word)].generate()
-        (third_last_stem, third_last_upper) = __stem_upper_mapping[third_last_word]
-        (second_last_stem, second_last_upper) = __stem_upper_mapping[second_last_word]
-        try:
-            (last_stem, last_upper) = __stem_upper_mapping[last_word]
-        except KeyError:
-            last_stem = None
-            last_upper = last_word.upper()
+        third_last_metadata = __metadata[third_last_word]
+        second_last_metadata = __metadata[second_last_word]
+        last_metadata = __metadata[last_word]
         characters_generated += len(third_last_word) + len(second_last_word) + \
                                 len(last_word) + 4
                         
@@ -373,44 +441,30 @@ cdef class TextGenerator(object):
             # a sentence-ending token. This should be enforced in _process_file,
             # above
             first_word_metadata = __metadata[first_word]
-            (first_stem, first_upper) = __stem_upper_mapping[first_word]
-            characters_generated = self.__add_word(first_word,
-                                              first_stem,
-                                              first_upper,
+            characters_generated = self.__add_word(first_word_metadata.token_id,
                                               first_word_metadata.length, 
-                                              generated_words,
-                                              generated_stems,
-                                              generated_uppers,
+                                              generated_ids,
                                               characters_generated,
                                               max_characters)
                 
             # At this point, __add_word should have added an initial space.
             # Let's remove it.
-            generated_words.pop(0)
-            generated_stems.pop(0)
-            generated_uppers.pop(0)
+            generated_ids.pop(0)
             characters_generated -= 1
             
             # Now, add the second word as usual.
             second_word_metadata = __metadata[second_word]
             if second_word_metadata.is_start_token:
                 last_token_was_sentence = True
-                characters_generated = self.__add_start_token(second_word, 
-                                                         generated_words,
-                                                         generated_stems,
-                                                         generated_uppers,
+                characters_generated = self.__add_start_token(second_word_metadata.token_id, 
+                                                         generated_ids,
                                                          characters_generated,
                                                          max_characters)
             else:
                 last_token_was_sentence = False
-                (second_stem, second_upper) = __stem_upper_mapping[second_word]
-                characters_generated = self.__add_word(second_word,
-                                                  second_stem,
-                                                  second_upper,
+                characters_generated = self.__add_word(second_word_metadata.token_id,
                                                   second_word_metadata.length, 
-                                                  generated_words,
-                                                  generated_stems,
-                                                  generated_uppers,
+                                                  generated_ids,
                                                   characters_generated,
                                                   max_characters)                    
             
@@ -429,15 +483,10 @@ cdef class TextGenerator(object):
                     # with a sentence-ending token. This should be enforced in 
                     # _process-file, above.
                     first_word_metadata = __metadata[first_word]
-                    (first_stem, first_upper) = __stem_upper_mapping[first_word]
                     characters_generated = \
-                        self.__add_word(first_word, 
-                                   first_stem,
-                                   first_upper,
+                        self.__add_word(first_word_metadata.token_id, 
                                    first_word_metadata.length,     
-                                   generated_words,
-                                   generated_stems,
-                                   generated_uppers,
+                                   generated_ids,
                                    characters_generated,
                                    max_characters)
                         
@@ -445,23 +494,16 @@ cdef class TextGenerator(object):
                     if second_word_metadata.is_start_token:
                         last_token_was_sentence = True
                         characters_generated = \
-                            self.__add_start_token(second_word, 
-                                              generated_words,
-                                              generated_stems,
-                                              generated_uppers,
+                            self.__add_start_token(second_word_metadata.token_id, 
+                                              generated_ids,
                                               characters_generated,
                                               max_characters)
                     else:
                         last_token_was_sentence = False
-                        (second_stem, second_upper) = __stem_upper_mapping[second_word]
                         characters_generated = \
-                            self.__add_word(second_word,
-                                       second_stem,
-                                       second_upper,
+                            self.__add_word(second_word_metadata.token_id,
                                        second_word_metadata.length, 
-                                       generated_words,
-                                       generated_stems,
-                                       generated_uppers,
+                                       generated_ids,
                                        characters_generated,
                                        max_characters)                    
                     
@@ -472,10 +514,8 @@ cdef class TextGenerator(object):
                     except KeyError:
                         last_token_was_sentence = True
                         characters_generated = \
-                            self.__add_start_token('.', 
-                                              generated_words,
-                                              generated_stems,
-                                              generated_uppers,
+                            self.__add_start_token(self.__period_id, 
+                                              generated_ids,
                                               characters_generated,
                                               max_characters)
                     else:
@@ -484,23 +524,16 @@ cdef class TextGenerator(object):
                         if word_metadata.is_start_token:
                             last_token_was_sentence = True
                             characters_generated = \
-                                self.__add_start_token(word, 
-                                                  generated_words,
-                                                  generated_stems,
-                                                  generated_uppers,
+                                self.__add_start_token(word_metadata.token_id, 
+                                                  generated_ids,
                                                   characters_generated,
                                                   max_characters)
                         else:
                             last_token_was_sentence = False
-                            (stem, upper) = __stem_upper_mapping[word]
                             characters_generated = \
-                                self.__add_word(word,
-                                           stem,
-                                           upper,
+                                self.__add_word(word_metadata.token_id,
                                            word_metadata.length, 
-                                           generated_words,
-                                           generated_stems,
-                                           generated_uppers,
+                                           generated_ids,
                                            characters_generated,
                                            max_characters)                    
                             # Remove the left-most word from the tuple and 
@@ -509,39 +542,16 @@ cdef class TextGenerator(object):
                     
 
         except StopIteration:
-            generated_words.append(' ')
-            generated_stems.append(None)
-            generated_uppers.append(' ')
-            
-            generated_words.append(third_last_word)
-            generated_stems.append(third_last_stem)
-            generated_uppers.append(third_last_upper)
-
-            generated_words.append(' ')
-            generated_stems.append(None)
-            generated_uppers.append(' ')
-
-            generated_words.append(second_last_word)
-            generated_stems.append(second_last_stem)
-            generated_uppers.append(second_last_upper)
-
-            generated_words.append(' ')
-            generated_stems.append(None)
-            generated_uppers.append(' ')
-
-            generated_words.append(last_word)
-            generated_stems.append(last_stem)
-            generated_uppers.append(last_upper)
+            generated_ids.extend([space_id, third_last_metadata.token_id,
+                                  space_id, second_last_metadata.token_id,
+                                  space_id, last_metadata.token_id])
             
             if last_word!='.':
-                generated_words.append('.')
-                generated_stems.append(None)
-                generated_uppers.append('.')
+                generated_ids.append(self.__period_id)
 
-            return GeneratedText(generated_words, 
-                                 generated_stems, 
-                                 generated_uppers)
+            return generated_ids
         
+
     def generate_trigram(self, minim, maxim):
         """
         Generate starting trigram that follow the expected distribution
@@ -320,3 +320,30 @@ class TextGeneratorTest(unittest.TestCase):
         self.assertEqual(gen.word_cardinality(3), 1, self.seed_msg)    
         self.assertEqual(gen.word_cardinality(4), 1, self.seed_msg)
 
+
+    def test_generate_n(self):
+        """generate_n() should produce exactly the texts that calling
+        generate() once per target would, and every token ID should
+        agree with the text's word, stem and upper-case lists."""
+        f = StringIO('This is this. This is that. Is this a cat? '
+                     'That cat is running, and this cat ran.')
+        gen = TextGenerator((f,))
+        targets = [spar_random.randint(1, 200) for _ in xrange(20)]
+        spar_random.seed(self.seed)
+        expected = [gen.generate(target) for target in targets]
+        spar_random.seed(self.seed)
+        gened_texts = gen.generate_n(targets)
+        self.assertEqual(len(gened_texts), len(targets))
+        vocabulary = gen.vocabulary()
+        for (gened_text, expected_text) in zip(gened_texts, expected):
+            self.assertEqual(str(gened_text), str(expected_text),
+                             self.seed_msg)
+            self.assertIs(gened_text.vocabulary, vocabulary)
+            token_ids = gened_text.token_ids
+            self.assertListEqual([vocabulary.words[i] for i in token_ids],
+                                 gened_text.word_list, self.seed_msg)
+            self.assertListEqual([vocabulary.stems[i] for i in token_ids],
+                                 gened_text.stem_list, self.seed_msg)
+            self.assertListEqual([w.upper() for w in gened_text.word_list],
+                                 gened_text.upper_word_list, self.seed_msg)
+        self.assertListEqual(gen.generate_n([]), [])
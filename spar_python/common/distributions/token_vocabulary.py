@@ -0,0 +1,111 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Shared vocabulary of the tokens in generated text
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+
+class TokenVocabulary(object):
+    """
+    Gives every distinct token the TextGenerator can produce a small integer
+    ID, so that generated text can be stored as a list of token IDs rather
+    than as three parallel lists of strings (see GeneratedText). For each
+    token ID i, the vocabulary holds:
+
+    * words[i]: the token as it appears in the text (spaces and punctuation
+    are tokens too),
+
+    * stems[i]: the stem of the word, or None if the token is not a word,
+
+    * uppers[i]: the upper-case version of words[i], and
+
+    * is_word[i]: False for spaces and punctuation, which are left out of
+    GeneratedText.word_set and upper_set.
+
+    A vocabulary is built once per TextGenerator and shared by all the text
+    it generates. Tokens can be added later (for alarmwords, say) but never
+    removed or changed, so token IDs stay valid.
+
+    token_ids_with_stem() and token_ids_with_upper() go the other way, from
+    a stem (or upper-case word) to the IDs of the word tokens which have it.
+    This lets keyword and stem queries be turned into sets of token IDs
+    once, rather than comparing strings for every text (see
+    multi_query_matcher.py).
+    """
+
+    def __init__(self):
+        self.words = []
+        self.stems = []
+        self.uppers = []
+        self.is_word = []
+        self.__ids = {}
+        # Built on first use: see token_ids_with_stem() and
+        # token_ids_with_upper()
+        self.__stem_index = None
+        self.__upper_index = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_TokenVocabulary__stem_index'] = None
+        state['_TokenVocabulary__upper_index'] = None
+        return state
+
+    def __len__(self):
+        return len(self.words)
+
+    def intern(self, word, stem, upper, is_word):
+        '''
+        Returns the token ID for the given (word, stem, upper) triple, adding
+        it to the vocabulary if it is new.
+        '''
+        key = (word, stem, upper)
+        try:
+            return self.__ids[key]
+        except KeyError:
+            token_id = len(self.words)
+            self.words.append(word)
+            self.stems.append(stem)
+            self.uppers.append(upper)
+            self.is_word.append(is_word)
+            self.__ids[key] = token_id
+            if self.__stem_index is not None:
+                self.__index_token(token_id)
+            return token_id
+
+    def __index_token(self, token_id):
+        if self.stems[token_id] is not None:
+            self.__stem_index.setdefault(self.stems[token_id],
+                                         []).append(token_id)
+        if self.is_word[token_id]:
+            self.__upper_index.setdefault(self.uppers[token_id],
+                                          []).append(token_id)
+
+    def __build_indices(self):
+        self.__stem_index = {}
+        self.__upper_index = {}
+        for token_id in xrange(len(self.words)):
+            self.__index_token(token_id)
+
+    def token_ids_with_stem(self, stem):
+        '''
+        Returns the list of IDs of the tokens whose stem is stem. (These
+        are the tokens which make GeneratedText.contains_stem(stem) true.)
+        '''
+        if self.__stem_index is None:
+            self.__build_indices()
+        return self.__stem_index.get(stem, [])
+
+    def token_ids_with_upper(self, upper):
+        '''
+        Returns the list of IDs of the word tokens whose upper-case version
+        is upper. (These are the tokens which make
+        GeneratedText.contains_upper(upper) true.)
+        '''
+        if self.__upper_index is None:
+            self.__build_indices()
+        return self.__upper_index.get(upper, [])
@@ -79,29 +79,102 @@ def weight_vector(i):
 XML_DEPTH = 3
 FAN_OUT = 5
 
-class GeneratedXml(object):
+
+def _escape_text(text):
+    """
+    Escapes text the same way ElementTree.tostring() does.
+    """
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if isinstance(text, unicode):
+        text = text.encode('us-ascii', 'xmlcharrefreplace')
+    return text
+
+
+def _serialize_node(node, parts):
     """
-    Class to hold arificial XML generated by the XmlGenerator class. Note that
-    this class (GeneratedXml) is mostly a thin wrapper around an ElementTree
-    (see xml.etree.ElementTree) passed in to the constructor. Indeed, some
-    methods of this class (e.g., matches_xpath_expression()) are passed through
-    to the underlying ElementTree. However, two methods (has_leaf() and
-    has_path()) are bottlenecks and hence are heavily optimized. 
+    Appends the string form of the given (tag, value, children) node, and
+    all the nodes below it, to the list parts. The result is exactly what
+    ElementTree.tostring() would produce for the equivalent Element.
+    """
+    (tag, value, children) = node
+    if value is None and not children:
+        parts.append('<%s />' % tag)
+    else:
+        parts.append('<%s>' % tag)
+        if value is not None:
+            parts.append(_escape_text(value))
+        if children:
+            for child in children:
+                _serialize_node(child, parts)
+        parts.append('</%s>' % tag)
+
+
+def _node_to_element(node):
+    """
+    Returns the Element equivalent to the given (tag, value, children) node.
+    """
+    (tag, value, children) = node
+    element = ElementTree.Element(tag)
+    if value is not None:
+        element.text = value
+    if children:
+        for child in children:
+            element.append(_node_to_element(child))
+    return element
 
+
+class GeneratedXml(object):
+    """
+    Class to hold arificial XML generated by the XmlGenerator class. Two
+    methods of this class (has_leaf() and has_path()) are bottlenecks and
+    hence are heavily optimized: they are set lookups against the (tag,
+    value) pairs of the leaves and the tag-paths to the leaves, which are
+    computed once, up front.
+
+    The XML itself is held in one of two forms:
+
+    * As a tree of lightweight nodes, each a (tag, value, children) tuple
+      where children is None for a leaf. This is what XmlGenerator produces
+      (see from_nodes()), along with the leaf and path sets, so that data
+      generation never has to build or walk an ElementTree. The string form
+      is serialized straight from these nodes, and the ElementTree needed by
+      matches_xpath_expression() and matches_query() is only built if one of
+      them (or to_etree()) is called.
+
+    * As an ElementTree (see xml.etree.ElementTree) passed in to the
+      constructor, in which case the leaf and path sets are computed by
+      walking it.
     """
     
-    def __init__(self, etree):
+    def __init__(self, etree=None, root=None, leaves=None, paths=None):
+        # Exactly one of etree and root should be given. Most callers
+        # should use GeneratedXml(etree) or GeneratedXml.from_nodes().
         self._etree = etree
+        self._root = root
 
         # The following hold data derived from the etree, so as to memoize
         # work and optimize the query-aggregation
         self._str_form = None
         
         # will hold (tag, value) pairs for all leaves
-        self._leaves = self._precompute_leaves(etree) 
+        if leaves is None:
+            leaves = self._precompute_leaves(etree)
+        self._leaves = leaves
         
         # will hold (tag1, tag2, ... leaf-tag, leaf-value tuples for all paths
-        self._paths = self._precompute_paths(etree)
+        if paths is None:
+            paths = self._precompute_paths(etree)
+        self._paths = paths
+
+    @classmethod
+    def from_nodes(cls, root, leaves, paths):
+        """
+        Returns a GeneratedXml for the tree of (tag, value, children) nodes
+        rooted at root. leaves and paths must be the sets that
+        _precompute_leaves() and _precompute_paths() would return for the
+        equivalent ElementTree.
+        """
+        return cls(root=root, leaves=leaves, paths=paths)
                          
                          
     def _precompute_leaves(self, etree):
@@ -171,6 +244,8 @@ class GeneratedXml(object):
         
         
     def to_etree(self):
+        if self._etree is None:
+            self._etree = ElementTree.ElementTree(_node_to_element(self._root))
         return self._etree
     
     def __len__(self):
@@ -178,8 +253,13 @@ class GeneratedXml(object):
         
     def __str__(self):
         if not self._str_form:
-            root = self._etree.getroot()
-            self._str_form = ElementTree.tostring(root)
+            if self._root is not None:
+                parts = []
+                _serialize_node(self._root, parts)
+                self._str_form = ''.join(parts)
+            else:
+                root = self._etree.getroot()
+                self._str_form = ElementTree.tostring(root)
         return self._str_form
         
     def str(self):
@@ -191,7 +271,7 @@ class GeneratedXml(object):
     # xml.etree.ElementTree supports some XPath searches. I am sure we will
     # want to extend this as time goes on, but here's one example:
     def matches_xpath_expression(self, xpath_expression):
-        nodes = self._etree.findall(xpath_expression)
+        nodes = self.to_etree().findall(xpath_expression)
         return len(nodes) > 0
     
     def matches_query(self, xpath_expression, value):
@@ -204,7 +284,7 @@ class GeneratedXml(object):
         of this class should be used instead whenever possible. 
         """
         upper_value = value.upper()
-        nodes = self._etree.findall(xpath_expression)
+        nodes = self.to_etree().findall(xpath_expression)
         return any(node.text.upper() == upper_value for node in nodes)
     
 
@@ -448,22 +528,32 @@ class XmlGenerator(object):
         # look in the header for the date of the original version, and then
         # use that to pull this file out of source-control.
         
+        # Rather than building an ElementTree, we build a tree of lightweight
+        # (tag, value, children) nodes and collect the leaf and path sets
+        # for GeneratedXml as we go. (See GeneratedXml.from_nodes().)
+        
         root_tag = self._top_level_node.tag
-        root_node = ElementTree.Element(root_tag)
-        if self._top_level_node.value:
-            root_node.text = self._top_level_node.value
-
-        xml_tree = ElementTree.ElementTree(root_node)
+        root_value = self._top_level_node.value or None
+        leaves = set()
+        paths = set()
         
-        if not self._top_level_node.is_leaf:
+        if self._top_level_node.is_leaf:
+            root_node = (root_tag, root_value, None)
+            upper_value = root_value.upper() if root_value else None
+            leaves.add((root_tag, upper_value))
+            paths.add((root_tag, upper_value))
+        
+        else:
+            
+            root_node = (root_tag, root_value, [])
             
             # Okay, here's the overview of the stack-based algorithm.
             # The stack will be filled with 
-            # (Element, path, depth, generator_function) tuples, where
+            # (node, path, depth, generator_function) tuples, where
             # the path element is a list of tags leading to (and including)
-            # the Element object. While the stack is not empty, we:
+            # the node. While the stack is not empty, we:
             #
-            # * Pop the top (Element, path, depth, functiopn) element.
+            # * Pop the top (node, path, depth, function) element.
             #
             # * Look at len(path) to figure out which node-generator to call.
             # 
@@ -471,10 +561,11 @@ class XmlGenerator(object):
             # 
             # * For each child node:
             # 
-            #    * We add the child nodes to Element.
+            #    * We add the child nodes to the node's children.
             # 
-            #    * IF the child is not a leaf, we push it (and its path,
-            #      depth, and new function) onto the stack.
+            #    * IF the child is a leaf, we add it to the leaf and path
+            #      sets. Otherwise, we push it (and its path, depth, and new
+            #      function) onto the stack.
             #
             # Note: while the depth element and function re redundant, this
             # method is a bottleneck and it seems to speed things up.
@@ -485,32 +576,49 @@ class XmlGenerator(object):
             stack = []
             first_stack_element = (root_node, [root_tag], 0, generators[0])        
             stack.append(first_stack_element)
-            Element = ElementTree.Element
             stack_pop = stack.pop
             stack_append = stack.append
+            leaves_add = leaves.add
+            paths_add = paths.add
 
             while stack:
                 
-                (curr_element, curr_path, curr_depth, curr_generator) = stack_pop()
+                (curr_node, curr_path, curr_depth, curr_generator) = stack_pop()
                 child_node_specs = curr_generator(curr_path)
                 
+                if not child_node_specs:
+                    # An interior node with no children is a leaf after all
+                    curr_value = curr_node[1]
+                    upper_value = curr_value.upper() if curr_value else None
+                    leaves_add((curr_node[0], upper_value))
+                    paths_add(tuple(curr_path) + (upper_value,))
+                    continue
+                
                 new_depth = curr_depth + 1
                 new_generator = generators[new_depth]
+                curr_children = curr_node[2]
                 
                 for child_spec in child_node_specs:
                     
                     new_tag = child_spec.tag
-                    new_path = curr_path + [new_tag]
-                    new_node = Element(new_tag)
-                    if child_spec.value: new_node.text = child_spec.value
-                    curr_element.append(new_node)
+                    new_value = child_spec.value or None
                         
-                    if not child_spec.is_leaf:
+                    if child_spec.is_leaf:
+                        
+                        curr_children.append((new_tag, new_value, None))
+                        upper_value = new_value.upper() if new_value else None
+                        leaves_add((new_tag, upper_value))
+                        paths_add(tuple(curr_path) + (new_tag, upper_value))
+
+                    else:
                         
+                        new_node = (new_tag, new_value, [])
+                        curr_children.append(new_node)
+                        new_path = curr_path + [new_tag]
                         new_stack_element = (new_node, new_path, new_depth, new_generator)
                         stack_append(new_stack_element)
 
-        return GeneratedXml(xml_tree)
+        return GeneratedXml.from_nodes(root_node, leaves, paths)
 
     def generate_node_pdf(self, level, min, max):
         assert level < len(self._node_generators)-1
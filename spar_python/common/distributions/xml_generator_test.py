@@ -238,6 +238,41 @@ class XmlGeneratorTest(unittest.TestCase):
         root = ElementTree.fromstring(xml_str)
 
 
+    def test_same_as_etree(self):
+        # XML generated without an ElementTree should behave exactly like
+        # XML built from the equivalent ElementTree
+        xml_gen = XmlGenerator(self.dist_holder)
+        for _ in xrange(50):
+            xml = xml_gen.generate()
+            xml_str = str(xml)
+            from_etree = GeneratedXml(xml.to_etree())
+            self.assertEqual(ElementTree.tostring(xml.to_etree().getroot()),
+                             xml_str, self.seed_msg)
+            self.assertEqual(str(from_etree), xml_str, self.seed_msg)
+            self.assertEqual(xml._leaves, from_etree._leaves, self.seed_msg)
+            self.assertEqual(xml._paths, from_etree._paths, self.seed_msg)
+
+    def test_from_nodes(self):
+        root = ('a', 'A & B', [('b', None, [('d', '<D>', None),
+                                           ('f', None, None)]),
+                              ('c', 'C', None),
+                              ('e', None, [])])
+        leaves = set([('d', '<D>'), ('f', None), ('c', 'C'), ('e', None)])
+        paths = set([('a', 'b', 'd', '<D>'), ('a', 'b', 'f', None),
+                     ('a', 'c', 'C'), ('a', 'e', None)])
+        xml = GeneratedXml.from_nodes(root, leaves, paths)
+        self.assertEqual(str(xml),
+                         '<a>A &amp; B<b><d>&lt;D&gt;</d><f /></b><c>C</c>'
+                         '<e /></a>')
+        self.assertEqual(ElementTree.tostring(xml.to_etree().getroot()),
+                         str(xml))
+        from_etree = GeneratedXml(xml.to_etree())
+        self.assertEqual(from_etree._leaves, leaves)
+        self.assertEqual(from_etree._paths, paths)
+        self.assertTrue(xml.has_path(['a', 'b', 'f']))
+        self.assertTrue(xml.matches_query('./b/d', '<d>'))
+        self.assertFalse(xml.matches_xpath_expression('./c/d'))
+
     def test_check_forbidden_characters(self):
         
         xml_gen = XmlGenerator(self.dist_holder)
@@ -19,6 +19,8 @@ import copy
 
 shuffle = numpy.random.shuffle
 seed = numpy.random.seed
+get_state = numpy.random.get_state
+set_state = numpy.random.set_state
 bytes = numpy.random.bytes
 triangle = numpy.random.triangular
 rand = numpy.random.rand
@@ -26,6 +28,25 @@ random = numpy.random.random
 
 randint = numpy.random.random_integers
 
+_UINT32_MASK = 2 ** 32 - 1
+
+def seed_substream(base_seed, stream):
+    """
+    Seeds the RNG for substream number `stream` (a non-negative integer) of
+    base_seed. Each (base_seed, stream) pair gets its own sequence, which 
+    does not depend on how much of any other substream has been used. (The
+    pair is fed through numpy's seed-array initialization, which mixes
+    every word of the key into the whole generator state.) If base_seed is
+    None, the RNG is seeded from the current time, as seed(None) is.
+    """
+    if base_seed is None:
+        seed(None)
+    else:
+        base_seed = int(base_seed)
+        seed([stream & _UINT32_MASK, 
+              base_seed & _UINT32_MASK, 
+              (base_seed >> 32) & _UINT32_MASK])
+
 def choice(seq): 
     if not seq:
         raise IndexError
@@ -170,3 +170,19 @@ class SparRandomTest(unittest.TestCase):
         self.assertGreater(ratio1, 0.4, self.seed_msg)
         self.assertGreater(ratio0, 0.4, self.seed_msg)
 
+
+    def test_seed_substream(self):
+        list_len = 50
+        def draw(base_seed, stream):
+            spar_random.seed_substream(base_seed, stream)
+            return [spar_random.randint(1, 1000) for _ in xrange(list_len)]
+        first_list = draw(self.seed, 3)
+        # Drawing from other substreams in between makes no difference
+        draw(self.seed, 4)
+        self.assertListEqual(draw(self.seed, 3), first_list, self.seed_msg)
+        # Neighbouring streams and seeds (including ones differing only
+        # above 32 bits) give different sequences
+        for (base_seed, stream) in [(self.seed, 4), (self.seed + 1, 3),
+                                    (self.seed + 2 ** 32, 3)]:
+            self.assertNotEqual(draw(base_seed, stream), first_list,
+                                self.seed_msg)
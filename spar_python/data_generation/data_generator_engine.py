@@ -29,6 +29,44 @@ import spar_python.data_generation.generated_row as generated_row
 LOGGER = logging.getLogger(__name__)
 
 
+class _SubstreamRow(dict):
+    """
+    The row dictionary used while generating a row with per-field RNG
+    substreams. Each field is generated from its own substream of the row's
+    seed (see spar_random.seed_substream), so its value does not depend on
+    which other fields were generated before it. The catch is conditional
+    distributions, which look up the values of other fields of the row: if
+    one of those has not been generated yet, it is generated on the spot
+    (with the RNG state of the field asking for it saved and restored around
+    it).
+    """
+
+    def __init__(self, dist_dict, row_seed):
+        dict.__init__(self)
+        self._dist_dict = dist_dict
+        self._row_seed = row_seed
+
+    def generate(self, var):
+        '''
+        Returns the value of var for this row, generating it if need be.
+        '''
+        if var in self:
+            return dict.__getitem__(self, var)
+        spar_random.seed_substream(self._row_seed, var)
+        v = self._dist_dict[var].generate(self)
+        self[var] = v
+        return v
+
+    def __missing__(self, var):
+        if var not in self._dist_dict:
+            raise KeyError(var)
+        rng_state = spar_random.get_state()
+        try:
+            return self.generate(var)
+        finally:
+            spar_random.set_state(rng_state)
+
+
 class DataGeneratorEngine(object):
     """
     A class for generating data rows, feeding them to aggregators, and managing
@@ -51,12 +89,25 @@ class DataGeneratorEngine(object):
         self.dist_holder = dist_holder
         self.multiprocess = (options.num_processes > 1)
         self.aggregators = options.aggregators
+        self.columnar = options.columnar
+        self.rng_substreams = options.rng_substreams
             
         for agg in self.aggregators:
             agg.start()
             
         self.fields_to_gen = \
             self._select_fields_to_generate(dist_holder, self.aggregators)
+        if self.rng_substreams:
+            self.fields_to_gen = \
+                self._select_substream_fields(self.fields_to_gen,
+                                              self.aggregators)
+
+        # Only the fields which some aggregator needs are converted into 
+        # aggregator format (and only when first read)
+        fields_needed = set()
+        for agg in self.aggregators:
+            fields_needed.update(agg.fields_needed())
+        self.agg_table = generated_row.AggFormatTable(fields_needed)
 
     @staticmethod
     def _select_fields_to_generate(dist_holder, aggregators):
@@ -100,7 +151,21 @@ class DataGeneratorEngine(object):
         
         dist_vars.reverse()
         return dist_vars
-        
+
+    @staticmethod
+    def _select_substream_fields(fields_to_gen, aggregators):
+        """
+        Given the output of _select_fields_to_generate, returns the fields
+        which need to be generated when every field has its own RNG
+        substream: only those needed by the aggregators, in the same order.
+        Any other fields they depend on are generated on demand (see
+        _SubstreamRow).
+        """
+        fields_needed = set()
+        for agg in aggregators:
+            fields_needed.update(agg.fields_needed())
+        return [var for var in fields_to_gen if var in fields_needed]
+
 
 
     def done(self):
@@ -127,8 +192,16 @@ class DataGeneratorEngine(object):
         """
         Given a list of (row_id, seed) pairs,
         generate the rows, aggregate the results, return aggregate results.
+        If the engine was created in columnar mode, the rows will be 
+        generated as a single GeneratedColumnBatch and fed to the
+        map_reduce_column_batch() method of the aggregators.
         """
         
+        if self.columnar:
+            column_batch = self.generate_column_batch(row_id_seed_pairs)
+            return [aggregator.map_reduce_column_batch(column_batch)
+                    for aggregator in self.aggregators]
+
         rows = map(self.generate_row_dict, row_id_seed_pairs)
 
         this_batch_results = [aggregator.map_reduce_row_list(rows)
@@ -143,12 +216,61 @@ class DataGeneratorEngine(object):
         from the given seed, and returns it in a dictionary.
         """
         (row_id, seed) = row_id_seed_pair
-        spar_random.seed(seed)
-        row_dict = generated_row.GeneratedRow()
         dist_dict = self.dist_holder.dist_dict
-        for var in self.fields_to_gen:
-            dist = dist_dict[var]
-            v = dist.generate(row_dict)
-            row_dict[var] = v
+        if self.rng_substreams:
+            # Fields generated on demand are left out of the row, as they
+            # would be from a column batch
+            substream_row = _SubstreamRow(dist_dict, seed)
+            row_dict = generated_row.GeneratedRow(
+                (var, substream_row.generate(var)) 
+                for var in self.fields_to_gen)
+        else:
+            spar_random.seed(seed)
+            row_dict = generated_row.GeneratedRow()
+            for var in self.fields_to_gen:
+                dist = dist_dict[var]
+                v = dist.generate(row_dict)
+                row_dict[var] = v
+        row_dict.agg_table = self.agg_table
         row_dict[sv.VARS.ID] = row_id
         return row_dict
+
+
+    def generate_column_batch(self, row_id_seed_pairs):
+        """
+        Given a list of (row_id, seed) pairs, generates the rows and returns 
+        them as a single GeneratedColumnBatch. Each row is generated exactly
+        as in generate_row_dict (that is, the RNG is re-seeded from the 
+        row's seed and the fields are generated in the same order) so
+        the values will be identical to those of generate_row_dict. The
+        savings come from not building (and converting) a GeneratedRow for
+        every row.
+        """
+        dist_dict = self.dist_holder.dist_dict
+        columns = dict((var, []) for var in self.fields_to_gen)
+        if self.rng_substreams:
+            appends = [(var, columns[var].append)
+                       for var in self.fields_to_gen]
+            row_ids = []
+            for (row_id, row_seed) in row_id_seed_pairs:
+                substream_row = _SubstreamRow(dist_dict, row_seed)
+                for (var, append) in appends:
+                    append(substream_row.generate(var))
+                row_ids.append(row_id)
+            return generated_row.GeneratedColumnBatch(row_ids, columns)
+        # Hoist the lookups out of the per-row loop
+        generation_plan = [(var, dist_dict[var].generate, columns[var].append)
+                           for var in self.fields_to_gen]
+        seed = spar_random.seed
+        row_ids = []
+        for (row_id, row_seed) in row_id_seed_pairs:
+            seed(row_seed)
+            # Conditional distributions need to see the earlier values of
+            # this row, so we still need a (plain) dictionary per row.
+            row_dict = {}
+            for (var, generate, append) in generation_plan:
+                v = generate(row_dict)
+                row_dict[var] = v
+                append(v)
+            row_ids.append(row_id)
+        return generated_row.GeneratedColumnBatch(row_ids, columns)
@@ -24,6 +24,8 @@ import spar_python.data_generation.data_generator_engine\
 import spar_python.common.distributions.distribution_holder \
     as distribution_holder
 import spar_python.common.aggregators.counts_aggregator as ca
+import spar_python.common.distributions.frozen_distributions \
+    as frozen_distributions
 import spar_python.common.spar_random as spar_random
 from spar_python.common.enum import Enum as Enum
 import unittest
@@ -335,6 +337,109 @@ class DataGeneratorEngineTest(unittest.TestCase):
         self.assertListEqual(aggregate_results, goal_result)
 
 
+    def test_generate_column_batch(self):
+        '''
+        Test that generate_column_batch() generates exactly the same rows as 
+        generate_row_dict().
+        '''
+        engine_options = gw.DataGeneratorOptions()
+        counts_agg = ca.CountsAggregator()
+        counts_agg.fields_needed = lambda : sv.VAR_GENERATION_ORDER
+        engine_options.aggregators = [counts_agg]
+        engine = data_generator_engine.DataGeneratorEngine(engine_options,
+                                                           self.dist_holder)
+        num_rows = 50
+        row_specs = [ (id, 1000 + id) for id in xrange(num_rows) ]
+        column_batch = engine.generate_column_batch(row_specs)
+        self.assertEqual(len(column_batch), num_rows)
+        rows = map(engine.generate_row_dict, row_specs)
+        for (row, batch_row) in zip(rows, column_batch.rows()):
+            self.assertSetEqual(set(row.keys()), set(batch_row.keys()))
+            for key in row.keys():
+                self.assertEqual(str(row[key]), str(batch_row[key]), 
+                                 self.seed_msg)
+
+
+    def test_frozen_dist_holder(self):
+        '''
+        Test that a frozen (shared-memory) copy of the distribution holder 
+        generates exactly the same rows as the original.
+        '''
+        engine_options = gw.DataGeneratorOptions()
+        counts_agg = ca.CountsAggregator()
+        counts_agg.fields_needed = lambda : sv.VAR_GENERATION_ORDER
+        engine_options.aggregators = [counts_agg]
+        engine = data_generator_engine.DataGeneratorEngine(engine_options,
+                                                           self.dist_holder)
+        frozen_holder = \
+            frozen_distributions.freeze_distribution_holder(self.dist_holder)
+        frozen_engine = \
+            data_generator_engine.DataGeneratorEngine(engine_options,
+                                                      frozen_holder)
+        for row_spec in [ (id, self.seed + id) for id in xrange(50) ]:
+            row = engine.generate_row_dict(row_spec)
+            frozen_row = frozen_engine.generate_row_dict(row_spec)
+            self.assertSetEqual(set(row.keys()), set(frozen_row.keys()))
+            for key in row.keys():
+                self.assertEqual(str(row[key]), str(frozen_row[key]), 
+                                 self.seed_msg)
+
+
+    def test_map_reduce_columnar(self):
+        '''
+        Test that generate_and_aggregate_rows() gives the same results in 
+        columnar mode.
+        '''
+        engine_options = gw.DataGeneratorOptions(columnar = True)
+        engine_options.aggregators = [ca.CountsAggregator()]
+        engine = data_generator_engine.DataGeneratorEngine(engine_options,
+                                                           self.dist_holder)
+        num_rows = 100
+        row_specs = [ ('000-000', seed) for seed in xrange(num_rows) ]
+        aggregate_results = engine.generate_and_aggregate_rows( row_specs )
+        self.assertListEqual(aggregate_results, [num_rows])
+
+
+    def test_rng_substreams(self):
+        '''
+        Test that in rng_substreams mode, the value of a field depends only
+        on the row's seed (and not on which other fields are generated), and
+        that generate_column_batch() generates exactly the same rows as
+        generate_row_dict().
+        '''
+        def make_engine(fields):
+            engine_options = gw.DataGeneratorOptions(rng_substreams = True)
+            counts_agg = ca.CountsAggregator()
+            counts_agg.fields_needed = lambda : fields
+            engine_options.aggregators = [counts_agg]
+            return data_generator_engine.DataGeneratorEngine(engine_options,
+                                                             self.dist_holder)
+        full_engine = make_engine(sv.VAR_GENERATION_ORDER)
+        # LAST_UPDATED is conditioned on DOB, which is not needed and so
+        # must be generated on demand
+        fields = [sv.VARS.LAST_UPDATED, sv.VARS.FOO]
+        engine = make_engine(fields)
+        self.assertListEqual(engine.fields_to_gen,
+                             [v for v in self.dist_holder.var_order
+                              if v in fields])
+        row_specs = [ (id, self.seed + id) for id in xrange(50) ]
+        for row_spec in row_specs:
+            full_row = full_engine.generate_row_dict(row_spec)
+            row = engine.generate_row_dict(row_spec)
+            self.assertEqual(row, engine.generate_row_dict(row_spec),
+                             self.seed_msg)
+            for key in fields + [sv.VARS.ID]:
+                self.assertEqual(row[key], full_row[key], self.seed_msg)
+        for test_engine in [full_engine, engine]:
+            column_batch = test_engine.generate_column_batch(row_specs)
+            rows = map(test_engine.generate_row_dict, row_specs)
+            for (row, batch_row) in zip(rows, column_batch.rows()):
+                self.assertSetEqual(set(row.keys()), set(batch_row.keys()))
+                for key in row.keys():
+                    self.assertEqual(str(row[key]), str(batch_row[key]),
+                                     self.seed_msg)
+
+
     def test_select_fields1(self):
         
         class DummyAggregator(object):
@@ -0,0 +1,174 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        On-disk cache of learned distributions
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+
+"""
+Learning distributions (parsing PUMS, names, zipcodes, streets and the
+text corpus, then training the text engine) takes many minutes, and used
+to be repeated on every run. This module caches the finished, sanitized
+DistributionHolder in a directory on disk, keyed by a fingerprint of
+everything that determines it:
+
+* CACHE_VERSION (bump this whenever learning or the distribution classes
+  change in a way that would make old caches wrong),
+
+* the name and expected SHA-1 of every data file in url_dict, plus the size
+  and modification time of whatever is on disk under the data directory,
+
+* whether missing files are allowed, and
+
+* the sanitization settings and the income fuzz-factor.
+
+Use learn_distributions_cached() as a drop-in replacement for
+learn_distributions.learn_distributions(). If a valid cache entry exists
+it is loaded instead of re-learning. Otherwise the distributions are
+learned and the result is written to the cache for next time. Either way,
+the global random state is left exactly as learning would have left it, so
+runs are reproducible whether or not the cache was used.
+"""
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..')
+sys.path.append(base_dir)
+
+import copy_reg
+import cPickle
+import hashlib
+import tempfile
+import numpy.random
+
+import spar_python.common.distributions.text_generator as text_generator
+import spar_python.data_generation.learn_distributions as learn_distributions
+import spar_python.data_generation.learning.url_dict as url_dict
+import spar_python.data_generation.sanitization as sanitization
+
+
+CACHE_VERSION = 2
+
+CACHE_FILE_TEMPLATE = 'distributions-%s.pickle'
+
+
+
+def _make_text_generator(state):
+    """
+    Recreates a TextGenerator from the output of its get_state() method.
+    Must be at the top level of this module so that pickle can find it.
+    """
+    tg = text_generator.TextGenerator.__new__(text_generator.TextGenerator)
+    tg.set_state(state)
+    return tg
+
+
+def _reduce_text_generator(tg):
+    return (_make_text_generator, (tg.get_state(),))
+
+
+copy_reg.pickle(text_generator.TextGenerator, _reduce_text_generator)
+
+
+
+def _file_stats(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, int(stat.st_mtime))
+
+
+def fingerprint(options):
+    """
+    Returns a hex string identifying the DistributionHolder which
+    learn_distributions.learn_distributions(options, ...) would produce.
+    """
+    parts = [CACHE_VERSION,
+             bool(options.allow_missing_files),
+             sanitization.FORBIDDEN_CHARACTERS,
+             sanitization.FORBIDDEN_LINES,
+             learn_distributions.INCOME_FUZZ_FACTOR]
+    for key in sorted(url_dict.url_dict.keys()):
+        data_dir = os.path.join(options.data_dir, key)
+        files_dict = url_dict.url_dict[key]
+        for file_descriptor in sorted(files_dict.keys()):
+            (file_name, _, hash_val) = files_dict[file_descriptor]
+            data_file = os.path.join(data_dir, file_name)
+            # Zip files are unzipped next to the archive, and the unzipped
+            # file is what actually gets read.
+            unzipped_file = os.path.splitext(data_file)[0]
+            parts.append((key, file_name, hash_val,
+                          _file_stats(data_file),
+                          _file_stats(unzipped_file)))
+    return hashlib.sha1(repr(parts)).hexdigest()
+
+
+def cache_path(cache_dir, options):
+    return os.path.join(cache_dir, CACHE_FILE_TEMPLATE % fingerprint(options))
+
+
+def load(path, logger):
+    """
+    Returns (dist_holder, random_state) from the cache file at path, or
+    None if there is no usable cache file there.
+    """
+    try:
+        with open(path, 'rb') as f:
+            (version, dist_holder, random_state) = cPickle.load(f)
+    except IOError:
+        return None
+    except Exception:
+        logger.warning("Could not read distribution cache %s; ignoring it",
+                       path, exc_info=True)
+        return None
+    if version != CACHE_VERSION:
+        logger.info("Distribution cache %s is out of date; ignoring it", path)
+        return None
+    return (dist_holder, random_state)
+
+
+def store(path, dist_holder, random_state, logger):
+    """
+    Writes dist_holder and random_state to the cache file at path. The
+    file is written under a temporary name and renamed into place, so a
+    concurrent or interrupted run never sees a partial cache file.
+    """
+    cache_dir = os.path.dirname(path) or '.'
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    (fd, tmp_path) = tempfile.mkstemp(dir = cache_dir, suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            cPickle.dump((CACHE_VERSION, dist_holder, random_state), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    logger.info("Wrote distribution cache %s", path)
+
+
+def learn_distributions_cached(options, logger, cache_dir):
+    """
+    Returns the same DistributionHolder as
+    learn_distributions.learn_distributions(options, logger), loading it
+    from cache_dir if possible and adding it to cache_dir otherwise.
+    """
+    path = cache_path(cache_dir, options)
+    cached = load(path, logger)
+    if cached is not None:
+        logger.info("Loaded distributions from cache %s", path)
+        (dist_holder, random_state) = cached
+    else:
+        dist_holder = learn_distributions.learn_distributions(options, logger)
+        random_state = numpy.random.get_state()
+        store(path, dist_holder, random_state, logger)
+    numpy.random.set_state(random_state)
+    return dist_holder
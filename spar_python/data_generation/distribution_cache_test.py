@@ -0,0 +1,142 @@
+# *****************************************************************
+#  Copyright 2015 MIT Lincoln Laboratory
+#  Project:            SPAR
+#  Authors:            JCH
+#  Description:        Tests for distribution_cache.py
+#
+#  Modifications:
+#  Date          Name           Modification
+#  ----          ----           ------------
+# *****************************************************************
+
+import os
+import sys
+this_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.join(this_dir, '..', '..')
+sys.path.append(base_dir)
+
+import logging
+import shutil
+import tempfile
+import time
+import unittest
+import numpy.random
+import StringIO as stringio
+
+import spar_python.common.distributions.base_distributions \
+    as base_distributions
+import spar_python.common.distributions.distribution_holder \
+    as distribution_holder
+import spar_python.common.distributions.text_distribution \
+    as text_distribution
+import spar_python.common.spar_random as spar_random
+import spar_python.data_generation.distribution_cache as distribution_cache
+import spar_python.data_generation.learn_distributions as learn_distributions
+import spar_python.data_generation.learning.mock_data_files as mock_data_files
+import spar_python.data_generation.spar_variables as sv
+
+
+class Options(object):
+    pass
+
+
+class DistributionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.seed = int(time.time())
+        self.seed_msg = "Random seed used for this test: %s" % self.seed
+        self.longMessage = True
+        spar_random.seed(self.seed)
+
+        self.logger = logging.getLogger('dummy')
+        self.logger.addHandler(logging.NullHandler())
+
+        self.data_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.options = Options()
+        self.options.data_dir = self.data_dir
+        self.options.allow_missing_files = False
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def make_dist_holder(self):
+        text_files = [('mock_text',
+                       stringio.StringIO(mock_data_files.mock_text_files))]
+        text_engine = learn_distributions.train_text_engine(self.options,
+                                                            self.logger,
+                                                            text_files)
+        last_names = base_distributions.CompactIndependentDistribution()
+        last_names.add('SMITH', 10)
+        last_names.add('JONES', 3)
+        dist_dict = {
+            sv.VARS.LAST_NAME : last_names,
+            sv.VARS.NOTES4 :
+                text_distribution.TextDistribution(text_engine, 20, 50)}
+        var_order = [sv.VARS.LAST_NAME, sv.VARS.NOTES4]
+        var_names = [sv.VARS.to_string(x) for x in var_order]
+        return distribution_holder.DistributionHolder(var_order, var_names,
+                                                      dist_dict)
+
+    def generate(self, dist_holder):
+        spar_random.seed(self.seed)
+        return [str(dist_holder.dist_dict[var].generate({}))
+                for _ in xrange(10)
+                for var in dist_holder.var_order]
+
+    def test_fingerprint(self):
+        fingerprint = distribution_cache.fingerprint(self.options)
+        self.assertEqual(fingerprint,
+                         distribution_cache.fingerprint(self.options))
+
+        self.options.allow_missing_files = True
+        self.assertNotEqual(fingerprint,
+                            distribution_cache.fingerprint(self.options))
+        self.options.allow_missing_files = False
+
+        os.mkdir(os.path.join(self.data_dir, 'names'))
+        with open(os.path.join(self.data_dir, 'names', 'last_names.txt'),
+                  'w') as f:
+            f.write(mock_data_files.mock_last_names)
+        self.assertNotEqual(fingerprint,
+                            distribution_cache.fingerprint(self.options))
+
+    def test_store_and_load(self):
+        dist_holder = self.make_dist_holder()
+        path = distribution_cache.cache_path(self.cache_dir, self.options)
+        self.assertIsNone(distribution_cache.load(path, self.logger))
+
+        distribution_cache.store(path, dist_holder, 'state', self.logger)
+        self.assertListEqual(os.listdir(self.cache_dir),
+                             [os.path.basename(path)])
+        (loaded_holder, random_state) = \
+            distribution_cache.load(path, self.logger)
+        self.assertEqual(random_state, 'state')
+        self.assertListEqual(loaded_holder.var_order, dist_holder.var_order)
+        self.assertListEqual(self.generate(loaded_holder),
+                             self.generate(dist_holder), self.seed_msg)
+
+    def test_corrupt_cache_ignored(self):
+        path = distribution_cache.cache_path(self.cache_dir, self.options)
+        with open(path, 'w') as f:
+            f.write('not a pickle')
+        self.assertIsNone(distribution_cache.load(path, self.logger))
+
+    def test_learn_distributions_cached(self):
+        dist_holder = self.make_dist_holder()
+        spar_random.seed(12345)
+        random_state = numpy.random.get_state()
+        expected = spar_random.randint(0, 2**30)
+        path = distribution_cache.cache_path(self.cache_dir, self.options)
+        distribution_cache.store(path, dist_holder, random_state, self.logger)
+
+        # Nothing is in data_dir, so this would fail if it tried to learn
+        spar_random.seed(self.seed)
+        loaded_holder = \
+            distribution_cache.learn_distributions_cached(self.options,
+                                                          self.logger,
+                                                          self.cache_dir)
+        self.assertEqual(spar_random.randint(0, 2**30), expected)
+        self.assertListEqual(self.generate(loaded_holder),
+                             self.generate(dist_holder), self.seed_msg)
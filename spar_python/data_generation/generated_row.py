@@ -10,32 +10,225 @@
 #  30 Oct 2013    jch           Original file
 # *****************************************************************
 
+import itertools
+
+import numpy
+
 import spar_python.data_generation.spar_variables as sv
 
+class AggFormatTable(object):
+
+    """
+    The converters into the format expected by the aggregators in 
+    query_aggregators, for a fixed set of fields: those which some 
+    aggregator has asked for through fields_needed(). A DataGeneratorEngine
+    builds one of these once and shares it between all the rows it 
+    generates, so that the converters are not looked up per row and fields
+    which no aggregator reads (fields generated only to keep the RNG in 
+    step, say, or only written to LineRaw files) are never converted.
+    """
+
+    def __init__(self, fields):
+        # (field-ID, converter or None if no conversion is needed)
+        self._converters = []
+        for field_id in sorted(set(fields)):
+            reformat = sv.VAR_CONVERTERS[field_id].to_agg_fmt
+            if reformat is sv.no_conversion:
+                reformat = None
+            self._converters.append((field_id, reformat))
+
+    def convert(self, row):
+        '''
+        Returns a dictionary mapping each field in this table which row
+        has to the value of row[field], converted into aggregator format.
+        '''
+        agg_format = {}
+        for (field_id, reformat) in self._converters:
+            try:
+                value = row[field_id]
+            except KeyError:
+                continue
+            if reformat is None:
+                agg_format[field_id] = value
+            else:
+                agg_format[field_id] = reformat(value)
+        return agg_format
+
+    @staticmethod
+    def convert_all(row):
+        '''
+        Returns a dictionary mapping every field in row to its value in
+        aggregator format.
+        '''
+        return dict((field_id, sv.VAR_CONVERTERS[field_id].to_agg_fmt(value))
+                    for (field_id, value) in row.iteritems())
+
+
+
+class _LazyAggFormat(object):
+
+    """
+    The descriptor behind GeneratedRow.in_query_aggregator_format. The first
+    time the attribute is read on a row, it converts the row and stores the
+    result in the row's own __dict__, which then hides this (non-data) 
+    descriptor: every later read is a plain attribute lookup.
+    """
+
+    def __get__(self, row, row_class):
+        if row is None:
+            return self
+        if row.agg_table is None:
+            agg_format = AggFormatTable.convert_all(row)
+        else:
+            agg_format = row.agg_table.convert(row)
+        row.__dict__['in_query_aggregator_format'] = agg_format
+        return agg_format
+
+
+
 class GeneratedRow(dict):
 
     """
     This class holds the row generated by the DataGeneratorEngine class. It is
     a child of the UserDict class, and so will implement the dictionary
     interface for backwards compatibility. In addition, it will implement 
-    the following extra attribute for optimization:
+    the following extra attributes for optimization:
     
     
     * in_query_aggregator_format: will map a field-ID into the value of 
       of self[id], but already converted into the format expected by the
-      aggregators in query_aggregators.
+      aggregators in query_aggregators. This is computed the first time it 
+      is read, and so reflects the fields of the row at that time: fields
+      should not be added or changed afterwards.
+
+    * agg_table: the AggFormatTable saying which fields to convert for
+      in_query_aggregator_format, or None (the default) to convert all of 
+      them.
     
     """
 
-    def __init__(self, *args, **kwargs):
-
-        dict.__init__(self, *args, **kwargs)
-        self.in_query_aggregator_format = {}
+    agg_table = None
 
-    def __setitem__(self, field_id, value):
-        dict.__setitem__(self, field_id, value)
+    in_query_aggregator_format = _LazyAggFormat()
         
-        reformat = sv.VAR_CONVERTERS[field_id].to_agg_fmt
-        reformatted_val = reformat(value)
-        self.in_query_aggregator_format[field_id] = reformatted_val
-        
\ No newline at end of file
+
+
+class GeneratedColumnBatch(object):
+
+    """
+    This class holds a whole batch of rows generated by the
+    DataGeneratorEngine, but in columnar form: one column (list or numpy
+    array) per generated field rather than one dictionary per row. It
+    implements the following attributes and methods:
+    
+    * row_ids: a list of the row-IDs in the batch, in batch order.
+    
+    * columns: maps a field-ID to the column of values generated for that
+      field, in the same order as row_ids. Integer fields whose values all fit
+      in 64 (signed) bits are stored as numpy int64 arrays. All other fields
+      are stored as lists.
+
+    * agg_column(field_id): returns the column for field_id already converted
+      into the format expected by the aggregators in query_aggregators. The
+      conversion is done once per column (not per row) the first time it is
+      requested, and memoized for all other aggregators.
+
+    * rows(): returns the batch as a list of GeneratedRow objects, for the
+      benefit of aggregators which have no column-based implementation.
+      Again, this is computed once and memoized.
+    
+    Note that sv.VARS.ID is not stored in columns, but column(sv.VARS.ID)
+    and agg_column(sv.VARS.ID) will return row_ids anyway.
+    """
+
+    def __init__(self, row_ids, columns):
+        self.row_ids = row_ids
+        self.columns = {}
+        for (field_id, column) in columns.iteritems():
+            self.columns[field_id] = self._make_column(field_id, column)
+        self._agg_columns = {}
+        self._rows = None
+
+
+    @staticmethod
+    def _make_column(field_id, values):
+        '''
+        Converts a list of values into the stored column format. Integer
+        fields are moved into numpy arrays when possible. (Note: we need to
+        ask numpy for int64 explicitly, as it will otherwise silently convert
+        the larger FOO values into floats.)
+        '''
+        if field_id in sv.INT_VARS and field_id != sv.VARS.ID:
+            try:
+                return numpy.array(values, dtype=numpy.int64)
+            except (OverflowError, TypeError, ValueError):
+                pass
+        return values
+
+
+    def __len__(self):
+        return len(self.row_ids)
+
+
+    def column(self, field_id):
+        '''
+        Returns the column of (unconverted) values for field_id.
+        '''
+        if field_id == sv.VARS.ID:
+            return self.row_ids
+        return self.columns[field_id]
+
+
+    def agg_column(self, field_id):
+        '''
+        Returns the column of values for field_id, converted into the format 
+        expected by the query aggregators.
+        '''
+        try:
+            return self._agg_columns[field_id]
+        except KeyError:
+            reformat = sv.VAR_CONVERTERS[field_id].to_agg_fmt
+            column = self.column(field_id)
+            if reformat is sv.no_conversion:
+                agg_column = column
+            else:
+                agg_column = map(reformat, column)
+            self._agg_columns[field_id] = agg_column
+            return agg_column
+
+
+    def select_row_ids(self, matches):
+        '''
+        Given a sequence of booleans (list or numpy array) parallel to the
+        batch, returns the list of row-IDs for which it is True.
+        '''
+        return list(itertools.compress(self.row_ids, matches))
+
+
+    def rows(self):
+        '''
+        Returns the batch as a list of GeneratedRow objects.
+        '''
+        if self._rows is None:
+            fields = self.columns.keys()
+            value_lists = [self._column_as_list(f) for f in fields]
+            rows = []
+            for (i, row_id) in enumerate(self.row_ids):
+                row = GeneratedRow()
+                for (field_id, values) in zip(fields, value_lists):
+                    row[field_id] = values[i]
+                row[sv.VARS.ID] = row_id
+                rows.append(row)
+            self._rows = rows
+        return self._rows
+
+
+    def _column_as_list(self, field_id):
+        '''
+        Returns the column for field_id with numpy scalars converted back into
+        python ints.
+        '''
+        column = self.columns[field_id]
+        if isinstance(column, numpy.ndarray):
+            return column.tolist()
+        return column
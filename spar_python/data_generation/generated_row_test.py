@@ -13,6 +13,7 @@
 import unittest
 import datetime
 import xml.etree.ElementTree as ElementTree
+import numpy
 
 
 import spar_python.data_generation.spar_variables as sv
@@ -124,4 +125,75 @@ class GeneratedRowTest(unittest.TestCase):
                          generated_xml)
         self.assertEqual(self.generated_row.in_query_aggregator_format[xml_field],
                          generated_xml)
-    
\ No newline at end of file
+
+
+    def test_agg_table(self):
+        table = generated_row.AggFormatTable([sv.VARS.FIRST_NAME, 
+                                              sv.VARS.DOB, sv.VARS.INCOME])
+        self.generated_row.agg_table = table
+        self.generated_row[sv.VARS.FIRST_NAME] = "Jonathan"
+        self.generated_row[sv.VARS.STATE] = sv.STATES.Maine
+        self.generated_row[sv.VARS.DOB] = datetime.date(2013,1,1)
+        # Nothing is converted until the aggregator format is asked for
+        self.assertNotIn('in_query_aggregator_format', 
+                         self.generated_row.__dict__)
+        # and then only the fields in the table are converted
+        self.assertDictEqual(self.generated_row.in_query_aggregator_format,
+                             { sv.VARS.FIRST_NAME : 'JONATHAN',
+                               sv.VARS.DOB : datetime.date(2013,1,1) })
+        self.assertIs(self.generated_row.in_query_aggregator_format,
+                      self.generated_row.in_query_aggregator_format)
+
+
+
+class GeneratedColumnBatchTest(unittest.TestCase):
+
+
+    def setUp(self):
+        
+        row_ids = [10, 11, 12]
+        columns = { sv.VARS.INCOME : [10, 20, 30],
+                    sv.VARS.FOO : [1, 2**64 - 1, 3],
+                    sv.VARS.STATE : [sv.STATES.Maine, sv.STATES.Ohio, 
+                                     sv.STATES.Maine],
+                    sv.VARS.FIRST_NAME : ['Jonathan', 'Ann', 'Bob'] }
+        self.column_batch = generated_row.GeneratedColumnBatch(row_ids, 
+                                                               columns)
+        
+    def test_len(self):
+        self.assertEqual(len(self.column_batch), 3)
+        
+    def test_columns(self):
+        income_column = self.column_batch.column(sv.VARS.INCOME)
+        self.assertIsInstance(income_column, numpy.ndarray)
+        self.assertListEqual(income_column.tolist(), [10, 20, 30])
+        # Too big for int64, so must stay a list
+        self.assertListEqual(self.column_batch.column(sv.VARS.FOO), 
+                             [1, 2**64 - 1, 3])
+        self.assertListEqual(self.column_batch.column(sv.VARS.ID), 
+                             [10, 11, 12])
+        
+    def test_agg_column(self):
+        self.assertListEqual(self.column_batch.agg_column(sv.VARS.STATE),
+                             ['MAINE', 'OHIO', 'MAINE'])
+        self.assertListEqual(self.column_batch.agg_column(sv.VARS.FIRST_NAME),
+                             ['JONATHAN', 'ANN', 'BOB'])
+        
+    def test_select_row_ids(self):
+        self.assertListEqual(
+            self.column_batch.select_row_ids([True, False, True]), [10, 12])
+        matches = self.column_batch.column(sv.VARS.INCOME) > 15
+        self.assertListEqual(self.column_batch.select_row_ids(matches), 
+                             [11, 12])
+        
+    def test_rows(self):
+        rows = self.column_batch.rows()
+        self.assertEqual(len(rows), 3)
+        self.assertIsInstance(rows[1], generated_row.GeneratedRow)
+        self.assertEqual(rows[1][sv.VARS.ID], 11)
+        self.assertEqual(rows[1][sv.VARS.INCOME], 20)
+        self.assertNotIsInstance(rows[1][sv.VARS.INCOME], numpy.integer)
+        self.assertEqual(rows[1][sv.VARS.FOO], 2**64 - 1)
+        self.assertEqual(rows[1].in_query_aggregator_format[sv.VARS.STATE],
+                         'OHIO')
+
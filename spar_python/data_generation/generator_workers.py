@@ -36,10 +36,13 @@ sys.path.append(base_dir)
 import multiprocessing
 import itertools
 import datetime
+import time
 
 import spar_python.data_generation.data_generator_engine\
        as data_generator_engine
 import spar_python.common.spar_random as spar_random
+import spar_python.common.distributions.frozen_distributions \
+    as frozen_distributions
 from spar_python.common.enum import Enum
 import Queue
 from spar_python.data_generation.progress_reporters import \
@@ -73,7 +76,10 @@ class DataGeneratorOptions(object): #pylint: disable-msg=R0903
                  num_rows = 100,
                  verbose = False,
                  aggregators = None,
-                 batch_size = 5):
+                 batch_size = 5,
+                 columnar = False,
+                 target_batch_seconds = 2.0,
+                 rng_substreams = False):
         '''
         Constructor. Current arguments (and valid options for data-generation)
         include:
@@ -97,6 +103,24 @@ class DataGeneratorOptions(object): #pylint: disable-msg=R0903
           will be lost in a crash. The Right Value for this parameter should
           be determined through experimentation.
                 
+        * columnar : If True, each batch of rows will be generated in columnar
+          form (see GeneratedColumnBatch in generated_row.py) and fed to the
+          map_reduce_column_batch() method of the aggregators, rather than
+          being generated and fed row-by-row.
+
+        * target_batch_seconds : In multi-process mode, batch_size is only the
+          size of the first batches. After that, the mothership measures how
+          long workers take per row and sizes batches so that each takes
+          about this many seconds to generate (see BatchSizer). If None,
+          every batch has batch_size rows.
+
+        * rng_substreams : If True, each field of each row is generated from
+          its own RNG substream, derived from the row's seed and the field
+          (see spar_random.seed_substream). Only the fields needed by the
+          aggregators (and any fields they are conditioned on) are then
+          generated, rather than every field up to the last one needed.
+          This generates different rows from a given seed than the default
+          (False), which is kept so that existing seeds still reproduce.
           
         '''
 
@@ -119,6 +143,64 @@ class DataGeneratorOptions(object): #pylint: disable-msg=R0903
         self.num_rows = num_rows
         self.verbose = verbose
         self.batch_size = batch_size
+        self.columnar = columnar
+        self.target_batch_seconds = target_batch_seconds
+        self.rng_substreams = rng_substreams
+
+
+
+class BatchSizer(object):
+    '''
+    Chooses the size of each batch sent to workers in multi-process mode.
+    Fixed-size batches are either too small (the mothership spends all its
+    time on messages once there are many workers) or too big (workers sit
+    idle at the end of the run while one finishes a huge batch), and the
+    right size depends on which fields and aggregators are in use. So
+    instead, workers report how long each batch took, and this class keeps
+    a smoothed estimate of the seconds-per-row and sizes batches to take
+    target_seconds each. Batches are also kept small enough that the rows
+    remaining can be spread over TAIL_BATCHES_PER_WORKER batches per worker.
+    '''
+
+    MIN_BATCH_SIZE = 1
+    MAX_BATCH_SIZE = 100000
+
+    # Weight given to the newest measurement in the seconds-per-row estimate
+    SMOOTHING = 0.3
+
+    TAIL_BATCHES_PER_WORKER = 2
+
+    def __init__(self, initial_size, target_seconds, num_processes):
+        self.initial_size = initial_size
+        self.target_seconds = target_seconds
+        self.num_processes = num_processes
+        self.seconds_per_row = None
+
+    def record(self, num_rows, seconds):
+        '''
+        Update the estimate with the time it took a worker to generate (and 
+        aggregate) a batch of num_rows rows.
+        '''
+        if num_rows <= 0:
+            return
+        measured = float(seconds) / num_rows
+        if self.seconds_per_row is None:
+            self.seconds_per_row = measured
+        else:
+            self.seconds_per_row = (self.SMOOTHING * measured +
+                                    (1 - self.SMOOTHING) * self.seconds_per_row)
+
+    def next_size(self, rows_remaining):
+        '''
+        Return the size of the next batch, given the number of rows that
+        have not yet been put into a batch.
+        '''
+        if self.target_seconds is None or self.seconds_per_row is None:
+            return self.initial_size
+        size = int(self.target_seconds / max(self.seconds_per_row, 1e-9))
+        tail_batches = self.TAIL_BATCHES_PER_WORKER * self.num_processes
+        size = min(size, rows_remaining // tail_batches)
+        return max(self.MIN_BATCH_SIZE, min(size, self.MAX_BATCH_SIZE))
 
 
 
@@ -276,16 +358,16 @@ class Worker(object):
         batches = self._make_multiprocessing_batches(self.id_seed_generator,
                                                      self.options.batch_size)
 
-        batch_result_tally = None
+        results = None
         
         for batch in batches:
             batch_result = engine.generate_and_aggregate_rows(batch)
-            batch_result_tally = self._record_batch_results(batch_result_tally,
-                                                             batch_result)
+            results = self._reduce_into_running_results(self.options.aggregators,
+                                                        results,
+                                                        batch_result)
             ripr.add(len(batch))
             
         ripr.done()
-        results = self._reduce_batch_results(batch_result_tally)
         engine.done()
         return results
 
@@ -319,13 +401,17 @@ class Worker(object):
     # 
     # * A GENERATED message, which travels over the results queue. This message
     # contains a batch-id, inidicating that the named batch has been
-    # fully generated without errors, and the aggregate results for that batch.
+    # fully generated without errors, along with the number of rows in the
+    # batch and the number of seconds it took. (The aggregate results for the
+    # batch stay on the worker, reduced into its running results.)
     #
     # * A DONE message, which travels over the tasks queue. This message
     # indicates to the worker that it is to terminate gracefully.
     #
     # * A DYING message, which travels from worker to mothership over the
-    # results queue. This message contains the id of the worker, indicates that
+    # results queue. This message contains the id of the worker and the
+    # worker's aggregate results (its batch-level results, reduced together
+    # by the worker as they were generated), and indicates that
     # the given worker is in a state where it can die gracefully. Due to
     # problems with earlier versions of this engine, a worker will both attempt
     # to terminate itself *and* the mothership will attempt to terminate workers
@@ -337,9 +423,11 @@ class Worker(object):
     #
     # Workers are pretty simple: they loop endlessly, taking tasks from the task
     # queue and processing them. If the task is a BATCH message, the worker
-    # generates the rows and sends back a GENERATED message over the results
+    # generates the rows, reduces the batch-level aggregate results into its
+    # running results, and sends back a GENERATED message over the results
     # queue. (The GENERATED message will hold the same batch ID as the BATCH
-    # message.) If the task was the DONE message, the worker terminates
+    # message.) If the task was the DONE message, the worker sends its
+    # running results back in its DYING message, and terminates
     # gracefully. And if an exception if raised on the worker process (including
     # a KeyboardInterrupt) the worker will trap it, embed it in an EXCEPTION
     # message, send the EXCEPTION message over the errors queue, and then
@@ -364,15 +452,20 @@ class Worker(object):
     # updates the ripr, removes the finished batch from outstanding_batches, 
     # puts another task into the task queue. (Generally, the mothership will try
     # to keep the task queue and outstanding_batches at about three tasks per
-    # worker process.) The mothership will then aggreate the results from the
-    # GENERATED message into its internal running 'tally' of aggregate results.
+    # worker process.) It also feeds the timing in the GENERATED message to a
+    # BatchSizer, which decides how big the batches it queues from then on
+    # should be. Because workers keep (and reduce) their own results,
+    # the mothership does very little per batch, and so does not become the
+    # bottleneck when there are many workers.
     # 
     # This continues until all batches are confirmed to be processed or the
     # mothership receives any messages over the error queue. If all batches are
     # confirmed to be done, then the mothership sends the DONE message to all
-    # workers. THe workers clean up any open files, subprocesses, etc., send
-    # back a DYING message to the mothership, and terminate. The mothership,
-    # upon receiving a DYING message, attempts to terminate the worker as well,
+    # workers. THe workers clean up any open files,
+    # subprocesses, etc., send back a DYING message to the mothership, and
+    # terminate. The mothership, upon receiving a DYING message, records the
+    # worker's results in its running 'tally' of aggregate results, and 
+    # attempts to terminate the worker as well,
     # in the spirit of belt *and* suspenders. 
     # 
     # 
@@ -408,6 +501,23 @@ class Worker(object):
             else:
                 raise StopIteration
             
+    @staticmethod
+    def _make_adaptive_batches(itr, sizer, num_rows):
+        '''
+        Like _make_multiprocessing_batches, but asks sizer (a BatchSizer) for
+        the size of each batch just before making it, so that later batches
+        reflect whatever sizer has learned in the meantime. num_rows is the
+        total number of items in itr.
+        '''
+        rows_remaining = num_rows
+        while rows_remaining > 0:
+            size = sizer.next_size(rows_remaining)
+            return_me = list(itertools.islice(itr, size))
+            if not return_me:
+                break
+            rows_remaining -= len(return_me)
+            yield return_me
+
     @staticmethod
     def extract_batch_bounds(batch):
         '''
@@ -429,15 +539,19 @@ class Worker(object):
         """
         Function to be executed by worker processes in multi-processing mode. 
         Will loop over tasks in the task_queue. If the task is a batch to 
-        generate, will generate and aggregate the batch. If the task is the DONE
-        signal, will clean up and exit. If exceptions/errors occur during either,
-        will capture the exception and send over the errors_queue.
+        generate, will generate and aggregate the batch, reducing the
+        batch-level results into this worker's running results as they come.
+        If the task is the DONE signal, will send those results back, clean
+        up and exit. If
+        exceptions/errors occur during any of these, will capture the
+        exception and send over the errors_queue.
         """
         
         return_code = 0 
         engine = data_generator_engine.DataGeneratorEngine(options,
                                                            dist_holder)
         done_attempted = False
+        worker_results = None
         try:
             while True:
                 # Note: the following line will block.
@@ -445,19 +559,29 @@ class Worker(object):
                 (signal, payload) = task
                 if signal == Worker.SIGNALS.BATCH:
                     (batch_id, batch) = payload
-                    # track whether we've already tried to call engine.done(),
-                    # so that we don't call it for a second time in the except:
-                    # clause
+                    start_time = time.time()
                     aggr_results = engine.generate_and_aggregate_rows(batch)
-                    msg = (Worker.SIGNALS.GENERATED, batch_id, aggr_results)
+                    elapsed = time.time() - start_time
+                    # Reduce each batch's results as soon as they arrive, so
+                    # that the worker holds one result per aggregator rather
+                    # than one per batch:
+                    worker_results = \
+                        Worker._reduce_into_running_results(
+                            options.aggregators, worker_results, aggr_results)
+                    msg = (Worker.SIGNALS.GENERATED, batch_id, 
+                           (len(batch), elapsed))
                     results_queue.put( msg )
                 else:
                     assert signal == Worker.SIGNALS.DONE
                     # Clean up code goes here.
+                    # track whether we've already tried to call engine.done(),
+                    # so that we don't call it for a second time in the except:
+                    # clause
                     if engine:
-                        done_attempted = False
+                        done_attempted = True
                         engine.done()
-                    results_queue.put( (Worker.SIGNALS.DYING, os.getpid()) )
+                    msg = (Worker.SIGNALS.DYING, os.getpid(), worker_results)
+                    results_queue.put( msg )
                     break
         except BaseException:
 
@@ -502,15 +626,20 @@ class Worker(object):
     def _generate_rows_multi_process(self):
         '''
         The code run by the mothership in multi-process mode. Returns
-        the non-reduced batch level results
+        the non-reduced worker level results (in the format produced by
+        _record_batch_results)
         '''
         self.logger.info("Generating rows in multiprocessor mode")
     
     
     
+        sizer = BatchSizer(self.options.batch_size,
+                           self.options.target_batch_seconds,
+                           self.options.num_processes)
         unqueued_batches = \
-            self._make_multiprocessing_batches(self.id_seed_generator,
-                                               self.options.batch_size)
+            self._make_adaptive_batches(self.id_seed_generator,
+                                        sizer,
+                                        self.options.num_rows)
     
         # Queue for sending batches to workers:
         tasks_queue = multiprocessing.Queue()
@@ -529,8 +658,8 @@ class Worker(object):
         outstanding_batches = {}
 
 
-        # Maintain a running record of batch-level aggregate 
-        # results sent back in GENERATED messages.
+        # Maintain a running record of the worker-level aggregate 
+        # results sent back in DYING messages.
         batch_result_tally = None
 
         
@@ -549,13 +678,20 @@ class Worker(object):
             tasks_queue.put(task)
             outstanding_batches[batch_id] = batch
     
+        # Freeze the distributions into shared memory before forking, so
+        # that the workers all read the same copy instead of each slowly
+        # copying the whole DistributionHolder (see frozen_distributions.py).
+        self.logger.debug("Freezing distributions into shared memory.")
+        shared_dist_holder = \
+            frozen_distributions.freeze_distribution_holder(self.dist_holder)
+
         # Start the pool of workers
         self.logger.debug("Task queue filled. Starting pool of workers.")
         
         process_list = \
             [multiprocessing.Process(target = Worker._spawned_worker,
                                      args = (self.options,
-                                             self.dist_holder,
+                                             shared_dist_holder,
                                              tasks_queue,
                                              results_queue,
                                              errors_queue))\
@@ -582,20 +718,16 @@ class Worker(object):
                         # an error arrives on the other queue in the meantime.
                         # So, time-out after one second.
                         msg = results_queue.get(True, 1)
-                        (signal, batch_id, batch_results) = msg
+                        (signal, batch_id, (num_rows, seconds)) = msg
                         assert signal == self.SIGNALS.GENERATED
                         batch = outstanding_batches[batch_id]
-                        self.logger.debug('Received results for batch %s', 
-                                          batch_id)
+                        self.logger.debug('Batch %s generated in %.3f '
+                                          'seconds', batch_id, seconds)
     
                         # process received batch
                         ripr.add_list(batch)
                         del outstanding_batches[batch_id]
-
-                        batch_result_tally = \
-                                self._record_batch_results(
-                                        batch_result_tally,
-                                        batch_results)
+                        sizer.record(num_rows, seconds)
     
                         # place a new tasks in the tasks queue
                         try:
@@ -654,29 +786,18 @@ class Worker(object):
 
             live_processes = {process.pid : process for process in process_list}
 
-            minutes_since_last_message = 0
+            seconds_since_last_message = 0
             
             while live_processes:
-                self.logger.debug("Waiting to hear back from: %s", 
-                                  live_processes)
                 try:
-                    # TODO(njhwang) this was lengthened since 5 seconds didn't
-                    # appear long enough for aggregators to finalize (especially
-                    # if flushing a large amount of data?), so just lengthened
-                    # this to a minute. Generally, it's fine if this timeout
-                    # expires and there are no errors in the queue.
-                    # TODO(njhwang) update...it looks like even 60 seconds isn't
-                    # sufficient here. if the workers have tons of aggregators
-                    # that are chewing on stuff, timing out here will end data
-                    # generation and not give them a chance to finish. seems
-                    # like we need to block indefinitely here, and manually kill
-                    # if needed after checking to see how many rows got
-                    # generated and whether query data was flushed to
-                    # files/results databases.
-                    msg = results_queue.get(True, 60)
-                    minutes_since_last_message = 0
+                    # Note: workers call engine.done() before sending the
+                    # DYING message, which can take a while for some
+                    # aggregators. So we block indefinitely here, but
+                    # check the errors queue every second in the meantime.
+                    msg = results_queue.get(True, 1)
+                    seconds_since_last_message = 0
                 except Queue.Empty:
-                    minutes_since_last_message += 1
+                    seconds_since_last_message += 1
                     
                     # There aren't enough DYING messages. Go check the errors 
                     # queue
@@ -686,25 +807,32 @@ class Worker(object):
                         # raise exceptions
                     except Queue.Empty:
                         # No error messages. Maybe we haven't waited long enough
-                        # Log it, but try again
-                        self.logger.debug("Waiting for DYING messages from "
-                                          "processes %s. No response from "
-                                          "them, but no errors from them "
-                                          "either. Minutes since last message "
-                                          "reception: %s.",
-                                          live_processes.keys(),
-                                          minutes_since_last_message)
+                        # Log it (once a minute), but try again
+                        if seconds_since_last_message % 60 == 0:
+                            self.logger.debug("Waiting for DYING messages "
+                                              "from processes %s. No "
+                                              "response from them, but no "
+                                              "errors from them either. "
+                                              "Seconds since last message "
+                                              "reception: %s.",
+                                              live_processes.keys(),
+                                              seconds_since_last_message)
                         continue
         
 
-                self.logger.debug("Received message: %s", msg)      
-
-                (signal, pid) = msg
+                (signal, pid, worker_results) = msg
                 assert signal == Worker.SIGNALS.DYING
                 assert pid in live_processes, (pid, live_processes)
+                self.logger.debug("Received DYING message from %s", pid)
 
                 del live_processes[pid]
 
+                # A worker which never got a batch has no results
+                if worker_results is not None:
+                    batch_result_tally = \
+                        self._record_batch_results(batch_result_tally,
+                                                   worker_results)
+
             for proc in process_list:
                 proc.terminate()
 
@@ -747,7 +875,26 @@ class Worker(object):
         return
         
 
-    def _record_batch_results(self, running_list, batch_result):
+    @staticmethod
+    def _reduce_into_running_results(aggregators, running_results,
+                                     batch_result):
+        """
+        Reduce a batch-level result (one value per aggregator) into the
+        running results (in the same format), and return the new running
+        results. If running_results is None, the batch-level result becomes
+        the running results. The running result is passed to reduce() first,
+        as it will have been created by reducing more rows.
+        """
+        if running_results is None:
+            return list(batch_result)
+        assert len(running_results) == len(batch_result)
+        return [agg.reduce(running_result, agg_batch_result)
+                for (agg, running_result, agg_batch_result)
+                in zip(aggregators, running_results, batch_result)]
+
+
+    @staticmethod
+    def _record_batch_results(running_list, batch_result):
         """
         Add a batch-level result to the running list of batch-level results.
         This running tally has been unzipped from the batch-level results.
@@ -309,6 +309,53 @@ class GenerateDataTest(unittest.TestCase):
         self.assertRaises(StopIteration, l2.next)
 
 
+    def test_make_adaptive_batches(self):
+        sizer = gw.BatchSizer(3, None, 2)
+        batches = self.worker._make_adaptive_batches(iter(xrange(10)), 
+                                                     sizer, 10)
+        self.assertListEqual(list(batches), 
+                             [[0,1,2], [3,4,5], [6,7,8], [9]])
+
+        class FixedSizer(object):
+            def __init__(self):
+                self.sizes = iter([1, 4, 2, 100])
+                self.rows_remaining = []
+            def next_size(self, rows_remaining):
+                self.rows_remaining.append(rows_remaining)
+                return self.sizes.next()
+        sizer = FixedSizer()
+        batches = self.worker._make_adaptive_batches(iter(xrange(10)), 
+                                                     sizer, 10)
+        self.assertListEqual(list(batches), 
+                             [[0], [1,2,3,4], [5,6], [7,8,9]])
+        self.assertListEqual(sizer.rows_remaining, [10, 9, 5, 3])
+
+    def test_batch_sizer(self):
+        sizer = gw.BatchSizer(1000, 2.0, 4)
+        # No measurements yet
+        self.assertEqual(sizer.next_size(10**6), 1000)
+        # 1ms per row
+        sizer.record(1000, 1.0)
+        self.assertEqual(sizer.next_size(10**6), 2000)
+        # Never so big that the remaining rows can't be spread over the
+        # workers
+        self.assertEqual(sizer.next_size(800), 
+                         800 // (4 * sizer.TAIL_BATCHES_PER_WORKER))
+        self.assertEqual(sizer.next_size(0), sizer.MIN_BATCH_SIZE)
+        # Slower batches mean smaller batches, but smoothly
+        sizer.record(100, 1.0)
+        self.assertLess(sizer.next_size(10**6), 2000)
+        self.assertGreater(sizer.next_size(10**6), 200)
+        # Extremely fast rows are capped
+        fast_sizer = gw.BatchSizer(1000, 2.0, 4)
+        fast_sizer.record(1000, 0.0)
+        self.assertEqual(fast_sizer.next_size(10**9), 
+                         fast_sizer.MAX_BATCH_SIZE)
+        # No target: fixed-size batches
+        fixed_sizer = gw.BatchSizer(1000, None, 4)
+        fixed_sizer.record(1000, 1.0)
+        self.assertEqual(fixed_sizer.next_size(10**6), 1000)
+
     def test_extract_batch_bounds(self):
         batch = [(1,2), (3,4), (5,6), (7,8)]
         bounds = self.worker.extract_batch_bounds(batch)
@@ -405,6 +452,17 @@ class GenerateDataTest(unittest.TestCase):
             
             
 
+    def test_reduce_into_running_results(self):
+        aggregators = [_CheckShared([]), ca.CountsAggregator()]
+        running_results = None
+        for batch_result in [[1, 10], [2, 20], [3, 30]]:
+            running_results = gw.Worker._reduce_into_running_results(
+                aggregators, running_results, batch_result)
+        self.assertListEqual(running_results, [6, 60])
+        # one reduce() per batch after the first:
+        self.assertEqual(aggregators[0].reduce_call_counter, 2)
+
+
     def test_generate_aggregate_results(self):
                 
         self.options.aggregators = [ca.CountsAggregator()]
@@ -595,8 +653,11 @@ class GenerateDataTest(unittest.TestCase):
         # How many times did the *top-level* CheckShared.reduce get called?
         # IF a single aggregator was shared, it would be 199. 
         # If the mothership's aggregator is not shared with the workers,
-        # it should be 19.
-        self.assertEqual(top_level_aggregator.reduce_call_counter, 19)
+        # it only reduces together the results of the workers (which reduce
+        # their own batch-level results), so it should be at most 
+        # num_processes - 1.
+        self.assertLessEqual(top_level_aggregator.reduce_call_counter,
+                             num_processes - 1)
 
 
 
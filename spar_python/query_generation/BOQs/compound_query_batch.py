@@ -22,6 +22,7 @@ import spar_python.report_generation.ta1.ta1_schema as rdb
 import spar_python.data_generation.spar_variables as sv
 import spar_python.query_generation.query_ids as qids
 import spar_python.common.aggregators.query_aggregator as qa
+import spar_python.common.aggregators.row_bitmaps as row_bitmaps
 import spar_python.query_generation.query_schema as qs
 import itertools
 import logging
@@ -134,6 +135,7 @@ class AndQueryBatch(CompoundQueryBatch):
         else:
             refined_total = 0    
             refined_queries = []
+            bitmaps = row_bitmaps.RecordIdBitmaps()
             for x in xrange(len(self.queries)):
                 comp_q = self.queries[x]
                 sub_results = agg_results[qs.QRY_SUBRESULTS]
@@ -191,10 +193,10 @@ class AndQueryBatch(CompoundQueryBatch):
                         seen_where_group.append(values)
                         
                         #check conditions
-                        matching_ids_set = reduce(set.intersection, 
-                                      [set(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
-                                                                         in clause_list])
-                        count = len(matching_ids_set)
+                        matching_bitmap = row_bitmaps.intersection(
+                                      [bitmaps.bitmap(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
+                                                                                    in clause_list])
+                        count = row_bitmaps.count(matching_bitmap)
      
                         if not all([count >= qbs.get_rss_lower(comp_q[qs.QRY_ENUM]),
                                 count <= qbs.get_rss_upper(comp_q[qs.QRY_ENUM]),
@@ -210,18 +212,21 @@ class AndQueryBatch(CompoundQueryBatch):
                         working_clauses = clause_list 
                         reordered_clauses = working_clauses[:1]
                         working_clauses.remove(reordered_clauses[0])
-                        cumulative_set = set(reordered_clauses[0][1][rdb.DBF_MATCHINGRECORDIDS])
+                        cumulative_bitmap = bitmaps.bitmap(reordered_clauses[0][1][rdb.DBF_MATCHINGRECORDIDS])
                         while len(working_clauses) > 0:
                             next_clause = working_clauses[0]
-                            current_set = cumulative_set.intersection(working_clauses[0][1][rdb.DBF_MATCHINGRECORDIDS])
+                            current_bitmap = cumulative_bitmap & bitmaps.bitmap(working_clauses[0][1][rdb.DBF_MATCHINGRECORDIDS])
+                            current_count = row_bitmaps.count(current_bitmap)
                             for clauses in working_clauses:
-                                potential_set = cumulative_set.intersection(clauses[1][rdb.DBF_MATCHINGRECORDIDS])
-                                if len(potential_set) < len(current_set):
+                                potential_bitmap = cumulative_bitmap & bitmaps.bitmap(clauses[1][rdb.DBF_MATCHINGRECORDIDS])
+                                potential_count = row_bitmaps.count(potential_bitmap)
+                                if potential_count < current_count:
                                     next_clause = clauses
-                                    current_set = potential_set     
+                                    current_bitmap = potential_bitmap
+                                    current_count = potential_count
                             working_clauses.remove(next_clause)
                             reordered_clauses.append(next_clause)
-                            cumulative_set = current_set
+                            cumulative_bitmap = current_bitmap
             
                         working_clauses = reordered_clauses
             
@@ -232,9 +237,8 @@ class AndQueryBatch(CompoundQueryBatch):
                         comp_q[qs.QRY_SUBBOBS] = [b for ((_,b), _) in working_clauses]
             
                         ftm_match = len(working_clauses[0][1][rdb.DBF_MATCHINGRECORDIDS])
-                        matching_ids_set = reduce(set.intersection, 
-                                      [set(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
-                                                                         in working_clauses])
+                        #reordering the clauses does not change their intersection
+                        matching_ids_set = bitmaps.record_ids(matching_bitmap)
                         comp_q_results[qs.QRY_SUBRESULTS] = [r for (_,r) in working_clauses]
                         comp_q_results[rdb.DBF_MATCHINGRECORDIDS] = matching_ids_set
                         comp_q_results[qs.QRY_NUMRECORDSMATCHINGFIRSTTERM] = ftm_match
@@ -291,6 +295,7 @@ class AndTA2QueryBatch(AndQueryBatch):
         else:    
             refined_queries = []
             refined_total=0
+            bitmaps = row_bitmaps.RecordIdBitmaps()
             for x in xrange(len(self.queries)):
                 comp_q = self.queries[x]
                 sub_results = agg_results[qs.QRY_SUBRESULTS]
@@ -329,10 +334,10 @@ class AndTA2QueryBatch(AndQueryBatch):
                         if len(values)!=len(set(values)) or values in seen_where_group:
                             continue
                         seen_where_group.append(values)
-                        matching_ids_set = reduce(set.intersection, 
-                                      [set(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
-                                                                         in clause_list])
-                        count = len(matching_ids_set)
+                        matching_bitmap = row_bitmaps.intersection(
+                                      [bitmaps.bitmap(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
+                                                                                    in clause_list])
+                        count = row_bitmaps.count(matching_bitmap)
                         P2_cats = [q for ((q,_),_) in clause_list if q[qs.QRY_CAT] == 'P2']
                         if not all([count >= qbs.get_rss_lower(comp_q[qs.QRY_ENUM]),
                                 count <= qbs.get_rss_upper(comp_q[qs.QRY_ENUM]),
@@ -363,9 +368,8 @@ class AndTA2QueryBatch(AndQueryBatch):
                         comp_q['sub_queries'] = [q for ((q,_),_) in working_clauses]
                         comp_q[qs.QRY_SUBBOBS] = [b for ((_,b), _) in working_clauses]
                         ftm_match = len(working_clauses[0][1][rdb.DBF_MATCHINGRECORDIDS])
-                        matching_ids_set = reduce(set.intersection, 
-                                      [set(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
-                                                                         in working_clauses])
+                        #reordering the clauses does not change their intersection
+                        matching_ids_set = bitmaps.record_ids(matching_bitmap)
                         comp_q_results[qs.QRY_SUBRESULTS] = [r for (_,r) in working_clauses]
                         comp_q_results[rdb.DBF_MATCHINGRECORDIDS] = matching_ids_set
                         comp_q_results[qs.QRY_NUMRECORDSMATCHINGFIRSTTERM] = ftm_match
@@ -432,6 +436,7 @@ class OrQueryBatch(CompoundQueryBatch):
         else: 
             refined_total = 0   
             refined_queries = []
+            bitmaps = row_bitmaps.RecordIdBitmaps()
             for x in xrange(len(self.queries)):
                 comp_q = self.queries[x]
                 sub_results = agg_results[qs.QRY_SUBRESULTS]
@@ -477,10 +482,10 @@ class OrQueryBatch(CompoundQueryBatch):
                     seen_where_group.append(values)
                     
                     #check conditions
-                    matching_ids_set = reduce(set.union, 
-                              [set(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
-                                                                 in clause_list])
-                    count = len(matching_ids_set)
+                    matching_bitmap = row_bitmaps.union(
+                              [bitmaps.bitmap(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
+                                                                            in clause_list])
+                    count = row_bitmaps.count(matching_bitmap)
                     all_match = sum(map(len, [r[rdb.DBF_MATCHINGRECORDIDS] for (_, r) in clause_list]))
                     if not all([count >= qbs.get_rss_lower(comp_q[qs.QRY_ENUM]),
                                 count <= qbs.get_rss_upper(comp_q[qs.QRY_ENUM]),
@@ -501,7 +506,7 @@ class OrQueryBatch(CompoundQueryBatch):
                     ftm_match = len(working_clauses[0][1][rdb.DBF_MATCHINGRECORDIDS])
 
                     comp_q_results[qs.QRY_SUBRESULTS] = [r for (_,r) in working_clauses]
-                    comp_q_results[rdb.DBF_MATCHINGRECORDIDS] = matching_ids_set
+                    comp_q_results[rdb.DBF_MATCHINGRECORDIDS] = bitmaps.record_ids(matching_bitmap)
                     comp_q_results[qs.QRY_SUMRECORDSMATCHINGEACHTERM] = all_match
                     comp_q_results[qs.QRY_NUMRECORDSMATCHINGFIRSTTERM] = ftm_match
 
@@ -580,6 +585,7 @@ class ThresholdQueryBatch(CompoundQueryBatch):
         else:
             refined_total = 0
             refined_queries = []
+            bitmaps = row_bitmaps.RecordIdBitmaps()
             for x in xrange(len(self.queries)):
                 comp_q = self.queries[x]
                 sub_results = agg_results[qs.QRY_SUBRESULTS]
@@ -623,13 +629,11 @@ class ThresholdQueryBatch(CompoundQueryBatch):
                    if not all([stfm >= qbs.get_tm_rss_lower(comp_q[qs.QRY_ENUM]),
                                stfm <= qbs.get_tm_rss_upper(comp_q[qs.QRY_ENUM])]):
                        continue
-                   #if stfm does match, calculate the set intersection
-                   matching_ids_set = set()
-                   for m_set in itertools.combinations(clause_list, comp_q[qs.QRY_M]):
-                       matching_ids_set.update(reduce(set.intersection, 
-                                 [set(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
-                                                                    in m_set]))
-                   count = len(matching_ids_set)
+                   #if stfm does match, find the records matching at least m clauses
+                   clause_bitmaps = [bitmaps.bitmap(r[rdb.DBF_MATCHINGRECORDIDS]) for (_,r)
+                                                                                  in clause_list]
+                   matching_bitmap = row_bitmaps.threshold(clause_bitmaps, comp_q[qs.QRY_M])
+                   count = row_bitmaps.count(matching_bitmap)
                    
                    #check overall compliance     
                    if not all([count >= qbs.get_rss_lower(comp_q[qs.QRY_ENUM]),
@@ -650,19 +654,15 @@ class ThresholdQueryBatch(CompoundQueryBatch):
                
                    #have to create a list of counts of how many that match N terms, n-1 terms...
                    #until m. Such of the form 34 | 384 | 1094
-                   records_matching_count = dict(zip(range(comp_q[qs.QRY_M],
-                                               comp_q[qs.QRY_N]+1),
-                                         [0]*comp_q[qs.QRY_N]))
-                   for id in matching_ids_set:
-                       matching_terms = [1 if id in clause[1][rdb.DBF_MATCHINGRECORDIDS] else 0
-                                   for clause in working_clauses]
-                       term_matches = sum(matching_terms)
-                       records_matching_count[term_matches] +=1
+                   exact_counts = row_bitmaps.exactly(clause_bitmaps)
+                   records_matching_count = dict((term_matches, exact_counts[term_matches])
+                                                 for term_matches in range(comp_q[qs.QRY_M],
+                                                                           comp_q[qs.QRY_N]+1))
                    matching_records_counts = sorted(records_matching_count.values(), 
                                                         reverse=True)
                    #update the results dictionary with the new calculated values
                    comp_q_results[qs.QRY_SUBRESULTS] = [r for (_,r) in working_clauses]
-                   comp_q_results[rdb.DBF_MATCHINGRECORDIDS] = matching_ids_set
+                   comp_q_results[rdb.DBF_MATCHINGRECORDIDS] = bitmaps.record_ids(matching_bitmap)
                    comp_q_results[qs.QRY_MATCHINGRECORDCOUNTS] = matching_records_counts
      
        
@@ -15,6 +15,8 @@ import sqlite3
 import string
 import sys
 
+import spar_python.report_generation.common.results_schema as results_schema
+
 LOGGER = logging.getLogger(__name__)
 
 def make_expanded_path(file_name):
@@ -42,8 +44,9 @@ def fill_hashes_column(mariadb_conn, sqlite_conn, separator='|'):
     Inputs:
     mariadb_conn: connection to the MariaDB database
     sqlite_conn: connection to the sqlite3 database
-    separator (optional): separator in matching_record_ids/hashes table
-        default='|'
+    separator (optional): separator in matching_record_hashes (and in
+        matching_record_ids, in databases from before the ids were packed
+        into BLOBs) default='|'
     
     Returns: nothing
     '''
@@ -64,14 +67,18 @@ def fill_hashes_column(mariadb_conn, sqlite_conn, separator='|'):
         # Get the matching ids
         qid = row[0]
         LOGGER.debug('Processing QID %s (#%s)', qid, qid_count)
-        matching_ids = string.split(row[1], sep=separator)
+        if isinstance(row[1], buffer):
+            # packed 64-bit ids (see results_schema.pack_integer_list)
+            matching_ids = results_schema.unpack_integer_list(row[1])
+        else:
+            # account for possiblity of no maching IDs (sqlite will return
+            # an empty string)
+            matching_ids = [int(matching_id) for matching_id 
+                            in string.split(row[1], sep=separator)
+                            if len(matching_id)]
         # Convert IDs to hashes
         matching_hashes = []
         for matching_id in matching_ids:
-            # account for possiblity of no maching IDs (sqlite will return
-            # an empty string)
-            if not len(matching_id):
-              continue
             if matching_id in row_hash_map:
                 thishash = row_hash_map[matching_id]
             else:
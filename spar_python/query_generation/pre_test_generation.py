@@ -44,9 +44,12 @@ from optparse import OptionParser, OptionGroup, SUPPRESS_HELP
 import multiprocessing as mp
 
 import spar_python.common.aggregators.line_raw_aggregator as lra
+import spar_python.common.aggregators.query_aggregator as qa
 import spar_python.data_generation.generator_workers as gw
 import spar_python.data_generation.learn_distributions as learn_distributions    
+import spar_python.data_generation.distribution_cache as distribution_cache
 import spar_python.query_generation.query_generation as query_generation 
+import spar_python.query_generation.query_schema as qs
 import spar_python.report_generation.ta1.ta1_database as ta1_database   
 import spar_python.query_generation.check_schema as cs
 import spar_python.common.spar_random as spar_random 
@@ -102,14 +105,20 @@ def generate_rows(options, queryset_aggregators, logger, dist_holder):
     # the results to be at the beginning of the result list. This requires 
     # that queryset_aggregators be at the beginning of the options.aggregators
     # list.
+    #
+    # The queryset aggregators are wrapped in a single GenChooseAggregator so
+    # that all of their atomic queries are matched against each batch of rows
+    # together (see multi_query_matcher.py). Its sub-results are unwrapped
+    # again below.
     
-    options.aggregators = queryset_aggregators + options.aggregators
+    queries_aggregator = qa.GenChooseAggregator(queryset_aggregators)
+    options.aggregators = [queries_aggregator] + options.aggregators
 
     # Spawn a worker and start it
     
     worker = gw.Worker(options, logger, dist_holder)
     aggregator_results = worker.start()
-    return aggregator_results
+    return aggregator_results[0][qs.QRY_SUBRESULTS] + aggregator_results[1:]
 
 #will probably run into problems writing to the same query file, if so
 #fork that out into another function call and just pool refinement
@@ -169,7 +178,12 @@ def set_up_and_execute_run(cl_flags, logger):
     parsed and verified.
     """
     
-    dist_holder = learn_distributions.learn_distributions(cl_flags, logger)
+    if cl_flags.distribution_cache_dir is not None:
+        dist_holder = \
+            distribution_cache.learn_distributions_cached(
+                cl_flags, logger, cl_flags.distribution_cache_dir)
+    else:
+        dist_holder = learn_distributions.learn_distributions(cl_flags, logger)
 
     
     ##########################################################################
@@ -184,7 +198,10 @@ def set_up_and_execute_run(cl_flags, logger):
                                       cl_flags.num_rows,
                                       cl_flags.verbose,
                                       [],
-                                      batch_size)
+                                      batch_size,
+                                      cl_flags.columnar_batches,
+                                      rng_substreams =
+                                      cl_flags.rng_substreams)
 
     if cl_flags.line_raw_file is not None:
         
@@ -238,6 +255,13 @@ def main():
             'data generation are missing. This flag will cause this '
             'program not to crash and to continue learning what it can. '
             'Generally, this is useful only for debugging')
+    learning_group.add_option('--distribution-cache-dir',
+            dest='distribution_cache_dir', default=None,
+            help = 'Directory in which to cache the learned distributions. '
+            'If a cache entry matching the data files and settings exists, '
+            'it is loaded instead of re-learning the distributions; '
+            'otherwise the learned distributions are added to the cache. '
+            'By default, distributions are always re-learned')
     parser.add_option_group(learning_group)
     
 
@@ -274,6 +298,16 @@ def main():
     gen_group.add_option('--row_width', help='the average width of rows in the database'\
                          ' , given in bytes',
                          dest='row_width', type = 'int', default = 100)
+    gen_group.add_option('--columnar-batches', dest = 'columnar_batches',
+            action = 'store_true', default = False,
+            help = 'Generate each batch of rows in columnar form and '
+            'aggregate it column-by-column rather than row-by-row. '
+            'Produces the same rows, but faster.')
+    gen_group.add_option('--rng-substreams', dest = 'rng_substreams',
+            action = 'store_true', default = False,
+            help = 'Generate each field of each row from its own random '
+            'substream, so that only the fields needed are generated. '
+            'Produces different rows than the default for the same seed.')
     parser.add_option_group(gen_group)
     
     query_group = OptionGroup(parser, 'Options that control query generation')
@@ -14,6 +14,7 @@ sys.path.append(base_dir)
 
 import spar_python.query_generation.query_schema as qs
 import spar_python.report_generation.ta1.ta1_schema as rdb
+import spar_python.report_generation.common.results_schema as rs
 import spar_python.report_generation.ta1.ta1_database as ta1_database        
 import spar_python.query_generation.query_result as qr
 import spar_python.query_generation.query_ids as qids
@@ -724,7 +725,7 @@ class StaticMethodsTest(unittest.TestCase):
             (rdb.DBF_RECORDSIZE, self._query1[qs.QRY_DBRECORDSIZE]),
             (rdb.DBF_WHERECLAUSE, self._query1[qs.QRY_WHERECLAUSE]),
             (rdb.DBF_NUMMATCHINGRECORDS,  2),
-            (rdb.DBF_MATCHINGRECORDIDS, "1|3" ),
+            (rdb.DBF_MATCHINGRECORDIDS, rs.pack_integer_list([1, 3])),
             (rdb.DBF_P1NUMTERMSPERCLAUSE, 
              self._query1[qs.QRY_NUMTERMSPERCLAUSE]),
             (rdb.DBF_P1ANDNUMRECORDSMATCHINGFIRSTTERM, 
@@ -764,7 +765,7 @@ class StaticMethodsTest(unittest.TestCase):
             (rdb.DBF_RECORDSIZE, self._query2[qs.QRY_DBRECORDSIZE]),
             (rdb.DBF_WHERECLAUSE, self._query2[qs.QRY_WHERECLAUSE]),
             (rdb.DBF_NUMMATCHINGRECORDS,  2),
-            (rdb.DBF_MATCHINGRECORDIDS, "1|3" ),
+            (rdb.DBF_MATCHINGRECORDIDS, rs.pack_integer_list([1, 3])),
             (rdb.DBF_P1NEGATEDTERM, "0|1"), 
             (rdb.DBF_P1NUMTERMSPERCLAUSE, 
              self._query2[qs.QRY_NUMTERMSPERCLAUSE]),
@@ -30,12 +30,22 @@ class Config(object):
         performerprototype: the name of the performer prototype
         baselinename: the name of the baseline
         tanum: the number of the technical area (should be 1 or 2)
+        check_query_plans: whether the plan of every query made of the results
+            database is to be checked for full table scans
+        memoize_queries: whether the values retrieved from the results database
+            are to be memoized, so that report sections asking for the same
+            values do not query the database again
+        num_processes: the number of processes in which the sections of the
+            report are to be rendered
     """
     def __init__(self):
         """Initializes the configuration object"""
         # other parameters with default value:
         self.threshold_rsquared = .75
         self.numsigfigs = 3
+        self.check_query_plans = False
+        self.memoize_queries = True
+        self.num_processes = 1
         # per-performer parameters:
         self.results_db_path = None
         self.img_dir = None
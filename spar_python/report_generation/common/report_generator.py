@@ -13,11 +13,35 @@
 
 # general imports:
 import logging
+import multiprocessing
 import os
 
 # LOGGER:
 LOGGER = logging.getLogger(__file__)
 
+# the report generator whose sections are being rendered in a process pool;
+# the pool's worker processes are forked from the one which sets this, and so
+# inherit it along with all of its pre-processing:
+_POOL_REPORT_GENERATOR = None
+
+def _init_pool_worker():
+    """Gives a worker process its own read-only connection to the results
+    database."""
+    _POOL_REPORT_GENERATOR.config.results_db.reconnect(read_only=True)
+
+def _render_section(section_index):
+    """Renders the section_index-th section of the report generator in a
+    worker process, and returns its LaTeX string (or None if it should not be
+    included), along with the full table scans found while rendering it; a
+    module-level function, so that it can be handed to a multiprocessing
+    pool."""
+    results_db = _POOL_REPORT_GENERATOR.config.results_db
+    section = _POOL_REPORT_GENERATOR._sections[section_index]
+    string = None
+    if section.should_be_included():
+        string = section.get_string()
+    return (string, results_db.get_full_scans())
+
 class ReportGenerator(object):
     """Represents a report generator.
     This is the superclass to the TA1 and the TA2 report generators, which are
@@ -33,6 +57,9 @@ class ReportGenerator(object):
         environment."""
         self.config = config
         self._jinja_env = jinja_env
+        # make sure that the results database has all of its indices before
+        # any of the queries needed for the report are made of it:
+        self.config.results_db.create_indices()
         
     def _create_sections(self):
         """Populates the sections attribute."""
@@ -44,14 +71,36 @@ class ReportGenerator(object):
             this_section = section_class(template, self)
             self._sections.append(this_section)
 
+    def _get_section_strings(self):
+        """Returns the list of the LaTeX strings representing the sections to
+        be included, in order. If the configuration asks for more than one
+        process, the sections are rendered in a pool of that many processes,
+        each with its own read-only connection to the results database."""
+        num_processes = self.config.num_processes
+        if num_processes <= 1 or self.config.results_db_path == ":memory:":
+            return [section.get_string() for section in self._sections
+                    if section.should_be_included()]
+        global _POOL_REPORT_GENERATOR
+        _POOL_REPORT_GENERATOR = self
+        pool = multiprocessing.Pool(num_processes, _init_pool_worker)
+        try:
+            results = pool.map(_render_section, range(len(self._sections)),
+                               chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+            _POOL_REPORT_GENERATOR = None
+        for (string, full_scans) in results:
+            self.config.results_db.add_full_scans(full_scans)
+        return [string for (string, full_scans) in results
+                if string is not None]
+
     def get_string(self):
         """Returns the LaTeX string representing the report."""
         if not self._sections:
             self._create_sections()
         template = self._jinja_env.get_template(self._report_template_name)
         outp = {}
-        outp["sections"] = os.linesep.join(
-            [section.get_string() for section in self._sections
-             if section.should_be_included()])
+        outp["sections"] = os.linesep.join(self._get_section_strings())
         string = template.render(outp=outp, config=self.config)
         return string
@@ -11,6 +11,8 @@
 # **************************************************************
 
 # general imports:
+import binascii
+import contextlib
 import sqlite3
 import csv
 import logging
@@ -32,18 +34,41 @@ class ResultsDB(object):
         _db_conn: the sqlite connection to the results database
         _db_curs: the cursour of the results database
         _schema: a results database schema object
+        _bulk_depth: the number of bulk_writes sessions currently open
+        _insert_plans: maps (table, frozenset of fields) to the field order,
+            prepared statement and value processors used to insert rows
+            with those fields (see _get_insert_plan)
+        _check_query_plans: whether the query plan of every query is checked
+            for full table scans before it is run
+        _query_plan_scans: maps each query whose plan has been checked to the
+            list of full table scans in its plan
+        _memoize_queries: whether the values retrieved by queries are memoized
+        _memoized_values: maps each memoized query to the values it retrieved;
+            emptied whenever the database is written to
     """
 
-    def __init__(self, db_path, schema):
+    def __init__(self, db_path, schema, check_query_plans=False,
+                 memoize_queries=False):
         """
         Initializes the database with a location (db_path), a schema module and
-        a logger, then starts the connecion and provides a cursor.
+        a logger, then starts the connecion and provides a cursor. If
+        check_query_plans is True, the plan of every query is checked for full
+        table scans (see get_full_scans). If memoize_queries is True, the values
+        retrieved by each query are remembered until the next write to the
+        database, so that asking for the same values again does not query the
+        database (see _memoize).
         """
         # Establish database connection:
         self._db_path = db_path
         self._db_conn = sqlite3.connect(self._db_path)
         self._db_curs = self._db_conn.cursor()
         self._schema = schema
+        self._bulk_depth = 0
+        self._insert_plans = {}
+        self._check_query_plans = check_query_plans
+        self._query_plan_scans = {}
+        self._memoize_queries = memoize_queries
+        self._memoized_values = {}
 
         # build the tables if they do not already exist:
         table_creation_cmds = [
@@ -53,14 +78,18 @@ class ResultsDB(object):
         for table_creation_cmd in table_creation_cmds:
             self._execute(table_creation_cmd)
         
-    def _execute(self, sql_cmd):
+    def _execute(self, sql_cmd, is_query=False):
         """
         Executes the speicified command on the database.
 
         Args:
           sql_cmd: a sql command
+          is_query: whether the command is known not to change the database
+              (if not, all memoized values are forgotten)
         """
         #LOGGER.info(sql_cmd)
+        if not is_query:
+            self._memoized_values.clear()
         try:
             self._db_curs.execute(sql_cmd)
             self._commit()
@@ -69,6 +98,65 @@ class ResultsDB(object):
                 sql_cmd, e.args)]
             raise e
 
+    def _execute_query(self, sql_cmd):
+        """
+        Executes the specified query on the database, first checking its plan
+        for full table scans if query plans are being checked.
+
+        Args:
+          sql_cmd: a sql query
+        """
+        if self._check_query_plans:
+            self._check_query_plan(sql_cmd)
+        self._execute(sql_cmd, is_query=True)
+
+    def _check_query_plan(self, sql_cmd):
+        """
+        Finds the full table scans in the plan of the specified query, and
+        logs a warning for each of them the first time that the query is seen.
+
+        Args:
+          sql_cmd: a sql query
+        """
+        if sql_cmd in self._query_plan_scans:
+            return
+        self._execute("EXPLAIN QUERY PLAN " + sql_cmd, is_query=True)
+        # the last column of each row of a query plan describes one step of
+        # it; a table which is read in full shows up as "SCAN <table>" (or
+        # "SCAN TABLE <table>" in older versions of sqlite), even when it is
+        # read through an index ("SCAN <table> USING [COVERING] INDEX ..."),
+        # while only a table which is looked up by a constraint shows up as
+        # "SEARCH <table> ...":
+        scans = [str(row[-1]) for row in self._fetchall()
+                 if str(row[-1]).startswith("SCAN")
+                 and str(row[-1]) != "SCAN CONSTANT ROW"]
+        for scan in scans:
+            LOGGER.warning("Full table scan (%s) in the query: %s",
+                           scan, sql_cmd)
+        self._query_plan_scans[sql_cmd] = scans
+
+    def get_full_scans(self):
+        """
+        Returns:
+            A list of tuples of the form (query, scan), one for each full table
+            scan found in the plan of a query run on the database while query
+            plans were being checked.
+        """
+        return [(sql_cmd, scan)
+                for sql_cmd in sorted(self._query_plan_scans.keys())
+                for scan in self._query_plan_scans[sql_cmd]]
+
+    def add_full_scans(self, full_scans):
+        """
+        Records full table scans found by another connection to the same
+        database (in the form returned by get_full_scans), so that they are
+        listed by get_full_scans here as well.
+        """
+        for (sql_cmd, scan) in full_scans:
+            scans = self._query_plan_scans.setdefault(sql_cmd, [])
+            if scan not in scans:
+                scans.append(scan)
+
     def _execute_many(self, statement, values):
         """
         Executes multiple commands on the database.
@@ -77,9 +165,57 @@ class ResultsDB(object):
             statement: a sql command with '?' in the place of some of the values
             values: a list of value tuples
         """
+        self._memoized_values.clear()
         self._db_curs.executemany(statement, values)
         self._commit()
         
+    def _memoize(self, sql_cmd, fields, process_query_cmd):
+        """
+        Args:
+            sql_cmd: a sql query
+            fields: a list of tuples of the form (table, field), one
+                corresponding to each value the query retrieves
+            process_query_cmd: a function which executes sql_cmd and returns
+                the list of processed value tuples which it retrieves
+
+        Returns:
+            The list of value tuples retrieved by sql_cmd. If queries are being
+            memoized, this is only computed the first time that sql_cmd is
+            seen after a write to the database. Queries which retrieve list
+            fields are never memoized, both because their values can be large
+            and because they can be modified by the caller.
+        """
+        is_memoizable = self._memoize_queries and not any(
+            [(table, field) in self._schema.list_fields or
+             (table, field) in self._schema.packed_list_fields
+             for (table, field) in fields])
+        if not is_memoizable:
+            return process_query_cmd()
+        if sql_cmd not in self._memoized_values:
+            self._memoized_values[sql_cmd] = process_query_cmd()
+        return list(self._memoized_values[sql_cmd])
+
+    def _normalize_constraint_lists(self, constraint_list=None,
+                                    non_standard_constraint_list=None):
+        """
+        Args:
+            constraint_list: a list of tuples of the form (table, field, value)
+            non_standard_constraint_list: a list of tuples of the form (table,
+                field, constraint_template)
+
+        Returns:
+            The two lists sorted and with repeated constraints removed, so that
+            equivalent constraints always result in the same sql command.
+        """
+        normalized_lists = []
+        for constraints in [constraint_list, non_standard_constraint_list]:
+            normalized_constraints = []
+            for constraint in sorted(constraints or []):
+                if constraint not in normalized_constraints:
+                    normalized_constraints.append(constraint)
+            normalized_lists.append(normalized_constraints)
+        return tuple(normalized_lists)
+
     def _fetchall(self):
         """
         Fetches all results of an executed query.
@@ -94,16 +230,96 @@ class ResultsDB(object):
 
     def _commit(self):
         """
-        Commits pending changes to the database
+        Commits pending changes to the database, unless a bulk_writes session
+        is open, in which case they are committed when it closes.
+        """
+        if not self._bulk_depth:
+            self._db_conn.commit()
+
+    @contextlib.contextmanager
+    def bulk_writes(self):
+        """
+        A context manager for making many writes to the database at once:
+
+            with results_db.bulk_writes():
+                results_db.add_row(...)
+                ...
+
+        All of the writes made inside it are made in a single transaction,
+        which is committed when it exits (or rolled back if it exits with an
+        exception), rather than being committed one statement at a time.
+        Sessions may be nested; only the outermost one commits.
+        Opening a session also puts the database in write-ahead logging mode
+        (which persists in the database file) with synchronous=NORMAL, so
+        that committing does not wait on as many fsyncs.
         """
-        self._db_conn.commit()
+        if not self._bulk_depth:
+            # journal_mode cannot be changed inside a transaction:
+            self._db_conn.commit()
+            self._db_curs.execute("PRAGMA journal_mode=WAL")
+            self._db_curs.execute("PRAGMA synchronous=NORMAL")
+            self._db_curs.execute("PRAGMA temp_store=MEMORY")
+        self._bulk_depth += 1
+        try:
+            yield self
+        except:
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                self._db_conn.rollback()
+                # values read inside the session may include the writes which
+                # have just been rolled back:
+                self._memoized_values.clear()
+            raise
+        self._bulk_depth -= 1
+        if not self._bulk_depth:
+            self._db_conn.commit()
                  
+    def create_indices(self):
+        """
+        Creates the secondary indices declared in the schema which do not
+        already exist, and if there were any, updates the statistics which
+        sqlite uses to choose between indices. If all of the indices already
+        exist, the database is not written to. This should be called after the
+        database has been bulk loaded, rather than before, since maintaining
+        the indices slows down every insertion.
+        """
+        self._execute("SELECT name FROM sqlite_master WHERE type='index'",
+                      is_query=True)
+        existing_index_names = set(
+            [str(row[0]) for row in self._fetchall()])
+        index_creation_cmds = []
+        for table in self._schema.tablename_to_fieldtotype.keys():
+            index_name_to_command = self._schema.get_create_index_commands(
+                table)
+            index_creation_cmds.extend(
+                [index_name_to_command[index_name]
+                 for index_name in sorted(index_name_to_command.keys())
+                 if index_name not in existing_index_names])
+        if not index_creation_cmds:
+            return
+        for index_creation_cmd in index_creation_cmds:
+            self._execute(index_creation_cmd)
+        self._execute("ANALYZE")
+
     def close(self):
         """
         Closes the connection to the database
         """
         self._db_conn.close()
 
+    def reconnect(self, read_only=False):
+        """
+        Replaces the connection to the database with a new one, as is needed
+        in a process forked from the one which opened the database (sqlite
+        connections must not be used across a fork, so the old connection is
+        never used again). If read_only is True, any attempt to write to the
+        database through the new connection fails.
+        """
+        self._db_conn = sqlite3.connect(self._db_path)
+        self._db_curs = self._db_conn.cursor()
+        if read_only:
+            self._db_curs.execute("PRAGMA query_only = ON")
+
     def add_row(self, table, values):
         """
         Adds a row to the table specified.
@@ -123,19 +339,62 @@ class ResultsDB(object):
             values: a list of dictionaries mapping field to value, one
                 dictionary corresponding to each row to be added.
         """
-        fields_list = list(set.union(*[set(values_dict.keys())
-                                       for values_dict in values]))
-        prepared_statement = "INSERT INTO %s (%s) VALUES (%s)" % (
-            table, ",".join(fields_list),
-            ",".join(["?" for field in fields_list]))
+        (fields_list, prepared_statement, processors) = self._get_insert_plan(
+            table, frozenset.union(*[frozenset(values_dict.keys())
+                                     for values_dict in values]))
+        fields_and_processors = zip(fields_list, processors)
         prepared_values = [
-            tuple([str(self._schema.process_to_database(
-                table, field, values_dict[field]))
+            tuple([process(values_dict[field])
                    if field in values_dict else None
-                   for field in fields_list]) for values_dict in values]
+                   for (field, process) in fields_and_processors])
+            for values_dict in values]
         self._execute_many(statement=prepared_statement,
                            values=prepared_values)
 
+    def _get_insert_plan(self, table, fields):
+        """
+        Args:
+            table: the name of a table
+            fields: a frozenset of fields in table
+
+        Returns:
+            A tuple of the list of the fields, the prepared statement for
+            inserting a row with those fields into table, and the list of
+            functions which prepare a value of each field to be bound to that
+            statement. These are cached, since rows with the same fields tend
+            to be added over and over again.
+        """
+        plan = self._insert_plans.get((table, fields))
+        if plan is None:
+            fields_list = list(fields)
+            prepared_statement = "INSERT INTO %s (%s) VALUES (%s)" % (
+                table, ",".join(fields_list),
+                ",".join(["?" for field in fields_list]))
+            processors = [self._get_value_preparer(table, field)
+                          for field in fields_list]
+            plan = (fields_list, prepared_statement, processors)
+            self._insert_plans[(table, fields)] = plan
+        return plan
+
+    def _get_value_preparer(self, table, field):
+        """
+        Args:
+            table: the name of a table
+            field: a field in table
+
+        Returns:
+            A function which prepares a value of field to be bound to a
+            prepared statement.
+        """
+        process = self._schema.get_processor_to_database(table, field)
+        def prepare(value):
+            value = process(value)
+            if isinstance(value, buffer):
+                # packed list fields are stored as BLOBs
+                return value
+            return str(value)
+        return prepare
+
     def update(self, table, field, value, constraint_list=None,
                non_standard_constraint_list=None):
         """
@@ -160,7 +419,9 @@ class ResultsDB(object):
             non_standard_constraint_list=non_standard_constraint_list)
         processed_value = self._schema.process_to_database(
             table, field, value)
-        if (field in self._schema.tablename_to_fieldtotype[table].keys() and
+        if isinstance(processed_value, buffer):
+            processed_value = "X'" + binascii.hexlify(processed_value) + "'"
+        elif (field in self._schema.tablename_to_fieldtotype[table].keys() and
             self._schema.tablename_to_fieldtotype[
                 table][field] == results_schema.FIELD_TYPES.TEXT):
             processed_value = "'" + processed_value + "'"
@@ -169,6 +430,23 @@ class ResultsDB(object):
             cmd += " WHERE {0}".format(constraint)
         self._execute(cmd)
 
+    def update_rows(self, table, field, rowids_and_values):
+        """
+        Updates the value of a field in many rows at once.
+
+        Args:
+            table: the name of a table in the database
+            field: a field in table
+            rowids_and_values: a list of tuples of the form (rowid, value),
+                where value is the value that the field should have in the row
+                of table with that ROWID
+        """
+        prepare = self._get_value_preparer(table, field)
+        self._execute_many(
+            statement="UPDATE %s SET %s=? WHERE ROWID=?" % (table, field),
+            values=[(prepare(value), rowid)
+                    for (rowid, value) in rowids_and_values])
+
     def clear(self):
         """
         Clears the database
@@ -398,20 +676,26 @@ class ResultsDB(object):
         Returns:
             A list of tuples containing the desired values
         """
+        (constraint_list,
+         non_standard_constraint_list) = self._normalize_constraint_lists(
+             constraint_list, non_standard_constraint_list)
         sql_cmd = self.build_query_cmd(fields, constraint_list,
                                        non_standard_constraint_list)
         num_fields = len(fields)
-        values_list = []
-        self._execute(sql_cmd)
-        row = self._fetchone()
-        while row != [] and row != None:
-            assert len(row) == num_fields
-            row_values = tuple([
-                self._schema.process_from_database(
-                    table, field, row_elt)
-                for ((table, field), row_elt) in zip(fields, row)])
-            values_list.append(row_values)
+        def process_query_cmd():
+            values_list = []
+            self._execute_query(sql_cmd)
             row = self._fetchone()
+            while row != [] and row != None:
+                assert len(row) == num_fields
+                row_values = tuple([
+                    self._schema.process_from_database(
+                        table, field, row_elt)
+                    for ((table, field), row_elt) in zip(fields, row)])
+                values_list.append(row_values)
+                row = self._fetchone()
+            return values_list
+        values_list = self._memoize(sql_cmd, fields, process_query_cmd)
         if not values_list:
             LOGGER.warn(
                 "No entries were found with the constraint %s."
@@ -12,6 +12,10 @@
 # *****************************************************************
 
 # general imports:
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
 
 # SPAR imports:
@@ -143,3 +147,207 @@ class ResultsDatabaseTest(unittest.TestCase):
             t1s.DBP_TABLENAME, t1s.DBP_FQID))
         self.assertFalse(self.database.is_populated(
             t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT))
+
+    def test_packed_list_fields(self):
+        ids = [2 ** 40 + 7, 3, 2 ** 32]
+        frows = [{t1s.DBF_FQID: fqid,
+                  t1s.DBF_CAT: "Eq",
+                  t1s.DBF_NUMRECORDS: 1000,
+                  t1s.DBF_RECORDSIZE: 100,
+                  t1s.DBF_WHERECLAUSE: 'fname="Grettle"',
+                  t1s.DBF_MATCHINGRECORDIDS: matching_ids}
+                 for (fqid, matching_ids) in [(100, ids), (101, [])]]
+        self.database.add_rows(t1s.DBF_TABLENAME, frows)
+        # a pipe-delimited list, as written by older versions:
+        self.database._execute(
+            "INSERT INTO %s (%s, %s, %s, %s, %s, %s) VALUES "
+            "(102, 'Eq', 1000, 100, 'fname=\"Hansel\"', '5|6')" % (
+                t1s.DBF_TABLENAME, t1s.DBF_FQID, t1s.DBF_CAT,
+                t1s.DBF_NUMRECORDS, t1s.DBF_RECORDSIZE, t1s.DBF_WHERECLAUSE,
+                t1s.DBF_MATCHINGRECORDIDS))
+        def get_ids(fqid):
+            return self.database.get_values(
+                [(t1s.DBF_TABLENAME, t1s.DBF_MATCHINGRECORDIDS)],
+                constraint_list=[(t1s.DBF_TABLENAME, t1s.DBF_FQID, fqid)])[0][0]
+        self.assertEqual(get_ids(100), ids)
+        self.assertEqual(get_ids(101), [])
+        self.assertEqual(get_ids(102), [5, 6])
+        self.database.update(
+            t1s.DBF_TABLENAME, t1s.DBF_MATCHINGRECORDIDS, set([8]),
+            constraint_list=[(t1s.DBF_TABLENAME, t1s.DBF_FQID, 102)])
+        self.assertEqual(get_ids(102), [8])
+
+    def test_processor_to_database(self):
+        schema = t1s.Ta1ResultsSchema()
+        for (table, field, value) in [
+            (t1s.DBF_TABLENAME, t1s.DBF_FQID, 12),
+            (t1s.DBF_TABLENAME, t1s.DBF_CAT, "Eq"),
+            (t1s.DBF_TABLENAME, t1s.DBF_MATCHINGRECORDIDS, [1, 2]),
+            (t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT, False),
+            (t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT, None),
+            (t1s.DBP_TABLENAME, t1s.DBP_EVENTMSGIDS, [99, 3]),
+            (t1s.DBP_TABLENAME, "ROWID", 3)]:
+            self.assertEqual(
+                schema.get_processor_to_database(table, field)(value),
+                schema.process_to_database(table, field, value))
+
+    def test_update_rows(self):
+        rowids = self.database.get_values(
+            [(t1s.DBP_TABLENAME, "ROWID")])[0]
+        self.database.update_rows(
+            t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT,
+            [(rowid, rowid % 2 == 0) for rowid in rowids])
+        self.database.update_rows(
+            t1s.DBP_TABLENAME, t1s.DBP_NUMNEWRETURNEDRECORDS,
+            [(rowids[0], 7)])
+        for rowid in rowids:
+            (is_correct, num_new) = [values[0] for values in
+                                     self.database.get_values(
+                [(t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT),
+                 (t1s.DBP_TABLENAME, t1s.DBP_NUMNEWRETURNEDRECORDS)],
+                constraint_list=[(t1s.DBP_TABLENAME, "ROWID", rowid)])]
+            self.assertEqual(is_correct, rowid % 2 == 0)
+            if rowid == rowids[0]:
+                self.assertEqual(num_new, 7)
+
+    def test_bulk_writes(self):
+        db_dir = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(db_dir, "results.db")
+            database = results_database.ResultsDB(
+                db_path=db_path, schema=t1s.Ta1ResultsSchema())
+            other_conn = sqlite3.connect(db_path)
+            def get_num_rows():
+                return other_conn.execute(
+                    "SELECT COUNT(*) FROM %s" % t1s.DBF_TABLENAME).fetchone()[0]
+            frows = [{t1s.DBF_FQID: fqid,
+                      t1s.DBF_CAT: "Eq",
+                      t1s.DBF_NUMRECORDS: 1000,
+                      t1s.DBF_RECORDSIZE: 100,
+                      t1s.DBF_WHERECLAUSE: 'fname="Grettle"'}
+                     for fqid in xrange(10)]
+            with database.bulk_writes():
+                with database.bulk_writes():
+                    for frow in frows[:5]:
+                        database.add_row(t1s.DBF_TABLENAME, frow)
+                # nothing is committed until the outermost session exits, but
+                # the session's own connection sees its writes:
+                self.assertEqual(0, get_num_rows())
+                self.assertEqual(5, len(database.get_values(
+                    [(t1s.DBF_TABLENAME, t1s.DBF_FQID)])[0]))
+            self.assertEqual(5, get_num_rows())
+            self.assertEqual("wal", other_conn.execute(
+                "PRAGMA journal_mode").fetchone()[0])
+            # a session which raises is rolled back:
+            with self.assertRaises(ValueError):
+                with database.bulk_writes():
+                    for frow in frows[5:]:
+                        database.add_row(t1s.DBF_TABLENAME, frow)
+                    raise ValueError()
+            self.assertEqual(5, get_num_rows())
+            self.assertEqual(5, len(database.get_values(
+                [(t1s.DBF_TABLENAME, t1s.DBF_FQID)])[0]))
+            # outside of a session, every write is committed:
+            database.add_rows(t1s.DBF_TABLENAME, frows[5:])
+            self.assertEqual(10, get_num_rows())
+            other_conn.close()
+            database.close()
+        finally:
+            shutil.rmtree(db_dir)
+
+    def test_bulk_writes_rollback_forgets_memoized_values(self):
+        database = results_database.ResultsDB(
+            db_path=":memory:", schema=t1s.Ta1ResultsSchema(),
+            memoize_queries=True)
+        fields = [(t1s.DBF_TABLENAME, t1s.DBF_FQID)]
+        with self.assertRaises(ValueError):
+            with database.bulk_writes():
+                database.add_row(t1s.DBF_TABLENAME,
+                                 {t1s.DBF_FQID: 1,
+                                  t1s.DBF_CAT: "Eq",
+                                  t1s.DBF_NUMRECORDS: 1000,
+                                  t1s.DBF_RECORDSIZE: 100,
+                                  t1s.DBF_WHERECLAUSE: 'fname="Grettle"'})
+                self.assertEqual([[1]], database.get_values(fields))
+                raise ValueError()
+        self.assertEqual(0, database._db_curs.execute(
+            "SELECT COUNT(*) FROM %s" % t1s.DBF_TABLENAME).fetchone()[0])
+        self.assertFalse(any(database.get_values(fields)))
+        database.close()
+
+    def test_reconnect_read_only(self):
+        db_dir = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(db_dir, "results.db")
+            database = results_database.ResultsDB(
+                db_path=db_path, schema=t1s.Ta1ResultsSchema())
+            frow = {t1s.DBF_FQID: 1,
+                    t1s.DBF_CAT: "Eq",
+                    t1s.DBF_NUMRECORDS: 1000,
+                    t1s.DBF_RECORDSIZE: 100,
+                    t1s.DBF_WHERECLAUSE: 'fname="Grettle"'}
+            database.add_row(t1s.DBF_TABLENAME, frow)
+            database.reconnect(read_only=True)
+            self.assertEqual([[1]], database.get_values(
+                [(t1s.DBF_TABLENAME, t1s.DBF_FQID)]))
+            with self.assertRaises(sqlite3.OperationalError):
+                database.add_row(t1s.DBF_TABLENAME, frow)
+            database.close()
+        finally:
+            shutil.rmtree(db_dir)
+
+    def test_create_indices(self):
+        def get_index_names():
+            self.database._execute(
+                "SELECT name FROM sqlite_master WHERE type='index'")
+            return set([str(row[0]) for row in self.database._fetchall()])
+        def get_num_stats():
+            self.database._execute("SELECT COUNT(*) FROM sqlite_stat1")
+            return self.database._fetchone()[0]
+        self.database.create_indices()
+        index_names = get_index_names()
+        schema = t1s.Ta1ResultsSchema()
+        for table in schema.tablename_to_indices:
+            for fields in schema.tablename_to_indices[table]:
+                self.assertIn("_".join(["idx", table] + list(fields)),
+                              index_names)
+        self.assertTrue(get_num_stats())
+        # creating the indices again does nothing, not even analyzing the
+        # database:
+        self.database._execute("DELETE FROM sqlite_stat1")
+        self.database.create_indices()
+        self.assertEqual(index_names, get_index_names())
+        self.assertEqual(0, get_num_stats())
+        # but a missing index is created, and the database analyzed again:
+        missing_index_name = "_".join(
+            ["idx", t1s.DBF_TABLENAME] +
+            list(schema.tablename_to_indices[t1s.DBF_TABLENAME][0]))
+        self.database._execute("DROP INDEX %s" % missing_index_name)
+        self.database.create_indices()
+        self.assertEqual(index_names, get_index_names())
+        self.assertTrue(get_num_stats())
+
+    def test_check_query_plans(self):
+        database = results_database.ResultsDB(
+            db_path=":memory:", schema=t1s.Ta1ResultsSchema(),
+            check_query_plans=True)
+        fields = [(t1s.DBF_TABLENAME, t1s.DBF_FQID)]
+        database.get_values(
+            fields, constraint_list=[(t1s.DBF_TABLENAME, t1s.DBF_CAT, "EQ")])
+        full_scans = database.get_full_scans()
+        self.assertEqual(1, len(full_scans))
+        self.assertIn(t1s.DBF_TABLENAME, full_scans[0][1])
+        # once the indices have been created, the same kind of query no
+        # longer needs a full table scan:
+        database.create_indices()
+        database.get_values(
+            fields, constraint_list=[(t1s.DBF_TABLENAME, t1s.DBF_CAT, "P1")])
+        self.assertEqual(full_scans, database.get_full_scans())
+        # but a query which reads the whole table through an index is still
+        # a full table scan:
+        database.get_values([(t1s.DBF_TABLENAME, t1s.DBF_CAT)])
+        full_scans = database.get_full_scans()
+        self.assertEqual(2, len(full_scans))
+        self.assertTrue(any(["INDEX" in scan for (sql_cmd, scan)
+                             in full_scans]))
+        database.close()
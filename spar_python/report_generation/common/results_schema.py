@@ -11,6 +11,9 @@
 #  16 Oct 2013   SY             Original Version
 # *****************************************************************
 
+# general imports:
+import numpy
+
 # SPAR imports:
 import spar_python.common.enum as enum
 
@@ -24,17 +27,47 @@ DB_FALSE_VALUE = 0
 PY_TRUE_VALUE = True
 PY_FALSE_VALUE = False
 DELIMITER = "|"
+# packed list fields are stored as BLOBs of little-endian 64-bit integers:
+PACKED_DTYPE = numpy.dtype("<i8")
 
 # field types in the results database:
-FIELD_TYPES = enum.Enum("TEXT", "INTEGER", "REAL", "BOOL")
+FIELD_TYPES = enum.Enum("TEXT", "INTEGER", "REAL", "BOOL", "BLOB")
+
+def pack_integer_list(values):
+    """
+    Args:
+        values: an iterable of integers
+
+    Returns:
+        The integers packed into a buffer, as stored in the database for a
+        packed list field
+    """
+    return buffer(numpy.fromiter(values, dtype=PACKED_DTYPE).tostring())
+
+def unpack_integer_list(value):
+    """
+    Args:
+        value: a value of a packed list field, as retrieved from the database
+
+    Returns:
+        The list of integers. Pipe-delimited strings, as written to packed
+        list fields by older versions of this code, are also accepted.
+    """
+    if isinstance(value, (buffer, bytearray)):
+        return numpy.frombuffer(value, dtype=PACKED_DTYPE).tolist()
+    if value in NULL_VALUES:
+        return []
+    return [int(elt) for elt in value.split(DELIMITER) if elt != ""]
 
 class ResultsSchema(object):
 
     def __init__(self):
         self.list_fields = dict()
+        self.packed_list_fields = set()
         self.tablename_to_fieldtotype = None
         self.tablename_to_requiredfields = None
         self.tablename_to_aux = None
+        self.tablename_to_indices = dict()
         self.tablename_to_joins = None
         self.performer_tablenamess = None
         self.other_tablenames_heirarchy = None
@@ -50,6 +83,8 @@ class ResultsSchema(object):
             The value formatted as it should be while in the database if the value
             represents a list
         """
+        if (tablename, fieldname) in self.packed_list_fields:
+            return pack_integer_list(value)
         if (tablename, fieldname) in self.list_fields.keys():
             value = DELIMITER.join([str(elt) for elt in value])
         return value
@@ -64,6 +99,8 @@ class ResultsSchema(object):
         Returns:
             The value formatted as it should be while in the database
         """
+        if (tablename, fieldname) in self.packed_list_fields:
+            return pack_integer_list(value)
         value = self.process_to_database_if_list(tablename, fieldname, value)
         if fieldname in self.tablename_to_fieldtotype[tablename].keys():
             if self.tablename_to_fieldtotype[
@@ -81,6 +118,35 @@ class ResultsSchema(object):
                     return DB_TRUE_VALUE
         return str(value)
 
+    def get_processor_to_database(self, tablename, fieldname):
+        """
+        Args:
+            tablename: the name of a table
+            fieldname: the name of a field in tablename
+
+        Returns:
+            A function which formats a value of fieldname exactly as
+            process_to_database does, but with all of the lookups on
+            tablename and fieldname done once, up front
+        """
+        if (tablename, fieldname) in self.packed_list_fields:
+            return pack_integer_list
+        field_type = self.tablename_to_fieldtotype[tablename].get(fieldname)
+        if field_type == FIELD_TYPES.BOOL:
+            def process_value(value):
+                if value in NULL_VALUES:
+                    return DB_NULL_VALUE
+                elif value in FALSE_VALUES:
+                    return DB_FALSE_VALUE
+                else:
+                    return DB_TRUE_VALUE
+        else:
+            process_value = str
+        if (tablename, fieldname) in self.list_fields:
+            return lambda value: process_value(
+                DELIMITER.join([str(elt) for elt in value]))
+        return process_value
+
     def process_from_database(self, tablename, fieldname, value):
         """
         Args:
@@ -91,6 +157,8 @@ class ResultsSchema(object):
         Returns:
             The value formatted as it should be while being used
         """
+        if (tablename, fieldname) in self.packed_list_fields:
+            return unpack_integer_list(value)
         if (tablename, fieldname) in self.list_fields:
             if value in NULL_VALUES: value_list = []
             else:
@@ -171,6 +239,24 @@ class ResultsSchema(object):
         sql_cmd_lines += [content, ")"]
         return "".join(sql_cmd_lines)
 
+    def get_create_index_commands(self, tablename):
+        """
+        Args:
+            tablename: the name of a table
+
+        Returns:
+            A dictionary mapping the name of each secondary index on the table
+            in question to a string representing the sql command for creating
+            it
+        """
+        index_name_to_command = {}
+        for fields in self.tablename_to_indices.get(tablename, []):
+            index_name = "_".join(["idx", tablename] + list(fields))
+            index_name_to_command[index_name] = (
+                "CREATE INDEX IF NOT EXISTS %s ON %s (%s)" % (
+                    index_name, tablename, ", ".join(fields)))
+        return index_name_to_command
+
     def process_for_sorting(self, item, (table, field)):
         """Processes the item so that it is in an order-friendly form."""
         return item
@@ -61,6 +61,14 @@ PARSER.add_option(
 PARSER.add_option(
     "-m", "--monitorimgdir",
     help="the path to the performance monitoring image directory")
+PARSER.add_option(
+    "-q", "--checkqueryplans", action="store_true", default=False,
+    help="check the plan of every query made of the results database, and "
+    "list the queries which require full table scans")
+PARSER.add_option(
+    "-n", "--numprocesses", type="int",
+    help="the number of processes to render the report sections in. "
+    "CLOBBERS CONFIG FILE VALUE")
 
 if __name__ == "__main__":
     (options, args) = PARSER.parse_args()
@@ -79,6 +87,10 @@ if __name__ == "__main__":
         config.baselinename = options.baselinename
     if options.monitorimgdir:
         config.perf_img_dir = options.monitorimgdir
+    if options.checkqueryplans:
+        config.check_query_plans = True
+    if options.numprocesses:
+        config.num_processes = options.numprocesses
     if not options.destfile:
         options.destfile = "_".join(
             ["ta" + str(config.tanum), config.performername, "report"])
@@ -97,5 +109,11 @@ if __name__ == "__main__":
     tex = open(options.destfile + ".tex", 'w')
     tex.write(report_generator.get_string())
     tex.close()
+    if options.checkqueryplans:
+        full_scans = config.results_db.get_full_scans()
+        LOGGER.info("%s full table scans were found in the query plans",
+                    len(full_scans))
+        for (sql_cmd, scan) in full_scans:
+            LOGGER.info("%s: %s", scan, sql_cmd)
     for typeset_num in xrange(NUM_TYPESETS):
         subprocess.call("pdflatex " + options.destfile, shell=True)
@@ -24,6 +24,41 @@ import spar_python.report_generation.common.correctness_getter as correctness_ge
 # LOGGER:
 LOGGER = logging.getLogger(__name__)
     
+def compare_records(mris, mrhs, rris, rrhs, check_hashes):
+    """
+    Args:
+        mris: the ids of the records which a query should have matched
+        mrhs: the hashes of those records
+        rris: the ids of the records which the query returned
+        rrhs: the hashes of those records (may be empty if the query did not
+            return hashes)
+        check_hashes: whether the hashes of the true positives are to be
+            checked
+
+    Returns:
+        A tuple of the lists of the ids of the true positives, the false
+        positives, the false negatives and the true positives with bad hashes,
+        in the orders in which they appear in rris (or, for false negatives,
+        in mris). The comparison is done with set lookups, so it takes time
+        linear (rather than quadratic) in the numbers of records.
+    """
+    if not rrhs:
+        # for the zip, create dummy returned record hashes:
+        rrhs = [None for idx in xrange(len(rris))]
+    returned = zip(rris, rrhs)
+    mris_set = set(mris)
+    truepos = [rri for (rri, rrh) in returned if rri in mris_set]
+    falsepos = [rri for (rri, rrh) in returned if rri not in mris_set]
+    truepos_set = set(truepos)
+    falseneg = [mri for mri in mris if mri not in truepos_set]
+    badhash = []
+    if check_hashes:
+        mrisandhs = set(zip(mris, mrhs))
+        # hashes are only checked for true positives:
+        badhash = [rri for (rri, rrh) in returned
+                   if rri in mris_set and (rri, rrh) not in mrisandhs]
+    return (truepos, falsepos, falseneg, badhash)
+
 class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
     """This class computes the correctness metrics (precision and recall) for
     the query process.
@@ -35,11 +70,15 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
         num_rankings: the number of P9 queries
         num_failed: the number of queries with FAILED messages
     """
-    def __init__(self, results_db=None, constraint_list=None, update_db=False):
+    def __init__(self, results_db=None, constraint_list=None, update_db=False,
+                 from_cache=False):
         """Initializes the QueryCorrectnessGetter with a results database and
         a where clause.
 
-        All of the computation is done at initialization."""
+        All of the computation is done at initialization. If from_cache is
+        True, the metrics are not computed from the queries themselves, but
+        summed up from the query correctness cache, which must already hold
+        every query in question (see populate)."""
         super(QueryCorrectnessGetter, self).__init__(results_db,
                                                      constraint_list)
         # keep running coutners of the following:
@@ -48,7 +87,10 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
         self.num_bad_rankings = 0 # number of bad rankings for P9
         self.num_rankings = 0 # number of P9 queries
         self.num_failed = 0 # number of failed queries
-        self.populate(update_db)
+        if from_cache:
+            self.populate_from_cache()
+        else:
+            self.populate(update_db)
 
     def __add__(self, other):
         new_correctness_getter = super(
@@ -68,7 +110,9 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
         Populates the _num_truepos, _num_falsepos, _num_falseneg, and other
         values.
         If update_db is True, updates the results database with correctness
-        information.
+        information, and stores the outcome for each query in the query
+        correctness cache, so that the metrics for any subset of these queries
+        can later be obtained with from_cache.
         """
         if self.results_db == None:
             return
@@ -116,6 +160,11 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
             (statuses, "failed messages")]
         for (val_list, name) in val_lists_and_names:
             assert len(val_list) == num_queries, "wrong number of %s" % name
+        # the (rowid, is_correct) pairs of the rows whose correctness
+        # should be updated, all of which are written at once at the end:
+        correctness_updates = []
+        # the rows of the query correctness cache, also written at the end:
+        cache_rows = []
         # iterate through all of the relevent queries, incrementing the running
         # counters as we go:
         for (pqid, fqid, cat, stored_is_correct,
@@ -130,6 +179,17 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
             if (scols == '*') and (len(rrhs) != len(rris)):
                 LOGGER.warning("Wrong number of hashes returned for query %s"
                                % str(fqid))
+            cache_row = {t1s.PQC_PQID: pqid,
+                         t1s.PQC_FAILED: bool(status),
+                         t1s.PQC_COUNTED: False,
+                         t1s.PQC_NUMTRUEPOS: 0,
+                         t1s.PQC_NUMFALSEPOS: 0,
+                         t1s.PQC_NUMFALSENEG: 0,
+                         t1s.PQC_NUMBADHASH: 0,
+                         t1s.PQC_RANKED: False,
+                         t1s.PQC_BADLYRANKED: False,
+                         t1s.PQC_ISCORRECT: False}
+            cache_rows.append(cache_row)
             if status:
                 self.num_failed += 1
                 # if the query failed, continue on to the next query - do not
@@ -140,33 +200,17 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
                 # correctness metrics
                 continue
             self.count += 1
-            truepos = []
-            falsepos = []
-            falseneg = []
-            badhash = []
+            (truepos, falsepos, falseneg, badhash) = compare_records(
+                mris, mrhs, rris, rrhs, check_hashes=(scols == '*'))
             badly_ranked = False
-            if not rrhs:
-                # for the zip, create dummy returned record hashes:
-                rrhs = [None for idx in xrange(len(rris))]
-            mrisandhs = zip(mris, mrhs) # so as not to rezip many times
-            for (rri, rrh) in zip(rris, rrhs):
-                if rri in mris:
-                    truepos.append(rri)
-                    # hashes are only checked for true positives:
-                    if scols == '*':
-                        if (rri, rrh) not in mrisandhs:
-                            badhash.append(rri)
-                else:
-                    falsepos.append(rri)
-            for mri in mris:
-                if mri not in truepos:
-                    falseneg.append(mri)
+            ranked = False
             # ranking correctness:
             if cat == t1s.CATEGORIES.to_string(t1s.CATEGORIES.P9):
                 if sum(mrcs) != len(mris):
                     LOGGER.error("Bad ranking ground truth for query %s"
                                  % str(fqid))
                 else:
+                    ranked = True
                     self.num_rankings += 1
                     ranking_idx = 0
                     for mrc in mrcs:
@@ -199,9 +243,7 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
                 else:
                     is_correct = True
                 if is_correct != stored_is_correct:
-                    self.results_db.update(
-                        t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT, is_correct,
-                        constraint_list=[(t1s.DBP_TABLENAME, "ROWID", pqid)])
+                    correctness_updates.append((pqid, is_correct))
             if badly_ranked:
                 self.num_bad_rankings += 1
             self.num_truepos += len(truepos)
@@ -209,8 +251,48 @@ class QueryCorrectnessGetter(correctness_getter.CorrectnessGetter):
             self.num_falseneg += len(falseneg)
             self.num_badhash += len(badhash)
             self.num_goodhash += len(truepos) - len(badhash)
-            if not (badly_ranked or falsepos or falseneg or badhash):
+            is_fully_correct = not (badly_ranked or falsepos or falseneg or
+                                    badhash)
+            if is_fully_correct:
                 self.num_correct += 1
+            cache_row.update({t1s.PQC_COUNTED: True,
+                              t1s.PQC_NUMTRUEPOS: len(truepos),
+                              t1s.PQC_NUMFALSEPOS: len(falsepos),
+                              t1s.PQC_NUMFALSENEG: len(falseneg),
+                              t1s.PQC_NUMBADHASH: len(badhash),
+                              t1s.PQC_RANKED: ranked,
+                              t1s.PQC_BADLYRANKED: badly_ranked,
+                              t1s.PQC_ISCORRECT: is_fully_correct})
+        if update_db:
+            if correctness_updates:
+                self.results_db.update_rows(
+                    t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT, correctness_updates)
+            self.results_db.cache_query_correctness(cache_rows)
+
+    def populate_from_cache(self):
+        """
+        Populates the _num_truepos, _num_falsepos, _num_falseneg, and other
+        values by summing up the query correctness cache over the queries
+        where the constraint holds, without looking at any of their records.
+        """
+        if self.results_db == None:
+            return
+        attrs_and_fields = [
+            ("count", t1s.PQC_COUNTED),
+            ("num_failed", t1s.PQC_FAILED),
+            ("num_truepos", t1s.PQC_NUMTRUEPOS),
+            ("num_falsepos", t1s.PQC_NUMFALSEPOS),
+            ("num_falseneg", t1s.PQC_NUMFALSENEG),
+            ("num_badhash", t1s.PQC_NUMBADHASH),
+            ("num_rankings", t1s.PQC_RANKED),
+            ("num_bad_rankings", t1s.PQC_BADLYRANKED),
+            ("num_correct", t1s.PQC_ISCORRECT)]
+        totals = self.results_db.get_cached_correctness_totals(
+            [field for (attr, field) in attrs_and_fields],
+            constraint_list=self.constraint_list)
+        for ((attr, field), total) in zip(attrs_and_fields, totals):
+            setattr(self, attr, total)
+        self.num_goodhash = self.num_truepos - self.num_badhash
 
     def get_badhash_fraction(self):
         """Returns the fraction of hashes returned as true positives that were
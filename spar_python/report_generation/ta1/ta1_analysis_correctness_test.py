@@ -625,6 +625,56 @@ class TestCorrectnessGetters(unittest.TestCase):
             [(t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT)])[0], [True, False])
         results_db.close()
 
+    def test_compare_records(self):
+        (truepos, falsepos, falseneg, badhash) = correctness.compare_records(
+            [1, 2, 3, 4], ["hash1", "hash2", "hash3", "hash4"],
+            [4, 9, 2, 2], ["hash4", "hash9", "badhash2", "hash2"],
+            check_hashes=True)
+        self.assertEqual(truepos, [4, 2, 2])
+        self.assertEqual(falsepos, [9])
+        self.assertEqual(falseneg, [1, 3])
+        self.assertEqual(badhash, [2])
+        # returned records without hashes are not considered:
+        self.assertEqual(
+            correctness.compare_records(
+                [1, 2], ["hash1", "hash2"], [1, 2, 3], ["hash1"],
+                check_hashes=True),
+            ([1], [], [2], []))
+        self.assertEqual(
+            correctness.compare_records(
+                [1, 2], ["hash1", "hash2"], [2, 3], [], check_hashes=True),
+            ([2], [3], [1], [2]))
+        self.assertEqual(
+            correctness.compare_records(
+                [1, 2], ["hash1", "hash2"], [2, 3], [], check_hashes=False),
+            ([2], [3], [1], []))
+
+    def test_from_cache(self):
+        results_db = t1d.Ta1ResultsDB(":memory:")
+        set_up_static_db(results_db)
+        attrs = ["count", "num_truepos", "num_falsepos", "num_falseneg",
+                 "num_correct", "num_badhash", "num_goodhash",
+                 "num_bad_rankings", "num_rankings", "num_failed"]
+        cg = correctness.QueryCorrectnessGetter(results_db, update_db=True)
+        cached_cg = correctness.QueryCorrectnessGetter(results_db,
+                                                       from_cache=True)
+        for attr in attrs:
+            self.assertEqual(getattr(cg, attr), getattr(cached_cg, attr))
+        self.assertEqual(cached_cg.get_count(), 2)
+        # the cache can be summed up over any subset of the queries:
+        constraint_list = [(t1s.DBP_TABLENAME, "ROWID", 2)]
+        cg = correctness.QueryCorrectnessGetter(results_db, constraint_list)
+        cached_cg = correctness.QueryCorrectnessGetter(
+            results_db, constraint_list, from_cache=True)
+        for attr in attrs:
+            self.assertEqual(getattr(cg, attr), getattr(cached_cg, attr))
+        self.assertEqual(cached_cg.get_num_correct(), 0)
+        # recomputing replaces the cached values rather than adding to them:
+        correctness.QueryCorrectnessGetter(results_db, update_db=True)
+        self.assertEqual(correctness.QueryCorrectnessGetter(
+            results_db, from_cache=True).get_count(), 2)
+        results_db.close()
+
     def test_policy_perfect_correctness(self):
         constraint_list = None
         rejecting_policies = [["policy1"], [], ["policy1", "policy2"]]
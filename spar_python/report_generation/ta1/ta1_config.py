@@ -136,6 +136,10 @@ class Ta1Config(config.Config):
         b_max: the greatest value of b for whcih performer will be compared to
             a + b*baseline
         desired_sections: a list of sections to be included in the report
+        precompute_query_slices: whether the latencies graphed and regressed
+            per query category are to be retrieved from the results database
+            up front, in one query, rather than in one query per category (only
+            takes effect if memoize_queries is set)
     """
     def __init__(self):
         """Initializes the configuration object"""
@@ -188,6 +192,7 @@ class Ta1Config(config.Config):
         self.results_db_path = None
         self.__results_db = None
         self.img_dir = None
+        self.precompute_query_slices = False
         self.desired_sections = [
             "ta1_other_sections",
             "ta1_supported_query_types",
@@ -278,7 +283,10 @@ class Ta1Config(config.Config):
     def results_db(self):
         """Returns the results database."""
         if not self.__results_db:
-            self.__results_db = t1d.Ta1ResultsDB(self.results_db_path)
+            self.__results_db = t1d.Ta1ResultsDB(
+                self.results_db_path,
+                check_query_plans=self.check_query_plans,
+                memoize_queries=self.memoize_queries)
         return self.__results_db
 
     def get_constraint_list(self, require_correct=True, usebaseline=False,
@@ -14,6 +14,7 @@
 # **************************************************************
 
 # general imports:
+import collections
 import logging
 
 # SPAR imports:
@@ -28,12 +29,17 @@ class Ta1ResultsDB(results_database.ResultsDB):
     A TA1 results database, containing per-query information.
     """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, check_query_plans=False,
+                 memoize_queries=False):
         """
-        Initializes the database with a location (db_path) and a logger.
+        Initializes the database with a location (db_path) and a logger, and
+        with whether the plans of its queries are to be checked for full table
+        scans and whether the values they retrieve are to be memoized.
         """
         schema = t1s.Ta1ResultsSchema()
-        super(Ta1ResultsDB, self).__init__(db_path, schema)        
+        super(Ta1ResultsDB, self).__init__(
+            db_path, schema, check_query_plans=check_query_plans,
+            memoize_queries=memoize_queries)
 
     def get_unique_query_values(self, simple_fields=None,
                                 atomic_fields_and_functions=None,
@@ -131,6 +137,101 @@ class Ta1ResultsDB(results_database.ResultsDB):
         return values_list
         
 
+    def precompute_query_values(self, simple_fields, slice_fields,
+                                constraint_list=None):
+        """
+        Args:
+            simple_fields: a list of tuples of the form (table, field), where
+                table is either the full queries or the performer queries table.
+            slice_fields: another such list
+            constraint_list: a list of tuples of the form (table, field, value),
+                where query values are returned only if table.field=value for
+                all of the tuples.
+
+        Retrieves the values of simple_fields for all of the queries where the
+        constraint holds with a single query, and memoizes them by slice, as
+        though get_query_values had been called for simple_fields once for
+        every combination of values of slice_fields, with constraint_list
+        extended to require that combination. Does nothing if queries are not
+        being memoized.
+        """
+        if not self._memoize_queries:
+            return
+        if not constraint_list: constraint_list = []
+        num_slice_fields = len(slice_fields)
+        slice_to_values = collections.defaultdict(list)
+        (constraint_list,
+         non_standard_constraint_list) = self._normalize_constraint_lists(
+             constraint_list)
+        sql_cmd = self.build_pquery_query_cmd(
+            slice_fields + simple_fields, [], [], constraint_list,
+            non_standard_constraint_list)
+        for values in self._process_simple_query_cmd(
+            sql_cmd, slice_fields + simple_fields):
+            slice_to_values[values[:num_slice_fields]].append(
+                values[num_slice_fields:])
+        for (slice_values, values_list) in slice_to_values.items():
+            (slice_constraint_list,
+             non_standard_constraint_list) = self._normalize_constraint_lists(
+                 constraint_list + [
+                     (table, field, value) for ((table, field), value)
+                     in zip(slice_fields, slice_values)])
+            # this is the command which get_query_values would build for the
+            # slice:
+            sql_cmd = self.build_pquery_query_cmd(
+                simple_fields, [], [], slice_constraint_list,
+                non_standard_constraint_list)
+            self._memoize(sql_cmd, simple_fields, lambda: values_list)
+
+    def cache_query_correctness(self, rows):
+        """
+        Args:
+            rows: a list of dictionaries mapping fields of the query correctness
+                cache to values, one corresponding to each performer query
+
+        Stores the rows in the query correctness cache, replacing whatever was
+        cached for the same performer queries before.
+        """
+        if not rows:
+            return
+        with self.bulk_writes():
+            self._execute_many(
+                statement="DELETE FROM %s WHERE %s=?" % (
+                    t1s.PQC_TABLENAME, t1s.PQC_PQID),
+                values=[(row[t1s.PQC_PQID],) for row in rows])
+            self.add_rows(t1s.PQC_TABLENAME, rows)
+
+    def get_cached_correctness_totals(self, fields, constraint_list=None,
+                                      non_standard_constraint_list=None):
+        """
+        Args:
+            fields: a list of fields of the query correctness cache
+            constraint_list: a list of tuples of the form (table, field, value),
+                where query values are returned only if table.field=value for
+                all of the tuples.
+            non_standard_constraint_list: a list of tuples of the form (table,
+                field, constraint_template), where constraint_template is a
+                string with two instances of %s; one for table, and one for
+                field.
+                This should be used for constraints that can't re represented as
+                table.field=value.
+
+        Returns:
+            A list of the sums of the fields over the cached correctness of
+            all of the performer queries where the constraint holds, one sum
+            corresponding to each field. The sums are taken by the database,
+            rather than by retrieving the cached rows.
+        """
+        sql_cmd = "SELECT %s FROM %s WHERE %s.%s IN (%s)" % (
+            ", ".join(["TOTAL(%s.%s)" % (t1s.PQC_TABLENAME, field)
+                       for field in fields]),
+            t1s.PQC_TABLENAME, t1s.PQC_TABLENAME, t1s.PQC_PQID,
+            self.build_pquery_query_cmd(
+                [(t1s.DBP_TABLENAME, "ROWID")], constraint_list=constraint_list,
+                non_standard_constraint_list=non_standard_constraint_list))
+        self._execute_query(sql_cmd)
+        return [int(total) for total in self._fetchone()]
+
     def _process_query_cmd(self, simple_fields=None,
                            atomic_fields_and_functions=None,
                            full_fields_and_functions=None,
@@ -162,8 +263,9 @@ class Ta1ResultsDB(results_database.ResultsDB):
         if not simple_fields: simple_fields = []
         if not atomic_fields_and_functions: atomic_fields_and_functions = []
         if not full_fields_and_functions: full_fields_and_functions = []
-        if not constraint_list: constraint_list = []
-        if not non_standard_constraint_list: non_standard_constraint_list = []
+        (constraint_list,
+         non_standard_constraint_list) = self._normalize_constraint_lists(
+             constraint_list, non_standard_constraint_list)
         assert not (atomic_fields_and_functions and full_fields_and_functions),(
             "cannot include both atomic and full sub-queries")
         constraint_tables = [table for (table, field, thing)
@@ -185,7 +287,11 @@ class Ta1ResultsDB(results_database.ResultsDB):
         if atomic_fields_and_functions or full_fields_and_functions:
             values_list = self._process_complex_query_cmd(sql_cmd, functions)
         else:
-            values_list = self._process_simple_query_cmd(sql_cmd, simple_fields)
+            # only simple queries are memoized, since the values of complex
+            # ones depend on the functions applied to them:
+            values_list = self._memoize(
+                sql_cmd, simple_fields,
+                lambda: self._process_simple_query_cmd(sql_cmd, simple_fields))
         if not values_list:
             LOGGER.warn("No items were found with the constraint %s."
                         % self.build_constraint(constraint_list,
@@ -207,7 +313,7 @@ class Ta1ResultsDB(results_database.ResultsDB):
         """
         num_fields = len(simple_fields)
         output = []
-        self._execute(sql_cmd)
+        self._execute_query(sql_cmd)
         row = self._fetchone()
         while row != [] and row != None:
             assert len(row) == num_fields
@@ -235,7 +341,7 @@ class Ta1ResultsDB(results_database.ResultsDB):
         the given functions on those lists of values.
         """
         num_fields = len(functions)
-        self._execute(sql_cmd)
+        self._execute_query(sql_cmd)
         
         # vals: Temporary storage for the valies.
         # Each full query id maps to a list of value tuples.
@@ -262,6 +262,62 @@ class Ta1DatabaseTest(unittest.TestCase):
         self.assertEqual(latency_values, expected_latency_values)
         self.assertEqual(performer_values, expected_performer_values)
 
+    def test_memoize_query_values(self):
+        database = t1d.Ta1ResultsDB(":memory:", memoize_queries=True)
+        set_up_static_db(database)
+        fields = [(t1s.DBP_TABLENAME, t1s.DBP_QUERYLATENCY)]
+        constraint_list = [
+            (t1s.DBP_TABLENAME, t1s.DBP_SELECTIONCOLS, "id"),
+            (t1s.DBP_TABLENAME, t1s.DBP_PERFORMERNAME, PERFORMER_NAME)]
+        expected_latency_values = [[5000.00, 10000.00, 5.0, 5.0]]
+        self.assertEqual(expected_latency_values, database.get_query_values(
+            fields, constraint_list=constraint_list))
+        # a change made behind the database's back is not seen, even when the
+        # constraints are given in another order, since the values are
+        # memoized:
+        database._db_curs.execute("UPDATE %s SET %s=1.0" % (
+            t1s.DBP_TABLENAME, t1s.DBP_QUERYLATENCY))
+        self.assertEqual(expected_latency_values, database.get_query_values(
+            fields, constraint_list=list(reversed(constraint_list))))
+        # but any write made through the database forgets the memoized values:
+        database.update(t1s.DBP_TABLENAME, t1s.DBP_ISCORRECT, "TRUE",
+                        constraint_list=[(t1s.DBP_TABLENAME, "ROWID", 5)])
+        self.assertEqual([[1.0, 1.0, 1.0, 1.0]], database.get_query_values(
+            fields, constraint_list=constraint_list))
+        database.close()
+
+    def test_precompute_query_values(self):
+        database = t1d.Ta1ResultsDB(":memory:", memoize_queries=True)
+        set_up_static_db(database)
+        fields = [(t1s.DBP_TABLENAME, t1s.DBP_FQID),
+                  (t1s.DBP_TABLENAME, t1s.DBP_QUERYLATENCY)]
+        slice_fields = [(t1s.DBF_TABLENAME, t1s.DBF_CAT),
+                        (t1s.DBP_TABLENAME, t1s.DBP_SELECTIONCOLS)]
+        constraint_list = [
+            (t1s.DBP_TABLENAME, t1s.DBP_PERFORMERNAME, PERFORMER_NAME)]
+        slices = self.database.get_unique_query_values(
+            slice_fields, constraint_list=constraint_list)
+        def get_slice_constraint_list(slice_values):
+            return constraint_list + [
+                (table, field, value) for ((table, field), value)
+                in zip(slice_fields, slice_values)]
+        expected_values = dict(
+            (slice_values, self.database.get_query_values(
+                fields,
+                constraint_list=get_slice_constraint_list(slice_values)))
+            for slice_values in slices)
+        database.precompute_query_values(
+            fields, slice_fields, constraint_list=constraint_list)
+        # the values are now memoized, so a change made behind the database's
+        # back is not seen:
+        database._db_curs.execute("DELETE FROM %s" % t1s.DBP_TABLENAME)
+        for slice_values in slices:
+            self.assertEqual(
+                expected_values[slice_values], database.get_query_values(
+                    fields,
+                    constraint_list=get_slice_constraint_list(slice_values)))
+        database.close()
+
     def test_get_simple_query_values_with_atomic_constraint(self):
         this_constraint_list = [
             (t1s.DBA_TABLENAME, t1s.DBA_FIELDTYPE, "string"),
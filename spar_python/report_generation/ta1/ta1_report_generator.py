@@ -193,6 +193,8 @@ class Ta1ReportGenerator(report_generator.ReportGenerator):
         self._populate_num_new_matches()
         self._discover_querytypes()
         self._discover_correctness()
+        if self.config.precompute_query_slices:
+            self._precompute_query_slices()
 
     def _populate_num_new_matches(self):
         """Populates the num_cache_hits field"""
@@ -207,19 +209,21 @@ class Ta1ReportGenerator(report_generator.ReportGenerator):
              self.config.performername)]
         values = self.config.results_db.get_values(
             fields=fields, constraint_list=constraint_list)
+        updates = []
         for (pqid, eventmsgids, nummatchingrecords,
              storednumnewrecords) in zip(*values):
             numcachehits = len([eventmsgid for eventmsgid in eventmsgids
                                 if eventmsgid == cachehitid])
             numnewrecords = nummatchingrecords - numcachehits
             if numnewrecords != storednumnewrecords:
-                this_constraint_list = constraint_list + [
-                    (t1s.DBP_TABLENAME, "ROWID", pqid)]
-                self.config.results_db.update(
-                    table=t1s.DBP_TABLENAME,
-                    field=t1s.DBP_NUMNEWRETURNEDRECORDS,
-                    value=numnewrecords,
-                    constraint_list=this_constraint_list)
+                updates.append((pqid, numnewrecords))
+        # the ROWIDs all come from rows of this performer, so they need no
+        # further constraint:
+        if updates:
+            self.config.results_db.update_rows(
+                table=t1s.DBP_TABLENAME,
+                field=t1s.DBP_NUMNEWRETURNEDRECORDS,
+                rowids_and_values=updates)
 
     def _check_baseline_correctness(self):
         """Checks and populates the baseline correctness."""
@@ -278,8 +282,35 @@ class Ta1ReportGenerator(report_generator.ReportGenerator):
                     self.atomic_present_cats.append(
                         (cat, subcat, subsubcat, dbnr, dbrs, fieldtype))
 
+    def _precompute_query_slices(self):
+        """Retrieves the numbers of records returned and the latencies of all
+        of the queries in one pass for each of the ways in which the latency
+        and overview sections slice them, so that those sections find them
+        already memoized on the results database."""
+        simple_fields = [(t1s.DBP_TABLENAME, t1s.DBP_NUMNEWRETURNEDRECORDS),
+                         (t1s.DBP_TABLENAME, t1s.DBP_QUERYLATENCY)]
+        constraint_list = self.config.get_constraint_list()
+        dbnr = (t1s.DBF_TABLENAME, t1s.DBF_NUMRECORDS)
+        dbrs = (t1s.DBF_TABLENAME, t1s.DBF_RECORDSIZE)
+        selectioncols = (t1s.DBP_TABLENAME, t1s.DBP_SELECTIONCOLS)
+        cat = (t1s.DBF_TABLENAME, t1s.DBF_CAT)
+        subcat = (t1s.DBF_TABLENAME, t1s.DBF_SUBCAT)
+        for slice_fields in [[dbnr, dbrs, selectioncols, cat],
+                             [dbnr, dbrs, selectioncols, cat, subcat]]:
+            self.config.results_db.precompute_query_values(
+                simple_fields=simple_fields, slice_fields=slice_fields,
+                constraint_list=constraint_list)
+
     def _discover_correctness(self):
         """Populates the correctness_getters attribute."""
+        # analyze all of the performer's queries in a single pass, which
+        # caches the outcome for each query in the results database, so that
+        # the correctness getter for each category only has to sum it up:
+        correctness.QueryCorrectnessGetter(
+            self.config.results_db,
+            constraint_list=[(t1s.DBP_TABLENAME, t1s.DBP_PERFORMERNAME,
+                              self.config.performername)],
+            update_db=True)
         for (cat, subcat, subsubcat, dbnr, dbrs) in self.present_cats:
             cat_string = t1s.CATEGORIES.to_string(cat)
             if subcat not in results_schema.NULL_VALUES:
@@ -307,7 +338,8 @@ class Ta1ReportGenerator(report_generator.ReportGenerator):
                          fieldtype_str)]
                     atomic_correctness_getter = correctness.QueryCorrectnessGetter(
                         self.config.results_db,
-                        constraint_list=atomic_constraint_list, update_db=True)
+                        constraint_list=atomic_constraint_list,
+                        from_cache=True)
                     self._atomic_correctness_getters[
                         category + tuple([fieldtype])
                         ] = atomic_correctness_getter
@@ -319,7 +351,7 @@ class Ta1ReportGenerator(report_generator.ReportGenerator):
             else:
                 correctness_getter = correctness.QueryCorrectnessGetter(
                     self.config.results_db,
-                    constraint_list=this_constraint_list, update_db=True)
+                    constraint_list=this_constraint_list, from_cache=True)
             self._correctness_getters[category] = correctness_getter
 
     def get_correctness_getter(self, cat=None, subcat=None, subsubcat=None,
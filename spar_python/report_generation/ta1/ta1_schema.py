@@ -22,7 +22,7 @@ DBF_ALIAS1 = "dbf1"
 DBF_ALIAS2 = "dbf2"
 
 # field types in the results database:
-FIELD_TYPES = enum.Enum("TEXT", "INTEGER", "REAL", "BOOL")
+FIELD_TYPES = enum.Enum("TEXT", "INTEGER", "REAL", "BOOL", "BLOB")
 # field types in the test database:
 TEST_FIELD_TYPES = enum.Enum("integer", "string", "enum", "date")
 
@@ -208,7 +208,7 @@ DBF_FIELDS_TO_TYPES = {
     DBF_P8N: FIELD_TYPES.INTEGER,
     DBF_P9MATCHINGRECORDCOUNTS: FIELD_TYPES.TEXT,
     DBF_NUMMATCHINGRECORDS: FIELD_TYPES.INTEGER,
-    DBF_MATCHINGRECORDIDS: FIELD_TYPES.TEXT,
+    DBF_MATCHINGRECORDIDS: FIELD_TYPES.BLOB,
     DBF_MATCHINGRECORDHASHES: FIELD_TYPES.TEXT,
     DBF_P1ANDNUMRECORDSMATCHINGFIRSTTERM: FIELD_TYPES.INTEGER,
     DBF_P1ORSUMRECORDSMATCHINGEACHTERM: FIELD_TYPES.INTEGER,
@@ -429,6 +429,39 @@ PVER_REQUIRED_FIELDS = [
     PVER_VERIFICATION,
     PVER_VERIFICATIONLATENCY]
 
+# the query correctness cache, which holds the outcome of the correctness
+# analysis of each performer query (see
+# ta1_analysis_correctness.QueryCorrectnessGetter), so that the correctness
+# metrics of any set of queries can be summed up without redoing it:
+PQC_TABLENAME = "performer_query_correctness"
+PQC_PQID = "performer_row_id"
+PQC_FAILED = "failed"
+PQC_COUNTED = "counted"
+PQC_NUMTRUEPOS = "num_true_positives"
+PQC_NUMFALSEPOS = "num_false_positives"
+PQC_NUMFALSENEG = "num_false_negatives"
+PQC_NUMBADHASH = "num_bad_hashes"
+PQC_RANKED = "ranked"
+PQC_BADLYRANKED = "badly_ranked"
+PQC_ISCORRECT = "correctness"
+
+PQC_FIELDS_TO_TYPES = {
+    PQC_PQID: FIELD_TYPES.INTEGER,
+    PQC_FAILED: FIELD_TYPES.BOOL,
+    PQC_COUNTED: FIELD_TYPES.BOOL,
+    PQC_NUMTRUEPOS: FIELD_TYPES.INTEGER,
+    PQC_NUMFALSEPOS: FIELD_TYPES.INTEGER,
+    PQC_NUMFALSENEG: FIELD_TYPES.INTEGER,
+    PQC_NUMBADHASH: FIELD_TYPES.INTEGER,
+    PQC_RANKED: FIELD_TYPES.BOOL,
+    PQC_BADLYRANKED: FIELD_TYPES.BOOL,
+    PQC_ISCORRECT: FIELD_TYPES.BOOL}
+
+PQC_REQUIRED_FIELDS = [
+    PQC_PQID,
+    PQC_FAILED,
+    PQC_COUNTED]
+
 TABLENAME_TO_FIELDTOTYPE = {
     DBA_TABLENAME: DBA_FIELDS_TO_TYPES,
     DBF_TABLENAME: DBF_FIELDS_TO_TYPES,
@@ -439,7 +472,8 @@ TABLENAME_TO_FIELDTOTYPE = {
     PMODS_TABLENAME: PMODS_FIELDS_TO_TYPES,
     F2A_TABLENAME: F2A_FIELDS_TO_TYPES,
     F2F_TABLENAME: F2F_FIELDS_TO_TYPES,
-    PVER_TABLENAME: PVER_FIELDS_TO_TYPES}
+    PVER_TABLENAME: PVER_FIELDS_TO_TYPES,
+    PQC_TABLENAME: PQC_FIELDS_TO_TYPES}
 
 TABLENAME_TO_REQUIREDFIELDS = {
     DBA_TABLENAME: DBA_REQUIRED_FIELDS,
@@ -451,12 +485,12 @@ TABLENAME_TO_REQUIREDFIELDS = {
     PMODS_TABLENAME: PMODS_REQUIRED_FIELDS,
     F2A_TABLENAME: F2A_REQUIRED_FIELDS,
     F2F_TABLENAME: F2F_REQUIRED_FIELDS,
-    PVER_TABLENAME: PVER_REQUIRED_FIELDS}
+    PVER_TABLENAME: PVER_REQUIRED_FIELDS,
+    PQC_TABLENAME: PQC_REQUIRED_FIELDS}
 
 # a dictionary of all pipe-delimited list fields, in (table, field) form,
 # mapped to the type of their elements:
 LIST_FIELDS = {
-    (DBF_TABLENAME, DBF_MATCHINGRECORDIDS): int,
     (DBF_TABLENAME, DBF_MATCHINGRECORDHASHES): str,
     (DBF_TABLENAME, DBF_REJECTINGPOLICIES): str,
     (DBF_TABLENAME, DBF_P9MATCHINGRECORDCOUNTS): int,
@@ -481,6 +515,12 @@ LIST_FIELDS = {
     (PVER_TABLENAME, PVER_EVENTMSGIDS): str,
     (PVER_TABLENAME, PVER_EVENTMSGVALS): str}
 
+# the set of all integer list fields which are stored packed into BLOBs (see
+# results_schema.pack_integer_list) rather than pipe-delimited, in
+# (table, field) form:
+PACKED_LIST_FIELDS = set([
+    (DBF_TABLENAME, DBF_MATCHINGRECORDIDS)])
+
 # a dictionary mapping each table to auxiliary lines necessary in its
 # construction:
 TABLENAME_TO_AUX = {
@@ -500,7 +540,29 @@ TABLENAME_TO_AUX = {
              "FOREIGN KEY (%s) REFERENCES %s (ROWID)" %
              (F2A_AQID, DBA_TABLENAME)]),
     PMODS_TABLENAME: "UNIQUE (%s, %s)" % (PMODS_SENDTIME, PMODS_RESULTSTIME),
-    PVER_TABLENAME: "UNIQUE (%s, %s)" % (PVER_SENDTIME, PVER_RESULTSTIME)}
+    PVER_TABLENAME: "UNIQUE (%s, %s)" % (PVER_SENDTIME, PVER_RESULTSTIME),
+    PQC_TABLENAME:
+    ",".join(["FOREIGN KEY (%s) REFERENCES %s (ROWID)" %
+              (PQC_PQID, DBP_TABLENAME),
+              "UNIQUE (%s)" % PQC_PQID])}
+
+# a dictionary mapping each table to the tuples of fields on which it has
+# secondary indices (see ResultsDB.create_indices). These cover the fields
+# which reports filter on and the fields on which tables are joined (other
+# than those which are already indexed by a UNIQUE constraint):
+TABLENAME_TO_INDICES = {
+    DBA_TABLENAME: [(DBA_CAT, DBA_SUBCAT)],
+    DBF_TABLENAME: [(DBF_CAT, DBF_SUBCAT),
+                    (DBF_NUMRECORDS, DBF_RECORDSIZE)],
+    DBP_TABLENAME: [(DBP_PERFORMERNAME, DBP_ISTHROUGHPUTQUERY),
+                    (DBP_FQID,)],
+    MODS_TABLENAME: [(MODS_MID,)],
+    MODQUERIES_TABLENAME: [(MODQUERIES_MID,)],
+    M2MQ_TABLENAME: [(M2MQ_MID,), (M2MQ_QID,)],
+    PMODS_TABLENAME: [(PMODS_PERFORMER,), (PMODS_MID,)],
+    F2A_TABLENAME: [(F2A_FQID,), (F2A_AQID,)],
+    F2F_TABLENAME: [(F2F_COMPOSITEQID,), (F2F_BASEQID,)],
+    PVER_TABLENAME: [(PVER_PERFORMER,)]}
 
 PERFORMER_TABLENAMES = set(
     [DBP_TABLENAME, PMODS_TABLENAME, PVER_TABLENAME])
@@ -542,9 +604,11 @@ class Ta1ResultsSchema(ResultsSchema):
     def __init__(self):
         super(Ta1ResultsSchema, self).__init__()
         self.list_fields = LIST_FIELDS
+        self.packed_list_fields = PACKED_LIST_FIELDS
         self.tablename_to_fieldtotype = TABLENAME_TO_FIELDTOTYPE
         self.tablename_to_requiredfields = TABLENAME_TO_REQUIREDFIELDS
         self.tablename_to_aux = TABLENAME_TO_AUX
+        self.tablename_to_indices = TABLENAME_TO_INDICES
         self.tablename_to_joins = TABLENAME_TO_JOINS
         self.performer_tablenames = PERFORMER_TABLENAMES
         self.other_tablenames_heirarchy = OTHER_TABLENAMES_HEIRARCHY
@@ -111,7 +111,10 @@ class Ta2Config(config.Config):
     def results_db(self):
         """Returns the results database."""
         if not self.__results_db:
-            self.__results_db = t2d.Ta2ResultsDB(self.results_db_path)
+            self.__results_db = t2d.Ta2ResultsDB(
+                self.results_db_path,
+                check_query_plans=self.check_query_plans,
+                memoize_queries=self.memoize_queries)
         return self.__results_db
     
     def get_constraint_list(self, fields, require_correct=True,
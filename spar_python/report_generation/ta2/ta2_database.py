@@ -25,13 +25,17 @@ class Ta2ResultsDB(results_database.ResultsDB):
     A TA2 results database, containing per-evaluation information.
     """
 
-    def __init__(self, db_path):
+    def __init__(self, db_path, check_query_plans=False,
+                 memoize_queries=False):
         """
-        Initializes the database with a location (db_path) and a logger.
+        Initializes the database with a location (db_path) and a logger, and
+        with whether the plans of its queries are to be checked for full table
+        scans and whether the values they retrieve are to be memoized.
         """
         schema = t2s.Ta2ResultsSchema()
         super(Ta2ResultsDB, self).__init__(
-            db_path, schema)        
+            db_path, schema, check_query_plans=check_query_plans,
+            memoize_queries=memoize_queries)
 
     def _get_next_id(self, table_name, id_field_name):
         """Returns the next value of the given field in the given table."""
@@ -75,8 +75,10 @@ class Ta2ReportGenerator(report_generator.ReportGenerator):
         self._report_template_name = "report.txt"
         # the following is to be populated in create_sections:
         self._sections = []
-        # perform all of the pre-processing:
-        self._populate_ground_truth()
+        # perform all of the pre-processing, making all of its updates in a
+        # single transaction:
+        with self.config.results_db.bulk_writes():
+            self._populate_ground_truth()
 
     def _populate_ground_truth(self):
         """Populates the ground truth with the baseline outputs."""
@@ -266,6 +266,17 @@ TABLENAME_TO_AUX = {
         (PEREVALUATION_IID,
          PEREVALUATION_TIMESTAMP)])}
 
+# a dictionary mapping each table to the tuples of fields on which it has
+# secondary indices (see ResultsDB.create_indices). These cover the fields
+# which reports filter on and the fields on which tables are joined (other
+# than those which are already indexed by a UNIQUE constraint):
+TABLENAME_TO_INDICES = {
+    CIRCUIT_TABLENAME: [(CIRCUIT_PID,), (CIRCUIT_TESTTYPE,)],
+    INPUT_TABLENAME: [(INPUT_CID,)],
+    PERKEYGEN_TABLENAME: [(PERKEYGEN_PERFORMERNAME,)],
+    PERINGESTION_TABLENAME: [(PERINGESTION_PERFORMERNAME,)],
+    PEREVALUATION_TABLENAME: [(PEREVALUATION_PERFORMERNAME,)]}
+
 PERFORMER_TABLENAMES = set(
     [PERKEYGEN_TABLENAME, PERINGESTION_TABLENAME,
      PEREVALUATION_TABLENAME])
@@ -338,6 +349,7 @@ class Ta2ResultsSchema(ResultsSchema):
         self.tablename_to_fieldtotype = TABLENAME_TO_FIELDTOTYPE
         self.tablename_to_requiredfields = TABLENAME_TO_REQUIREDFIELDS
         self.tablename_to_aux = TABLENAME_TO_AUX
+        self.tablename_to_indices = TABLENAME_TO_INDICES
         self.tablename_to_joins = TABLENAME_TO_JOINS
         self.performer_tablenames = PERFORMER_TABLENAMES
         self.other_tablenames_heirarchy = OTHER_TABLENAMES_HEIRARCHY